@@ -1,13 +1,26 @@
 #!/usr/bin/env bash
 
+# With --skip-contrail-restart the services are only enabled, the caller
+# restarts the ones whose config changed
+restart_contrail=1
+for arg in "$@"; do
+    if [ "$arg" == "--skip-contrail-restart" ]; then
+        restart_contrail=0
+    fi
+done
+
 #restart analytics services based on distribution
 if [ -f /etc/lsb-release ] && (egrep -q 'DISTRIB_RELEASE.*16.04' /etc/lsb-release); then
     for svc in alarm-gen analytics-api analytics-nodemgr collector query-engine snmp-collector topology; do
             chkconfig contrail-$svc on
-            service contrail-$svc restart
+            if [ $restart_contrail -eq 1 ]; then
+                service contrail-$svc restart
+            fi
     done
 else
     #setup script for analytics package under supervisord
     chkconfig supervisor-analytics on
-    service supervisor-analytics restart
+    if [ $restart_contrail -eq 1 ]; then
+        service supervisor-analytics restart
+    fi
 fi
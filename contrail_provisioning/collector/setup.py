@@ -3,16 +3,48 @@ import sys
 import argparse
 import ConfigParser
 
-from fabric.api import local, settings
+from contrail_provisioning.common.lazy import local, settings
 
 from contrail_provisioning.common.base import ContrailSetup
+from contrail_provisioning.common.service_restarts import ServiceGroup
 from contrail_provisioning.collector.templates import contrail_query_engine_conf
 from contrail_provisioning.collector.templates import contrail_collector_conf
 from contrail_provisioning.collector.templates import contrail_analytics_nodemgr_template
 from contrail_provisioning.collector.templates import redis_server_conf_template
 from contrail_provisioning.common.templates import contrail_database_template
 
+KEYSTONE_AUTH_CONF = '/etc/contrail/contrail-keystone-auth.conf'
+DATABASE_CONF = '/etc/contrail/contrail-database.conf'
+VNC_API_LIB_INI = '/etc/contrail/vnc_api_lib.ini'
+SUPERVISOR_ANALYTICS_FILES = '/etc/contrail/supervisord_analytics_files'
+
+# Config files read by each analytics node service
+ANALYTICS_SERVICES = ServiceGroup('supervisor-analytics', [
+    ('contrail-collector', ['/etc/contrail/contrail-collector.conf',
+                            DATABASE_CONF]),
+    ('contrail-query-engine', ['/etc/contrail/contrail-query-engine.conf',
+                               DATABASE_CONF]),
+    ('contrail-analytics-api', ['/etc/contrail/contrail-analytics-api.conf',
+                                KEYSTONE_AUTH_CONF, VNC_API_LIB_INI,
+                                DATABASE_CONF]),
+    ('contrail-alarm-gen', ['/etc/contrail/contrail-alarm-gen.conf',
+                            KEYSTONE_AUTH_CONF, VNC_API_LIB_INI]),
+    ('contrail-snmp-collector', ['/etc/contrail/contrail-snmp-collector.conf',
+                                 KEYSTONE_AUTH_CONF, VNC_API_LIB_INI,
+                                 SUPERVISOR_ANALYTICS_FILES +
+                                 '/contrail-snmp-collector.ini']),
+    ('contrail-topology', ['/etc/contrail/contrail-topology.conf',
+                           KEYSTONE_AUTH_CONF, VNC_API_LIB_INI,
+                           SUPERVISOR_ANALYTICS_FILES +
+                           '/contrail-topology.ini']),
+    ('contrail-analytics-nodemgr', ['/etc/contrail/contrail-analytics-nodemgr.conf']),
+    ], supervisor_files=[SUPERVISOR_ANALYTICS_FILES +
+                         '/contrail-snmp-collector.ini',
+                         SUPERVISOR_ANALYTICS_FILES + '/contrail-topology.ini'])
+
 class CollectorSetup(ContrailSetup):
+    use_render_plan = True
+
     def __init__(self, args_str = None):
         super(CollectorSetup, self).__init__()
         self._args = None
@@ -153,9 +185,9 @@ class CollectorSetup(ContrailSetup):
                  template_vals = {'__cassandra_user__': self._args.cassandra_user,
                                   '__cassandra_password__': self._args.cassandra_password
                                  }
-                 self._template_substitute_write(contrail_database_template.template,
-                                        template_vals, self._temp_dir_name + '/contrail-collector-database.conf')
-                 local("sudo mv %s/contrail-collector-database.conf /etc/contrail/contrail-database.conf" %(self._temp_dir_name))
+                 self._install_template(contrail_database_template.template,
+                                        template_vals,
+                                        '/etc/contrail/contrail-database.conf')
     # end fixup_cassandra_config
 
     def fixup_contrail_alarm_gen(self):
@@ -229,9 +261,9 @@ class CollectorSetup(ContrailSetup):
                              ' '.join('%s:%s' %(server, '8086') for server \
                              in self._args.collector_ip_list)
                          }
-        self._template_substitute_write(contrail_analytics_nodemgr_template.template,
-                                        template_vals, self._temp_dir_name + '/contrail-analytics-nodemgr.conf')
-        local("sudo mv %s/contrail-analytics-nodemgr.conf /etc/contrail/contrail-analytics-nodemgr.conf" %(self._temp_dir_name))
+        self._install_template(contrail_analytics_nodemgr_template.template,
+                               template_vals,
+                               '/etc/contrail/contrail-analytics-nodemgr.conf')
 
     def fixup_contrail_topology(self):
         conf_fl = '/etc/contrail/contrail-topology.conf'
@@ -293,10 +325,8 @@ class CollectorSetup(ContrailSetup):
         kafka_broker_list = [server[0] + ":9092" for server in self.cassandra_server_list]
         kafka_broker_list_str = ' '.join(map(str, kafka_broker_list))
         template_vals['__contrail_kafka_broker_list__'] = kafka_broker_list_str
-        self._template_substitute_write(contrail_collector_conf.template,
-                                   template_vals, self._temp_dir_name + '/contrail-collector.conf')
-        local("sudo mv %s/contrail-collector.conf %s" % \
-              (self._temp_dir_name, COLLECTOR_CONF_FILE))
+        self._install_template(contrail_collector_conf.template,
+                               template_vals, COLLECTOR_CONF_FILE)
 
         # pickup the number of partitions from alarmgen conf
         # if it isn't there, collector conf should use defaults too
@@ -321,9 +351,9 @@ class CollectorSetup(ContrailSetup):
                          '__contrail_redis_password__' : ''}
         if self._args.redis_password:
             template_vals['__contrail_redis_password__'] = 'password = '+ self._args.redis_password
-        self._template_substitute_write(contrail_query_engine_conf.template,
-                                        template_vals, self._temp_dir_name + '/contrail-query-engine.conf')
-        local("sudo mv %s/contrail-query-engine.conf /etc/contrail/contrail-query-engine.conf" %(self._temp_dir_name))
+        self._install_template(contrail_query_engine_conf.template,
+                               template_vals,
+                               '/etc/contrail/contrail-query-engine.conf')
 
     def fixup_contrail_analytics_api(self):
         conf_file = '/etc/contrail/contrail-analytics-api.conf'
@@ -394,17 +424,24 @@ class CollectorSetup(ContrailSetup):
         local("sudo service redis-server start")
 
     def restart_collector(self):
-        local("sudo service supervisor-analytics restart")
+        if self.changed_files is None:
+            local("sudo service supervisor-analytics restart")
+        else:
+            self.restart_changed_services(ANALYTICS_SERVICES)
 
     def run_services(self):
         #disable redis from init.d since upstart has been added
         if self.pdist == 'Ubuntu':
             self.load_redis_upstart_file()
 
+        setup_args = ''
         if self._args.num_nodes:
-            local("sudo collector-server-setup.sh multinode")
-        else:
-            local("sudo collector-server-setup.sh")
+            setup_args = ' multinode'
+        if self.changed_files is not None:
+            setup_args += ' --skip-contrail-restart'
+        local("sudo collector-server-setup.sh%s" % setup_args)
+        if self.changed_files is not None:
+            self.restart_changed_services(ANALYTICS_SERVICES)
 
 #end class CollectorSetup
 
@@ -414,7 +451,7 @@ def main(args_str = None):
 
 def fix_collector_config(args_str = None):
     collector = CollectorSetup(args_str)
-    collector.fixup_config_files()
+    collector.render_config_files()
     collector.restart_collector()
 
 if __name__ == "__main__":
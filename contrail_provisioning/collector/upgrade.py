@@ -7,10 +7,19 @@
 import os
 from distutils.version import LooseVersion
 
-from fabric.api import local
+from contrail_provisioning.common.lazy import local
 
 from setup import CollectorSetup
 from contrail_provisioning.common.upgrade import ContrailUpgrade
+from contrail_provisioning.common.config_rules import IniFile, Set, \
+    SetDefault, Delete, Transform, Dedent, apply_rules
+
+COLLECTOR_CONF = '/etc/contrail/contrail-collector.conf'
+QE_CONF = '/etc/contrail/contrail-query-engine.conf'
+ANALYTICS_API_CONF = '/etc/contrail/contrail-analytics-api.conf'
+ALARM_GEN_CONF = '/etc/contrail/contrail-alarm-gen.conf'
+TOPOLOGY_CONF = '/etc/contrail/contrail-topology.conf'
+SNMP_COLLECTOR_CONF = '/etc/contrail/contrail-snmp-collector.conf'
 
 
 class CollectorUpgrade(ContrailUpgrade, CollectorSetup):
@@ -39,10 +48,104 @@ class CollectorUpgrade(ContrailUpgrade, CollectorSetup):
         local('service supervisor-analytics restart')
 
     def upgrade(self):
+        if self._dry_run():
+            return
         self._upgrade()
         self.update_config()
         self.restart()
 
+    def _cql_server_list(self, servers):
+        return ' '.join('%s:%s' % (server.split(':')[0], '9042')
+                        for server in servers.split())
+
+    def _alarm_gen_partitions(self):
+        # None deletes partitions when alarm-gen has no valid value
+        pstr = IniFile(ALARM_GEN_CONF).get('DEFAULTS', 'partitions')
+        try:
+            int(pstr)
+        except (TypeError, ValueError):
+            return None
+        return pstr
+
+    def _api_server(self):
+        return self._args.cfgm_ip + ':8082'
+
+    def _rabbitmq_server_list(self):
+        return ','.join(self._args.amqp_ip_list)
+
+    def _has_amqp(self, conf):
+        return bool(self._args.amqp_ip_list)
+
+    def config_rules(self):
+        # The values of the other releases are callables, only evaluated
+        # when their rule applies
+        kafka_broker_list_str = ' '.join(server[0] + ":9092"
+                                         for server in self.cassandra_server_list)
+        rules = [
+            # From 3.0:
+            # Sanitize qe_conf by removing leading spaces from each line so
+            # that iniparse can open it
+            Dedent('3.00', QE_CONF),
+            Set('3.00', COLLECTOR_CONF, 'DEFAULT', 'kafka_broker_list',
+                kafka_broker_list_str),
+            # Analytics services no longer connect to the local collector.
+            # All analytics services other than collector would subscribe for
+            # the collector service with discovery server.
+            Set('3.00', TOPOLOGY_CONF, 'DISCOVERY', 'disc_server_ip',
+                self._args.cfgm_ip),
+            Set('3.00', TOPOLOGY_CONF, 'DISCOVERY', 'disc_server_port', '5998'),
+            Set('3.00', QE_CONF, 'DISCOVERY', 'server', self._args.cfgm_ip),
+            Set('3.00', QE_CONF, 'DISCOVERY', 'port', '5998'),
+            Delete('3.00', QE_CONF, 'DEFAULT', 'collectors'),
+            Delete('3.00', ANALYTICS_API_CONF, 'DEFAULTS', 'collectors'),
+            # Collector, query engine, analytics api use CQL to connect to
+            # cassandra and hence the port in DEFAULT.cassandra_server_list
+            # needs to be updated to the default CQL port - 9042
+            Transform('3.00', QE_CONF, 'DEFAULT', 'cassandra_server_list',
+                      self._cql_server_list),
+            Transform('3.00', COLLECTOR_CONF, 'DEFAULT',
+                      'cassandra_server_list', self._cql_server_list),
+            Transform('3.00', ANALYTICS_API_CONF, 'DEFAULTS',
+                      'cassandra_server_list', self._cql_server_list),
+            # Analytics AAA mode
+            # When upgrading, check contrail-analytics-api.conf for aaa_mode,
+            # if it does not exist then set it to the the passed value or
+            # "no-auth" if no value is passed, along with the API server VIP
+            Set(None, ANALYTICS_API_CONF, 'DEFAULTS', 'api_server',
+                self._api_server, when=lambda conf: not conf.has('DEFAULTS', 'aaa_mode')),
+            SetDefault(None, ANALYTICS_API_CONF, 'DEFAULTS', 'aaa_mode',
+                       self._args.aaa_mode or 'no-auth'),
+            # From 3.10, provision rabbitmq_server_list and rabbitmq_port in
+            # contrail-alarm-gen.conf, when the amqp servers are given
+            Set('3.1', ALARM_GEN_CONF, 'DEFAULTS', 'rabbitmq_server_list',
+                self._rabbitmq_server_list, when=self._has_amqp),
+            Set('3.1', ALARM_GEN_CONF, 'DEFAULTS', 'rabbitmq_port',
+                self._args.amqp_port, when=self._has_amqp),
+            # We must ensure that the number of partitions in collector
+            # and analytics-api is same as that in alarm-gen
+            Set(None, COLLECTOR_CONF, 'DEFAULT', 'partitions',
+                self._alarm_gen_partitions),
+            Set(None, ANALYTICS_API_CONF, 'DEFAULTS', 'partitions',
+                self._alarm_gen_partitions),
+        ]
+        # Collector uses Zookeeper servers from 3.0
+        if self.zookeeper_server_list:
+            rules.append(Set('3.00', COLLECTOR_CONF, 'DEFAULT',
+                'zookeeper_server_list',
+                ','.join('%s:%s' % zookeeper_server for zookeeper_server in \
+                self.zookeeper_server_list)))
+        # From 4.0, the analytics services talk to the API server, set on
+        # every upgrade to 4.0 or later as the API server may have moved
+        for conf_file, section in [(COLLECTOR_CONF, 'API_SERVER'),
+                                   (ALARM_GEN_CONF, 'API_SERVER'),
+                                   (SNMP_COLLECTOR_CONF, 'API_SERVER'),
+                                   (TOPOLOGY_CONF, 'API_SERVER')]:
+            rules += [Set('4.00', conf_file, section, 'api_server_list',
+                          self._api_server, every=True),
+                      Set('4.00', conf_file, section, 'api_server_use_ssl',
+                          str(self.api_ssl_enabled), every=True)]
+        return rules
+
     def update_config(self):
         # Seperate contrail-<role>-nodemgr.conf is introduced from release 2.20
         if (self._args.from_rel < LooseVersion('2.20') and
@@ -56,134 +159,15 @@ class CollectorUpgrade(ContrailUpgrade, CollectorSetup):
             if not os.path.exists('/etc/contrail/contrail-keystone-auth.conf'):
                 self.fixup_keystone_auth_config_file(False)
 
-        # From 3.0:
-        # 1. Alarmgen is enabled by default.
-        # 2. Analytics services no longer connect to the local collector.
-        #    All analytics services other than collector would subscribe for
-        #    the collector service with discovery server.
-        # 3. Collector uses Zookeeper servers.
-        # 4. Collector, query engine, analytics api use CQL to connect to
-        #    cassandra and hence the port in DEFAULT.cassandra_server_list
-        #    needs to be updated to the default CQL port - 9042
+        # From 3.0, Alarmgen is enabled by default.
         if (self._args.from_rel < LooseVersion('3.00') and
             self._args.to_rel >= LooseVersion('3.00')):
-            collector_conf = '/etc/contrail/contrail-collector.conf'
-            qe_conf = '/etc/contrail/contrail-query-engine.conf'
-            # Sanitize qe_conf by removing leading spaces from each line so
-            # that iniparse can open it
-            local('sed "s/^[ \t]*//" -i %s' % (qe_conf))
-            # 1. Alarmgen is enabled by default.
             self.fixup_contrail_alarm_gen()
-            kafka_broker_list = [server[0] + ":9092"\
-                                 for server in self.cassandra_server_list]
-            kafka_broker_list_str = ' '.join(map(str, kafka_broker_list))
-            self.set_config(collector_conf, 'DEFAULT', 'kafka_broker_list',
-                kafka_broker_list_str)
-            # 2. Analytics services no longer connect to the local collector.
-            #    All analytics services other than collector would subscribe for
-            #    the collector service with discovery server.
-            topology_conf = '/etc/contrail/contrail-topology.conf'
-            self.set_config(topology_conf, 'DISCOVERY',
-                            'disc_server_ip', self._args.cfgm_ip)
-            self.set_config(topology_conf, 'DISCOVERY',
-                            'disc_server_port', '5998')
-            self.set_config(qe_conf, 'DISCOVERY',
-                            'server', self._args.cfgm_ip)
-            self.set_config(qe_conf, 'DISCOVERY',
-                            'port', '5998')
-            self.del_config(qe_conf, 'DEFAULT', 'collectors')
-            analytics_api_conf = '/etc/contrail/contrail-analytics-api.conf'
-            self.del_config(analytics_api_conf, 'DEFAULTS', 'collectors')
-            # 3. Collector uses Zookeeper servers.
-            if self.zookeeper_server_list:
-                self.set_config(collector_conf, 'DEFAULT',
-                    'zookeeper_server_list',
-                    ','.join('%s:%s' % zookeeper_server for zookeeper_server in \
-                    self.zookeeper_server_list))
-            # 4. Collector, query engine, analytics api use CQL to connect to
-            #    cassandra and hence the port in DEFAULT.cassandra_server_list
-            #    needs to be updated to the default CQL port - 9042
-            qe_cass_server_list = self.get_config(qe_conf, 'DEFAULT',
-                'cassandra_server_list')
-            self.set_config(qe_conf, 'DEFAULT', 'cassandra_server_list',
-                ' '.join('%s:%s' % (server.split(':')[0], '9042') for server \
-                in qe_cass_server_list.split()))
-            collector_cass_server_list = self.get_config(collector_conf, 'DEFAULT',
-                'cassandra_server_list')
-            self.set_config(collector_conf, 'DEFAULT', 'cassandra_server_list',
-                ' '.join('%s:%s' % (server.split(':')[0], '9042') for server \
-                in collector_cass_server_list.split()))
-            analytics_api_cass_server_list = self.get_config(analytics_api_conf,
-                'DEFAULTS', 'cassandra_server_list')
-            self.set_config(analytics_api_conf, 'DEFAULTS',
-                'cassandra_server_list',
-                ' '.join('%s:%s' % (server.split(':')[0], '9042') for server \
-                in analytics_api_cass_server_list.split()))
-
-        # Analytics AAA mode
-        # 1. When upgrading, check contrail-analytics-api.conf for aaa_mode,
-        #    if it does not exist then set it to the the passed value or
-        #    "no-auth" if no value is passed
-        # 2. contrail-analytics-api.conf API server VIP needs to be specified
-        analytics_api_conf = '/etc/contrail/contrail-analytics-api.conf'
-        has_aaa_mode = self.has_config(analytics_api_conf, 'DEFAULTS',
-            'aaa_mode')
-        if not has_aaa_mode:
-            aaa_mode = self._args.aaa_mode if self._args.aaa_mode else \
-                'no-auth'
-            self.set_config(analytics_api_conf, 'DEFAULTS', 'aaa_mode',
-                aaa_mode)
-            self.set_config(analytics_api_conf, 'DEFAULTS', 'api_server',
-                self._args.cfgm_ip + ':8082')
-
-        # From 3.10:
-        # 1. Provision rabbitmq_server_list  and rabbitmq_port in
-        #    contrail-alarm-gen.conf
-        if (self._args.from_rel < LooseVersion('3.1') and
-                self._args.to_rel >= LooseVersion('3.1')):
-            alarm_gen_conf = '/etc/contrail/contrail-alarm-gen.conf'
-            self.set_config(alarm_gen_conf, 'DEFAULTS', 'rabbitmq_server_list',
-                ','.join(self._args.amqp_ip_list))
-            self.set_config(alarm_gen_conf, 'DEFAULTS', 'rabbitmq_port',
-                self._args.amqp_port)
-
-        # We must ensure that the number of partitions in collector
-        # and analytics-api is same as that in alarm-gen
-        try:
-            pstr = self.get_config('/etc/contrail/contrail-alarm-gen.conf',\
-                    'DEFAULTS', 'partitions')
-            pint = int(pstr)
-            self.set_config('/etc/contrail/contrail-collector.conf',\
-                    'DEFAULT', 'partitions', pstr)
-            self.set_config('/etc/contrail/contrail-analytics-api.conf',\
-                    'DEFAULTS', 'partitions', pstr)
-        except:
-            self.replace_in_file('/etc/contrail/contrail-collector.conf',\
-                    'partitions', '')
-            self.replace_in_file('/etc/contrail/contrail-analytics-api.conf',\
-                    'partitions', '')
-
-        if (self._args.to_rel >= LooseVersion('4.00')):
-            collector_conf = '/etc/contrail/contrail-collector.conf'
-            set_config(collector_conf, 'API_SERVER', 'api_server_list',
-                    self._args.cfgm_ip+':8082')
-            set_config(collector_conf, 'API_SERVER', 'api_server_use_ssl',
-                    str(self.api_ssl_enabled))
-            alarmgen_conf = '/etc/contrail/contrail-alarm-gen.conf'
-            self.set_config(alarmgen_conf, 'API_SERVER', 'api_server_list',
-                    self._args.cfgm_ip+':8082')
-            self.set_config(alarmgen_conf, 'API_SERVER', 'api_server_use_ssl',
-                    str(self.api_ssl_enabled))
-            snmp_collector_conf = '/etc/contrail/contrail-snmp-collector.conf'
-            self.set_config(snmp_collector_conf, 'API_SERVER', 'api_server_list',
-                    self._args.cfgm_ip+':8082')
-            self.set_config(snmp_collector_conf, 'API_SERVER', 'api_server_use_ssl',
-                    str(self.api_ssl_enabled))
-            topology_conf = '/etc/contrail/contrail-topology.conf'
-            self.set_config(topology_conf, 'API_SERVER', 'api_server_list',
-                    self._args.cfgm_ip+':8082')
-            self.set_config(topology_conf, 'API_SERVER', 'api_server_use_ssl',
-                    str(self.api_ssl_enabled))
+
+        # The remaining changes of all the releases crossed, one read and
+        # write per file
+        apply_rules(self.config_rules(), self._args.from_rel,
+                    self._args.to_rel)
     # end update_config
 
 def main():
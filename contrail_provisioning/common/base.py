@@ -11,28 +11,45 @@ import shutil
 import socket
 import argparse
 import tempfile
-import platform
 import ConfigParser
+from contextlib import contextmanager
 
-from fabric.api import *
+from contrail_provisioning.common.lazy import local, settings, lcd
+from contrail_provisioning.common import platform_info
+from contrail_provisioning.common.render_plan import RenderPlan
+from contrail_provisioning.common.service_restarts import restart_services
 from contrail_provisioning.common.templates import contrail_keystone_auth_conf
 from contrail_provisioning.config.templates import vnc_api_lib_ini
 
 class ContrailSetup(object):
+    # Roles whose config files are rendered and committed as one plan
+    use_render_plan = False
+
     def __init__(self):
-        (self.pdist, self.pdistversion, self.pdistrelease) = platform.dist()
+        (self.pdist, self.pdistversion, self.pdistrelease) = platform_info.dist()
         self.hostname = socket.gethostname()
-        if self.pdist == 'Ubuntu':
+        if (self.pdist == 'Ubuntu' and
+                os.path.realpath('/sbin/chkconfig') != os.path.realpath('/bin/true')):
             local("ln -sf /bin/true /sbin/chkconfig")
 
-        self._temp_dir_name = tempfile.mkdtemp()
+        self.__temp_dir_name = None
         self.contrail_bin_dir = '/opt/contrail/bin'
         self._fixed_qemu_conf = False
+        self._render_plan = None
+        self.changed_files = None
 
         # Parser defaults
         self.global_defaults = {
         }
 
+    @property
+    def _temp_dir_name(self):
+        # Created on first use, so that argument errors and -h don't
+        # leave temp directories behind.
+        if self.__temp_dir_name is None:
+            self.__temp_dir_name = tempfile.mkdtemp()
+        return self.__temp_dir_name
+
     def _parse_args(self, args_str):
         '''
             Base parser.
@@ -91,7 +108,56 @@ class ContrailSetup(object):
         outfile.write(data)
         outfile.close()
 
+    @contextmanager
+    def render_plan(self):
+        """Collects the config files written in the block and commits
+        them together when it completes.
+        """
+        self._render_plan = RenderPlan(self._temp_dir_name)
+        try:
+            yield self._render_plan
+            self._render_plan.commit()
+        finally:
+            self._render_plan = None
+
+    def render_config_files(self):
+        """Runs fixup_config_files, as one render plan when the role uses
+        it. Returns the changed files, None when they are not known.
+        """
+        if not self.use_render_plan:
+            self.fixup_config_files()
+            return None
+        with self.render_plan() as plan:
+            self.fixup_config_files()
+        self.changed_files = plan.changed
+        return self.changed_files
+
+    def restart_changed_services(self, group):
+        """Restarts the services of group whose config files changed."""
+        use_supervisor = (group.supervisor is not None and
+                          not (self.pdist in ['Ubuntu'] and
+                               self.pdistversion == '16.04'))
+        return restart_services(group, self.changed_files, use_supervisor)
+
+    def _install_template(self, template, vals, path, mode=None, owner=None):
+        """Renders template to path, in the render plan if one is active."""
+        data = self._template_substitute(template, vals)
+        if self._render_plan:
+            self._render_plan.render(path, data, mode, owner)
+            return
+        tmp_file = os.path.join(self._temp_dir_name, os.path.basename(path))
+        with open(tmp_file, 'w') as f:
+            f.write(data)
+        local("sudo mv %s %s" % (tmp_file, path))
+        if mode is not None:
+            local("sudo chmod %o %s" % (mode, path))
+        if owner is not None:
+            local("sudo chown %s %s" % (owner, path))
+
     def _replaces_in_file(self, file, replacement_list):
+        if self._render_plan:
+            self._render_plan.replace_lines(file, replacement_list)
+            return
         rs = [ (re.compile(regexp), repl) for (regexp, repl) in replacement_list]
         file_tmp = file + ".tmp"
         with open(file, 'r') as f:
@@ -317,9 +383,9 @@ class ContrailSetup(object):
                          '__keystone_key_file_opt__': 'keyfile=%s' % self._get_keystone_certs()[2] if self._args.keystone_certfile else '',
                          '__keystone_ca_file_opt__': 'cafile=%s' % self._get_keystone_certs()[1] if self._args.keystone_cafile else '',
                         }
-        self._template_substitute_write(contrail_keystone_auth_conf.template,
-                                        template_vals, self._temp_dir_name + '/contrail-keystone-auth.conf')
-        local("sudo mv %s/contrail-keystone-auth.conf /etc/contrail/" %(self._temp_dir_name))
+        self._install_template(contrail_keystone_auth_conf.template,
+                               template_vals,
+                               '/etc/contrail/contrail-keystone-auth.conf')
 
     def fixup_vnc_api_lib_ini(self):
         if hasattr(self, 'contrail_internal_vip'):
@@ -334,10 +400,9 @@ class ContrailSetup(object):
                          '__contrail_authn_url__': authn_url,
                          '__auth_protocol__': self._args.keystone_auth_protocol,
                         }
-        self._template_substitute_write(vnc_api_lib_ini.template,
-                                        template_vals, self._temp_dir_name + '/vnc_api_lib.ini')
-        local("sudo mv %s/vnc_api_lib.ini /etc/contrail/" %(self._temp_dir_name))
         conf_file = "/etc/contrail/vnc_api_lib.ini"
+        self._install_template(vnc_api_lib_ini.template, template_vals,
+                               conf_file, owner='contrail:contrail')
         if self.api_ssl_enabled:
             certfile, cafile, keyfile = self._get_apiserver_certs()
             configs = {'certfile': certfile,
@@ -349,7 +414,7 @@ class ContrailSetup(object):
         if self._args.orchestrator == 'vcenter':
             # Remove the auth setion from /etc/contrail/vnc_api_lib.ini
             # if orchestrator is not openstack
-            local("sudo contrail-config --del %s auth" % conf_file)
+            self.del_config(conf_file, 'auth')
         elif self._args.orchestrator == 'openstack' and self.keystone_ssl_enabled:
             certfile, cafile, keyfile = self._get_keystone_certs()
             configs = {'cafile': cafile,
@@ -358,19 +423,29 @@ class ContrailSetup(object):
                        'insecure': self._args.keystone_insecure}
             for param, value in configs.items():
                 self.set_config(conf_file, 'auth', param, value)
-        local("sudo chown contrail:contrail %s" % conf_file)
+        if not self._render_plan:
+            # The config edits do not keep the owner
+            local("sudo chown contrail:contrail %s" % conf_file)
 
     def set_config(self, fl, sec, var, val=''):
+        if self._render_plan:
+            self._render_plan.set_config(fl, sec, var, val)
+            return
         with settings(warn_only=True):
             local("contrail-config --set %s %s %s '%s'" % (
                         fl, sec, var, val))
 
     def del_config(self, fl, sec, var=''):
+        if self._render_plan:
+            self._render_plan.del_config(fl, sec, var)
+            return
         with settings(warn_only=True):
             local("contrail-config --del %s %s %s" % (
                         fl, sec, var))
 
     def get_config(self, fl, sec, var=''):
+        if self._render_plan:
+            return self._render_plan.get_config(fl, sec, var)
         output = None
         with settings(warn_only=True):
             output = local("openstack-config --get %s %s %s" % (
@@ -378,6 +453,8 @@ class ContrailSetup(object):
         return output
 
     def has_config(self, fl, sec, var=''):
+        if self._render_plan:
+            return self._render_plan.has_config(fl, sec, var or None)
         has = False
         with settings(warn_only=True):
             output = local("openstack-config --has %s %s %s" % (
@@ -389,5 +466,5 @@ class ContrailSetup(object):
         self.disable_selinux()
         self.disable_iptables()
         self.setup_coredump()
-        self.fixup_config_files()
+        self.render_config_files()
         self.run_services()
@@ -0,0 +1,268 @@
+#!/usr/bin/python
+#
+# Copyright (c) 2016 Juniper Networks, Inc. All rights reserved.
+#
+"""Declarative config migrations for the Contrail upgrade.
+
+Each rule names the release which introduced it. The rules applicable to
+a from/to release range are grouped by file and every file is read and
+written once, whatever the number of rules and releases crossed.
+
+    rules = [Set('3.00', conf, 'DEFAULT', 'kafka_broker_list', brokers),
+             Delete('3.00', conf, 'DEFAULT', 'collectors'),
+             Transform('3.00', conf, 'DEFAULT', 'cassandra_server_list',
+                       lambda servers: ...)]
+    apply_rules(rules, from_rel, to_rel)
+
+A rule with no release always applies, a rule made with every=True
+applies to every upgrade to its release or a later one, not only to the
+upgrades crossing it. Values may be callables, they are then evaluated
+when the rule is applied, so that the settings of the other releases are
+not needed.
+"""
+
+import os
+import re
+import shutil
+import tempfile
+from distutils.version import LooseVersion
+
+SECTION_RE = re.compile(r'^\s*\[([^\]]+)\]')
+OPTION_RE = re.compile(r'^\s*([^#;\s\[][^=:]*?)\s*[=:]\s*(.*?)\s*$')
+
+
+class IniFile(object):
+    """Line preserving ini file editor.
+
+    The file is read from path, unless its content is given.
+    """
+
+    def __init__(self, path, content=None):
+        self.path = path
+        self.exists = os.path.isfile(path)
+        self.lines = []
+        if content is not None:
+            self.lines = content.splitlines()
+        elif self.exists:
+            with open(path, 'r') as fd:
+                self.lines = fd.read().splitlines()
+        self.original = list(self.lines)
+
+    def render(self):
+        return '\n'.join(self.lines) + '\n'
+
+    def _section_range(self, section):
+        """(header index, end index) of section, None if not present."""
+        start = None
+        for index, line in enumerate(self.lines):
+            match = SECTION_RE.match(line)
+            if not match:
+                continue
+            if start is not None:
+                return start, index
+            if match.group(1).strip() == section:
+                start = index
+        if start is None:
+            return None
+        return start, len(self.lines)
+
+    def _find(self, section, key):
+        bounds = self._section_range(section)
+        if not bounds:
+            return None
+        for index in range(bounds[0] + 1, bounds[1]):
+            match = OPTION_RE.match(self.lines[index])
+            if match and match.group(1) == key:
+                return index
+        return None
+
+    def has(self, section, key=None):
+        if key is None:
+            return self._section_range(section) is not None
+        return self._find(section, key) is not None
+
+    def get(self, section, key):
+        index = self._find(section, key)
+        if index is None:
+            return None
+        return OPTION_RE.match(self.lines[index]).group(2)
+
+    def set(self, section, key, value):
+        line = '%s = %s' % (key, value)
+        index = self._find(section, key)
+        if index is not None:
+            self.lines[index] = line
+            return
+        bounds = self._section_range(section)
+        if not bounds:
+            if self.lines and self.lines[-1].strip():
+                self.lines.append('')
+            self.lines += ['[%s]' % section, line]
+            return
+        # After the last option of the section
+        insert_at = bounds[0] + 1
+        for index in range(bounds[0] + 1, bounds[1]):
+            if OPTION_RE.match(self.lines[index]):
+                insert_at = index + 1
+        self.lines.insert(insert_at, line)
+
+    def delete(self, section, key=None):
+        if key is None:
+            bounds = self._section_range(section)
+            if bounds:
+                del self.lines[bounds[0]:bounds[1]]
+            return
+        index = self._find(section, key)
+        if index is not None:
+            del self.lines[index]
+
+    def dedent(self):
+        self.lines = [line.lstrip(' \t') for line in self.lines]
+
+    def changed(self):
+        return self.lines != self.original
+
+    def save(self):
+        if not self.changed():
+            return False
+        directory = os.path.dirname(self.path) or '.'
+        fd, tmp = tempfile.mkstemp(dir=directory,
+                                   prefix='.%s.' % os.path.basename(self.path))
+        with os.fdopen(fd, 'w') as tmp_file:
+            tmp_file.write(self.render())
+        if self.exists:
+            shutil.copymode(self.path, tmp)
+        else:
+            os.chmod(tmp, 0644)
+        os.rename(tmp, self.path)
+        self.original = list(self.lines)
+        return True
+
+
+def _value(value):
+    return value() if callable(value) else value
+
+
+class Rule(object):
+    """A config change introduced in release since (None: always).
+
+    when, if given, is called with the IniFile and the rule is skipped
+    when it returns False. Subclasses make the change in edit(conf).
+    """
+
+    def __init__(self, since, path, when=None, every=False):
+        self.since = LooseVersion(since) if since else None
+        self.path = path
+        self.when = when
+        self.every = every
+
+    def applies(self, from_rel, to_rel):
+        if self.since is None:
+            return True
+        if self.every:
+            return to_rel >= self.since
+        return from_rel < self.since and to_rel >= self.since
+
+    def apply(self, conf):
+        if self.when is None or self.when(conf):
+            self.edit(conf)
+
+
+class Set(Rule):
+    """Sets section.key, deletes it if the value evaluates to None."""
+
+    def __init__(self, since, path, section, key, value, when=None,
+                 every=False):
+        super(Set, self).__init__(since, path, when, every)
+        self.section, self.key, self.value = section, key, value
+
+    def edit(self, conf):
+        value = _value(self.value)
+        if value is None:
+            conf.delete(self.section, self.key)
+        else:
+            conf.set(self.section, self.key, value)
+
+
+class SetDefault(Set):
+    """Sets section.key only if it is not present."""
+
+    def edit(self, conf):
+        if not conf.has(self.section, self.key):
+            super(SetDefault, self).edit(conf)
+
+
+class Delete(Rule):
+    """Deletes section.key, or the whole section if key is None."""
+
+    def __init__(self, since, path, section, key=None, when=None,
+                 every=False):
+        super(Delete, self).__init__(since, path, when, every)
+        self.section, self.key = section, key
+
+    def edit(self, conf):
+        conf.delete(self.section, self.key)
+
+
+class Rename(Rule):
+    """Moves section.key to new_section.new_key, keeping its value."""
+
+    def __init__(self, since, path, section, key, new_section, new_key,
+                 when=None, every=False):
+        super(Rename, self).__init__(since, path, when, every)
+        self.section, self.key = section, key
+        self.new_section, self.new_key = new_section, new_key
+
+    def edit(self, conf):
+        value = conf.get(self.section, self.key)
+        if value is None:
+            return
+        conf.delete(self.section, self.key)
+        conf.set(self.new_section, self.new_key, value)
+
+
+class Transform(Rule):
+    """Replaces the value of section.key by func(value), if present."""
+
+    def __init__(self, since, path, section, key, func, when=None,
+                 every=False):
+        super(Transform, self).__init__(since, path, when, every)
+        self.section, self.key, self.func = section, key, func
+
+    def edit(self, conf):
+        value = conf.get(self.section, self.key)
+        if value is not None:
+            conf.set(self.section, self.key, self.func(value))
+
+
+class Dedent(Rule):
+    """Strips the leading whitespace of every line, for iniparse."""
+
+    def edit(self, conf):
+        conf.dedent()
+
+
+def select_rules(rules, from_rel, to_rel):
+    """Applicable rules grouped by file, [(path, [rules])] in rule order."""
+    grouped = []
+    index = {}
+    for rule in rules:
+        if not rule.applies(from_rel, to_rel):
+            continue
+        if rule.path not in index:
+            index[rule.path] = len(grouped)
+            grouped.append((rule.path, []))
+        grouped[index[rule.path]][1].append(rule)
+    return grouped
+
+
+def apply_rules(rules, from_rel, to_rel):
+    """Applies the rules for from_rel -> to_rel, returns changed files."""
+    changed = []
+    for path, file_rules in select_rules(rules, from_rel, to_rel):
+        conf = IniFile(path)
+        for rule in file_rules:
+            rule.apply(conf)
+        if conf.save():
+            changed.append(path)
+    return changed
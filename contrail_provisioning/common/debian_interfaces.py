@@ -0,0 +1,258 @@
+#!/usr/bin/python
+#
+# Copyright (c) 2016 Juniper Networks, Inc. All rights reserved.
+#
+"""Parser and serializer for Debian /etc/network/interfaces files.
+
+Stanzas keep their original lines, so files round trip unchanged unless
+a stanza is edited, and only the files which actually changed are
+written back.
+"""
+
+import os
+import re
+import glob
+
+from contrail_provisioning.common import netstate
+
+STANZA_KEYWORDS = ('iface', 'mapping', 'auto', 'source', 'source-directory',
+                   'source-dir')
+SOURCE_DIR_FILE_RE = re.compile('^[a-zA-Z0-9_-]+$')
+OPTION_INDENT = '    '
+
+
+def _is_stanza_start(line):
+    fields = line.split()
+    if not fields:
+        return False
+    return fields[0] in STANZA_KEYWORDS or fields[0].startswith('allow-')
+
+
+def _is_trivia(line):
+    stripped = line.strip()
+    return not stripped or stripped.startswith('#')
+
+
+def _split_trailing_trivia(lines):
+    """Splits lines into (content, trailing blank/comment lines)."""
+    end = len(lines)
+    while end and _is_trivia(lines[end - 1]):
+        end -= 1
+    return lines[:end], lines[end:]
+
+
+class Stanza(object):
+    """A stanza header line and the lines following it up to the next one."""
+
+    def __init__(self, keyword, args, body=None, header=None):
+        self.keyword = keyword
+        self.args = list(args)
+        self.body = list(body or [])
+        self._header = header
+
+    @classmethod
+    def iface(cls, name, method, options=()):
+        stanza = cls('iface', [name, 'inet', method])
+        for key, value in options:
+            stanza.add_option(key, value)
+        stanza.body.append('')
+        return stanza
+
+    @property
+    def name(self):
+        if self.keyword in ('iface', 'mapping'):
+            return self.args[0]
+        return None
+
+    def header(self):
+        if self._header is not None:
+            return self._header
+        return ' '.join([self.keyword] + self.args)
+
+    def options(self):
+        """(key, value) pairs of the stanza options, in file order."""
+        options = []
+        for line in self.body:
+            if _is_trivia(line):
+                continue
+            fields = line.strip().split(None, 1)
+            options.append((fields[0], fields[1] if len(fields) > 1 else ''))
+        return options
+
+    def get_options(self, key):
+        return [value for k, value in self.options() if k == key]
+
+    def add_option(self, key, value):
+        content, trailing = _split_trailing_trivia(self.body)
+        line = OPTION_INDENT + ('%s %s' % (key, value) if value else key)
+        self.body = content + [line] + trailing
+
+    def remove_options(self, keys):
+        self.body = [line for line in self.body if _is_trivia(line) or
+                     line.strip().split(None, 1)[0] not in keys]
+
+    def set_method(self, method):
+        self.args[2] = method
+        self._header = None
+
+    def remove_ifaces(self, names):
+        """Drops names from an auto/allow- line, True if none are left."""
+        remaining = [arg for arg in self.args if arg not in names]
+        if remaining != self.args:
+            self.args = remaining
+            self._header = None
+        return not self.args
+
+    def lines(self):
+        return [self.header()] + self.body
+
+
+class InterfacesFile(object):
+    """A single interfaces file: leading lines followed by stanzas."""
+
+    def __init__(self, path, text=''):
+        self.path = path
+        self.original = text
+        self.leading = []
+        self.stanzas = []
+        self.parse(text)
+
+    @classmethod
+    def load(cls, path):
+        return cls(path, netstate.read_file(path) or '')
+
+    def parse(self, text):
+        self.leading = []
+        self.stanzas = []
+        continued = False
+        for line in text.splitlines():
+            # Continuation lines stay attached to the line they continue
+            if not continued and not _is_trivia(line) and \
+               _is_stanza_start(line):
+                fields = line.split()
+                self.stanzas.append(Stanza(fields[0], fields[1:],
+                                           header=line))
+            elif self.stanzas:
+                self.stanzas[-1].body.append(line)
+            else:
+                self.leading.append(line)
+            continued = line.endswith('\\')
+
+    def serialize(self):
+        lines = list(self.leading)
+        for stanza in self.stanzas:
+            lines.extend(stanza.lines())
+        if not lines:
+            return ''
+        return '\n'.join(lines) + '\n'
+
+    @property
+    def changed(self):
+        return self.serialize() != self.original
+
+    def find_iface(self, name):
+        for stanza in self.stanzas:
+            if stanza.keyword == 'iface' and stanza.name == name:
+                return stanza
+        return None
+
+    def _drop(self, index):
+        # Comments trailing a dropped stanza usually describe the next one
+        _, trailing = _split_trailing_trivia(self.stanzas[index].body)
+        if index:
+            self.stanzas[index - 1].body.extend(trailing)
+        else:
+            self.leading.extend(trailing)
+        del self.stanzas[index]
+
+    def remove_iface(self, name):
+        """Removes the iface stanzas and auto/allow- entries of name."""
+        index = 0
+        while index < len(self.stanzas):
+            stanza = self.stanzas[index]
+            if stanza.keyword == 'iface' and stanza.name == name:
+                self._drop(index)
+            elif ((stanza.keyword == 'auto' or
+                   stanza.keyword.startswith('allow-')) and
+                  stanza.remove_ifaces([name])):
+                self._drop(index)
+            else:
+                index += 1
+
+    def append(self, stanza):
+        if self.stanzas and self.stanzas[-1].body[-1:] != ['']:
+            self.stanzas[-1].body.append('')
+        elif not self.stanzas and self.leading and self.leading[-1] != '':
+            self.leading.append('')
+        self.stanzas.append(stanza)
+
+    def add_iface(self, name, method, options=(), auto=True):
+        if auto:
+            self.append(Stanza('auto', [name]))
+        stanza = Stanza.iface(name, method, options)
+        self.stanzas.append(stanza)
+        return stanza
+
+
+class InterfacesConfig(object):
+    """The main interfaces file together with every file it sources."""
+
+    def __init__(self, path='/etc/network/interfaces'):
+        self.path = path
+        self.base_dir = os.path.dirname(path)
+        self.files = []
+        self._load(path)
+
+    def _resolve(self, entry):
+        if not entry.startswith(os.path.sep):
+            entry = os.path.normpath(os.path.join(self.base_dir, entry))
+        return sorted(glob.glob(entry))
+
+    def _load(self, path):
+        if path in [cfg.path for cfg in self.files]:
+            return
+        cfg = InterfacesFile.load(path)
+        self.files.append(cfg)
+        for stanza in cfg.stanzas:
+            if stanza.keyword == 'source':
+                for entry in stanza.args:
+                    for sourced in self._resolve(entry):
+                        if os.path.isfile(sourced):
+                            self._load(sourced)
+            elif stanza.keyword in ('source-directory', 'source-dir'):
+                for entry in stanza.args:
+                    for directory in self._resolve(entry):
+                        if not os.path.isdir(directory):
+                            continue
+                        for name in sorted(os.listdir(directory)):
+                            sourced = os.path.join(directory, name)
+                            if (os.path.isfile(sourced) and
+                                    SOURCE_DIR_FILE_RE.match(name)):
+                                self._load(sourced)
+
+    @property
+    def main(self):
+        return self.files[0]
+
+    def file_for_iface(self, name):
+        """The file holding the iface stanza of name, None if not found."""
+        for cfg in self.files:
+            if cfg.find_iface(name):
+                return cfg
+        return None
+
+    def find_iface(self, name):
+        cfg = self.file_for_iface(name)
+        return cfg.find_iface(name) if cfg else None
+
+    def remove_iface(self, name):
+        for cfg in self.files:
+            cfg.remove_iface(name)
+
+    def save(self):
+        """Atomically writes every changed file, returns their paths."""
+        changed = [cfg for cfg in self.files if cfg.changed]
+        for cfg in changed:
+            netstate.install_file(cfg.path, cfg.serialize())
+            cfg.original = cfg.serialize()
+        return [cfg.path for cfg in changed]
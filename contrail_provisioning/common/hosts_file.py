@@ -0,0 +1,152 @@
+#!/usr/bin/python
+#
+# Copyright (c) 2016 Juniper Networks, Inc. All rights reserved.
+#
+"""Convergence of /etc/hosts to managed blocks of host entries.
+
+The desired entries are computed once and rendered into a section between
+marker lines. Each component (rabbitmq, storage, ...) owns a block of its
+own, named by the block argument, and only rewrites that block, leaving
+the blocks of the other components as they are. Managed names are
+dropped from the unmanaged lines, so each node gets a single idempotent
+write, and none when it is already in sync. Remote nodes are handled
+concurrently.
+"""
+
+import re
+from StringIO import StringIO
+
+from contrail_provisioning.common.lazy import run, settings, put
+
+from contrail_provisioning.common.netstate import read_file, install_file
+from contrail_provisioning.common.parallel import run_on_hosts
+
+HOSTS_FILE = '/etc/hosts'
+BEGIN_MARKER = '# BEGIN contrail-provisioning %s hosts'
+END_MARKER = '# END contrail-provisioning %s hosts'
+MARKER_RE = re.compile(r'^# (BEGIN|END) contrail-provisioning (\S+) hosts$')
+
+
+def merge_entries(entries):
+    """Merges [(ip, [names])] into an ordered [(ip, [names])].
+
+    Each name is kept once, on the last address it is given for.
+    """
+    owner = {}
+    for ip, names in entries:
+        for name in names:
+            owner[name] = ip
+    merged = []
+    index = {}
+    for ip, names in entries:
+        if ip not in index:
+            index[ip] = len(merged)
+            merged.append((ip, []))
+        ip_names = merged[index[ip]][1]
+        for name in names:
+            if owner[name] == ip and name not in ip_names:
+                ip_names.append(name)
+    return merged
+
+
+def render_hosts(content, entries, block):
+    """Returns content with the managed block named block set to entries."""
+    entries = merge_entries(entries)
+    managed_names = set()
+    for ip, names in entries:
+        managed_names.update(names)
+
+    lines = []
+    in_block = None
+    position = None
+    for line in content.splitlines():
+        marker = MARKER_RE.match(line.strip())
+        if marker:
+            in_block = marker.group(2) if marker.group(1) == 'BEGIN' else None
+            # The blocks of the other components are kept as they are
+            if marker.group(2) != block:
+                lines.append(line)
+            elif in_block and position is None:
+                position = len(lines)
+            continue
+        if in_block == block:
+            continue
+        if in_block is not None:
+            lines.append(line)
+            continue
+        fields = line.split('#', 1)[0].split()
+        if len(fields) < 2:
+            lines.append(line)
+            continue
+        ip, names = fields[0], fields[1:]
+        kept = [name for name in names if name not in managed_names]
+        if kept == names:
+            lines.append(line)
+        elif kept:
+            lines.append('%s %s' % (ip, ' '.join(kept)))
+
+    block_lines = [BEGIN_MARKER % block]
+    block_lines += ['%s %s' % (entry_ip, ' '.join(entry_names))
+                    for entry_ip, entry_names in entries]
+    block_lines.append(END_MARKER % block)
+    # The block stays where it is, a new one goes at the end
+    if position is not None:
+        lines[position:position] = block_lines
+        return '\n'.join(lines) + '\n'
+    while lines and not lines[-1].strip():
+        lines.pop()
+    if lines:
+        lines.append('')
+    return '\n'.join(lines + block_lines) + '\n'
+
+
+def converge_local_hosts(entries, block, path=HOSTS_FILE):
+    """Converges the local hosts file, returns True if it was changed."""
+    content = read_file(path) or ''
+    desired = render_hosts(content, entries, block)
+    if desired == content:
+        return False
+    install_file(path, desired, 0644)
+    return True
+
+
+def converge_remote_hosts(entry):
+    """Runs in a pool worker, returns (host, changed), changed being None
+    if the host could not be converged.
+    """
+    host, token, entries, block, commands = entry
+    with settings(host_string='root@%s' % host, password=token,
+                  warn_only=True):
+        content = run('cat %s' % HOSTS_FILE)
+        if content.failed:
+            return host, None
+        content = '\n'.join(content.splitlines()) + '\n'
+        desired = render_hosts(content, entries, block)
+        changed = desired != content
+        if changed:
+            staged = '/etc/.hosts.new'
+            if put(StringIO(desired), staged).failed:
+                return host, None
+            if run('chmod 644 %s && mv -f %s %s' %
+                   (staged, staged, HOSTS_FILE)).failed:
+                return host, None
+        if commands and run('\n'.join(commands), shell='/bin/bash').failed:
+            return host, None
+    return host, changed
+
+
+def converge_hosts(hosts, entries, block, commands=None):
+    """Converges the hosts file of every (host, token) in parallel.
+
+    commands are extra shell commands run on each host in the same
+    session. Returns the hosts whose file was changed.
+    """
+    if not hosts:
+        return []
+    work = [(host, token, entries, block, commands) for host, token in hosts]
+    results = run_on_hosts(converge_remote_hosts, work, len(work))
+    failed = [host for host, changed in results if changed is None]
+    if failed:
+        raise RuntimeError('Unable to update %s on %s'
+                           % (HOSTS_FILE, ', '.join(failed)))
+    return [host for host, changed in results if changed]
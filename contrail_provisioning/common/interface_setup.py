@@ -15,18 +15,13 @@ import socket
 import fcntl
 import struct
 import logging
-import platform
 import time
 import json
 import subprocess
-from netaddr import IPNetwork
-from tempfile import NamedTemporaryFile
-from distutils.version import LooseVersion
-try:
-    import lsb_release
-except ImportError:
-    pass
 
+from contrail_provisioning.common import netstate
+from contrail_provisioning.common import platform_info
+from contrail_provisioning.common.lazy import netaddr
 from contrail_provisioning.common.templates import vlan_egress_map
 
 
@@ -34,7 +29,8 @@ logging.basicConfig(format='%(asctime)-15s:: %(funcName)s:%(levelname)s::\
                             %(message)s',
                     level=logging.INFO)
 log = logging.getLogger(__name__)
-(PLATFORM, VERSION, EXTRA) = platform.linux_distribution()
+(PLATFORM, VERSION, EXTRA) = platform_info.linux_distribution()
+LINK_WAIT_TIMEOUT = 60
 
 bond_opts_dict  = {'arp_interval' : 'int',
                    'arp_ip_target': 'ipaddr_list',
@@ -71,7 +67,11 @@ class BaseInterface(object):
                                                        self.bond_opts)
         self.bond_opts_str = ''
         self.mac_list = {}
-        self.tempfile = NamedTemporaryFile(delete=False)
+        self.timeout    = kwargs.get('timeout', LINK_WAIT_TIMEOUT)
+        # path -> (content, mode) of the configs to install, and the
+        # contents they replace (None for new files) for rollback
+        self.pending_files = {}
+        self.original_files = {}
 
     def validate_bond_opts(self):
         for key in list(self.bond_opts):
@@ -108,6 +108,57 @@ class BaseInterface(object):
                                                         str(compare_dict[key])))
         return False
 
+    def read_cfg_file(self, path):
+        '''Return the staged contents of the given file, falling back to
+            the contents on disk
+        '''
+        if path in self.pending_files:
+            return self.pending_files[path][0]
+        return netstate.read_file(path) or ''
+
+    def stage_file(self, path, content, mode=None):
+        '''Queue a config file to be installed by commit_files'''
+        if path not in self.original_files:
+            self.original_files[path] = netstate.read_file(path)
+        self.pending_files[path] = (content, mode)
+
+    def backup_file_name(self, path):
+        return os.path.join(os.path.dirname(path),
+                            'moved-%s' %os.path.basename(path))
+
+    def commit_files(self):
+        '''Atomically install all the staged configs, returns the list of
+            files which changed
+        '''
+        changed = []
+        try:
+            for path, (content, mode) in sorted(self.pending_files.items()):
+                original = self.original_files[path]
+                if content == original:
+                    continue
+                if original is not None:
+                    backup = self.backup_file_name(path)
+                    log.info('Backup existing file %s to %s' %(path, backup))
+                    os.system('sudo cp %s %s' %(path, backup))
+                log.info('Writing %s' %path)
+                netstate.install_file(path, content, mode)
+                changed.append(path)
+        except Exception:
+            self.rollback_files(changed)
+            raise
+        return changed
+
+    def rollback_files(self, paths):
+        '''Restore the given files to their contents before commit_files'''
+        for path in paths:
+            original = self.original_files[path]
+            log.info('Restoring %s' %path)
+            if original is None:
+                netstate.remove_file(path)
+            else:
+                netstate.install_file(path, original,
+                                      self.pending_files[path][1])
+
     def write_network_script(self, device, cfg):
         '''Create an interface config file in network-scripts with given
             config
@@ -115,17 +166,8 @@ class BaseInterface(object):
         nw_scripts = os.path.join(os.path.sep, 'etc', 'sysconfig', 
                                   'network-scripts')
         nwfile = os.path.join(nw_scripts, 'ifcfg-%s' %device)
-        if os.path.isfile(nwfile):
-            tmpfile = os.path.join(os.path.dirname(nwfile), \
-                                  'moved-%s' %os.path.basename(nwfile))
-            log.info('Backup existing file %s to %s' %(nwfile, tmpfile))
-            os.system('sudo mv %s %s' %(nwfile, tmpfile))
-        with open(self.tempfile.name, 'w') as fd:
-            fd.write('\n'.join(['%s=%s' %(key, value) \
-                          for key, value in cfg.items()]))
-            fd.write('\n')
-            fd.flush()
-        os.system('sudo cp -f %s %s'%(self.tempfile.name, nwfile))
+        self.stage_file(nwfile, '\n'.join(['%s=%s' %(key, value) \
+                                  for key, value in cfg.items()]) + '\n')
 
     def get_mac_addr(self, iface):
         '''Retrieve mac address for the given interface in the system'''
@@ -230,15 +272,69 @@ class BaseInterface(object):
             self.create_vlan_interface()
         self.write_network_script(self.device, cfg)
 
-    def restart_service(self):
-        '''Restart network service'''
-        log.info('Restarting Network Services...')
-        os.system('sudo service network restart')
-        time.sleep(5)
+    def get_affected_devices(self):
+        '''Devices being reconfigured, in the order they are brought up'''
+        devices = list(self.members) + [self.device]
+        if self.vlan:
+            devices.append('%s.%s' %(self.device, self.vlan))
+        return devices
+
+    def bring_down(self, devices):
+        for dev in reversed(devices):
+            subprocess.call('sudo ifdown %s' %dev, shell=True)
+
+    def bring_up(self, devices):
+        # Only the reconfigured devices are bounced, which also avoids
+        # bringing down the PF of a VF together with the VFs.
+        for dev in devices:
+            subprocess.call('sudo ifup %s' %dev, shell=True)
+
+    def get_target_checks(self):
+        '''Checks which pass once the new config is in effect'''
+        checks = []
+        if 'bond' in self.device.lower():
+            for member in self.members:
+                checks.append(('%s enslaved to %s' %(member, self.device),
+                    lambda member=member:
+                        netstate.link_master(member) == self.device))
+        if self.no_ip:
+            checks.append(('%s up' %self.device,
+                lambda: netstate.link_is_admin_up(self.device)))
+            return checks
+        checks.append(('%s link up' %self.device,
+            lambda: netstate.link_is_up(self.device)))
+        ip_dev = self.device
+        if self.vlan:
+            ip_dev = '%s.%s' %(self.device, self.vlan)
+            checks.append(('%s link up' %ip_dev,
+                lambda: netstate.link_is_up(ip_dev)))
+        checks.append(('%s has address %s' %(ip_dev, self.ipaddr),
+            lambda: self.ipaddr in netstate.get_ipv4_addrs(ip_dev)))
+        return checks
 
     def post_conf(self):
-        '''Execute commands after after interface configuration'''
-        self.restart_service()
+        '''Install the staged configs and bring up the affected devices,
+            restoring the previous configs if they do not come up in time
+        '''
+        devices = self.get_affected_devices()
+        log.info('Reconfiguring %s...' %', '.join(devices))
+        self.bring_down(devices)
+        try:
+            changed = self.commit_files()
+        except Exception:
+            self.bring_up(devices)
+            raise
+        self.bring_up(devices)
+        failed = netstate.wait_until(self.get_target_checks(), self.timeout)
+        if not failed:
+            log.info('Interface %s is up' %self.device)
+            return
+        log.error('Not up after %s seconds: %s' %(self.timeout,
+                                                   ', '.join(failed)))
+        self.bring_down(devices)
+        self.rollback_files(changed)
+        self.bring_up(devices)
+        raise RuntimeError('Configuration of %s rolled back' %self.device)
 
     def pre_conf(self):
         '''Execute commands before interface configuration'''
@@ -251,7 +347,7 @@ class BaseInterface(object):
         self.validate_bond_opts()
         self.pre_conf()
         if self.ip:
-            ip = IPNetwork(self.ip)
+            ip = netaddr.IPNetwork(self.ip)
             self.ipaddr = str(ip.ip)
             self.netmask = str(ip.netmask)
         elif not self.no_ip:
@@ -260,47 +356,19 @@ class BaseInterface(object):
             self.create_bonding_interface()
         else:
             self.create_interface()
-        time.sleep(3)
         self.post_conf()
 
 class UbuntuInterface(BaseInterface):
-    def restart_service(self):
-        '''Restart network service for Ubuntu'''
-        log.info('Restarting Network Services...')
-        if LooseVersion(VERSION) < LooseVersion("14.04"):
-            subprocess.call('sudo /etc/init.d/networking restart', shell=True)
-        else:
-            # Avoid bringing down the PF of VF together with the VFs.
-            # Otherwise, the addition of the VF to a bond fails (probably due to
-            # a bug in the ixgbe driver)
-            if self.no_ip:
-                subprocess.call('sudo ifdown %s && ifup %s' % (self.device,
-                                self.device), shell=True)
-            else:
-                output = os.popen("sudo ifquery -l --allow=auto").read()
-                intfs = output.split()
-                lsb_info = lsb_release.get_lsb_information()
-                lsb_version = lsb_info['DESCRIPTION'].split()[1]
-                if LooseVersion(lsb_version) >= LooseVersion('14.04.4'):
-                    for intf in intfs:
-                        subprocess.call('sudo ifdown %s && ifup %s' %
-                                        (intf, intf), shell=True)
-                    subprocess.call('sudo ifup -a', shell=True)
-
-                else:
-                    for intf in intfs:
-                        subprocess.call('sudo ifdown %s && ifup -a' % (intf),
-                                        shell=True)
-        time.sleep(5)
+    def backup_file_name(self, path):
+        return os.path.join(os.path.dirname(path), 'orig.%s.%s' %(
+                    os.path.basename(path), time.strftime('%d%m%y%H%M%S')))
 
     def remove_lines(self, ifaces, filename):
         '''Remove existing config related to given interface if the same
             needs to be re-configured
         '''
         log.info('Remove Existing Interface configs in %s' %filename)
-        # read existing file
-        with open(filename, 'r') as fd:
-            cfg_file = fd.read()
+        cfg_file = self.read_cfg_file(filename)
 
         # get blocks
         keywords = ['allow-', 'auto', 'iface', 'source', 'mapping']
@@ -311,28 +379,21 @@ class UbuntuInterface(BaseInterface):
             return
         matches = map(cfg_file.__getslice__, indices, indices[1:] + [len(cfg_file)])
 
-        # backup old file
-        bckup = os.path.join(os.path.dirname(filename), 'orig.%s.%s' %(
-                    os.path.basename(filename),time.strftime('%d%m%y%H%M%S')))
-        os.system('sudo cp %s %s' %(filename, bckup))
-        os.system('sudo cp %s %s' %(filename, self.tempfile.name))
 
         iface_pattern = '^\s*iface ' + " |^\s*iface ".join(ifaces) + ' '
         auto_pattern = '^\s*auto ' + "|^\s*auto ".join(ifaces)
         allow_pattern = '^\s*allow-hotplug ' + "|^\s*allow-hotplug ".join(ifaces)
-        # write new file
-        with open(self.tempfile.name, 'w') as fd:
-            fd.write('%s\n' %cfg_file[0:indices[0]])
-            for each in matches:
-                each = each.strip()
-                if re.match(auto_pattern, each) or\
-                   re.match(iface_pattern, each) or\
-                   re.match(allow_pattern, each):
-                    continue
-                else:
-                    fd.write('%s\n' %each)
-            fd.flush()
-        os.system('sudo cp -f %s %s'%(self.tempfile.name, filename))
+        # stage new file, old one is backed up when committed
+        content = ['%s\n' %cfg_file[0:indices[0]]]
+        for each in matches:
+            each = each.strip()
+            if re.match(auto_pattern, each) or\
+               re.match(iface_pattern, each) or\
+               re.match(allow_pattern, each):
+                continue
+            else:
+                content.append('%s\n' %each)
+        self.stage_file(filename, ''.join(content))
 
     def pre_conf(self):
         '''Execute commands before interface configuration for Ubuntu'''
@@ -426,15 +487,11 @@ class UbuntuInterface(BaseInterface):
     def write_network_script(self, device, cfg):
         '''Append new configs to interfaces file'''
         interface_file = self.intf_cfgfile_dict[device][0]
-        os.system('sudo cp %s %s' %(interface_file, self.tempfile.name))
-
-        # write new file
-        with open(self.tempfile.name, 'a+') as fd:
-            fd.write('\n%s\n' %cfg[0])
-            fd.write('\n    '.join(cfg[1:]))
-            fd.write('\n')
-            fd.flush()
-        os.system('sudo cp -f %s %s'%(self.tempfile.name, interface_file))
+        content = self.read_cfg_file(interface_file)
+        content += '\n%s\n' %cfg[0]
+        content += '\n    '.join(cfg[1:])
+        content += '\n'
+        self.stage_file(interface_file, content)
 
     @staticmethod
     def _dev_is_vf(dev):
@@ -550,10 +607,7 @@ class UbuntuInterface(BaseInterface):
                 vlan_egress_map.template.safe_substitute(
                         {'__interface__' : interface})
         egress_map_script = '/opt/contrail/bin/vconfig-%s' % interface
-        with open(egress_map_script, 'w+') as fd:
-            fd.write(vlan_egress_map_config)
-            fd.flush()
-        os.chmod(egress_map_script, 0755)
+        self.stage_file(egress_map_script, vlan_egress_map_config, 0755)
 
         return egress_map_script
 
@@ -622,6 +676,12 @@ def parse_cli(args):
     parser.add_argument('--vlan',
                         action='store',
                         help='vLAN ID')
+    parser.add_argument('--timeout',
+                        action='store',
+                        type=int,
+                        default=LINK_WAIT_TIMEOUT,
+                        help='Seconds to wait for the interface to come up '
+                             'before rolling back')
 
     ip_group = parser.add_mutually_exclusive_group(required=True)
     ip_group.add_argument('--ip',
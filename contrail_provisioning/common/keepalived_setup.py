@@ -6,18 +6,15 @@
 import os
 import sys
 import argparse
-import netaddr
-import netifaces
 import ConfigParser
-import platform
-
-from fabric.api import local
 
+from contrail_provisioning.common import platform_info
+from contrail_provisioning.common.lazy import local, netaddr, netifaces
 from contrail_provisioning.common.base import ContrailSetup
 from contrail_provisioning.compute.network import ComputeNetworkSetup
 from contrail_provisioning.common.templates import keepalived_conf_template
 
-(PLATFORM, VERSION, EXTRA) = platform.linux_distribution()
+(PLATFORM, VERSION, EXTRA) = platform_info.linux_distribution()
 
 class KeepalivedSetup(ContrailSetup, ComputeNetworkSetup):
     def __init__(self, args_str = None):
@@ -0,0 +1,64 @@
+#!/usr/bin/python
+#
+# Copyright (c) 2016 Juniper Networks, Inc. All rights reserved.
+#
+"""Deferred imports of the heavy dependencies of the setup scripts.
+
+fabric (with paramiko and its crypto libraries), netaddr and netifaces
+make most of the start-up time of a console script, while -h, argument
+errors and the config-only runs never use them. The modules on the
+start-up path of the scripts get these names from here; the real module
+is imported the first time one of its attributes is used.
+"""
+
+import importlib
+
+
+class LazyModule(object):
+    """Stands for the module name, imported on first attribute access."""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+
+netaddr = LazyModule('netaddr')
+netifaces = LazyModule('netifaces')
+fabric_api = LazyModule('fabric.api')
+
+
+def local(*args, **kwargs):
+    return fabric_api.local(*args, **kwargs)
+
+
+def settings(*args, **kwargs):
+    return fabric_api.settings(*args, **kwargs)
+
+
+def lcd(path):
+    return fabric_api.lcd(path)
+
+
+def run(*args, **kwargs):
+    return fabric_api.run(*args, **kwargs)
+
+
+def sudo(*args, **kwargs):
+    return fabric_api.sudo(*args, **kwargs)
+
+
+def get(*args, **kwargs):
+    return fabric_api.get(*args, **kwargs)
+
+
+def put(*args, **kwargs):
+    return fabric_api.put(*args, **kwargs)
+
+
+def hide(*groups):
+    return fabric_api.hide(*groups)
@@ -0,0 +1,176 @@
+#!/usr/bin/python
+#
+# Copyright (c) 2016 Juniper Networks, Inc. All rights reserved.
+#
+"""Editor for the libvirt config files (qemu.conf, libvirtd.conf).
+
+The files use "key = value" lines, the value being an integer, a quoted
+string or a list of those which may span lines. LibvirtConf keeps every
+other line as is, replaces a setting in place, or adds it after its
+commented out default when it is not set. List settings are merged, so
+entries added by the admin are kept and nothing is duplicated on re-runs.
+
+    conf = LibvirtConf(content)
+    conf.set('user', 'root')
+    conf.merge_list('cgroup_device_acl', ['/dev/net/tun'],
+                    QEMU_DEFAULT_DEVICE_ACL)
+    content = conf.render()
+"""
+
+import os
+import re
+
+from contrail_provisioning.common.netstate import read_file, install_file
+
+QEMU_CONF = '/etc/libvirt/qemu.conf'
+LIBVIRTD_CONF = '/etc/libvirt/libvirtd.conf'
+# Devices allowed by libvirt when cgroup_device_acl is not set
+QEMU_DEFAULT_DEVICE_ACL = ['/dev/null', '/dev/full', '/dev/zero',
+                           '/dev/random', '/dev/urandom',
+                           '/dev/ptmx', '/dev/kvm', '/dev/kqemu',
+                           '/dev/rtc', '/dev/hpet']
+
+TOKEN_RE = re.compile(r'"(?:[^"\\]|\\.)*"|[\[\],]|#.*|[^\s\[\],#"]+')
+SETTING_RE = re.compile(r'^\s*([A-Za-z_][A-Za-z0-9_]*)\s*=(.*)$')
+COMMENTED_RE = re.compile(r'^\s*#\s*([A-Za-z_][A-Za-z0-9_]*)\s*=(.*)$')
+
+
+def _tokens(text):
+    """Value tokens of text, up to a comment."""
+    tokens = []
+    for token in TOKEN_RE.findall(text):
+        if token.startswith('#'):
+            break
+        tokens.append(token)
+    return tokens
+
+
+def _scalar(token):
+    if token.startswith('"'):
+        return re.sub(r'\\(.)', r'\1', token[1:-1])
+    try:
+        return int(token)
+    except ValueError:
+        raise ValueError('Invalid libvirt config value %r' % token)
+
+
+def parse_value(text):
+    """Parses a value, a list being returned as a python list."""
+    tokens = _tokens(text)
+    if not tokens:
+        raise ValueError('Missing libvirt config value')
+    if tokens[0] != '[':
+        return _scalar(tokens[0])
+    return [_scalar(token) for token in tokens[1:] if token not in ',]']
+
+
+def format_value(value):
+    if isinstance(value, (list, tuple)):
+        if not value:
+            return '[ ]'
+        items = [format_value(item) for item in value]
+        return '[\n%s\n]' % ',\n'.join('    %s' % item for item in items)
+    if isinstance(value, bool):
+        return str(int(value))
+    if isinstance(value, (int, long)):
+        return str(value)
+    return '"%s"' % str(value).replace('\\', '\\\\').replace('"', '\\"')
+
+
+def _list_end(lines, index, strip_comment=False):
+    """Index after the line closing the value started at lines[index]."""
+    depth = 0
+    for end in range(index, len(lines)):
+        line = lines[end]
+        if strip_comment:
+            line = re.sub(r'^\s*#', '', line)
+        if end == index:
+            line = line.split('=', 1)[1]
+        tokens = _tokens(line)
+        depth += tokens.count('[') - tokens.count(']')
+        if depth <= 0:
+            return end + 1
+    return len(lines)
+
+
+class LibvirtConf(object):
+    def __init__(self, content=''):
+        self.lines = content.splitlines()
+
+    def _find(self, key):
+        """(start, end) line range of the key setting, None if not set."""
+        for index, line in enumerate(self.lines):
+            match = SETTING_RE.match(line)
+            if match and match.group(1) == key:
+                return index, _list_end(self.lines, index)
+        return None
+
+    def _find_commented(self, key):
+        for index, line in enumerate(self.lines):
+            match = COMMENTED_RE.match(line)
+            if match and match.group(1) == key:
+                return index, _list_end(self.lines, index, True)
+        return None
+
+    def get(self, key, default=None):
+        bounds = self._find(key)
+        if not bounds:
+            return default
+        text = '\n'.join(self.lines[bounds[0]:bounds[1]]).split('=', 1)[1]
+        return parse_value(text)
+
+    def set(self, key, value):
+        """Sets key, returns True if the config was changed."""
+        bounds = self._find(key)
+        if bounds and self.get(key) == value:
+            return False
+        new_lines = ('%s = %s' % (key, format_value(value))).splitlines()
+        if bounds:
+            self.lines[bounds[0]:bounds[1]] = new_lines
+            return True
+        commented = self._find_commented(key)
+        if commented:
+            self.lines[commented[1]:commented[1]] = new_lines
+        else:
+            self.lines += new_lines
+        return True
+
+    def merge_list(self, key, items, default=()):
+        """Adds the missing items to the key list, which is default when
+        not set. Returns True if the config was changed.
+        """
+        current = self.get(key)
+        if current is None:
+            current = list(default)
+        elif not isinstance(current, list):
+            current = [current]
+        merged = current + [item for item in items if item not in current]
+        return self.set(key, merged)
+
+    def update(self, settings=(), lists=()):
+        """Applies settings [(key, value)] and lists [(key, items,
+        default)], returns True if the config was changed.
+        """
+        changed = False
+        for key, value in settings:
+            changed = self.set(key, value) or changed
+        for key, items, default in lists:
+            changed = self.merge_list(key, items, default) or changed
+        return changed
+
+    def render(self):
+        return '\n'.join(self.lines) + '\n'
+
+
+def update_local_conf(path, settings=(), lists=()):
+    """Updates a local libvirt config file with one atomic write, returns
+    True if it was changed.
+    """
+    content = read_file(path)
+    if content is None:
+        raise RuntimeError('%s does not exist' % path)
+    conf = LibvirtConf(content)
+    if not conf.update(settings, lists):
+        return False
+    install_file(path, conf.render(), os.stat(path).st_mode & 0777)
+    return True
@@ -0,0 +1,111 @@
+#!/usr/bin/python
+#
+# Copyright (c) 2016 Juniper Networks, Inc. All rights reserved.
+#
+"""Helpers shared by the interface and static route provisioning scripts.
+
+Files are installed with a sudo copy to a hidden sibling followed by a
+rename, so initscripts/ifupdown never read a half written config. Link and
+address state is read from /sys/class/net and iproute2 (netlink) instead of
+assuming a fixed sleep was long enough.
+"""
+
+import os
+import time
+import logging
+import subprocess
+from tempfile import NamedTemporaryFile
+
+log = logging.getLogger(__name__)
+
+IFF_UP = 0x1
+POLL_INTERVAL = 0.2
+
+
+def read_file(path):
+    """Returns the file contents or None when it does not exist."""
+    if not os.path.isfile(path):
+        return None
+    with open(path, 'r') as fd:
+        return fd.read()
+
+
+def install_file(path, content, mode=None):
+    """Atomically replaces path with content."""
+    staged = os.path.join(os.path.dirname(path),
+                          '.%s.new' % os.path.basename(path))
+    tmp = NamedTemporaryFile(delete=False)
+    try:
+        tmp.write(content)
+        tmp.close()
+        cmds = ['sudo cp -f %s %s' % (tmp.name, staged)]
+        if mode is not None:
+            cmds.append('sudo chmod %o %s' % (mode, staged))
+        cmds.append('sudo mv -f %s %s' % (staged, path))
+        if subprocess.call(' && '.join(cmds), shell=True):
+            subprocess.call('sudo rm -f %s' % staged, shell=True)
+            raise RuntimeError('Unable to install %s' % path)
+    finally:
+        os.unlink(tmp.name)
+
+
+def remove_file(path):
+    subprocess.call('sudo rm -f %s' % path, shell=True)
+
+
+def _read_sys(dev, attr):
+    try:
+        with open('/sys/class/net/%s/%s' % (dev, attr), 'r') as fd:
+            return fd.read().strip()
+    except IOError:
+        return None
+
+
+def link_is_admin_up(dev):
+    flags = _read_sys(dev, 'flags')
+    return flags is not None and bool(int(flags, 16) & IFF_UP)
+
+
+def link_is_up(dev):
+    """True once the device is administratively up and has a link."""
+    if not link_is_admin_up(dev):
+        return False
+    # Virtual devices without carrier reporting stay in 'unknown'
+    return _read_sys(dev, 'operstate') in ('up', 'unknown')
+
+
+def link_master(dev):
+    """Name of the bond/bridge the device is enslaved to, if any."""
+    master = '/sys/class/net/%s/master' % dev
+    if not os.path.islink(master):
+        return None
+    return os.path.basename(os.readlink(master))
+
+
+def get_ipv4_addrs(dev):
+    """IPv4 addresses configured on the device, as reported by netlink."""
+    proc = subprocess.Popen(['ip', '-o', '-4', 'addr', 'show', 'dev', dev],
+                            stdout=subprocess.PIPE,
+                            stderr=open(os.devnull, 'w'))
+    output = proc.communicate()[0]
+    addrs = []
+    for line in output.splitlines():
+        fields = line.split()
+        if 'inet' in fields:
+            addrs.append(fields[fields.index('inet') + 1].split('/')[0])
+    return addrs
+
+
+def wait_until(checks, timeout):
+    """Polls the named checks until all pass or the deadline expires.
+
+    checks is a list of (description, callable) tuples, the descriptions
+    of the checks still failing at the deadline are returned.
+    """
+    deadline = time.time() + timeout
+    pending = list(checks)
+    while True:
+        pending = [(desc, check) for desc, check in pending if not check()]
+        if not pending or time.time() >= deadline:
+            return [desc for desc, _ in pending]
+        time.sleep(POLL_INTERVAL)
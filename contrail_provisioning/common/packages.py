@@ -0,0 +1,167 @@
+#!/usr/bin/python
+#
+# Copyright (c) 2016 Juniper Networks, Inc. All rights reserved.
+#
+"""Package transactions for the Contrail upgrade.
+
+The remove, downgrade, upgrade and replace sets of an upgrade are merged
+into one PackagePlan, which a backend turns into as few package manager
+runs as the distribution allows: a single apt-get run on Ubuntu, one
+rpm -e and one yum run on CentOS/RedHat. Packages which are not installed
+are dropped from the removals up front.
+
+A backend only needs installed() and run(), so the planning can be
+exercised with a fake backend.
+"""
+
+from abc import ABCMeta, abstractmethod
+
+from contrail_provisioning.common.lazy import local, settings
+
+
+def _unique(names):
+    seen = set()
+    result = []
+    for name in names:
+        if name not in seen:
+            seen.add(name)
+            result.append(name)
+    return result
+
+
+def package_name(spec):
+    """Name of a package spec, eg. 'contrail-lib=3.0-2' -> 'contrail-lib'."""
+    return spec.split('=')[0]
+
+
+class PackagePlan(object):
+    """Merged package operations of an upgrade."""
+
+    def __init__(self, remove=(), downgrade=(), upgrade=(), replace=()):
+        self.removals = _unique(list(remove) +
+                                [old for old, new in replace])
+        self.installs = _unique(list(downgrade) + list(upgrade) +
+                                [new for old, new in replace])
+        self.downgrade = bool(downgrade)
+        self.reinstall = bool(replace)
+
+    def is_empty(self):
+        return not self.removals and not self.installs
+
+    def removal_plan(self):
+        """Plan of the removals only."""
+        plan = PackagePlan()
+        plan.removals = list(self.removals)
+        return plan
+
+    def install_plan(self):
+        """Plan of the installs only."""
+        plan = PackagePlan()
+        plan.installs = list(self.installs)
+        plan.downgrade, plan.reinstall = self.downgrade, self.reinstall
+        return plan
+
+    def resolve(self, installed):
+        """Drops the removals which are not in installed."""
+        self.removals = [name for name in self.removals if name in installed]
+
+    def describe(self):
+        lines = ['Package plan:']
+        lines += ['    remove  %s' % name for name in self.removals]
+        lines += ['    install %s' % spec for spec in self.installs]
+        if self.is_empty():
+            lines.append('    nothing to do')
+        return '\n'.join(lines)
+
+
+class PackageBackend(object):
+    __metaclass__ = ABCMeta
+
+    def run(self, cmd):
+        local(cmd)
+
+    @abstractmethod
+    def installed(self, names):
+        """Returns the subset of names which are installed."""
+
+    @abstractmethod
+    def commands(self, plan, simulate=False):
+        """Returns the package manager commands running plan."""
+
+
+class AptBackend(PackageBackend):
+    def __init__(self, force_confmiss=False):
+        self.dpkg_options = ['--force-overwrite', '--force-confnew']
+        if force_confmiss:
+            self.dpkg_options.insert(1, '--force-confmiss')
+
+    def installed(self, names):
+        if not names:
+            return set()
+        output = local("dpkg-query -W -f='${Package} ${Status}\\n' %s "
+                       "2>/dev/null || true" % ' '.join(names), capture=True)
+        return set(line.split()[0] for line in output.splitlines()
+                   if line.endswith(' installed'))
+
+    def commands(self, plan, simulate=False):
+        if plan.is_empty():
+            return []
+        install_names = set(package_name(spec) for spec in plan.installs)
+        # One apt-get run, "pkg-" removes (and purges) pkg
+        specs = plan.installs + ['%s-' % name for name in plan.removals
+                                 if name not in install_names]
+        cmd = 'DEBIAN_FRONTEND=noninteractive apt-get -y --force-yes'
+        for option in self.dpkg_options:
+            cmd += ' -o Dpkg::Options::="%s"' % option
+        if simulate:
+            cmd += ' --simulate'
+        if plan.reinstall:
+            cmd += ' --reinstall'
+        if plan.removals:
+            cmd += ' --purge'
+        return [cmd + ' install %s' % ' '.join(specs)]
+
+
+class YumBackend(PackageBackend):
+    def installed(self, names):
+        if not names:
+            return set()
+        output = local("rpm -q --qf '%%{NAME}\\n' %s 2>/dev/null || true"
+                       % ' '.join(names), capture=True)
+        return set(line.strip() for line in output.splitlines()
+                   if ' ' not in line.strip()) & set(names)
+
+    def commands(self, plan, simulate=False):
+        cmds = []
+        if plan.removals:
+            # Replaced packages are removed without their dependents
+            cmds.append('rpm -e --nodeps %s%s' % ('--test ' if simulate
+                                                  else '',
+                                                  ' '.join(plan.removals)))
+        if plan.installs:
+            repos = '--disablerepo=* --enablerepo=contrail*'
+            # Re-validate the contrail repos metadata only, the cached
+            # metadata is kept and only fetched again if it changed
+            if not simulate:
+                cmds.append('yum %s clean expire-cache' % repos)
+            cmd = 'yum %s %s' % ('--assumeno' if simulate else '-y', repos)
+            if plan.downgrade or plan.reinstall:
+                cmd += ' --nogpgcheck'
+            cmds.append(cmd + ' install %s' % ' '.join(plan.installs))
+        return cmds
+
+
+def apply_plan(backend, plan, dry_run=False):
+    """Runs plan with backend, or only shows it when dry_run is set."""
+    plan.resolve(backend.installed(plan.removals))
+    print plan.describe()
+    cmds = backend.commands(plan, simulate=dry_run)
+    for cmd in cmds:
+        if dry_run:
+            # The simulated runs print the resolved transaction, yum
+            # --assumeno exits non zero
+            with settings(warn_only=True):
+                backend.run(cmd)
+        else:
+            backend.run(cmd)
+    return cmds
@@ -0,0 +1,80 @@
+#!/usr/bin/python
+#
+# Copyright (c) 2016 Juniper Networks, Inc. All rights reserved.
+#
+"""Runs of a function over jobs on a pool of worker processes.
+
+Fabric keeps its connection state in the global env, so hosts are
+handled in separate processes rather than threads. A fabric abort()
+raises SystemExit, which kills a python 2 pool worker without a result
+and leaves the pool waiting for it; workers turn it into a failure.
+"""
+
+import multiprocessing
+
+# Wait (almost) forever on pool results; a plain get() can not be
+# interrupted with Ctrl-C in python 2.
+POOL_WAIT_TIMEOUT = 365 * 24 * 3600
+
+
+def _run_job(call):
+    func, job, on_error = call
+    try:
+        return func(job)
+    except SystemExit as e:
+        error = 'aborted: %s' % e
+    except Exception as e:
+        if on_error is None:
+            raise
+        error = str(e)
+    if on_error is None:
+        raise RuntimeError(error)
+    return on_error(job, error)
+
+
+def run_parallel(func, jobs, workers=None, on_error=None):
+    """Returns [func(job)] of jobs, computed on up to workers processes.
+
+    A job which fails gives on_error(job, error message) when on_error is
+    set, else the failure is raised. func and on_error must be module
+    level functions so that they can be sent to the workers.
+    """
+    if not jobs:
+        return []
+    workers = min(workers or multiprocessing.cpu_count(), len(jobs))
+    calls = [(func, job, on_error) for job in jobs]
+    if workers <= 1:
+        return map(_run_job, calls)
+    pool = multiprocessing.Pool(workers)
+    try:
+        return pool.map_async(_run_job, calls).get(POOL_WAIT_TIMEOUT)
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def host_failed(entry, error):
+    """on_error of the host entries, (host, ...), gives (host, None)."""
+    print 'Failed on %s: %s' % (entry[0], error)
+    return entry[0], None
+
+
+def run_on_hosts(func, entries, max_workers):
+    """Runs func over the (host, ...) entries, one process per host up to
+    max_workers. A host which fails gives (host, None).
+    """
+    return run_parallel(func, entries, max_workers, host_failed)
+
+
+def run_host_script(entry):
+    """Runs the commands of (host, token, commands) as one script which
+    stops at the first failure. Returns (host, succeeded).
+    """
+    # Not imported at module level, local jobs do not need fabric
+    from fabric.api import run, settings
+
+    host, token, commands = entry
+    with settings(host_string='root@%s' % host, password=token,
+                  warn_only=True):
+        result = run('\n'.join(['set -e'] + commands), shell='/bin/bash')
+    return host, result.succeeded
@@ -0,0 +1,28 @@
+#!/usr/bin/python
+#
+# Copyright (c) 2016 Juniper Networks, Inc. All rights reserved.
+#
+"""Cached platform detection for the provisioning scripts.
+
+platform.dist() and platform.linux_distribution() parse the release files
+under /etc on every call; the provisioning modules ask for them at import
+time and again from every ContrailSetup instance.
+"""
+
+import platform
+
+_cache = {}
+
+
+def dist():
+    """Returns (distname, version, id) as platform.dist() does."""
+    if 'dist' not in _cache:
+        _cache['dist'] = platform.dist()
+    return _cache['dist']
+
+
+def linux_distribution():
+    """Returns (distname, version, id) as platform.linux_distribution() does."""
+    if 'linux_distribution' not in _cache:
+        _cache['linux_distribution'] = platform.linux_distribution()
+    return _cache['linux_distribution']
@@ -11,9 +11,10 @@ import shutil
 import socket
 from time import sleep
 
-from fabric.api import local, settings, hide
+from contrail_provisioning.common.lazy import local, settings
 
 from contrail_provisioning.common.base import ContrailSetup
+from contrail_provisioning.common.hosts_file import converge_local_hosts
 from contrail_provisioning.common.templates import rabbitmq_env_conf,\
     rabbitmq_config, rabbitmq_config_single_node
 
@@ -123,12 +124,11 @@ class RabbitMQ(ContrailSetup):
         # Need to have the alias created to map to the hostname
         # this is required for erlang node to cluster using
         # the same interface that is used for rabbitMQ TCP listener
+        host_entries = []
         for rabbit_host in self._args.rabbit_hosts:
-            with settings(hide('stderr'), warn_only=True):
-                if local('grep %s /etc/hosts' % (rabbit_host+CTRL)).failed:
-                    host_ip = socket.gethostbyname(rabbit_host)
-                    local("echo '%s     %s     %s' >> /etc/hosts" %
-                          (host_ip, rabbit_host, rabbit_host+CTRL))
+            host_ip = socket.gethostbyname(rabbit_host)
+            host_entries.append((host_ip, [rabbit_host, rabbit_host+CTRL]))
+        converge_local_hosts(host_entries, 'rabbitmq')
 
     def allow_rabbitmq_port(self):
         self.disable_iptables()
@@ -0,0 +1,193 @@
+#!/usr/bin/python
+#
+# Copyright (c) 2016 Juniper Networks, Inc. All rights reserved.
+#
+"""Render plan of the config files of a role.
+
+The templates rendered by a role and the ini edits made to them (or to
+files already on the node) are applied in memory. Once every file has its
+final content, the ini files are parsed to validate them and the changed
+files are committed in one privileged step: all of them are staged next
+to their target, then renamed in place. A failure before the renames
+leaves /etc untouched.
+
+    with setup.render_plan() as plan:
+        setup.fixup_config_files()
+    restart_for(plan.changed)
+"""
+
+import os
+import re
+import grp
+import pwd
+import ConfigParser
+from StringIO import StringIO
+
+from contrail_provisioning.common.lazy import local, settings
+from contrail_provisioning.common.netstate import read_file
+from contrail_provisioning.common.config_rules import IniFile
+
+INI_SUFFIXES = ('.conf', '.ini')
+
+
+class PlannedFile(object):
+    def __init__(self, path, content, mode=None, owner=None, ini=None):
+        self.path = path
+        self.content = content
+        self.mode = mode
+        self.owner = owner
+        if ini is None:
+            ini = path.endswith(INI_SUFFIXES)
+        self.ini = ini
+
+
+def _staged_path(path):
+    return os.path.join(os.path.dirname(path),
+                        '.%s.new' % os.path.basename(path))
+
+
+def _current_owner(path):
+    stat = os.stat(path)
+    return '%s:%s' % (pwd.getpwuid(stat.st_uid).pw_name,
+                      grp.getgrgid(stat.st_gid).gr_name)
+
+
+class RenderPlan(object):
+    def __init__(self, staging_dir):
+        self.staging_dir = staging_dir
+        self.files = {}
+        self.order = []
+        self.touched_files = []
+        self.changed = []
+
+    def has(self, path):
+        return path in self.files
+
+    def _file(self, path):
+        """Planned file of path, starting from the file on the node."""
+        if path not in self.files:
+            self.files[path] = PlannedFile(path, read_file(path) or '')
+            self.order.append(path)
+        return self.files[path]
+
+    def touched(self, path):
+        """Records a file changed in place, outside of the plan."""
+        if path not in self.touched_files:
+            self.touched_files.append(path)
+
+    def render(self, path, content, mode=None, owner=None, ini=None):
+        """Sets the whole content of path."""
+        planned = self._file(path)
+        planned.content = content
+        if mode is not None:
+            planned.mode = mode
+        if owner is not None:
+            planned.owner = owner
+        if ini is not None:
+            planned.ini = ini
+
+    def get_config(self, path, section, key):
+        return IniFile(path, self._file(path).content).get(section, key)
+
+    def has_config(self, path, section, key=None):
+        return IniFile(path, self._file(path).content).has(section, key)
+
+    def set_config(self, path, section, key, value=''):
+        planned = self._file(path)
+        conf = IniFile(path, planned.content)
+        conf.set(section, key, value)
+        planned.content = conf.render()
+
+    def del_config(self, path, section, key=None):
+        planned = self._file(path)
+        conf = IniFile(path, planned.content)
+        conf.delete(section, key or None)
+        if conf.changed():
+            planned.content = conf.render()
+
+    def replace_lines(self, path, replacement_list):
+        """Replaces each line matching a regexp, as _replaces_in_file."""
+        planned = self._file(path)
+        rs = [(re.compile(regexp), repl) for regexp, repl in replacement_list]
+        lines = []
+        for line in planned.content.splitlines(True):
+            for r, replace in rs:
+                if r.search(line):
+                    line = replace + '\n'
+            lines.append(line)
+        planned.content = ''.join(lines)
+
+    def validate(self):
+        """Returns the errors of the ini files of the plan."""
+        errors = []
+        for path in self.order:
+            planned = self.files[path]
+            if not planned.ini:
+                continue
+            parser = ConfigParser.RawConfigParser()
+            try:
+                parser.readfp(StringIO(planned.content), path)
+            except ConfigParser.Error as e:
+                errors.append('%s: %s' % (path, str(e).strip()))
+        return errors
+
+    def _is_changed(self, planned):
+        if not os.path.isfile(planned.path):
+            return True
+        if read_file(planned.path) != planned.content:
+            return True
+        if (planned.mode is not None and
+                os.stat(planned.path).st_mode & 07777 != planned.mode):
+            return True
+        if (planned.owner is not None and
+                _current_owner(planned.path) != planned.owner):
+            return True
+        return False
+
+    def commit(self):
+        """Validates and installs the changed files, returns their paths."""
+        errors = self.validate()
+        if errors:
+            raise RuntimeError('Invalid config files, nothing was changed:\n'
+                               + '\n'.join(errors))
+        changed = [path for path in self.order
+                   if self._is_changed(self.files[path])]
+        touched = [path for path in self.touched_files
+                   if path not in changed]
+        if not changed:
+            self.changed = touched
+            return self.changed
+
+        stage_cmds = []
+        rename_cmds = []
+        for index, path in enumerate(changed):
+            planned = self.files[path]
+            source = os.path.join(self.staging_dir, 'plan-%d' % index)
+            with open(source, 'w') as f:
+                f.write(planned.content)
+            staged = _staged_path(path)
+            stage_cmds += ['mkdir -p %s' % os.path.dirname(path),
+                           'cp -f %s %s' % (source, staged)]
+            exists = os.path.isfile(path)
+            if planned.mode is not None:
+                stage_cmds.append('chmod %o %s' % (planned.mode, staged))
+            elif exists:
+                stage_cmds.append('chmod --reference=%s %s' % (path, staged))
+            else:
+                stage_cmds.append('chmod 644 %s' % staged)
+            if planned.owner is not None:
+                stage_cmds.append('chown %s %s' % (planned.owner, staged))
+            elif exists:
+                stage_cmds.append('chown --reference=%s %s' % (path, staged))
+            rename_cmds.append('mv -f %s %s' % (staged, path))
+
+        with settings(warn_only=True):
+            result = local('sudo sh -c "%s"' % ' && '.join(stage_cmds))
+            if result.failed:
+                local('sudo rm -f %s' % ' '.join(_staged_path(path)
+                                                 for path in changed))
+                raise RuntimeError('Unable to stage the config files, '
+                                   'nothing was changed')
+        local('sudo sh -c "%s"' % ' && '.join(rename_cmds))
+        self.changed = changed + touched
+        return self.changed
@@ -23,9 +23,7 @@ if  dist == 'centos':
     subprocess.call("sudo pip-python install contrail_setup_utils/Fabric-1.7.0.tar.gz", shell=True)
     subprocess.call("sudo pip-python install contrail_setup_utils/zope.interface-3.7.0.tar.gz", shell=True)
 
-from fabric.api import local
-from fabric.operations import get, put
-from fabric.context_managers import lcd, settings
+from contrail_provisioning.common.lazy import local
 
 
 class Reset(object):
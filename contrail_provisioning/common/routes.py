@@ -0,0 +1,117 @@
+#!/usr/bin/python
+#
+# Copyright (c) 2016 Juniper Networks, Inc. All rights reserved.
+#
+"""IPv4 route table snapshot and batched route programming.
+
+The kernel table is parsed once into a set of Route tuples, the desired
+routes are diffed against it and only the delta is programmed, with a
+single "ip -batch" run. The routes to the same prefixes which "ip route
+replace" overwrites are known from the table, so that they can be put
+back.
+"""
+
+import socket
+import struct
+import subprocess
+from collections import namedtuple
+
+from contrail_provisioning.common.lazy import netaddr
+
+RTF_GATEWAY = 0x2
+
+
+def _hex_to_ip(value):
+    return socket.inet_ntoa(struct.pack('I', int(value, 16)))
+
+
+class Route(namedtuple('Route', 'destination prefixlen gateway device')):
+    """A gateway route, destination is always the network address."""
+
+    @classmethod
+    def from_netmask(cls, destination, netmask, gateway, device):
+        network = netaddr.IPNetwork('%s/%s' % (destination, netmask))
+        return cls(str(network.network), network.prefixlen, gateway, device)
+
+    @property
+    def is_default(self):
+        return self.prefixlen == 0
+
+    def spec(self):
+        """Route in "ip route" syntax."""
+        return '%s/%s via %s dev %s' % (self.destination, self.prefixlen,
+                                        self.gateway, self.device)
+
+    def on_device(self, device):
+        return self._replace(device=device)
+
+
+class RouteTable(object):
+    """Gateway routes of the kernel main table, indexed by device."""
+
+    def __init__(self, routes=(), metrics=None):
+        self.routes = set(routes)
+        self.metrics = metrics or {}
+        self.by_device = {}
+        for route in self.routes:
+            self.by_device.setdefault(route.device, set()).add(route)
+
+    @classmethod
+    def read(cls, path='/proc/net/route'):
+        '''
+        Sample output of /proc/net/route :
+        Iface   Destination     Gateway         Flags   RefCnt  Use     Metric  Mask            MTU     Window  IRTT
+        p4p1    00000000        FED8CC0A        0003    0       0       0       00000000        0       0       0
+        '''
+        routes = []
+        metrics = {}
+        with open(path, 'r') as fd:
+            fd.readline()
+            for line in fd:
+                fields = line.split()
+                if len(fields) < 8 or not int(fields[3], 16) & RTF_GATEWAY:
+                    continue
+                mask = int(fields[7], 16)
+                route = Route(_hex_to_ip(fields[1]), bin(mask).count('1'),
+                              _hex_to_ip(fields[2]), fields[0])
+                routes.append(route)
+                metrics[route] = int(fields[6])
+        return cls(routes, metrics)
+
+    def device_routes(self, device):
+        return set(self.by_device.get(device, ()))
+
+    def missing(self, desired):
+        """Desired routes which are not in the table."""
+        return set(desired) - self.routes
+
+    def replaced_by(self, routes):
+        """Routes of the table which "ip route replace" of routes
+        overwrites: the metric 0 ones to the same prefixes, through another
+        gateway or device.
+        """
+        routes = set(routes)
+        prefixes = set((route.destination, route.prefixlen)
+                       for route in routes)
+        return set(route for route in self.routes - routes
+                   if (route.destination, route.prefixlen) in prefixes and
+                   self.metrics.get(route, 0) == 0)
+
+
+def apply_routes(add=(), delete=()):
+    """Programs the given routes with a single "ip -batch" invocation."""
+    commands = ['route del %s' % route.spec() for route in delete]
+    commands += ['route replace %s' % route.spec() for route in add]
+    if not commands:
+        return
+    proc = subprocess.Popen(['sudo', 'ip', '-batch', '-'],
+                            stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                            stderr=subprocess.STDOUT)
+    output = proc.communicate('\n'.join(commands) + '\n')[0]
+    if proc.returncode:
+        raise RuntimeError('Unable to program routes: %s' % output.strip())
+
+
+def format_routes(routes, prefix=''):
+    """One "ip route" spec per line, as used by the persistence files."""
+    return ''.join(['%s%s\n' % (prefix, route.spec()) for route in routes])
@@ -0,0 +1,82 @@
+#!/usr/bin/python
+#
+# Copyright (c) 2016 Juniper Networks, Inc. All rights reserved.
+#
+"""Restarts of the services whose config changed.
+
+A ServiceGroup maps each service of a role to the config files it reads.
+Given the files changed by the provisioning run (see render_plan), only
+the services with a changed input, or which are not running, are
+restarted and the decision taken for every service is reported. The
+whole supervisor group is restarted when a supervisor program file
+changed, when the supervisor is not running, or when the changed files
+are not known.
+"""
+
+from contrail_provisioning.common.lazy import local, settings
+
+RESTART = 'restart'
+SKIP = 'skip'
+
+
+class ServiceGroup(object):
+    def __init__(self, supervisor, services, supervisor_files=()):
+        """services is [(service, [config files read by it])]."""
+        self.supervisor = supervisor
+        self.services = services
+        self.supervisor_files = list(supervisor_files)
+
+
+def service_running(service):
+    with settings(warn_only=True):
+        status = local('sudo service %s status' % service, capture=True)
+    return status.succeeded
+
+
+def plan_restarts(group, changed_files, use_supervisor=True,
+                  running=service_running):
+    """Returns (restart the supervisor, [(service, action, reason)])."""
+    if use_supervisor:
+        reason = None
+        if changed_files is None:
+            reason = 'changed files unknown'
+        elif not running(group.supervisor):
+            reason = '%s not running' % group.supervisor
+        else:
+            changed = [path for path in group.supervisor_files
+                       if path in changed_files]
+            if changed:
+                reason = ', '.join(changed)
+        if reason:
+            return True, [(service, RESTART, 'restart of %s: %s' %
+                           (group.supervisor, reason))
+                          for service, inputs in group.services]
+
+    decisions = []
+    for service, inputs in group.services:
+        if changed_files is None:
+            decisions.append((service, RESTART, 'changed files unknown'))
+            continue
+        changed = [path for path in inputs if path in changed_files]
+        if changed:
+            decisions.append((service, RESTART, ', '.join(changed)))
+        elif not running(service):
+            decisions.append((service, RESTART, 'not running'))
+        else:
+            decisions.append((service, SKIP, 'no input changed'))
+    return False, decisions
+
+
+def restart_services(group, changed_files, use_supervisor=True):
+    """Restarts what changed_files requires, returns the decisions."""
+    restart_supervisor, decisions = plan_restarts(group, changed_files,
+                                                  use_supervisor)
+    for service, action, reason in decisions:
+        print '[%s] %s: %s' % (action, service, reason)
+    if restart_supervisor:
+        local('sudo service %s restart' % group.supervisor)
+    else:
+        for service, action, reason in decisions:
+            if action == RESTART:
+                local('sudo service %s restart' % service)
+    return decisions
@@ -6,24 +6,19 @@
 
 __version__ = '1.0'
 
-import re
 import sys
-import time
 import os.path
 import logging
-import platform
 import argparse
-import socket
-import struct
-import subprocess
-from netaddr import IPNetwork
-from tempfile import NamedTemporaryFile
-from distutils.version import LooseVersion
+from contrail_provisioning.common import netstate
+from contrail_provisioning.common import routes
+from contrail_provisioning.common import platform_info
 
 logging.basicConfig(format='%(asctime)-15s:: %(funcName)s:%(levelname)s:: %(message)s',
                     level=logging.INFO)
 log = logging.getLogger(__name__)
-(PLATFORM, VERSION, EXTRA) = platform.linux_distribution()
+(PLATFORM, VERSION, EXTRA) = platform_info.linux_distribution()
+ROUTE_WAIT_TIMEOUT = 30
 
 class StaticRoute(object):
     '''Base class containing common methods for configuring static routes
@@ -34,64 +29,95 @@ class StaticRoute(object):
         self.gw     = kwargs.get('gw', [])
         self.mask   = kwargs.get('netmask', [])
         self.vlan   = kwargs.get('vlan', None)
-        self.cmd    = []
-        self.tempfile = NamedTemporaryFile(delete=False)
-        self.config_route_list = []
+        self.timeout = kwargs.get('timeout', ROUTE_WAIT_TIMEOUT)
+        self.desired = []
+        # routes programmed by restart_service which were not already
+        # in the kernel, removed again on rollback
+        self.added = set()
+        # routes to the same prefixes overwritten by the added ones, put
+        # back on rollback
+        self.replaced = set()
+        # path -> (contents, mode) replaced by write_network_script
+        self.original_files = {}
+
+    def install_script(self, path, content, mode=None):
+        '''Atomically install a route script, remembering what it replaced'''
+        original = netstate.read_file(path)
+        self.original_files.setdefault(path, (original, mode))
+        if original is not None:
+            backup = self.backup_file_name(path)
+            log.info('Backup existing file %s to %s' %(path, backup))
+            os.system('sudo cp %s %s'%(path, backup))
+        netstate.install_file(path, content, mode)
+
+    def rollback(self):
+        '''Remove the routes added, put back the routes they replaced and
+            restore the route scripts replaced by write_network_script
+        '''
+        try:
+            routes.apply_routes(add=self.replaced, delete=self.added)
+        except RuntimeError, err:
+            log.error(err)
+        for path, (original, mode) in self.original_files.items():
+            log.info('Restoring %s' %path)
+            if original is None:
+                netstate.remove_file(path)
+            else:
+                netstate.install_file(path, original, mode)
+
+    def backup_file_name(self, path):
+        return os.path.join(os.path.dirname(path),
+                            'moved-%s' %os.path.basename(path))
 
     def write_network_script(self):
         '''Create an interface config file in network-scripts with given
             config
         '''
-        if os.path.isfile(self.nwfile):
-            tmpfile = os.path.join(os.path.dirname(self.nwfile),
-                                  'moved-%s' %os.path.basename(self.nwfile))
-            log.info('Backup existing file %s to %s' %(self.nwfile, tmpfile))
-            os.system('sudo cp %s %s'%(self.nwfile, tmpfile))
-        # read existing file
-        with open(self.tempfile.name, 'w') as fd:
-            fd.write('\n'.join(self.cmd))
-            fd.write('\n')
-        os.system('sudo cp -f %s %s'%(self.tempfile.name, self.nwfile))
+        self.install_script(self.nwfile, routes.format_routes(self.desired))
 
     def restart_service(self):
-        '''Restart network service'''
-        log.info('Restarting Network Services...')
-        os.system('sudo service network restart')
-        time.sleep(3)
- 
+        '''Program the routes missing from the kernel in one batch, instead
+            of restarting the network
+        '''
+        table = routes.RouteTable.read()
+        self.added = table.missing(self.desired)
+        self.replaced = table.replaced_by(self.added)
+        log.info('Adding %s of %s routes on %s' %(len(self.added),
+                 len(self.desired), self.device))
+        for route in sorted(self.replaced):
+            log.info('Replacing route %s' %route.spec())
+        routes.apply_routes(add=self.added)
+
+    def get_routes(self):
+        return [routes.Route.from_netmask(destination, mask, gw, self.device)
+                for destination, mask, gw in zip(self.netw, self.mask, self.gw)]
+
     def pre_config(self):
         '''Setup env before static route configuration'''
         if self.vlan:
             self.device += "."+self.vlan
         self.nwfile = os.path.join(os.path.sep, 'etc', 'sysconfig',
                                   'network-scripts', 'route-%s' %self.device)
-        i = 0
-        for destination in self.netw:
-            prefix = IPNetwork('%s/%s' %(destination, self.mask[i])).prefixlen
-            self.cmd += ['%s/%s via %s dev %s' %(
-                       destination, prefix, self.gw[i], self.device)]
-            self.config_route_list.append('%s %s %s' %(destination, self.mask[i], self.gw[i]))
-            i+=1
+        self.desired = self.get_routes()
 
     def verify_route(self):
-        '''verify configured static routes'''
-        actual_list = []
-        for route in open('/proc/net/route', 'r').readlines():
-            if route.startswith(self.device):
-                route_fields = route.split()
-                flags = int(route_fields[3], 16)
-                destination = socket.inet_ntoa(struct.pack('I', int(route_fields[1], 16)))
-                if flags & 0x2:
-                    gateway = socket.inet_ntoa(struct.pack('I', int(route_fields[2], 16)))
-                    mask = socket.inet_ntoa(struct.pack('I', int(route_fields[7], 16)))
-                    actual_list.append('%s %s %s' %(destination, mask, gateway))
-        if (set(actual_list).intersection(self.config_route_list)) != set(self.config_route_list):
+        '''verify configured static routes, waiting up to the timeout for
+            them to show up
+        '''
+        if netstate.wait_until([('routes',
+                lambda: not routes.RouteTable.read().missing(self.desired))],
+                self.timeout):
             raise RuntimeError('Seems Routes are not properly configured')
 
     def post_config(self):
         '''Execute commands after static route configuration'''
-        self.restart_service()
-        self.verify_route()
+        try:
+            self.restart_service()
+            self.verify_route()
+        except RuntimeError:
+            log.error('Routes not configured, rolling back')
+            self.rollback()
+            raise
 
     def setup(self):
         '''High level method to call individual methods to configure
@@ -100,40 +126,22 @@ class StaticRoute(object):
         self.pre_config()
         self.write_network_script()
         self.post_config()
-        os.unlink(self.tempfile.name)
 
 class UbuntuStaticRoute(StaticRoute):
     '''Configure Static Route in Ubuntu'''
 
-    def restart_service(self):
-        '''Restart network service for Ubuntu'''
-        log.info('Restarting Network Services...')
-        if LooseVersion(VERSION) < LooseVersion("14.04"):
-            subprocess.call('sudo /etc/init.d/networking restart', shell=True)
-        else:
-            subprocess.call('sudo ifdown -a && sudo ifup -a', shell=True)
-        time.sleep(5)
+    def backup_file_name(self, path):
+        # if-up.d runs every file in it, keep backups out of the way
+        return os.path.join(os.path.sep, 'tmp',
+                            'moved-%s' %os.path.basename(path))
 
     def write_network_script(self):
         '''Add route to ifup-parts dir and set the correct permission'''
-        if os.path.isfile(self.nwfile):
-            tmpfile = os.path.join(os.path.join(os.path.sep, 'tmp'),
-                                  'moved-%s' %os.path.basename(self.nwfile))
-            log.info('Backup existing file %s to %s' %(self.nwfile, tmpfile))
-            os.system('sudo cp %s %s'%(self.nwfile, tmpfile))
-        # read existing file
-        with open(self.tempfile.name, 'w') as fd:
-            fd.write('#!/bin/bash\n[ "$IFACE" != "%s" ] && exit 0\n' %self.device)
-            fd.write('\n'.join(self.cmd))
-            fd.write('\n')
-        os.system('sudo cp -f %s %s'%(self.tempfile.name, self.nwfile))
-        os.system('sudo chmod 755 %s'%(self.nwfile))
-        with open(self.tempfile.name, 'w') as fd:
-            fd.write('#!/bin/bash\n[ "$IFACE" != "%s" ] && exit 0\n' %self.device)
-            fd.write('\n'.join(self.downcmd))
-            fd.write('\n')
-        os.system('sudo cp -f %s %s'%(self.tempfile.name, self.downfile))
-        os.system('sudo chmod 755 %s'%(self.downfile))
+        header = '#!/bin/bash\n[ "$IFACE" != "%s" ] && exit 0\n' %self.device
+        self.install_script(self.nwfile, header +
+            routes.format_routes(self.desired, 'ip route add '), 0755)
+        self.install_script(self.downfile, header +
+            routes.format_routes(self.desired, 'ip route del '), 0755)
 
     def pre_config(self):
         '''Setup env before static route configuration in Ubuntu'''
@@ -141,17 +149,9 @@ class UbuntuStaticRoute(StaticRoute):
         # reflected in setup.py too
         if self.vlan:
             self.device = 'vlan'+self.vlan
-        i = 0
-        for destination in self.netw:
-            prefix = IPNetwork('%s/%s' %(destination, self.mask[i])).prefixlen
-            self.cmd += ['%s/%s via %s dev %s' %(
-                       destination, prefix, self.gw[i], self.device)]
-            self.config_route_list.append('%s %s %s' %(destination, self.mask[i], self.gw[i]))
-            i+=1
+        self.desired = self.get_routes()
         self.downfile = os.path.join(os.path.sep, 'etc', 'network', 'if-down.d', 'routes')
-        self.downcmd = ['ip route del '+x for x in self.cmd]
         self.nwfile = os.path.join(os.path.sep, 'etc', 'network', 'if-up.d', 'routes')
-        self.cmd = ['ip route add '+x for x in self.cmd]
 
 def parse_cli(args):
     parser = argparse.ArgumentParser(description=__doc__)
@@ -183,6 +183,12 @@ def parse_cli(args):
     parser.add_argument('--vlan',
                         action='store',
                         help='vLAN ID')
+    parser.add_argument('--timeout',
+                        action='store',
+                        type=int,
+                        default=ROUTE_WAIT_TIMEOUT,
+                        help='Seconds to wait for the routes to show up '
+                             'before rolling back')
     pargs = parser.parse_args(args)
     if len(args) == 0:
         parser.print_help()
@@ -9,8 +9,10 @@ import shutil
 import argparse
 import stat
 from distutils.version import LooseVersion
-from fabric.api import settings
-from fabric.api import local
+from contrail_provisioning.common.lazy import local
+
+from contrail_provisioning.common.packages import PackagePlan, AptBackend, \
+    YumBackend, apply_plan
 
 class ContrailUpgrade(object):
     def __init__(self):
@@ -25,6 +27,7 @@ class ContrailUpgrade(object):
             'rename_config' : [],
             'replace' : [],
         }
+        self.dry_run = False
 
 
     def _parse_args(self, args_str):
@@ -46,6 +49,8 @@ class ContrailUpgrade(object):
             help = "List of packages to be upgraded.")
         conf_parser.add_argument("-R", "--roles", nargs='+', type=str,
             help = "List of contrail roles provisioned in this node.")
+        conf_parser.add_argument("--dry-run", action="store_true",
+            help = "Show the package transaction of the upgrade and exit.")
         args, self.remaining_argv = conf_parser.parse_known_args(args_str.split())
 
         if args.conf_file:
@@ -60,6 +65,7 @@ class ContrailUpgrade(object):
             self.global_defaults.update({'from_rel' : args.from_rel})
         if args.to_rel:
             self.global_defaults.update({'to_rel' : args.to_rel})
+        self.dry_run = args.dry_run
 
         # Override with CLI options
         # Don't surpress add_help here so it will handle -h
@@ -76,28 +82,42 @@ class ContrailUpgrade(object):
 
         return parser
 
-    def _upgrade_package(self):
-        if not self.upgrade_data['upgrade']:
-            return
-        pkgs = ' '.join(self.upgrade_data['upgrade'])
+    def _package_backend(self):
         if self.pdist in ['Ubuntu']:
-            if (self._args.from_rel >= LooseVersion('2.20') and
+            return AptBackend(force_confmiss=(
+                    self._args.from_rel >= LooseVersion('2.20') and
                     self._args.from_rel < LooseVersion('3.00') and
-                        self._args.to_rel >= LooseVersion('3.00')):
-                cmd = 'DEBIAN_FRONTEND=noninteractive apt-get -y --force-yes'
-                cmd += ' -o Dpkg::Options::="--force-overwrite"'
-                cmd += ' -o Dpkg::Options::="--force-confmiss"'
-                cmd += ' -o Dpkg::Options::="--force-confnew" install %s' % pkgs
-            else:
-                cmd = 'DEBIAN_FRONTEND=noninteractive apt-get -y --force-yes'
-                cmd += ' -o Dpkg::Options::="--force-overwrite"'
-                cmd += ' -o Dpkg::Options::="--force-confnew" install %s' % pkgs
-        else:
-            local('yum clean all')
-            cmd = 'yum -y --disablerepo=* --enablerepo=contrail*'
-            cmd += ' install %s' % pkgs
-        local(cmd)
-    
+                    self._args.to_rel >= LooseVersion('3.00')))
+        return YumBackend()
+
+    def _package_plan(self):
+        return PackagePlan(remove=self.upgrade_data['remove'],
+                           downgrade=self.upgrade_data['downgrade'],
+                           upgrade=self.upgrade_data['upgrade'] or [],
+                           replace=self.upgrade_data['replace'])
+
+    def _apply_packages(self):
+        # Remove, downgrade, upgrade and replace in a single transaction,
+        # on CentOS the packages are removed before the ensured ones are
+        # installed
+        backend = self._package_backend()
+        plan = self._package_plan()
+        if self.pdist in ['centos']:
+            apply_plan(backend, plan.removal_plan(), dry_run=self.dry_run)
+            plan = plan.install_plan()
+        if not self.dry_run:
+            self._ensure_package()
+        apply_plan(backend, plan, dry_run=self.dry_run)
+
+    def _dry_run(self):
+        """With --dry-run, shows the package transaction and returns True,
+        the role must then return before changing anything.
+        """
+        if not self.dry_run:
+            return False
+        self._apply_packages()
+        return True
+
     def _backup_config(self):
         self.backup_dir = "/var/tmp/contrail-%s-%s-upgradesave" % \
                            (self._args.to_rel, self.get_build().split('~')[0])
@@ -130,49 +150,6 @@ class ContrailUpgrade(object):
             else:
                 print "WARNING: [%s] is not backed up, no need to restore" % restore_elem
 
-    def _downgrade_package(self):
-        if not self.upgrade_data['downgrade']:
-            return
-        pkgs = ' '.join(self.upgrade_data['downgrade'])
-        if self.pdist in ['Ubuntu']:
-            cmd = 'DEBIAN_FRONTEND=noninteractive apt-get -y --force-yes'
-            cmd += ' -o Dpkg::Options::="--force-overwrite"'
-            cmd += ' -o Dpkg::Options::="--force-confnew"'
-            cmd += ' install %s' % pkgs
-        else:
-            cmd = 'yum -y --nogpgcheck --disablerepo=*'
-            cmd += ' --enablerepo=contrail* install %s' % pkgs
-        local(cmd)
-
-    def _remove_package(self):
-        if not self.upgrade_data['remove']:
-            return
-        pkgs = ' '.join(self.upgrade_data['remove'])
-        if self.pdist in ['Ubuntu']:
-            local('DEBIAN_FRONTEND=noninteractive apt-get -y remove --purge\
-                   %s' % pkgs)
-        else:
-            local('rpm -e --nodeps %s' % pkgs)
-
-    def _replace_package(self):
-        if not self.upgrade_data['replace']:
-            return
-
-        rem_pkgs = ' '.join([x for (x,y) in self.upgrade_data['replace']])
-        add_pkgs = ' '.join([y for (x,y) in self.upgrade_data['replace']])
-        if self.pdist in ['Ubuntu']:
-            with settings(warn_only = True):
-                local('DEBIAN_FRONTEND=noninteractive apt-get -y remove --purge\
-                       %s' % rem_pkgs)
-            local('DEBIAN_FRONTEND=noninteractive apt-get -y install --reinstall\
-                   %s' % add_pkgs)
-        else:
-            with settings(warn_only = True):
-                local('rpm -e --nodeps %s' % rem_pkgs)
-            cmd = 'yum -y --nogpgcheck --disablerepo=*'
-            cmd += ' --enablerepo=contrail* install %s' % add_pkgs
-            local(cmd)
-
     def _ensure_package(self):
         if not self.upgrade_data['ensure']:
             return
@@ -225,14 +202,7 @@ class ContrailUpgrade(object):
  
     def _upgrade(self):
         self._backup_config()
-        if self.pdist in ['centos']:
-            self._remove_package()
-        self._ensure_package()
-        self._downgrade_package()
-        self._upgrade_package()
-        if self.pdist in ['Ubuntu']:
-            self._remove_package()
-        self._replace_package()
+        self._apply_packages()
         self._restore_config()
         self._rename_config()
         self._remove_config()
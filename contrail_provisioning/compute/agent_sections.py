@@ -0,0 +1,251 @@
+#!/usr/bin/python
+#
+# Copyright (c) 2016 Juniper Networks, Inc. All rights reserved.
+#
+"""Multi-instance sections of contrail-vrouter-agent.conf.
+
+[GATEWAY-n], [QOS], [QUEUE-n], [QOS-NIANTIC] and [PG-n] are modelled as
+section objects which validate their values and render deterministically.
+AgentSections merges them into a rendered agent conf, replacing any
+section of the same kind, so the conf is written once and re-running the
+provisioning does not duplicate sections.
+"""
+
+import re
+
+from contrail_provisioning.common.lazy import netaddr
+
+SECTION_RE = re.compile(r'^\s*\[([^\]]+)\]')
+PG_SCHEDULING = ('strict', 'rr')
+
+
+def _prefixes(values, what):
+    """Validates a list of ip/prefix strings."""
+    for value in values:
+        try:
+            netaddr.IPNetwork(value)
+        except (netaddr.AddrFormatError, ValueError, TypeError):
+            raise ValueError('Invalid %s %r' % (what, value))
+    return list(values)
+
+
+def _int(value, what):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError('Invalid %s %r' % (what, value))
+
+
+class AgentSection(object):
+    """A section, its options being (comment lines, key, value).
+
+    A None value is rendered as the commented out example given by the
+    option. comments are rendered after the section header.
+    """
+    # Pattern of the section names of this kind, for the merge
+    family = None
+
+    def __init__(self, name, comments=()):
+        self.name = name
+        self.comments = list(comments)
+        self.options = []
+
+    def add_option(self, comments, key, value, example=None):
+        self.options.append((comments, key, value, example))
+
+    def render(self):
+        lines = ['[%s]' % self.name]
+        if self.comments:
+            lines += ['# %s' % comment for comment in self.comments] + ['']
+        for comments, key, value, example in self.options:
+            lines += ['# %s' % comment for comment in comments]
+            if value is None:
+                lines.append('# %s=%s' % (key, example or ''))
+            else:
+                lines.append('%s=%s' % (key, value))
+            lines.append('')
+        if not self.options and not self.comments:
+            lines.append('')
+        return lines
+
+
+class GatewaySection(AgentSection):
+    family = re.compile(r'^GATEWAY-\d+$')
+
+    def __init__(self, index, routing_instance, interface=None,
+                 ip_blocks=(), routes=()):
+        super(GatewaySection, self).__init__('GATEWAY-%d' % index)
+        if not routing_instance:
+            raise ValueError('Gateway %d has no routing instance' % index)
+        self.add_option(['Name of the routing_instance for which the '
+                         'gateway is being configured'],
+                        'routing_instance', routing_instance)
+        self.add_option(['Gateway interface name'], 'interface', interface)
+        ip_blocks = _prefixes(ip_blocks, 'gateway ip block')
+        self.add_option(['Virtual network ip blocks for which gateway '
+                         'service is required. Each IP',
+                         'block is represented as ip/prefix. Multiple IP '
+                         'blocks are represented by',
+                         'separating each with a space'],
+                        'ip_blocks', ' '.join(ip_blocks) or None,
+                        'ip1/prefix1 ip2/prefix2')
+        routes = _prefixes(routes, 'gateway route')
+        self.add_option(['Routes to be exported in routing_instance. Each '
+                         'route is represented as',
+                         'ip/prefix. Multiple routes are represented by '
+                         'separating each with a space'],
+                        'routes', ' '.join(routes) or None,
+                        'ip1/prefix1 ip2/prefix2')
+
+
+class QosSection(AgentSection):
+    family = re.compile(r'^QOS$')
+
+    def __init__(self):
+        super(QosSection, self).__init__('QOS')
+
+
+class QueueSection(AgentSection):
+    family = re.compile(r'^QUEUE-\d+$')
+
+    def __init__(self, queue_id, logical_queues, default_hw_queue=False):
+        super(QueueSection, self).__init__(
+                'QUEUE-%d' % _int(queue_id, 'hardware queue id'))
+        if default_hw_queue:
+            self.add_option(['This is the default hardware queue'],
+                            'default_hw_queue', 'true')
+        for logical_queue in logical_queues:
+            # Single queue ids or ranges, eg. 1 or 3-5
+            for bound in logical_queue.split('-', 1):
+                _int(bound, 'logical queue')
+        self.add_option(['Logical nic queues for qos config'],
+                        'logical_queue',
+                        '[%s]' % (', '.join(logical_queues) or ' '))
+
+
+class QosNianticSection(AgentSection):
+    family = re.compile(r'^QOS-NIANTIC$')
+
+    def __init__(self):
+        super(QosNianticSection, self).__init__('QOS-NIANTIC')
+
+
+class PriorityGroupSection(AgentSection):
+    family = re.compile(r'^PG-\d+$')
+
+    def __init__(self, pg_id, scheduling, bandwidth):
+        super(PriorityGroupSection, self).__init__(
+                'PG-%d' % _int(pg_id, 'priority group id'))
+        if scheduling not in PG_SCHEDULING:
+            raise ValueError('Invalid scheduling %r for priority group %s, '
+                             'expected one of %s' % (scheduling, pg_id,
+                             '/'.join(PG_SCHEDULING)))
+        self.add_option(['Scheduling algorithm for priority group '
+                         '(strict/rr)'], 'scheduling', scheduling)
+        self.add_option(['Total hardware queue bandwidth used by priority '
+                         'group'], 'bandwidth',
+                        _int(bandwidth, 'priority group bandwidth'))
+
+
+class AgentSections(object):
+    """An ordered set of agent sections."""
+
+    def __init__(self):
+        self.sections = []
+        self.names = set()
+
+    def add(self, section):
+        if section.name in self.names:
+            raise ValueError('Duplicate section [%s]' % section.name)
+        self.names.add(section.name)
+        self.sections.append(section)
+
+    def extend(self, sections):
+        for section in sections:
+            self.add(section)
+
+    def render(self):
+        lines = []
+        for section in self.sections:
+            lines += section.render()
+        return '\n'.join(lines)
+
+    def merge_into(self, content):
+        """Returns content with these sections replacing any of their kind."""
+        families = set(section.family for section in self.sections)
+        lines = []
+        skipping = False
+        for line in content.splitlines():
+            match = SECTION_RE.match(line)
+            if match:
+                name = match.group(1).strip()
+                skipping = any(family.match(name) for family in families)
+            if not skipping:
+                lines.append(line)
+        while lines and not lines[-1].strip():
+            lines.pop()
+        if self.sections:
+            lines += [''] + self.render().splitlines()
+        return '\n'.join(lines) + '\n'
+
+
+def split_prov_list(value):
+    """Splits the "[a;b]" lists given to the compute provisioning."""
+    return value[1:-1].split(';')
+
+
+def split_prov_item(value):
+    """Splits one item which is either a plain value or "['x','y']"."""
+    if value.find('[') != -1:
+        return [ele.strip()[1:-1] for ele in value[1:-1].split(',')
+                if ele.strip()]
+    return value.split()
+
+
+def gateway_sections(vn_names, subnets, interfaces, routes=None):
+    """[GATEWAY-n] of the simple gateway provisioning arguments."""
+    vn_names = split_prov_list(vn_names)
+    subnets = split_prov_list(subnets)
+    interfaces = split_prov_list(interfaces)
+    routes = split_prov_list(routes) if routes is not None else []
+    sections = []
+    for index, vn_name in enumerate(vn_names):
+        gw_routes = []
+        if index < len(routes) and routes[index] != '[]':
+            gw_routes = split_prov_item(routes[index])
+        sections.append(GatewaySection(index, vn_name, interfaces[index],
+                                       split_prov_item(subnets[index]),
+                                       gw_routes))
+    return sections
+
+
+def qos_sections(queue_ids, logical_queues, default_hw_queue=False):
+    """[QOS] and [QUEUE-n], the last queue id being the default queue
+    when default_hw_queue is set."""
+    logical_queues = [[queue for queue in logical_queue.split(',') if queue]
+                      for logical_queue in logical_queues]
+    sections = [QosSection()]
+    num_sections = len(logical_queues)
+    if len(logical_queues) == len(queue_ids) and default_hw_queue:
+        num_sections = num_sections - 1
+    for index in range(num_sections):
+        sections.append(QueueSection(queue_ids[index], logical_queues[index]))
+    if default_hw_queue:
+        default_queues = []
+        if len(logical_queues) == len(queue_ids):
+            default_queues = logical_queues[-1]
+        sections.append(QueueSection(queue_ids[-1], default_queues, True))
+    return sections
+
+
+def priority_group_sections(pg_ids, scheduling, bandwidth):
+    """[QOS-NIANTIC] and [PG-n]."""
+    if not len(pg_ids) == len(scheduling) == len(bandwidth):
+        raise ValueError('priority_id, priority_scheduling and '
+                         'priority_bandwidth must have the same length')
+    sections = [QosNianticSection()]
+    for pg_id, pg_scheduling, pg_bandwidth in zip(pg_ids, scheduling,
+                                                  bandwidth):
+        sections.append(PriorityGroupSection(pg_id, pg_scheduling,
+                                             pg_bandwidth))
+    return sections
@@ -1,34 +1,248 @@
+"""Converts the XML agent config (agent.conf) of the 1.05 and earlier
+releases to the INI contrail-vrouter-agent.conf.
+
+The XML elements are mapped to parameters by XML_MAP and the parameters
+to INI options by INI_MAP, so supporting a new element is a table entry.
+Many files, from a directory or a manifest of "source target" lines, can
+be converted in one run, in parallel, with a result reported per file.
+
+Eg. agent_xml2ini --source_file filename1 --target_file filename2
+    agent_xml2ini --source_dir dir1 --target_dir dir2 --workers 8
+    agent_xml2ini --manifest manifest_file --overwrite_target_file
+"""
+
 import sys
 import os
 import argparse
-import ConfigParser
 import xml.etree.ElementTree as ET
 
-class AgentXmlParams():
-    def __init__(self):
-        self.xmpp_server1=""
-        self.xmpp_server2=""
-        self.dns_server1=""
-        self.dns_server2=""
-        self.flow_timeout=""
-        self.tunnel_type=""
-        self.discovery_ip=""
-        self.hypervisor_type=""
-        self.xen_ll_ip=""
-        self.xen_ll_interface=""
-        self.vmware_interface=""
-        self.max_control_nodes=""
-        self.max_system_flows=""
-        self.max_vm_flows=""
-        self.metadata_secret=""
-        self.control_network_ip=""
-        self.vhost_name=""
-        self.vhost_ip=""
-        self.vhost_gw=""
-        self.physical_interface=""
-        self.gateway_idx=0
-        self.gateway_str=""
-    #end __init__
+from contrail_provisioning.common.parallel import run_parallel
+from contrail_provisioning.compute.agent_sections import AgentSection, \
+    AgentSections, GatewaySection
+
+# (path under <agent>, parameter), "element@attribute" reads an attribute.
+# Repeated elements are joined with a space.
+XML_MAP = [
+    ('xmpp-server/ip-address', 'xmpp_servers'),
+    ('dns-server/ip-address', 'dns_servers'),
+    ('flow-cache/timeout', 'flow_timeout'),
+    ('tunnel-type', 'tunnel_type'),
+    ('discovery-server/ip-address', 'discovery_ip'),
+    ('discovery-server/control-instances', 'max_control_nodes'),
+    ('hypervisor@mode', 'hypervisor_type'),
+    ('hypervisor/xen-ll-port', 'xen_ll_interface'),
+    ('hypervisor/xen-ll-ip-address', 'xen_ll_ip'),
+    ('hypervisor/port', 'vmware_interface'),
+    ('metadata-proxy/shared-secret', 'metadata_secret'),
+    ('control/ip-address', 'control_network_ip'),
+    ('vhost/name', 'vhost_name'),
+    ('vhost/ip-address', 'vhost_ip'),
+    ('vhost/gateway', 'vhost_gw'),
+    ('eth-port/name', 'physical_interface'),
+]
+
+# Maximum number of control-node and dns servers of the agent
+MAX_SERVERS = {'xmpp_servers': 2, 'dns_servers': 2}
+
+# Parameters always written, empty if not in the XML config
+MANDATORY_PARAMS = set(['vhost_name', 'vhost_ip', 'vhost_gw',
+                        'physical_interface'])
+
+SERVER_COMMENTS = [
+    'IP address to be used to connect to %s. Maximum of 2 IP addresses',
+    '(separated by a space) can be provided. If no IP is configured then the',
+    'value provided by discovery service will be used. (Optional)']
+
+# [(section, section comments, [(comments, key, parameter, example)])]
+# The options without parameter were not supported by the XML config and
+# are only written commented out.
+INI_MAP = [
+    ('CONTROL-NODE', [], [
+        ([SERVER_COMMENTS[0] % 'control-node'] + SERVER_COMMENTS[1:],
+         'server', 'xmpp_servers', 'x.x.x.x y.y.y.y'),
+    ]),
+    ('DEFAULT', ['Everything in this section is optional'], [
+        (['IP address and port to be used to connect to collector. If these '
+          'are not',
+          'configured, value provided by discovery service will be used. '
+          'Multiple',
+          'IP:port strings separated by space can be provided'],
+         'collectors', None, '127.0.0.1:8086'),
+        (['Enable/disable debug logging. Possible values are 0 (disable) and '
+          '1 (enable)'], 'debug', None, '0'),
+        (['Aging time for flow-records in seconds'],
+         'flow_cache_timeout', 'flow_timeout', '0'),
+        (['Hostname of compute-node. If this is not configured value from '
+          '`hostname`', 'will be taken'], 'hostname', None, None),
+        (['Http server port for inspecting vnswad state (useful for '
+          'debugging)'], 'http_server_port', None, '8085'),
+        (["Category for logging. Default value is '*'"],
+         'log_category', None, None),
+        (['Local log file name'], 'log_file', None,
+         '/var/log/contrail/vrouter.log'),
+        (['Log severity levels. Possible values are SYS_EMERG, SYS_ALERT, '
+          'SYS_CRIT,',
+          'SYS_ERR, SYS_WARN, SYS_NOTICE, SYS_INFO and SYS_DEBUG. Default is '
+          'SYS_DEBUG'], 'log_level', None, 'SYS_NOTICE'),
+        (['Enable/Disable local file logging. Possible values are 0 '
+          '(disable) and 1 (enable)'], 'log_local', None, '1'),
+        (['Encapsulation type for tunnel. Possible values are MPLSoGRE, '
+          'MPLSoUDP, VXLAN'], 'tunnel_type', 'tunnel_type', None),
+    ]),
+    ('DISCOVERY', ['If COLLECTOR and/or CONTROL-NODE and/or DNS is not '
+                   'specified this section is',
+                   'mandatory. Else this section is optional'], [
+        (['IP address of discovery server'], 'server', 'discovery_ip',
+         '10.204.217.52'),
+        (['Number of control-nodes info to be provided by Discovery service. '
+          'Possible', 'values are 1 and 2'],
+         'max_control_nodes', 'max_control_nodes', '1'),
+    ]),
+    ('DNS', [], [
+        ([SERVER_COMMENTS[0] % 'dns-node'] + SERVER_COMMENTS[1:],
+         'server', 'dns_servers', 'x.x.x.x y.y.y.y'),
+    ]),
+    ('HYPERVISOR', ['Everything in this section is optional'], [
+        (['Hypervisor type. Possible values are kvm, xen and vmware'],
+         'type', 'hypervisor_type', 'kvm'),
+        (['Link-local IP address and prefix in ip/prefix_len format (for '
+          'xen)'], 'xen_ll_ip', 'xen_ll_ip', None),
+        (['Link-local interface name when hypervisor type is Xen'],
+         'xen_ll_interface', 'xen_ll_interface', None),
+        (['Physical interface name when hypervisor type is vmware'],
+         'vmware_physical_interface', 'vmware_interface', None),
+    ]),
+    ('FLOWS', ['Everything in this section is optional'], [
+        (['Maximum flows allowed per VM - given as % of maximum system '
+          'flows'], 'max_vm_flows', None, '100'),
+        (['Maximum number of link-local flows allowed across all VMs'],
+         'max_system_linklocal_flows', None, '4096'),
+        (['Maximum number of link-local flows allowed per VM'],
+         'max_vm_linklocal_flows', None, '1024'),
+    ]),
+    ('METADATA', [], [
+        (['Shared secret for metadata proxy service. (Optional)'],
+         'metadata_proxy_secret', 'metadata_secret', 'contrail'),
+    ]),
+    ('NETWORKS', [], [
+        (['control-channel IP address used by WEB-UI to connect to vnswad to '
+          'fetch', 'required information (Optional)'],
+         'control_network_ip', 'control_network_ip', None),
+    ]),
+    ('VIRTUAL-HOST-INTERFACE', ['Everything in this section is mandatory'], [
+        (['name of virtual host interface'], 'name', 'vhost_name', None),
+        (['IP address and prefix in ip/prefix_len format'],
+         'ip', 'vhost_ip', None),
+        (['Gateway IP address for virtual host'], 'gateway', 'vhost_gw',
+         None),
+        (['Physical interface name to which virtual host interface maps to'],
+         'physical_interface', 'physical_interface', None),
+    ]),
+]
+
+
+def parse_agent_xml(source_file):
+    """Returns (parameters, gateway sections) of an XML agent config."""
+    agent_elem = ET.parse(source_file).getroot().find('agent')
+    if agent_elem is None:
+        raise ValueError('No agent element in %s' % source_file)
+    params = {}
+    for path, param in XML_MAP:
+        if '@' in path:
+            path, attribute = path.split('@')
+            values = [elem.attrib.get(attribute)
+                      for elem in agent_elem.findall(path)]
+        else:
+            values = [elem.text for elem in agent_elem.findall(path)]
+        values = [value.strip() for value in values
+                  if value and value.strip()]
+        if param in MAX_SERVERS:
+            values = values[:MAX_SERVERS[param]]
+        if values:
+            params[param] = ' '.join(values)
+
+    gateways = AgentSections()
+    for index, gateway in enumerate(agent_elem.findall('gateway')):
+        ri_name = (gateway.attrib.get('virtual-network') or
+                   gateway.attrib.get('routing-instance'))
+        gateways.add(GatewaySection(index, ri_name,
+                                    gateway.findtext('interface'),
+                                    [subnet.text for subnet in
+                                     gateway.findall('subnet')],
+                                    [route.text for route in
+                                     gateway.findall('route')]))
+    return params, gateways
+
+
+def render_ini(params, gateways=None):
+    """Renders the INI agent config of the parameters."""
+    sections = AgentSections()
+    for name, section_comments, options in INI_MAP:
+        section = AgentSection(name, section_comments)
+        for comments, key, param, example in options:
+            value = params.get(param) if param else None
+            if value is None and param in MANDATORY_PARAMS:
+                value = ''
+            section.add_option(comments, key, value, example)
+        sections.add(section)
+    content = sections.render()
+    if gateways:
+        content = gateways.merge_into(content)
+    return content
+
+
+def convert_file(job):
+    """Converts (source, target, overwrite), returns (source, target,
+    status, message) with status one of converted, skipped and failed.
+    """
+    source_file, target_file, overwrite = job
+    if not os.path.isfile(source_file):
+        return (source_file, target_file, 'failed',
+                'Source file %s does not exist' % source_file)
+    if os.path.isfile(target_file) and not overwrite:
+        return (source_file, target_file, 'skipped',
+                'Target file %s already exists' % target_file)
+    try:
+        params, gateways = parse_agent_xml(source_file)
+        ini_str = render_ini(params, gateways)
+        with open(target_file, 'w') as f:
+            f.write(ini_str)
+    except Exception as e:
+        return (source_file, target_file, 'failed',
+                'Unable to convert %s: %s' % (source_file, e))
+    return (source_file, target_file, 'converted',
+            'Converted %s to %s' % (source_file, target_file))
+
+
+def convert_files(jobs, workers=None):
+    """Converts [(source, target, overwrite)] in parallel, returns the
+    results of convert_file in the order of jobs.
+    """
+    return run_parallel(convert_file, jobs, workers)
+
+
+def read_manifest(manifest_file):
+    """Reads the "source target" lines of a manifest, # starts a comment."""
+    pairs = []
+    with open(manifest_file, 'r') as f:
+        for line in f:
+            fields = line.split('#', 1)[0].split()
+            if not fields:
+                continue
+            if len(fields) != 2:
+                raise ValueError('Invalid manifest line: %s' % line.strip())
+            pairs.append((fields[0], fields[1]))
+    return pairs
+
+
+def directory_pairs(source_dir, target_dir):
+    """(source, target) of each file of source_dir, same name in target_dir."""
+    if os.path.realpath(source_dir) == os.path.realpath(target_dir):
+        raise ValueError('Source and target directory are the same')
+    return [(os.path.join(source_dir, name), os.path.join(target_dir, name))
+            for name in sorted(os.listdir(source_dir))
+            if os.path.isfile(os.path.join(source_dir, name))]
+
 
 class Xml2Ini():
     def __init__(self, args_str = None):
@@ -40,14 +254,16 @@ class Xml2Ini():
 
     def _parse_args(self, args_str):
         '''
-        Eg. agent_xml2ini --source_file filename1 --target_file filename2 
+        Eg. agent_xml2ini --source_file filename1 --target_file filename2
                               --overwrite_target_file
+            agent_xml2ini --source_dir dir1 --target_dir dir2 --workers 8
+            agent_xml2ini --manifest manifest_file
         '''
         # Source any specified config/ini file
         # Turn off help, so we print all options in response to -h
         conf_parser = argparse.ArgumentParser(add_help = False,
                                               formatter_class=argparse.ArgumentDefaultsHelpFormatter)
-        
+
         args, remaining_argv = conf_parser.parse_known_args(args_str.split())
 
         # Override with CLI options
@@ -63,301 +279,48 @@ class Xml2Ini():
         parser.add_argument("--source_file", default="/etc/contrail/agent.conf", help = "Agent conf file name having config in XML format  (default: %(default)s)")
         parser.add_argument("--target_file", default="/etc/contrail/contrail-vrouter-agent.conf", help = "Target Agent conf file name which will have INI config  (default: %(default)s)")
         parser.add_argument("--overwrite_target_file", help = "Overwrite target file if it is already present", action='store_true')
+        parser.add_argument("--source_dir", help = "Convert every file of this directory, the INI config being written under --target_dir with the same file name")
+        parser.add_argument("--target_dir", help = "Directory of the INI configs converted from --source_dir")
+        parser.add_argument("--manifest", help = "File listing the conversions to do, one 'source_file target_file' per line")
+        parser.add_argument("--workers", type=int, help = "Number of parallel conversions (default: number of cpus)")
         self._args = parser.parse_args(remaining_argv)
+        if self._args.source_dir and not self._args.target_dir:
+            parser.error("--target_dir is required with --source_dir")
 
     #end __parse_args__
 
-    def process_vhost(self, item, obj):
-        for child_item in item:
-            if child_item.tag == "name":
-                obj.vhost_name = child_item.text
-            elif child_item.tag == "ip-address":
-                obj.vhost_ip = child_item.text
-            elif child_item.tag == "gateway":
-                obj.vhost_gw = child_item.text
-    #end process_vhost
-
-    def process_eth_port(self, item, obj):
-        for child_item in item:
-            if child_item.tag == "name":
-                obj.physical_interface=child_item.text
-    #end process_eth_port
-
-    def process_discovery(self, item, obj):
-        for child_item in item:
-            if child_item.tag == "ip-address":
-                obj.discovery_ip = child_item.text
-            elif child_item.tag == "control-instances":
-                obj.max_control_nodes = child_item.text
-    #end process_discovery
-
-    def process_control(self, item, obj):
-        for child_item in item:
-            if child_item.tag == "ip-address":
-                obj.control_network_ip = child_item.text
-    #end process_control
-
-    def process_hypervisor(self, item, obj):
-        self.hypervisor_type = item.attrib["mode"]
-        for child_item in item:
-            if child_item.tag == "xen-ll-port":
-                self.xen_ll_interface = child_item.text
-            elif child_item.tag == "xen-ll-ip-address":
-                self.en_ll_ip = child_item.text
-            if child_item.tag == "port":
-                self.vmware_interface = child_item.text
-    #end process_hypervisor
-
-    def process_metadata(self, item, obj):
-        for child_item in item:
-            if child_item.tag == "shared-secret":
-                obj.metadata_secret = child_item.text
-    #end process_metadata
-
-    def process_flow_cache(self, item, obj):
-        for child_item in item:
-            if child_item.tag == "timeout":
-                obj.flow_timeout = child_item.text
-    #end process_flow_cache
-
-    def process_xmpp_server(self, item, obj):
-        for child_item in item:
-            if child_item.tag == "ip-address":
-                if not obj.xmpp_server1:
-                    obj.xmpp_server1 = child_item.text
-                else:
-                    obj.xmpp_server2 = child_item.text
-    #end process_xmpp_server
-
-    def process_dns_server(self, item, obj):
-        for child_item in item:
-            if child_item.tag == "ip-address":
-                if not obj.dns_server1:
-                    obj.dns_server1 = child_item.text
-                else:
-                    obj.dns_server2 = child_item.text
-    #end process_dns_server
-
-    def process_gateway(self, item, obj):
-        subnet_list = []
-        route_list = []
-        obj.gateway_str += "[GATEWAY-%d]\n" %(obj.gateway_idx)
-        obj.gateway_str += "# Name of the routing_instance for which the gateway is being configured\n"
-        ri_name = item.attrib["virtual-network"]
-        if not ri_name:
-            ri_name = item.attrib["routing-instance"]
-        obj.gateway_str += "routing_instance=%s\n\n" %(ri_name)
-        for child_item in item:
-            if child_item.tag == "interface":
-                obj.gateway_str += "# Gateway interface name\n"
-                obj.gateway_str += "interface=%s\n\n" %(child_item.text)
-            elif child_item.tag == "subnet":
-                subnet_list.append(child_item.text)
-            elif child_item.tag == "":
-                route_list.append(child_item.text)
-        obj.gateway_str += "# Virtual network ip blocks for which gateway service is required. Each IP\n"
-        obj.gateway_str += "# block is represented as ip/prefix. Multiple IP blocks are represented by\n"
-        obj.gateway_str += "# separating each with a space\n"
-        if subnet_list:
-            obj.gateway_str += "ip_blocks="
-            for subnet in subnet_list:
-                obj.gateway_str += "%s " %(subnet)
-            obj.gateway_str += "\n\n"
-        else:
-            obj.gateway_str += "# ip_blocks=ip1/prefix1 ip2/prefix2\n\n"
-        obj.gateway_str += "# Routes to be exported in routing_instance. Each route is represented as\n"
-        obj.gateway_str += "# ip/prefix. Multiple routes are represented by separating each with a space\n"
-        if route_list:
-            obj.gateway_str += "routes="
-            for route in route_list:
-                obj.gateway_str += "%s " %(route)
-            route_str += "\n\n"
-        else:
-            obj.gateway_str += "# routes=ip1/prefix1 ip2/prefix2\n\n"
-        obj.gateway_idx = obj.gateway_idx + 1
-    #end process_gateway
-
-    def convert(self):
-        if not os.path.isfile(self._args.source_file):
-            print 'Source file %s does not exist' %(self._args.source_file)
-            return
-        if os.path.isfile(self._args.target_file):
-            if not self._args.overwrite_target_file:
-                print 'Target file %s already exists' %(self._args.target_file)
-                return
-        agent_tree = ET.parse(self._args.source_file)
-        agent_root = agent_tree.getroot()
-        agent_elem = agent_root.find('agent')
-        obj = AgentXmlParams()
-        for item in agent_elem:
-            if item.tag == "vhost":
-                self.process_vhost(item, obj)
-            elif item.tag == "eth-port":
-                self.process_eth_port(item, obj)
-            elif item.tag == "discovery-server":
-                self.process_discovery(item, obj)
-            elif item.tag == "control":
-                self.process_control(item, obj)
-            elif item.tag == "hypervisor":
-                self.process_hypervisor(item, obj)
-            elif item.tag == "tunnel-type":
-                obj.tunnel_type = item.text
-            elif item.tag == "metadata-proxy":
-                self.process_metadata(item, obj)
-            elif item.tag == "xmpp-server":
-                self.process_xmpp_server(item, obj)
-            elif item.tag == "dns-server":
-                self.process_dns_server(item, obj)
-            elif item.tag == "flow-cache":
-                self.process_flow_cache(item, obj)
-            elif item.tag == "gateway":
-                self.process_gateway(item, obj)
-
-        #Generate the agent config file in INI format.
-        ini_str += "[CONTROL-NODE]\n" 
-        ini_str += "# IP address to be used to connect to control-node. Maximum of 2 IP addresses\n"
-        ini_str += "# (separated by a space) can be provided. If no IP is configured then the\n"
-        ini_str += "# value provided by discovery service will be used. (Optional)\n"
-        if obj.xmpp_server1 or obj.xmpp_server2:
-            ini_str += "server=%s %s\n\n" %(obj.xmpp_server1, obj.xmpp_server2)
-        else:
-            ini_str += "# server=x.x.x.x y.y.y.y\n\n"
-
-        ini_str += "[DEFAULT]\n"
-        ini_str += "# Everything in this section is optional\n\n"
-        #Collector configuration was not supported via conf file in 1.05 and earlier releases
-        #Add only commented section for collector
-        ini_str += "# IP address and port to be used to connect to collector. If these are not\n"
-        ini_str += "# configured, value provided by discovery service will be used. Multiple\n"
-        ini_str += "# IP:port strings separated by space can be provided\n"
-        ini_str += "# collectors=127.0.0.1:8086\n\n"
-        #Debug logging configuration was not supported in 1.05 and earlier releases
-        #Add only commented item for debug logging config
-        ini_str += "# Enable/disable debug logging. Possible values are 0 (disable) and 1 (enable)\n"
-        ini_str += "# debug=0\n\n"
-        ini_str += "# Aging time for flow-records in seconds\n"
-        if obj.flow_timeout:
-            ini_str += "flow_cache_timeout=%s\n\n" %(obj.flow_timeout)
-        else:
-            ini_str += "# flow_cache_timeout=0\n\n"
-
-        #The following configuration was not supported via conf file in 1.05 and earlier releases
-        #Add only commented items for these config
-        ini_str += "# Hostname of compute-node. If this is not configured value from `hostname`\n"
-        ini_str += "# will be taken\n"
-        ini_str += "# hostname=\n\n"
-        ini_str += "# Http server port for inspecting vnswad state (useful for debugging)\n"
-        ini_str += "# http_server_port=8085\n\n"
-        ini_str += "# Category for logging. Default value is '*'\n"
-        ini_str += "# log_category=\n\n"
-        ini_str += "# Local log file name\n"
-        ini_str += "# log_file=/var/log/contrail/vrouter.log\n\n"
-        ini_str += "# Log severity levels. Possible values are SYS_EMERG, SYS_ALERT, SYS_CRIT,\n"
-        ini_str += "# SYS_ERR, SYS_WARN, SYS_NOTICE, SYS_INFO and SYS_DEBUG. Default is SYS_DEBUG\n"
-        ini_str += "# log_level=SYS_NOTICE\n\n"
-        ini_str += "# Enable/Disable local file logging. Possible values are 0 (disable) and 1 (enable)\n"
-        ini_str += "# log_local=1\n\n"
-        ini_str += "# Encapsulation type for tunnel. Possible values are MPLSoGRE, MPLSoUDP, VXLAN\n"
-        if obj.tunnel_type:
-            ini_str += "tunnel_type=%s\n\n" %(obj.tunnel_type)
-        else:
-            ini_str += "# tunnel_type=\n\n"
-
-        ini_str += "[DISCOVERY]\n"
-        ini_str += "# If COLLECTOR and/or CONTROL-NODE and/or DNS is not specified this section is\n"
-        ini_str += "# mandatory. Else this section is optional\n\n"
-        ini_str += "# IP address of discovery server\n"
-        if obj.discovery_ip:
-            ini_str += "server=%s\n\n" %(obj.discovery_ip)
-        else:
-            ini_str += "# server=10.204.217.52\n\n"
-        ini_str += "# Number of control-nodes info to be provided by Discovery service. Possible\n"
-        ini_str += "# values are 1 and 2\n"
-        if obj.max_control_nodes:
-            ini_str += "max_control_nodes=%s\n\n" %(obj.max_control_nodes)
-        else:
-            ini_str += "# max_control_nodes=1\n\n"
-        ini_str += "[DNS]\n"
-        ini_str += "# IP address to be used to connect to dns-node. Maximum of 2 IP addresses\n"
-        ini_str += "# (separated by a space) can be provided. If no IP is configured then the\n"
-        ini_str += "# value provided by discovery service will be used. (Optional)\n"
-        if obj.dns_server1 or obj.dns_server2:
-            ini_str += "server=%s %s\n\n" %(obj.dns_server1, obj.dns_server2)
-        else:
-            ini_str += "# server=x.x.x.x y.y.y.y\n\n"
+    def is_bulk(self):
+        return bool(self._args.source_dir or self._args.manifest)
 
-        ini_str += "[HYPERVISOR]\n"
-        ini_str += "# Everything in this section is optional\n\n"
-        ini_str += "# Hypervisor type. Possible values are kvm, xen and vmware\n"
-        if obj.hypervisor_type:
-            ini_str += "# type=%s\n\n" %(obj.hypervisor_type)
+    def jobs(self):
+        if self._args.manifest:
+            pairs = read_manifest(self._args.manifest)
+        elif self._args.source_dir:
+            pairs = directory_pairs(self._args.source_dir,
+                                    self._args.target_dir)
         else:
-            ini_str += "# type=kvm\n\n"
+            pairs = [(self._args.source_file, self._args.target_file)]
+        return [(source_file, target_file, self._args.overwrite_target_file)
+                for source_file, target_file in pairs]
 
-        ini_str += "# Link-local IP address and prefix in ip/prefix_len format (for xen)\n"
-        if obj.xen_ll_ip:
-            ini_str += "xen_ll_ip=%s\n\n" %(obj.xen_ll_ip)
-        else:
-            ini_str += "# xen_ll_ip=\n\n"
-
-        ini_str += "# Link-local interface name when hypervisor type is Xen\n"
-        if obj.xen_ll_interface:
-            ini_str += "xen_ll_interface=%s\n\n" %(obj.xen_ll_interface)
-        else:
-            ini_str += "# xen_ll_interface=\n\n"
-
-        ini_str += "# Physical interface name when hypervisor type is vmware\n"
-        if obj.vmware_interface:
-            ini_str += "vmware_physical_interface=%s\n\n" %(obj.vmware_interface)
-        else:
-            ini_str += "# vmware_physical_interface=\n\n"
-
-        ini_str += "[FLOWS]\n"
-        ini_str += "# Everything in this section is optional\n\n"
-        ini_str += "# Maximum flows allowed per VM - given as \% of maximum system flows\n"
-        ini_str += "# max_vm_flows=100\n\n"
-        ini_str += "# Maximum number of link-local flows allowed across all VMs\n"
-        if obj.max_system_flows:
-            ini_str += "max_system_linklocal_flows=%s\n\n" %(obj.max_system_flows)
-        else:
-            ini_str += "# max_system_linklocal_flows=4096\n\n"
-        ini_str += "# Maximum number of link-local flows allowed per VM\n"
-        if obj.max_vm_flows:
-            ini_str += "max_vm_linklocal_flows=%s\n\n" %(obj.max_vm_flows)
-        else:
-            ini_str += "# max_vm_linklocal_flows=1024\n\n"
-
-        ini_str += "[METADATA]\n"
-        ini_str += "# Shared secret for metadata proxy service. (Optional)\n"
-        if obj.metadata_secret:
-            ini_str += "metadata_proxy_secret=%s\n\n" %(obj.metadata_secret)
-        else:
-            ini_str += "# metadata_proxy_secret=contrail\n\n"
-
-        ini_str += "[NETWORKS]\n"
-        ini_str += "# control-channel IP address used by WEB-UI to connect to vnswad to fetch\n"
-        ini_str += "# required information (Optional)\n"
-        if obj.control_network_ip:
-            ini_str += "control_network_ip=%s\n\n" %(obj.control_network_ip)
-        else:
-            ini_str += "# control_network_ip=\n\n"
-        
-        ini_str += "[VIRTUAL-HOST-INTERFACE]\n"
-        ini_str += "# Everything in this section is mandatory\n\n"
-        ini_str += "# name of virtual host interface\n"
-        ini_str += "name=%s\n\n" %(obj.vhost_name)
-
-        ini_str += "# IP address and prefix in ip/prefix_len format\n"
-        ini_str += "ip=%s\n\n" %(obj.vhost_ip)
-
-        ini_str += "# Gateway IP address for virtual host\n"
-        ini_str += "gateway=%s\n\n" %(obj.vhost_gw)
-
-        ini_str += "# Physical interface name to which virtual host interface maps to\n"
-        ini_str += "physical_interface=%s\n\n" %(obj.physical_interface)
-
-        with open(self._args.target_file, "w") as f:
-            f.write(ini_str)
+    def convert(self):
+        if not self.is_bulk() and not os.path.isfile(self._args.source_file):
+            # Nothing to convert, as on the nodes set up after 1.05
+            print 'Source file %s does not exist' % self._args.source_file
+            return []
+        results = convert_files(self.jobs(), self._args.workers)
+        counts = {}
+        for source_file, target_file, status, message in results:
+            counts[status] = counts.get(status, 0) + 1
+            if self.is_bulk():
+                print '%-9s %s' % (status, message)
+            elif status != 'converted':
+                print message
+        if self.is_bulk():
+            print '%d converted, %d skipped, %d failed' % (
+                counts.get('converted', 0), counts.get('skipped', 0),
+                counts.get('failed', 0))
+        return results
 
     #end __convert__
 
@@ -367,8 +330,11 @@ class Xml2Ini():
 
 def main(args_str = None):
     obj = Xml2Ini(args_str)
-    obj.convert()
-    obj.convert_supervisor_ini()
+    results = obj.convert()
+    if [result for result in results if result[2] == 'failed']:
+        sys.exit(1)
+    if not obj.is_bulk():
+        obj.convert_supervisor_ini()
 #end main
 
 if __name__ == "__main__":
@@ -6,18 +6,18 @@
 import os
 import sys
 import socket
-import netaddr
 import argparse
-import netifaces
 import subprocess
 import ConfigParser
 
-from fabric.api import local, run
-from fabric.state import env
-from fabric.context_managers import settings, lcd
-
 from contrail_provisioning.common.base import ContrailSetup
+from contrail_provisioning.common.lazy import local, settings, lcd, \
+    netaddr, netifaces
+from contrail_provisioning.common.libvirt_conf import QEMU_CONF, \
+    QEMU_DEFAULT_DEVICE_ACL, update_local_conf
 from contrail_provisioning.compute.network import ComputeNetworkSetup
+from contrail_provisioning.compute.agent_sections import AgentSections, \
+    gateway_sections, qos_sections, priority_group_sections
 from contrail_provisioning.compute.templates import vrouter_nodemgr_param
 from contrail_provisioning.compute.templates import contrail_vrouter_agent_conf
 from contrail_provisioning.compute.templates import contrail_vrouter_nodemgr_template
@@ -74,20 +74,18 @@ class ComputeBaseSetup(ContrailSetup, ComputeNetworkSetup):
 
     def add_dev_tun_in_cgroup_device_acl(self):
         # add /dev/net/tun in cgroup_device_acl needed for type=ethernet interfaces
+        qemu_settings = []
+        if self.pdist in ['centos', 'redhat']:
+            qemu_settings = [('clear_emulator_capabilities', 1),
+                             ('user', 'root'),
+                             ('group', 'root')]
+        # Merged in the existing (or default) acl, one write of qemu.conf
+        if os.path.isfile(QEMU_CONF) and \
+           update_local_conf(QEMU_CONF, qemu_settings,
+                [('cgroup_device_acl', ['/dev/net/tun'],
+                  QEMU_DEFAULT_DEVICE_ACL)]):
+            self._fixed_qemu_conf = True
         with settings(warn_only = True):
-            ret = local("sudo grep -q '^cgroup_device_acl' /etc/libvirt/qemu.conf")
-            if ret.return_code == 1:
-                if  self.pdist in ['centos', 'redhat']:
-                    local('sudo echo "clear_emulator_capabilities = 1" >> /etc/libvirt/qemu.conf')
-                    local('sudo echo \'user = "root"\' >> /etc/libvirt/qemu.conf')
-                    local('sudo echo \'group = "root"\' >> /etc/libvirt/qemu.conf')
-                local('sudo echo \'cgroup_device_acl = [\' >> /etc/libvirt/qemu.conf')
-                local('sudo echo \'    "/dev/null", "/dev/full", "/dev/zero",\' >> /etc/libvirt/qemu.conf')
-                local('sudo echo \'    "/dev/random", "/dev/urandom",\' >> /etc/libvirt/qemu.conf')
-                local('sudo echo \'    "/dev/ptmx", "/dev/kvm", "/dev/kqemu",\' >> /etc/libvirt/qemu.conf')
-                local('sudo echo \'    "/dev/rtc", "/dev/hpet","/dev/net/tun",\' >> /etc/libvirt/qemu.conf')
-                local('sudo echo \']\' >> /etc/libvirt/qemu.conf')
-                self._fixed_qemu_conf = True
             # add "alias bridge off" in /etc/modprobe.conf for Centos
             if  self.pdist in ['centos', 'redhat']:
                 local('sudo echo "alias bridge off" > /etc/modprobe.conf')
@@ -214,86 +212,25 @@ class ComputeBaseSetup(ContrailSetup, ComputeNetworkSetup):
                      ' '.join('%s:%s' %(server, '8086') for server \
                      in self._args.collectors)
             }
-            self._template_substitute_write(contrail_vrouter_agent_conf.template,
-                    vnswad_conf_template_vals, self._temp_dir_name + '/vnswad.conf')
+            vnswad_conf = self._template_substitute(
+                    contrail_vrouter_agent_conf.template,
+                    vnswad_conf_template_vals)
 
+            # Gateway, QoS queue and priority group sections, merged in
+            # the rendered conf which is then written once
+            agent_sections = AgentSections()
             if vgw_public_vn_name and vgw_public_subnet:
-                vgw_public_vn_name = vgw_public_vn_name[1:-1].split(';')
-                vgw_public_subnet = vgw_public_subnet[1:-1].split(';')
-                vgw_intf_list = vgw_intf_list[1:-1].split(';')
-                gateway_str = ""
-                if vgw_gateway_routes != None:
-                    vgw_gateway_routes = vgw_gateway_routes[1:-1].split(';')
-                for i in range(len(vgw_public_vn_name)):
-                    gateway_str += '\n[%s%d]\n' %("GATEWAY-", i)
-                    gateway_str += "# Name of the routing_instance for which the gateway is being configured\n"
-                    gateway_str += "routing_instance=" + vgw_public_vn_name[i] + "\n\n"
-                    gateway_str += "# Gateway interface name\n"
-                    gateway_str += "interface=" + vgw_intf_list[i] + "\n\n"
-                    gateway_str += "# Virtual network ip blocks for which gateway service is required. Each IP\n"
-                    gateway_str += "# block is represented as ip/prefix. Multiple IP blocks are represented by\n"
-                    gateway_str += "# separating each with a space\n"
-                    gateway_str += "ip_blocks="
-
-                    if vgw_public_subnet[i].find("[") !=-1:
-                        for ele in vgw_public_subnet[i][1:-1].split(","):
-                            gateway_str += ele[1:-1] + " "
-                    else:
-                        gateway_str += vgw_public_subnet[i]
-                    gateway_str += "\n\n"
-                    if vgw_gateway_routes != None and i < len(vgw_gateway_routes):
-                        if  vgw_gateway_routes[i] != '[]':
-                            gateway_str += "# Routes to be exported in routing_instance. Each route is represented as\n"
-                            gateway_str += "# ip/prefix. Multiple routes are represented by separating each with a space\n"
-                            gateway_str += "routes="
-                            if vgw_gateway_routes[i].find("[") !=-1:
-                                for ele in vgw_gateway_routes[i][1:-1].split(","):
-                                    gateway_str += ele[1:-1] + " "
-                            else:
-                                gateway_str += vgw_gateway_routes[i]
-                            gateway_str += "\n"
-                filename = self._temp_dir_name + "/vnswad.conf"
-                with open(filename, "a") as f:
-                    f.write(gateway_str)
-
+                agent_sections.extend(gateway_sections(vgw_public_vn_name,
+                        vgw_public_subnet, vgw_intf_list, vgw_gateway_routes))
             if qos_queue_id_list != None:
-                qos_str = ""
-                qos_str += "[QOS]\n"
-                num_sections = len(qos_logical_queue)
-                if(len(qos_logical_queue) == len(qos_queue_id_list) and default_hw_queue_qos):
-                    num_sections = num_sections - 1
-                for i in range(num_sections):
-                    qos_str += '[%s%s]\n' %("QUEUE-", qos_queue_id_list[i])
-                    qos_str += "# Logical nic queues for qos config\n"
-                    qos_str += "logical_queue=[%s]\n\n" % qos_logical_queue[i].replace(",",", ")
-
-                if (default_hw_queue_qos):
-                    qos_str += '[%s%s]\n' %("QUEUE-", qos_queue_id_list[-1])
-                    qos_str += "# This is the default hardware queue\n"
-                    qos_str += "default_hw_queue= true\n\n"
-                    qos_str += "# Logical nic queues for qos config\n"
-
-                    if(len(qos_logical_queue) == len(qos_queue_id_list)):
-                        qos_str += "logical_queue=[%s]\n\n" % qos_logical_queue[-1].replace(",",", ")
-                    else:
-                        qos_str += "logical_queue=[ ]\n\n"
-                filename = self._temp_dir_name + "/vnswad.conf"
-                with open(filename, "a") as f:
-                    f.write(qos_str)
-
+                agent_sections.extend(qos_sections(qos_queue_id_list,
+                        qos_logical_queue, default_hw_queue_qos))
             if priority_id_list != None:
-                priority_group_str = ""
-                priority_group_str += "[QOS-NIANTIC]\n"
-                for i in range(len(priority_id_list)):
-                    priority_group_str += '[%s%s]\n' %("PG-", priority_id_list[i])
-                    priority_group_str += "# Scheduling algorithm for priority group (strict/rr)\n"
-                    priority_group_str += "scheduling=" + priority_scheduling[i] + "\n\n"
-                    priority_group_str += "# Total hardware queue bandwidth used by priority group\n"
-                    priority_group_str += "bandwidth=" + priority_bandwidth[i] + "\n\n"
-
-                filename = self._temp_dir_name + "/vnswad.conf"
-                with open(filename, "a") as f:
-                    f.write(priority_group_str)
+                agent_sections.extend(priority_group_sections(
+                        priority_id_list, priority_scheduling,
+                        priority_bandwidth))
+            with open(self._temp_dir_name + '/vnswad.conf', 'w') as f:
+                f.write(agent_sections.merge_into(vnswad_conf))
 
             if self._args.metadata_secret:
                 local("sudo openstack-config --set %s/vnswad.conf METADATA \
@@ -5,13 +5,10 @@
 
 import os
 import re
-import glob
-import struct
-import socket
-import netifaces
 
-from fabric.api import local
-from fabric.context_managers import settings
+from contrail_provisioning.common import routes
+from contrail_provisioning.common.lazy import local, settings, netifaces
+from contrail_provisioning.common.debian_interfaces import InterfacesConfig
 
 class ComputeNetworkSetup(object):
     def find_gateway (self, dev):
@@ -186,93 +183,28 @@ HWADDR=%s
 
     def migrate_routes(self, device):
         '''
-        Sample output of /proc/net/route :
-        Iface   Destination     Gateway         Flags   RefCnt  Use     Metric  Mask            MTU     Window  IRTT
-        p4p1    00000000        FED8CC0A        0003    0       0       0       00000000        0       0       0
+        Moves the static routes of device over to vhost0 in a single
+        read of the route table
         '''
         temp_dir_name = self._temp_dir_name
         cfg_file = '/etc/sysconfig/network-scripts/route-vhost0'
         tmp_file = '%s/route-vhost0'%(temp_dir_name)
+        table = routes.RouteTable.read()
+        vhost_routes = sorted([route.on_device('vhost0')
+                               for route in table.device_routes(device)
+                               if not route.is_default])
         with open(tmp_file, 'w') as route_cfg_file:
-            for route in open('/proc/net/route', 'r').readlines():
-                if route.startswith(device):
-                    route_fields = route.split()
-                    destination = int(route_fields[1], 16)
-                    gateway = int(route_fields[2], 16)
-                    flags = int(route_fields[3], 16)
-                    mask = int(route_fields[7], 16)
-                    if flags & 0x2:
-                        if destination != 0:
-                            route_cfg_file.write(socket.inet_ntoa(struct.pack('I', destination)))
-                            route_cfg_file.write('/' + str(bin(mask).count('1')) + ' ')
-                            route_cfg_file.write('via ')
-                            route_cfg_file.write(socket.inet_ntoa(struct.pack('I', gateway)) + ' ')
-                            route_cfg_file.write('dev vhost0')
-                        #end if detination...
-                    #end if flags &...
-                #end if route.startswith...
-            #end for route...
-        #end with open...
+            route_cfg_file.write(routes.format_routes(vhost_routes))
         local("sudo mv -f %s %s" %(tmp_file, cfg_file))
         #delete the route-dev file
         if os.path.isfile('/etc/sysconfig/network-scripts/route-%s'%device):
             os.unlink('/etc/sysconfig/network-scripts/route-%s'%device)
     #end def migrate_routes
 
-    def get_cfgfile_for_dev(self, iface, cfg_files):
-        if not cfg_files:
-            return None
-        mapped_intf_cfgfile = None
-        for file in cfg_files:
-            with open(file, 'r') as fd:
-                contents = fd.read()
-                regex = '(?:^|\n)\s*iface\s+%s\s+'%iface
-                if re.search(regex, contents):
-                    mapped_intf_cfgfile = file
-        return mapped_intf_cfgfile
-
-    def get_sourced_files(self):
-        '''Get all sourced config files'''
-        files = self.get_valid_files(self.get_source_entries())
-        files += self.get_source_directory_files()
-        return list(set(files))
-
-    def get_source_directory_files(self):
-        '''Get source-directory entry and make list of valid files'''
-        regex = '(?:^|\n)\s*source-directory\s+(\S+)'
-        files = list()
-        with open(self.default_cfg_file, 'r') as fd:
-            entries = re.findall(regex, fd.read())
-        dirs = [d for d in self.get_valid_files(entries) if os.path.isdir(d)]
-        for dir in dirs:
-            files.extend([os.path.join(dir, f) for f in os.listdir(dir)\
-                          if os.path.isfile(os.path.join(dir, f)) and \
-                          re.match('^[a-zA-Z0-9_-]+$', f)])
-        return files
-
-    def get_source_entries(self):
-        '''Get entries matching source keyword from /etc/network/interfaces file'''
-        regex = '(?:^|\n)\s*source\s+(\S+)'
-        with open(self.default_cfg_file, 'r') as fd:
-            return re.findall(regex, fd.read())
-
-    def get_valid_files(self, entries):
-        '''Provided a list of glob'd strings, return matching file names'''
-        files = list()
-        prepend = os.path.join(os.path.sep, 'etc', 'network') + os.path.sep
-        for entry in entries:
-            entry = entry.lstrip('./') if entry.startswith('./') else entry
-            entry = prepend+entry if not entry.startswith(os.path.sep) else entry
-            files.extend(glob.glob(entry))
-        return files
-
     def _rewrite_net_interfaces_file(self, dev, mac, vhost_ip, netmask, gateway_ip, esxi_vm, vmpg_mtu,
                                      datapg_mtu):
-        self.default_cfg_file = '/etc/network/interfaces'
-        cfg_files = self.get_sourced_files()
-        cfg_files.append(self.default_cfg_file)
-        intf_cfgfile = self.get_cfgfile_for_dev('vhost0', cfg_files)
-        if intf_cfgfile:
+        config = InterfacesConfig('/etc/network/interfaces')
+        if config.file_for_iface('vhost0'):
             print "Interface vhost0 is already present in /etc/network/interfaces"
             print "Skipping rewrite of this file"
             return
@@ -298,63 +230,44 @@ HWADDR=%s
                 local("sudo sed -i 's/%s/vhost0/g' %s" %(dev, ifup_parts_file))
                 local("sudo sed -i 's/%s/vhost0/g' %s" %(dev, ifdown_parts_file))
 
-        dev_cfgfile = self.get_cfgfile_for_dev(dev, cfg_files)
-        temp_intf_file = '%s/interfaces' %(self._temp_dir_name)
-        local("cp %s %s" %(dev_cfgfile, temp_intf_file))
-        with open(dev_cfgfile, 'r') as fd:
-            cfg_file = fd.read()
+        dev_cfg = config.file_for_iface(dev) or config.main
+        dev_stanza = dev_cfg.find_iface(dev)
+
+        esxi_options = []
+        if esxi_vm:
+            esxi_options.append(('pre-up', 'ifconfig %s up mtu %s' % (dev, datapg_mtu)))
+            device_driver = local("ethtool -i %s | grep driver | cut -f 2 -d ' '" %dev, capture=True)
+            if (device_driver == "vmxnet3"):
+                esxi_options.append(('pre-up', 'ethtool --offload %s rx off' % dev))
+                esxi_options.append(('pre-up', 'ethtool --offload %s tx off' % dev))
+        if vlan:
+            updown_options = [('post-up', 'ifconfig %s up' % dev),
+                              ('pre-down', 'ifconfig %s down' % dev)]
+        else:
+            updown_options = [('pre-up', 'ifconfig %s up' % dev),
+                              ('post-down', 'ifconfig %s down' % dev)]
 
         if not self._args.non_mgmt_ip:
-            # remove entry from auto <dev> to auto excluding these pattern
-            # then delete specifically auto <dev> 
-            local("sed -i '/auto %s/,/auto/{/auto/!d}' %s" %(dev, temp_intf_file))
-            local("sed -i '/auto %s/d' %s" %(dev, temp_intf_file))
-            # add manual entry for dev
-            local("echo 'auto %s' >> %s" %(dev, temp_intf_file))
-            local("echo 'iface %s inet manual' >> %s" %(dev, temp_intf_file))
-            if vlan:
-                local("echo '    post-up ifconfig %s up' >> %s" %(dev, temp_intf_file))
-                local("echo '    pre-down ifconfig %s down' >> %s" %(dev, temp_intf_file))
-            else: 
-                local("echo '    pre-up ifconfig %s up' >> %s" %(dev, temp_intf_file))
-                local("echo '    post-down ifconfig %s down' >> %s" %(dev, temp_intf_file))
-            if (esxi_vm):
-                    local("echo '    pre-up ifconfig %s up mtu %s' >> %s" % (dev, datapg_mtu, temp_intf_file))
-                    device_driver = local("ethtool -i %s | grep driver | cut -f 2 -d ' '" %dev, capture=True)
-                    if (device_driver == "vmxnet3"):
-                        local("echo '    pre-up ethtool --offload %s rx off' >> %s" %(dev, temp_intf_file))
-                        local("echo '    pre-up ethtool --offload %s tx off' >> %s" %(dev, temp_intf_file))
+            # replace the stanza of dev with a manual one, vhost0 takes
+            # over its address
+            bond_options = []
+            if 'bond' in dev.lower() and dev_stanza:
+                bond_options = [(key, value) for key, value in dev_stanza.options()
+                                if key.startswith('bond-')]
+            config.remove_iface(dev)
+            options = updown_options + esxi_options
             if vlan:
-                local("echo '    vlan-raw-device %s' >> %s" %(phydev, temp_intf_file))
-            if 'bond' in dev.lower():
-                iters = re.finditer('^\s*auto\s', cfg_file, re.M)
-                indices = [match.start() for match in iters]
-                matches = map(cfg_file.__getslice__, indices, indices[1:] + [len(cfg_file)])
-                for each in matches:
-                    each = each.strip()
-                    if re.match('^auto\s+%s'%dev, each):
-                        string = ''
-                        for lines in each.splitlines():
-                            if 'bond-' in lines:
-                                string += lines+os.linesep
-                        local("echo '%s' >> %s" %(string, temp_intf_file))
-                    else:
-                        continue
-            local("echo '' >> %s" %(temp_intf_file))
+                options.append(('vlan-raw-device', phydev))
+            dev_cfg.add_iface(dev, 'manual', options + bond_options)
         else:
-            #remove ip address and gateway
-            with settings(warn_only = True):
-                local("sed -i '/iface %s inet static/, +2d' %s" % (dev, temp_intf_file))
-                if esxi_vm:
-                    local("echo '    pre-up ifconfig %s up mtu %s' >> %s" % (dev, datapg_mtu, temp_intf_file))
-                    device_driver = local("ethtool -i %s | grep driver | cut -f 2 -d ' '" %dev, capture=True)
-                    if (device_driver == "vmxnet3"):
-                        local("echo '    pre-up ethtool --offload %s rx off' >> %s" %(dev, temp_intf_file))
-                        local("echo '    pre-up ethtool --offload %s tx off' >> %s" %(dev, temp_intf_file))
-                if vlan:
-                    local("sed -i '/auto %s/ a\iface %s inet manual\\n    post-up ifconfig %s up\\n    pre-down ifconfig %s down\' %s"% (dev, dev, dev, dev, temp_intf_file))
-                else:
-                    local("sed -i '/auto %s/ a\iface %s inet manual\\n    pre-up ifconfig %s up\\n    post-down ifconfig %s down\' %s"% (dev, dev, dev, dev, temp_intf_file))
+            #remove ip address and gateway, keep the rest of the stanza
+            if not dev_stanza:
+                dev_stanza = dev_cfg.add_iface(dev, 'manual')
+            dev_stanza.set_method('manual')
+            dev_stanza.remove_options(['address', 'netmask', 'gateway',
+                                       'broadcast', 'network'])
+            for key, value in updown_options + esxi_options:
+                dev_stanza.add_option(key, value)
         if esxi_vm and vmpg_mtu:
             intf = self.get_secondary_device(self.dev)
             mac_addr = self.get_if_mac(intf)
@@ -364,38 +277,31 @@ HWADDR=%s
             local("cp %s %s" %(udev_net_file, temp_udev_net_file))
             local("echo 'SUBSYSTEM==\"net\", ACTION==\"add\", DRIVERS==\"?*\", ATTR{address}==\"%s\", ATTR{dev_id}==\"0x0\", ATTR{type}==\"1\", KERNEL==\"eth*\", NAME=\"%s\"' >> %s" %(mac_addr, intf, temp_udev_net_file))
             local("sudo mv -f %s %s" %(temp_udev_net_file, udev_net_file))
-            local("sed -i '/auto %s/,/down/d' %s" %(intf, temp_intf_file))
-            local("echo '\nauto %s' >> %s" %(intf, temp_intf_file))
-            local("echo 'iface %s inet manual' >> %s" %(intf, temp_intf_file))
-            local("echo '    pre-up ifconfig %s up mtu %s' >> %s" % (intf, vmpg_mtu, temp_intf_file))
-            local("echo '    post-down ifconfig %s down' >> %s" %(intf, temp_intf_file))
-            local("echo '    pre-up ethtool --offload %s lro off' >> %s" %(intf, temp_intf_file))
+            config.remove_iface(intf)
+            dev_cfg.add_iface(intf, 'manual',
+                              [('pre-up', 'ifconfig %s up mtu %s' % (intf, vmpg_mtu)),
+                               ('post-down', 'ifconfig %s down' % intf),
+                               ('pre-up', 'ethtool --offload %s lro off' % intf)])
 
         # populte vhost0 as static
-        local("echo '' >> %s" %(temp_intf_file))
-        local("echo 'auto vhost0' >> %s" %(temp_intf_file))
-        local("echo 'iface vhost0 inet static' >> %s" %(temp_intf_file))
-        local("echo '    pre-up %s/if-vhost0' >> %s" %(self.contrail_bin_dir, temp_intf_file))
-        local("echo '    netmask %s' >> %s" %(netmask, temp_intf_file))
-        local("echo '    network_name application' >> %s" %(temp_intf_file))
+        options = [('pre-up', '%s/if-vhost0' % self.contrail_bin_dir),
+                   ('netmask', netmask),
+                   ('network_name', 'application')]
         if esxi_vm and datapg_mtu:
-            local("echo '    mtu %s' >> %s" %(datapg_mtu, temp_intf_file))
+            options.append(('mtu', datapg_mtu))
         if vhost_ip:
-            local("echo '    address %s' >> %s" %(vhost_ip, temp_intf_file))
+            options.append(('address', vhost_ip))
         if (not self._args.non_mgmt_ip) and gateway_ip:
-            local("echo '    gateway %s' >> %s" %(gateway_ip, temp_intf_file))
+            options.append(('gateway', gateway_ip))
 
         domain = self.get_domain_search_list()
         if domain:
-            local("echo '    dns-search %s' >> %s" %(domain, temp_intf_file))
+            options.append(('dns-search', domain))
         dns_list = self.get_dns_servers(dev)
         if dns_list:
-            local("echo -n '    dns-nameservers' >> %s" %(temp_intf_file))
-            for dns in dns_list:
-                local("echo -n ' %s' >> %s" %(dns, temp_intf_file))
-            local("echo '' >> %s" % (temp_intf_file))
-        local("echo '    post-up ip link set vhost0 address %s' >> %s" % (mac,
-              temp_intf_file))
-
-        # move it to right place
-        local("sudo mv -f %s %s" %(temp_intf_file, dev_cfgfile))
+            options.append(('dns-nameservers', ' '.join(dns_list)))
+        options.append(('post-up', 'ip link set vhost0 address %s' % mac))
+        dev_cfg.add_iface('vhost0', 'static', options)
+
+        # write each changed file once, atomically
+        config.save()
@@ -8,9 +8,7 @@ import argparse
 import subprocess
 import ConfigParser
 
-from fabric.api import local
-from fabric.context_managers import settings
-
+from contrail_provisioning.common.lazy import local, settings
 from contrail_provisioning.compute.common import ComputeBaseSetup
 
 
@@ -7,18 +7,16 @@ import os
 import sys
 import argparse
 import ConfigParser
-import platform
-from fabric.api import local, run
-from fabric.state import env
-from fabric.context_managers import settings, lcd
+from contrail_provisioning.common.lazy import local
 
+from contrail_provisioning.common import platform_info
 from contrail_provisioning.common.base import ContrailSetup
 from contrail_provisioning.compute.toragent.templates import tor_agent_conf
 from contrail_provisioning.compute.toragent.templates import tor_agent_ini
 from contrail_provisioning.compute.toragent.templates import tor_agent_service
 from distutils.version import LooseVersion
 
-(PLATFORM, VERSION, EXTRA) = platform.linux_distribution()
+(PLATFORM, VERSION, EXTRA) = platform_info.linux_distribution()
 
 class TorAgentBaseSetup(ContrailSetup):
     def __init__(self, tor_agent_args, args_str=None):
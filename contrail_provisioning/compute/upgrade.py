@@ -12,7 +12,7 @@ from openstack import ComputeOpenstackSetup
 from contrail_provisioning.common.upgrade import ContrailUpgrade
 from contrail_provisioning.compute.common import ComputeBaseSetup
 
-from fabric.api import local
+from contrail_provisioning.common.lazy import local
 
 
 class ComputeUpgrade(ContrailUpgrade, ComputeSetup):
@@ -94,6 +94,8 @@ class ComputeUpgrade(ContrailUpgrade, ComputeSetup):
         local("openstack-config --set /etc/nova/nova.conf neutron user_domain_name Default")
 
     def upgrade(self):
+        if self._dry_run():
+            return
         self.disable_apt_get_auto_start()
         self._upgrade()
         if ((self.pdist not in ['Ubuntu']) and
@@ -7,10 +7,10 @@
 import os
 from time import sleep
 
-from fabric.api import local
-from fabric.context_managers import settings
+from contrail_provisioning.common.lazy import local, settings
 
 from contrail_provisioning.common.base import ContrailSetup
+from contrail_provisioning.common.service_restarts import ServiceGroup
 from contrail_provisioning.database.base import DatabaseCommon
 from contrail_provisioning.config.templates import contrail_api_conf
 from contrail_provisioning.config.templates import contrail_api_ini
@@ -24,7 +24,36 @@ from contrail_provisioning.config.templates import contrail_config_nodemgr_templ
 from contrail_provisioning.common.templates import contrail_database_template
 from contrail_provisioning.config.templates import contrail_device_manager_ini
 
+KEYSTONE_AUTH_CONF = '/etc/contrail/contrail-keystone-auth.conf'
+DATABASE_CONF = '/etc/contrail/contrail-database.conf'
+VNC_API_LIB_INI = '/etc/contrail/vnc_api_lib.ini'
+SUPERVISOR_CONFIG_FILES = '/etc/contrail/supervisord_config_files'
+
+# Config files read by each config node service
+CONFIG_SERVICES = ServiceGroup('supervisor-config', [
+    ('contrail-api', ['/etc/contrail/contrail-api.conf', KEYSTONE_AUTH_CONF,
+                      DATABASE_CONF, '/etc/init.d/contrail-api',
+                      SUPERVISOR_CONFIG_FILES + '/contrail-api.ini']),
+    ('contrail-schema', ['/etc/contrail/contrail-schema.conf',
+                         KEYSTONE_AUTH_CONF, DATABASE_CONF, VNC_API_LIB_INI,
+                         SUPERVISOR_CONFIG_FILES + '/contrail-schema.ini']),
+    ('contrail-svc-monitor', ['/etc/contrail/contrail-svc-monitor.conf',
+                              KEYSTONE_AUTH_CONF, DATABASE_CONF,
+                              VNC_API_LIB_INI, SUPERVISOR_CONFIG_FILES +
+                              '/contrail-svc-monitor.ini']),
+    ('contrail-device-manager', ['/etc/contrail/contrail-device-manager.conf',
+                                 KEYSTONE_AUTH_CONF, DATABASE_CONF,
+                                 VNC_API_LIB_INI, SUPERVISOR_CONFIG_FILES +
+                                 '/contrail-device-manager.ini']),
+    ('contrail-config-nodemgr', ['/etc/contrail/contrail-config-nodemgr.conf']),
+    ], supervisor_files=[SUPERVISOR_CONFIG_FILES + '/contrail-api.ini',
+                         SUPERVISOR_CONFIG_FILES + '/contrail-schema.ini',
+                         SUPERVISOR_CONFIG_FILES + '/contrail-svc-monitor.ini',
+                         SUPERVISOR_CONFIG_FILES + '/contrail-device-manager.ini'])
+
 class ConfigBaseSetup(ContrailSetup):
+    use_render_plan = True
+
     def __init__(self, config_args, args_str=None):
         super(ConfigBaseSetup, self).__init__()
         self._args = config_args
@@ -98,11 +127,12 @@ class ConfigBaseSetup(ContrailSetup):
                              ' '.join('%s:%s' %(server, '8086') for server \
                                 in self._args.collector_ip_list)
                         }
-        self._template_substitute_write(contrail_api_conf.template,
-                                        template_vals, self._temp_dir_name + '/contrail-api.conf')
-        local("sudo mv %s/contrail-api.conf /etc/contrail/" %(self._temp_dir_name))
+        self._install_template(contrail_api_conf.template,
+                               template_vals,
+                               '/etc/contrail/contrail-api.conf')
         if self.amqp_password:
-            local("sudo openstack-config --set /etc/contrail/contrail-api.conf DEFAULTS rabbit_password %s" % self.amqp_password)
+            self.set_config('/etc/contrail/contrail-api.conf', 'DEFAULTS',
+                            'rabbit_password', self.amqp_password)
 
     def fixup_contrail_api_supervisor_ini(self, config_files=['/etc/contrail/contrail-api.conf', '/etc/contrail/contrail-database.conf']):
         # supervisor contrail-api.ini
@@ -116,9 +146,9 @@ class ConfigBaseSetup(ContrailSetup):
         else:
             tmpl = contrail_api_ini_centos.template
 
-        self._template_substitute_write(tmpl,
-                                        template_vals, self._temp_dir_name + '/contrail-api.ini')
-        local("sudo mv %s/contrail-api.ini /etc/contrail/supervisord_config_files/" %(self._temp_dir_name))
+        self._install_template(tmpl,
+                               template_vals,
+                               '/etc/contrail/supervisord_config_files/contrail-api.ini')
 
     def fixup_contrail_api_initd(self):
         # initd script wrapper for contrail-api
@@ -135,10 +165,9 @@ class ConfigBaseSetup(ContrailSetup):
 
             template_vals = {'__contrail_supervisorctl_lines__': sctl_lines,
                             }
-            self._template_substitute_write(contrail_api_svc.template,
-                                            template_vals, self._temp_dir_name + '/contrail-api')
-            local("sudo mv %s/contrail-api /etc/init.d/" %(self._temp_dir_name))
-            local("sudo chmod a+x /etc/init.d/contrail-api")
+            self._install_template(contrail_api_svc.template,
+                                   template_vals,
+                                   '/etc/init.d/contrail-api', mode=0755)
 
     def fixup_schema_transformer_config_file(self):
         # contrail-schema.conf
@@ -157,13 +186,14 @@ class ConfigBaseSetup(ContrailSetup):
                              ' '.join('%s:%s' %(server, '8086') for server \
                                 in self._args.collector_ip_list)
                         }
-        self._template_substitute_write(contrail_schema_transformer_conf.template,
-                                        template_vals, self._temp_dir_name + '/contrail-schema.conf')
-        local("sudo mv %s/contrail-schema.conf /etc/contrail/contrail-schema.conf" %(self._temp_dir_name))
+        self._install_template(contrail_schema_transformer_conf.template,
+                               template_vals,
+                               '/etc/contrail/contrail-schema.conf')
         if os.path.exists('/etc/init.d/contrail-schema'):
             local("sudo chmod a+x /etc/init.d/contrail-schema")
         if self.amqp_password:
-            local("sudo openstack-config --set /etc/contrail/contrail-schema.conf DEFAULTS rabbit_password %s" % self.amqp_password)
+            self.set_config('/etc/contrail/contrail-schema.conf', 'DEFAULTS',
+                            'rabbit_password', self.amqp_password)
 
     def fixup_device_manager_ini(self,config_files=
                                       ['/etc/contrail/contrail-device-manager.conf',
@@ -175,9 +205,9 @@ class ConfigBaseSetup(ContrailSetup):
             config_files.append('/etc/contrail/contrail-database.conf')
         config_file_args = ' --conf_file '.join(config_files)
         template_vals = {'__contrail_config_file_args__': config_file_args}
-        self._template_substitute_write(contrail_device_manager_ini.template,
-                                        template_vals, self._temp_dir_name + '/contrail-device-manager.ini')
-        local("sudo mv %s/contrail-device-manager.ini /etc/contrail/supervisord_config_files/" %(self._temp_dir_name))
+        self._install_template(contrail_device_manager_ini.template,
+                               template_vals,
+                               '/etc/contrail/supervisord_config_files/contrail-device-manager.ini')
 
     def fixup_device_manager_config_file(self):
         # contrail-device-manager.conf
@@ -192,12 +222,13 @@ class ConfigBaseSetup(ContrailSetup):
                              ' '.join('%s:%s' %(server, '8086') for server \
                                 in self._args.collector_ip_list) 
                         }
-        self._template_substitute_write(contrail_device_manager_conf.template,
-                                        template_vals, self._temp_dir_name + '/contrail-device-manager.conf')
-        local("sudo mv %s/contrail-device-manager.conf /etc/contrail/contrail-device-manager.conf" %(self._temp_dir_name))
+        self._install_template(contrail_device_manager_conf.template,
+                               template_vals,
+                               '/etc/contrail/contrail-device-manager.conf')
         #local("sudo chmod a+x /etc/init.d/contrail-device-manager")
         if self.amqp_password:
-            local("sudo openstack-config --set /etc/contrail/contrail-device-manager.conf DEFAULTS rabbit_password %s" % self.amqp_password)
+            self.set_config('/etc/contrail/contrail-device-manager.conf', 'DEFAULTS',
+                            'rabbit_password', self.amqp_password)
 
     def fixup_svc_monitor_config_file(self):
         # contrail-svc-monitor.conf
@@ -220,20 +251,21 @@ class ConfigBaseSetup(ContrailSetup):
                              ' '.join('%s:%s' %(server, '8081') for server \
                                 in self._args.collector_ip_list)
                         }
-        self._template_substitute_write(contrail_svc_monitor_conf.template,
-                                        template_vals, self._temp_dir_name + '/contrail-svc-monitor.conf')
-        local("sudo mv %s/contrail-svc-monitor.conf /etc/contrail/contrail-svc-monitor.conf" %(self._temp_dir_name))
+        self._install_template(contrail_svc_monitor_conf.template,
+                               template_vals,
+                               '/etc/contrail/contrail-svc-monitor.conf')
         if self.amqp_password:
-            local("sudo openstack-config --set /etc/contrail/contrail-svc-monitor.conf DEFAULTS rabbit_password %s" % self.amqp_password)
+            self.set_config('/etc/contrail/contrail-svc-monitor.conf', 'DEFAULTS',
+                            'rabbit_password', self.amqp_password)
 
     def fixup_contrail_sudoers(self):
         # sudoers for contrail
             template_vals = {
                             }
-            self._template_substitute_write(contrail_sudoers.template,
-                                            template_vals, self._temp_dir_name + '/contrail_sudoers')
-            local("sudo mv %s/contrail_sudoers /etc/sudoers.d/" %(self._temp_dir_name))
-            local("sudo chmod 440 /etc/sudoers.d/contrail_sudoers")
+            self._install_template(contrail_sudoers.template,
+                                   template_vals,
+                                   '/etc/sudoers.d/contrail_sudoers',
+                                   mode=0440)
 
     def fixup_contrail_config_nodemgr(self):
         template_vals = {
@@ -241,9 +273,9 @@ class ConfigBaseSetup(ContrailSetup):
                              ' '.join('%s:%s' %(server, '8086') for server \
                                 in self._args.collector_ip_list) 
                         }
-        self._template_substitute_write(contrail_config_nodemgr_template.template,
-                                        template_vals, self._temp_dir_name + '/contrail-config-nodemgr.conf')
-        local("sudo mv %s/contrail-config-nodemgr.conf /etc/contrail/contrail-config-nodemgr.conf" %(self._temp_dir_name))
+        self._install_template(contrail_config_nodemgr_template.template,
+                               template_vals,
+                               '/etc/contrail/contrail-config-nodemgr.conf')
 
     def fixup_cassandra_config(self):
         if self._args.cassandra_user is not None:
@@ -252,15 +284,22 @@ class ConfigBaseSetup(ContrailSetup):
                  template_vals = {'__cassandra_user__': self._args.cassandra_user,
                                   '__cassandra_password__': self._args.cassandra_password
                                  }
-                 self._template_substitute_write(contrail_database_template.template,
-                                        template_vals, self._temp_dir_name + '/contrail-config-database.conf')
-                 local("sudo mv %s/contrail-config-database.conf /etc/contrail/contrail-database.conf" %(self._temp_dir_name))
+                 self._install_template(contrail_database_template.template,
+                                        template_vals,
+                                        '/etc/contrail/contrail-database.conf')
  
     def restart_config(self):
-        local('sudo service supervisor-config restart')
+        if self.changed_files is None:
+            local('sudo service supervisor-config restart')
+        else:
+            self.restart_changed_services(CONFIG_SERVICES)
 
     def run_services(self):
-        local("sudo config-server-setup.sh")
+        if self.changed_files is None:
+            local("sudo config-server-setup.sh")
+        else:
+            local("sudo config-server-setup.sh --skip-contrail-restart")
+            self.restart_changed_services(CONFIG_SERVICES)
         # Wait for supervisor to start contrail-api and rabbitmq
         for i in range(10):
             services_status = {'contrail-api' : 'down', 'rabbitmq-server' : 'down'}
@@ -285,7 +324,8 @@ class ConfigBaseSetup(ContrailSetup):
     def setup_database(self):
         db = DatabaseCommon()
         db.fixup_zookeeper_configs(self._args.zookeeper_ip_list,
-                                   self._args.cfgm_index)
+                                   self._args.cfgm_index,
+                                   self._args.self_ip)
         db_services = ['zookeeper']
         if self._args.manage_db:
             db.create_data_dir(self._args.data_dir)
@@ -310,5 +350,5 @@ class ConfigBaseSetup(ContrailSetup):
         self.disable_iptables()
         self.setup_coredump()
         self.setup_database()
-        self.fixup_config_files()
+        self.render_config_files()
         self.run_services()
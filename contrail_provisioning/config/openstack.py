@@ -6,9 +6,7 @@
 
 import os
 
-from fabric.state import env
-from fabric.api import local
-from fabric.context_managers import settings
+from contrail_provisioning.common.lazy import local, fabric_api
 
 from contrail_provisioning.config.common import ConfigBaseSetup
 from contrail_provisioning.config.templates import contrail_plugin_ini
@@ -107,13 +105,13 @@ class ConfigOpenstackSetup(ConfigBaseSetup):
                          '__contrail_cloud_admin_role__': "cloud_admin_role=%s" % self._args.cloud_admin_role if self._args.cloud_admin_role else '',
                          '__contrail_aaa_mode__': "aaa_mode=%s" % self._args.aaa_mode if self._args.aaa_mode else '',
                     }
-        self._template_substitute_write(contrail_plugin_ini.template,
-                                        template_vals, self._temp_dir_name + '/contrail_plugin.ini')
         if os.path.exists("/etc/neutron"):
             local("sudo mkdir -p /etc/neutron/plugins/opencontrail")
-            local("sudo mv %s/contrail_plugin.ini /etc/neutron/plugins/opencontrail/ContrailPlugin.ini" %(self._temp_dir_name))
+            plugin_ini = '/etc/neutron/plugins/opencontrail/ContrailPlugin.ini'
         else:
-            local("sudo mv %s/contrail_plugin.ini /etc/quantum/plugins/contrail/contrail_plugin.ini" %(self._temp_dir_name))
+            plugin_ini = '/etc/quantum/plugins/contrail/contrail_plugin.ini'
+        self._install_template(contrail_plugin_ini.template, template_vals,
+                               plugin_ini)
 
         if self.pdist == 'Ubuntu':
             neutron_def_file = "/etc/default/neutron-server"
@@ -188,7 +186,7 @@ class ConfigOpenstackSetup(ConfigBaseSetup):
                      '--password         %s ' % self._args.keystone_admin_passwd + \
                      '--svc_password     %s ' % self._args.neutron_password + \
                      '--svc_tenant_name  %s ' % self._args.keystone_service_tenant_name + \
-                     '--root_password    %s ' % env.password + \
+                     '--root_password    %s ' % fabric_api.env.password + \
                      '--auth_protocol    %s ' % self._args.keystone_auth_protocol
         if self._args.keystone_insecure:
             quant_args += '--insecure'
@@ -207,6 +205,6 @@ class ConfigOpenstackSetup(ConfigBaseSetup):
         self.disable_iptables()
         self.setup_coredump()
         self.setup_database()
-        self.fixup_config_files()
+        self.render_config_files()
         self.build_ctrl_details()
         self.run_services()
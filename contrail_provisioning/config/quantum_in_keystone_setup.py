@@ -12,13 +12,11 @@ import sys
 import argparse
 import ConfigParser
 
-from fabric.api import run
-from fabric.context_managers import settings
+from contrail_provisioning.common import platform_info
+from contrail_provisioning.common.lazy import LazyModule
 
-from keystoneclient.v2_0 import client
-from keystoneclient import utils as ksutils
-from keystoneclient import exceptions
-import platform
+client = LazyModule('keystoneclient.v2_0.client')
+exceptions = LazyModule('keystoneclient.exceptions')
 
 class QuantumSetup(object):
     def __init__(self, args_str = None):
@@ -279,7 +277,7 @@ class QuantumSetup(object):
     # end quant_set_endpoints
 
     def do_quant_setup(self):
-        pdist = platform.dist()[0]
+        pdist = platform_info.dist()[0]
         # get service tenant ID
         self.quant_tenant_id = self.quant_set_tenant_id()
 
@@ -18,6 +18,13 @@
 CONF_DIR=/etc/contrail
 set -x
 
+# With --skip-contrail-restart the contrail services are only enabled,
+# the caller restarts the ones whose config changed
+restart_contrail=1
+if [ "$1" == "--skip-contrail-restart" ]; then
+    restart_contrail=0
+fi
+
 if [ -f /etc/redhat-release ]; then
    is_redhat=1
    is_ubuntu=0
@@ -57,7 +64,9 @@ for svc in rabbitmq-server $web_svc memcached; do
     service $svc restart
 done
 
-if [ $is_ubuntu -eq 1 ] && (egrep -q 'DISTRIB_RELEASE.*16.04' /etc/lsb-release); then
+if [ $restart_contrail -eq 0 ]; then
+    :
+elif [ $is_ubuntu -eq 1 ] && (egrep -q 'DISTRIB_RELEASE.*16.04' /etc/lsb-release); then
     for svc in api config-nodemgr device-manager schema svc-monitor; do
         service contrail-$svc restart
     done 
@@ -5,7 +5,6 @@
 
 import os
 import sys
-from fabric.api import local
 
 from contrail_provisioning.common.base import ContrailSetup
 from contrail_provisioning.config.common import ConfigBaseSetup
@@ -179,7 +178,7 @@ def fix_cfgm_config_files(args_str=None):
         config = ConfigOpenstackSetup(config_args)
     else:
         config = ConfigBaseSetup(config_args)
-    config.fixup_config_files()
+    config.render_config_files()
     config.restart_config()
 
 if __name__ == "__main__":
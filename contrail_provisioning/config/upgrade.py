@@ -6,10 +6,12 @@
 
 from distutils.version import LooseVersion
 
-from fabric.api import local
+from contrail_provisioning.common.lazy import local
 
 from setup import ConfigSetup
 from contrail_provisioning.common.upgrade import ContrailUpgrade
+from contrail_provisioning.common.config_rules import Set, Delete, \
+    apply_rules
 from contrail_provisioning.config.common import ConfigBaseSetup
 from contrail_provisioning.config.openstack import ConfigOpenstackSetup
 from contrail_provisioning.database.migrate import DatabaseMigrate
@@ -75,6 +77,8 @@ class ConfigUpgrade(ContrailUpgrade, ConfigSetup):
                 self.upgrade_data['rename_config'] += [('/etc/zookeeper/conf/zoo.cfg', '/etc/zookeeper/zoo.cfg')]
 
     def upgrade(self):
+        if self._dry_run():
+            return
         # Accomodate cassandra upgrade, if needed
         if self._args.manage_db:
             self._migrator = DatabaseMigrate()
@@ -105,32 +109,36 @@ class ConfigUpgrade(ContrailUpgrade, ConfigSetup):
         if (self._args.from_rel < LooseVersion('2.20') and
             self._args.to_rel >= LooseVersion('2.20')):
             self.config_setup.fixup_contrail_config_nodemgr()
+        # The config changes of all the releases crossed, one read and
+        # write per file
+        apply_rules(self.config_rules(), self._args.from_rel,
+                    self._args.to_rel)
+
+    def config_rules(self):
+        svc_monitor_conf = '/etc/contrail/contrail-svc-monitor.conf'
+        plugin_conf = '/etc/neutron/plugins/opencontrail/ContrailPlugin.ini'
+        rules = [
             # Populate RabbitMQ details in contrail-svc-monitor.conf
-            conf_file = '/etc/contrail/contrail-svc-monitor.conf'
-            self.set_config(conf_file, 'DEFAULTS', 'rabbit_server',
-                            self.config_setup.rabbit_host)
-            self.set_config(conf_file, 'DEFAULTS', 'rabbit_port',
-                            self.config_setup.rabbit_port)
-        # Populate collector configuration to retrieve loadbalancer stats
-        if (self._args.from_rel < LooseVersion('2.20') and
-            self._args.to_rel >= LooseVersion('2.20')):
-            conf_file = '/etc/neutron/plugins/opencontrail/ContrailPlugin.ini'
-            self.set_config(conf_file, 'COLLECTOR', 'analytics_api_ip',
-                            self._args.internal_vip or self._args.self_ip)
-            self.set_config(conf_file, 'COLLECTOR', 'analytics_api_port',
-                            '8081')
+            Set('2.20', svc_monitor_conf, 'DEFAULTS', 'rabbit_server',
+                self.config_setup.rabbit_host),
+            Set('2.20', svc_monitor_conf, 'DEFAULTS', 'rabbit_port',
+                self.config_setup.rabbit_port),
+            # Populate collector configuration to retrieve loadbalancer stats
+            Set('2.20', plugin_conf, 'COLLECTOR', 'analytics_api_ip',
+                self._args.internal_vip or self._args.self_ip),
+            Set('2.20', plugin_conf, 'COLLECTOR', 'analytics_api_port',
+                '8081'),
+        ]
         # Correct the rabbit server config parameter to use ip:port
-        if (self._args.from_rel < LooseVersion('3.00') and
-            self._args.to_rel >= LooseVersion('3.00')):
-            conf_files = ['/etc/contrail/contrail-api.conf',
+        for conf_file in ['/etc/contrail/contrail-api.conf',
                           '/etc/contrail/contrail-schema.conf',
                           '/etc/contrail/contrail-device-manager.conf',
-                          '/etc/contrail/contrail-svc-monitor.conf',
-                         ]
-            for conf_file in conf_files:
-                self.del_config(conf_file, 'DEFAULTS', 'rabbit_port')
-                self.set_config(conf_file, 'DEFAULTS', 'rabbit_server',
-                                self.config_setup.rabbit_servers)
+                          svc_monitor_conf,
+                         ]:
+            rules += [Delete('3.00', conf_file, 'DEFAULTS', 'rabbit_port'),
+                      Set('3.00', conf_file, 'DEFAULTS', 'rabbit_server',
+                          self.config_setup.rabbit_servers)]
+        return rules
 
 
 def main():
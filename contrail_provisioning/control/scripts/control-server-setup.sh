@@ -1,5 +1,12 @@
 #!/usr/bin/env bash
 
+# With --skip-contrail-restart the services are only enabled, the caller
+# restarts the ones whose config changed
+restart_contrail=1
+if [ "$1" == "--skip-contrail-restart" ]; then
+    restart_contrail=0
+fi
+
 if [ "`grep server /etc/puppet/puppet.conf`" ]; then
     chkconfig puppetagent on
     service puppetagent restart
@@ -19,10 +26,14 @@ if [ -f /etc/lsb-release ] && (egrep -q 'DISTRIB_RELEASE.*16.04' /etc/lsb-releas
     #setup script for contrail-control package under systemd
     for svc in control control-nodemgr dns named; do
             chkconfig contrail-$svc on
-            service contrail-$svc restart
+            if [ $restart_contrail -eq 1 ]; then
+                service contrail-$svc restart
+            fi
     done
 else
     #setup script for contrail-control package under supervisord
     chkconfig supervisor-control on
-    service supervisor-control restart
+    if [ $restart_contrail -eq 1 ]; then
+        service supervisor-control restart
+    fi
 fi
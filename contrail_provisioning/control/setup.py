@@ -8,14 +8,29 @@ import sys
 import argparse
 import ConfigParser
 
-from fabric.api import local
+from contrail_provisioning.common.lazy import local, settings
 
 from contrail_provisioning.common.base import ContrailSetup
+from contrail_provisioning.common.service_restarts import ServiceGroup
 from contrail_provisioning.control.templates import contrail_control_conf
 from contrail_provisioning.control.templates import dns_conf
 from contrail_provisioning.control.templates import contrail_control_nodemgr_template
 
+DNS_CONF_DIR = '/etc/contrail/dns'
+
+# Config files read by each control node service
+CONTROL_SERVICES = ServiceGroup('supervisor-control', [
+    ('contrail-control', ['/etc/contrail/contrail-control.conf']),
+    ('contrail-dns', ['/etc/contrail/contrail-dns.conf',
+                      DNS_CONF_DIR + '/contrail-rndc.conf']),
+    ('contrail-named', [DNS_CONF_DIR + '/contrail-named.conf',
+                        DNS_CONF_DIR + '/contrail-rndc.conf']),
+    ('contrail-control-nodemgr', ['/etc/contrail/contrail-control-nodemgr.conf']),
+    ])
+
 class ControlSetup(ContrailSetup):
+    use_render_plan = True
+
     def __init__(self, args_str = None):
         super(ControlSetup, self).__init__()
         self._args = None
@@ -84,9 +99,9 @@ class ControlSetup(ContrailSetup):
                              ' '.join('%s:%s' %(server, '8086') for server \
                                 in self._args.collectors),
                         }
-        self._template_substitute_write(contrail_control_conf.template,
-                                        template_vals, self._temp_dir_name + '/contrail-control.conf')
-        local("sudo mv %s/contrail-control.conf /etc/contrail/contrail-control.conf" %(self._temp_dir_name))
+        self._install_template(contrail_control_conf.template,
+                               template_vals,
+                               '/etc/contrail/contrail-control.conf')
 
     def fixup_contrail_control_nodemgr(self):
         template_vals = {
@@ -94,9 +109,9 @@ class ControlSetup(ContrailSetup):
                              ' '.join('%s:%s' %(server, '8086') for server \
                                 in self._args.collectors),
                         }
-        self._template_substitute_write(contrail_control_nodemgr_template.template,
-                                        template_vals, self._temp_dir_name + '/contrail-control-nodemgr.conf')
-        local("sudo mv %s/contrail-control-nodemgr.conf /etc/contrail/contrail-control-nodemgr.conf" %(self._temp_dir_name))
+        self._install_template(contrail_control_nodemgr_template.template,
+                               template_vals,
+                               '/etc/contrail/contrail-control-nodemgr.conf')
 
     def fixup_dns(self):
         dns_template_vals = {'__contrail_hostname__': self.hostname,
@@ -114,16 +129,28 @@ class ControlSetup(ContrailSetup):
                              ' '.join('%s:%s' %(server, '8086') for server \
                                 in self._args.collectors),
                         }
-        self._template_substitute_write(dns_conf.template,
-                                        dns_template_vals, self._temp_dir_name + '/contrail-dns.conf')
-        local("sudo mv %s/contrail-dns.conf /etc/contrail/contrail-dns.conf" %(self._temp_dir_name))
+        self._install_template(dns_conf.template,
+                               dns_template_vals,
+                               '/etc/contrail/contrail-dns.conf')
         for confl in 'contrail-rndc contrail-named'.split():
+            conf_file = '%s/%s.conf' % (DNS_CONF_DIR, confl)
+            with settings(warn_only=True):
+                default_secret = local("grep -q 'secret \"secret123\"' %s"
+                                       % conf_file).succeeded
+            if not default_secret:
+                continue
             local("".join(["sed -i 's/secret \"secret123\"",
                            ";/secret \"xvysmOR8lnUQRBcunkC6vg==\";/g'",
-                           " /etc/contrail/dns/%s.conf" % confl]))
+                           " %s" % conf_file]))
+            if self._render_plan:
+                self._render_plan.touched(conf_file)
 
     def run_services(self):
-        local("sudo control-server-setup.sh")
+        if self.changed_files is None:
+            local("sudo control-server-setup.sh")
+        else:
+            local("sudo control-server-setup.sh --skip-contrail-restart")
+            self.restart_changed_services(CONTROL_SERVICES)
 
 def main(args_str = None):
     control = ControlSetup(args_str)
@@ -9,7 +9,7 @@ from distutils.version import LooseVersion
 from setup import ControlSetup
 from contrail_provisioning.common.upgrade import ContrailUpgrade
 
-from fabric.api import local
+from contrail_provisioning.common.lazy import local
 
 
 class ControlUpgrade(ContrailUpgrade, ControlSetup):
@@ -37,6 +37,8 @@ class ControlUpgrade(ContrailUpgrade, ControlSetup):
         local('service supervisor-control restart')
 
     def upgrade(self):
+        if self._dry_run():
+            return
         self._upgrade()
         # Seperate contrail-<role>-nodemgr.conf is introduced from release 2.20
         if (self._args.from_rel < LooseVersion('2.20') and
@@ -5,9 +5,10 @@
 
 import os
 import subprocess
-from fabric.api import local, settings
+from contrail_provisioning.common.lazy import local, settings
 
 from contrail_provisioning.common.base import ContrailSetup
+from contrail_provisioning.database.zookeeper import update_zookeeper_config
 
 
 class CassandraInfo(object):
@@ -142,28 +143,22 @@ class DatabaseCommon(ContrailSetup):
         for pattern_to_match, str_to_replace in env_file_settings:
             local("sudo sed -i 's/%s/%s/g' %s" % (pattern_to_match, str_to_replace, env_file))
 
-    def fix_zookeeper_servers_config(self, zookeeper_ip_list, myid):
-        zk_index = 1
-        # Instead of inserting/deleting config, remove all the zoo keeper servers
-        # and re-generate.
-        local("sudo sed -i '/server.[1-9]*=/d' %s/zoo.cfg" % self.zoo_conf_dir)
-
-        for zk_ip in zookeeper_ip_list:
-            local('sudo echo "server.%d=%s:2888:3888" >> %s/zoo.cfg' %(zk_index, zk_ip, self.zoo_conf_dir))
-            zk_index = zk_index + 1
-
-        #put cluster-unique zookeeper's instance id in myid
-        datadir = local('grep -oP "^dataDir=\K.*" %s/zoo.cfg' % self.zoo_conf_dir, capture=True)
-        local('sudo echo "%s" > %s/myid' %(myid, datadir))
-
-    def fixup_zookeeper_configs(self, zookeeper_ip_list=None, myid=None):
+    def fix_zookeeper_servers_config(self, zookeeper_ip_list, myid,
+                                     self_ip=None):
+        # zoo.cfg and the cluster-unique zookeeper's instance id in myid
+        changed = update_zookeeper_config(self.zoo_conf_dir,
+                                          zookeeper_ip_list, myid, self_ip)
+        for path in changed:
+            print "Updated %s" % path
+        return changed
+
+    def fixup_zookeeper_configs(self, zookeeper_ip_list=None, myid=None,
+                                self_ip=None):
         if not zookeeper_ip_list:
             zookeeper_ip_list = self._args.zookeeper_ip_list
+            self_ip = self_ip or self._args.self_ip
         if not myid:
             myid = self._args.database_index
-        # set high session timeout to survive glance led disk activity
-        local('sudo echo "maxSessionTimeout=120000" >> %s/zoo.cfg' % self.zoo_conf_dir)
-        local('sudo echo "autopurge.purgeInterval=3" >> %s/zoo.cfg' % self.zoo_conf_dir)
         local("sudo sed 's/^#log4j.appender.ROLLINGFILE.MaxBackupIndex=/log4j.appender.ROLLINGFILE.MaxBackupIndex=/g' %s/log4j.properties > log4j.properties.new" % self.zoo_conf_dir)
         local("sudo mv log4j.properties.new %s/log4j.properties" % self.zoo_conf_dir)
         if self.pdist in ['fedora', 'centos', 'redhat']:
@@ -171,7 +166,8 @@ class DatabaseCommon(ContrailSetup):
         if self.pdist == 'Ubuntu':
             local('echo ZOO_LOG4J_PROP="INFO,CONSOLE,ROLLINGFILE" >> %s/environment' % self.zoo_conf_dir)
 
-        self.fix_zookeeper_servers_config(zookeeper_ip_list, myid)
+        return self.fix_zookeeper_servers_config(zookeeper_ip_list, myid,
+                                                 self_ip)
 
     def check_database_down(self):
         proc = subprocess.Popen('ps auxw | grep -Eq "Dcassandra-pidfile=.*cassandra\.pid"', shell=True,
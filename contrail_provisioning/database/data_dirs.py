@@ -0,0 +1,204 @@
+#!/usr/bin/python
+#
+# Copyright (c) 2016 Juniper Networks, Inc. All rights reserved.
+#
+"""Preparation of the cassandra data directories.
+
+The ownership of the data, commitlog and saved caches trees is fixed by
+walking them in parallel, the top of the trees being split into subtrees
+handed to a pool of workers. Only the entries whose owner (or directory
+mode) differ are changed, so re-running on a prepared node only reads
+the inodes. Mount and capacity info is read from /proc/mounts and
+os.statvfs instead of parsing df.
+"""
+
+import os
+import pwd
+import stat
+import time
+import errno
+import multiprocessing
+
+from contrail_provisioning.common.lazy import local
+
+from contrail_provisioning.common.parallel import run_parallel
+
+try:
+    from scandir import scandir
+except ImportError:
+    scandir = None
+
+# Subtrees handed to each worker, the trees being split until reached
+UNITS_PER_WORKER = 4
+MAX_SPLIT_DEPTH = 3
+
+
+def _entries(path):
+    """[(path, is_dir)] of the entries of path, links not followed."""
+    if scandir is not None:
+        return [(entry.path, entry.is_dir(follow_symlinks=False))
+                for entry in scandir(path)]
+    entries = []
+    for name in os.listdir(path):
+        entry = os.path.join(path, name)
+        entries.append((entry, stat.S_ISDIR(os.lstat(entry).st_mode)))
+    return entries
+
+
+def _fix_entry(path, is_dir, uid, gid, dir_mode):
+    """Fixes the owner and mode of path, returns True if changed."""
+    st = os.lstat(path)
+    changed = False
+    if st.st_uid != uid or st.st_gid != gid:
+        os.lchown(path, uid, gid)
+        changed = True
+    if (is_dir and dir_mode is not None and
+            stat.S_IMODE(st.st_mode) != dir_mode):
+        os.chmod(path, dir_mode)
+        changed = True
+    return changed
+
+
+def fix_tree(job):
+    """Fixes the tree of job (path, uid, gid, dir_mode), the path itself
+    excluded. Returns (path, scanned, changed, errors).
+    """
+    path, uid, gid, dir_mode = job
+    scanned = changed = 0
+    errors = []
+    dirs = [path]
+    while dirs:
+        current = dirs.pop()
+        try:
+            entries = _entries(current)
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                errors.append('%s: %s' % (current, e.strerror))
+            continue
+        for entry, is_dir in entries:
+            scanned += 1
+            try:
+                if _fix_entry(entry, is_dir, uid, gid, dir_mode):
+                    changed += 1
+            except OSError as e:
+                # sstables come and go with the compactions
+                if e.errno != errno.ENOENT:
+                    errors.append('%s: %s' % (entry, e.strerror))
+                continue
+            if is_dir:
+                dirs.append(entry)
+    return (path, scanned, changed, errors)
+
+
+class DirStats(object):
+    def __init__(self):
+        self.scanned = 0
+        self.changed = 0
+        self.errors = []
+        self.elapsed = 0
+
+    def add(self, scanned, changed, errors=()):
+        self.scanned += scanned
+        self.changed += changed
+        self.errors += errors
+
+    def report(self):
+        return ('%d files scanned, %d changed in %.1fs' %
+                (self.scanned, self.changed, self.elapsed))
+
+
+def _split(roots, uid, gid, dir_mode, units, stats):
+    """Fixes the top of the trees and returns the subtrees left to walk,
+    at least units of them when the trees are deep enough.
+    """
+    subtrees = list(roots)
+    for root in roots:
+        stats.add(1, int(_fix_entry(root, True, uid, gid, dir_mode)))
+    for depth in range(MAX_SPLIT_DEPTH):
+        if len(subtrees) >= units:
+            break
+        expanded = []
+        for subtree in subtrees:
+            try:
+                entries = _entries(subtree)
+            except OSError as e:
+                if e.errno != errno.ENOENT:
+                    stats.errors.append('%s: %s' % (subtree, e.strerror))
+                continue
+            for entry, is_dir in entries:
+                try:
+                    changed = _fix_entry(entry, is_dir, uid, gid, dir_mode)
+                except OSError as e:
+                    if e.errno != errno.ENOENT:
+                        stats.errors.append('%s: %s' % (entry, e.strerror))
+                    continue
+                stats.add(1, int(changed))
+                if is_dir:
+                    expanded.append(entry)
+        subtrees = expanded
+    return subtrees
+
+
+def prepare_data_dirs(paths, user='cassandra', dir_mode=None, workers=None):
+    """Gives the trees of paths to user and its group, as chown -R user:
+    does, the missing paths being skipped. Returns a DirStats.
+    """
+    start = time.time()
+    stats = DirStats()
+    roots = []
+    for path in sorted(set(os.path.realpath(path) for path in paths
+                           if path and os.path.isdir(path))):
+        # Trees nested in another one are walked with it
+        if not any(path.startswith(root.rstrip('/') + '/') for root in roots):
+            roots.append(path)
+    if not roots:
+        return stats
+    if os.geteuid() != 0:
+        for root in roots:
+            local("sudo chown -R %s: %s" % (user, root))
+        stats.elapsed = time.time() - start
+        return stats
+
+    pw_entry = pwd.getpwnam(user)
+    uid, gid = pw_entry.pw_uid, pw_entry.pw_gid
+    workers = workers or multiprocessing.cpu_count()
+    subtrees = _split(roots, uid, gid, dir_mode,
+                      workers * UNITS_PER_WORKER, stats)
+    jobs = [(subtree, uid, gid, dir_mode) for subtree in subtrees]
+    results = run_parallel(fix_tree, jobs, workers)
+    for path, scanned, changed, errors in results:
+        stats.add(scanned, changed, errors)
+    stats.elapsed = time.time() - start
+    if stats.errors:
+        raise RuntimeError('Unable to give %s to %s:\n%s' %
+                           (', '.join(roots), user, '\n'.join(stats.errors)))
+    return stats
+
+
+def _unescape_mount(field):
+    """Decodes the octal escapes (\\040 for space) of /proc/mounts."""
+    return field.decode('string_escape')
+
+
+def mount_info(path):
+    """(mount point, device, fs type) of the mount holding path."""
+    path = os.path.realpath(path)
+    best = None
+    with open('/proc/mounts', 'r') as f:
+        for line in f:
+            fields = line.split()
+            if len(fields) < 3:
+                continue
+            device, mount_point, fs_type = [_unescape_mount(field)
+                                            for field in fields[:3]]
+            if (path == mount_point or
+                    path.startswith(mount_point.rstrip('/') + '/')):
+                if best is None or len(mount_point) >= len(best[0]):
+                    best = (mount_point, device, fs_type)
+    return best
+
+
+def disk_capacity(path):
+    """(total bytes, available bytes) of the filesystem of path."""
+    st = os.statvfs(path)
+    return st.f_blocks * st.f_frsize, st.f_bavail * st.f_frsize
@@ -10,9 +10,9 @@ from distutils.version import LooseVersion
 from subprocess import Popen, PIPE
 
 from contrail_provisioning.database.base import DatabaseCommon
+from contrail_provisioning.database.data_dirs import prepare_data_dirs
 
-from fabric.api import local
-from fabric.api import settings
+from contrail_provisioning.common.lazy import local, settings
 
 
 class DatabaseMigrate(DatabaseCommon):
@@ -187,14 +187,10 @@ class DatabaseMigrate(DatabaseCommon):
             local('sleep 5')
 
         # change owner on directories
-        local('chown -R cassandra: /var/lib/cassandra/')
-        local('chown -R cassandra: /var/log/cassandra/')
-        if data_dir:
-            local('chown -R cassandra: %s' % data_dir)
-        if analytics_data_dir:
-            local('chown -R cassandra: %s' % analytics_data_dir)
-        if ssd_data_dir:
-            local('chown -R cassandra: %s' % ssd_data_dir)
+        stats = prepare_data_dirs(['/var/lib/cassandra/',
+                                   '/var/log/cassandra/', data_dir,
+                                   analytics_data_dir, ssd_data_dir])
+        print 'Cassandra directories owned by cassandra: %s' % stats.report()
         for inter_pkg in inter_pkgs:
             # upgrade cassandra to intermediate rel first
             if self.pdist in ['Ubuntu']:
@@ -9,9 +9,12 @@ import re
 import time
 import subprocess
 
-from fabric.api import *
+from contrail_provisioning.common.lazy import local, settings
 
 from contrail_provisioning.database.base import DatabaseCommon
+from contrail_provisioning.database.data_dirs import prepare_data_dirs
+from contrail_provisioning.database.data_dirs import mount_info, disk_capacity
+from contrail_provisioning.database.streaming import run_with_progress
 from contrail_provisioning.database.templates import cassandra_create_user_template
  
 class DatabaseSetup(DatabaseCommon):
@@ -79,15 +82,13 @@ class DatabaseSetup(DatabaseCommon):
         else:
             verify_dir = analytics_dir
         if not os.path.exists(verify_dir):
-            if not os.path.exists(data_dir):
-                local("sudo mkdir -p %s" % (data_dir))
-                local("sudo chown -R cassandra: %s" % (data_dir))
-            if not os.path.exists(cass_data_dir):
-                local("sudo mkdir -p %s" % (cass_data_dir))
-                local("sudo chown -R cassandra: %s" % (cass_data_dir))
-            if not os.path.exists(analytics_dir):
-                local("sudo mkdir -p %s" % (analytics_dir))
-                local("sudo chown -R cassandra: %s" % (analytics_dir))
+            created = []
+            for new_dir in [data_dir, cass_data_dir, analytics_dir]:
+                if not os.path.exists(new_dir):
+                    local("sudo mkdir -p %s" % (new_dir))
+                    created.append(new_dir)
+            stats = prepare_data_dirs(created)
+            print "Prepared %s: %s" % (', '.join(created), stats.report())
             if analytics_dir_link:
                 local("sudo ln -s %s %s" % (analytics_dir, analytics_dir_link))
                 local("sudo chown -h cassandra: %s" % (analytics_dir_link))
@@ -117,9 +118,12 @@ class DatabaseSetup(DatabaseCommon):
             self.create_analytics_data_dir(data_dir, cass_data_dir,
                                            analytics_dir)
 
-        disk_cmd = "df -Pk " + analytics_dir + " | grep % | awk '{print $2}'"
-        total_disk = local(disk_cmd, capture = True).strip()
-        if (int(total_disk)/(1024*1024) < int(self._args.minimum_diskGB)):
+        mount_point, device, fs_type = mount_info(analytics_dir)
+        total_disk, avail_disk = disk_capacity(analytics_dir)
+        print "Analytics db on %s (%s, %s): %dGB, %dGB available" % (
+                mount_point, device, fs_type,
+                total_disk / (1024 ** 3), avail_disk / (1024 ** 3))
+        if (total_disk / (1024 ** 3) < int(self._args.minimum_diskGB)):
             raise RuntimeError('Minimum disk space for analytics db is not met')
 
     def fixup_config_files(self):
@@ -271,10 +275,11 @@ class DatabaseSetup(DatabaseCommon):
 
     def decommission_db_node(self):
         print "Decommissioning node %s from cluster. This might take a long time" % self._args.self_ip
-        local("nodetool decommission")
+        if run_with_progress("nodetool decommission") != 0:
+            raise RuntimeError("Error while decommissioning %s from the DB cluster" % self._args.self_ip)
         is_decommissioned = local('nodetool netstats | grep "Mode: DECOMMISSIONED"').succeeded
         if not is_decommissioned:
-            raise RuntimeError("Error while decommissioning %s from the DB cluster", del_db_node)
+            raise RuntimeError("Error while decommissioning %s from the DB cluster" % self._args.self_ip)
 
         local("service supervisor-database stop")
 
@@ -284,7 +289,8 @@ class DatabaseSetup(DatabaseCommon):
             node_uuid = local('nodetool status | grep %s | awk \'{print $7}\'' % self._args.node_to_delete, capture = True) 
 
         if node_uuid:
-            local("nodetool removenode %s" % node_uuid)
+            if run_with_progress("nodetool removenode %s" % node_uuid) != 0:
+                raise RuntimeError("Error while removing node %s from the DB cluster" % self._args.node_to_delete)
         else:
             print "Node %s was never part of the cluster", self._args.node_to_delete
             return
@@ -0,0 +1,243 @@
+#!/usr/bin/python
+#
+# Copyright (c) 2016 Juniper Networks, Inc. All rights reserved.
+#
+"""Progress of the cassandra streams of a decommission or removenode.
+
+nodetool netstats is sampled while the nodetool operation runs. Each
+sample gives the bytes sent to and received from every peer, and the
+progress of every file being streamed:
+
+    Mode: LEAVING
+    Unbootstrap 3c5a8e10-0ad4-11e6-9a28-55e7a3f4b2c1
+        /10.84.13.24
+            Sending 12 files, 5368709120 bytes total. Already sent 4 files, 1073741824 bytes total
+                /var/lib/cassandra/data/ContrailAnalytics/... 536870912/1073741824 bytes(50%) sent to idx:0/10.84.13.24
+
+StreamingProgress derives the throughput and the ETA from the samples and
+reports a stall when no byte was streamed for stall_timeout seconds.
+"""
+
+import re
+import time
+import subprocess
+
+SAMPLE_INTERVAL = 30
+STALL_TIMEOUT = 600
+# Samples used to compute the throughput
+THROUGHPUT_WINDOW = 10
+
+MODE_RE = re.compile(r'^Mode:\s*(\S+)')
+PEER_RE = re.compile(r'^\s+/(\S+)(?: \(using /\S+\))?\s*$')
+# "Already sent/received" is missing from the output of cassandra 2.0
+SESSION_RE = re.compile(r'^\s+(Sending|Receiving) (\d+) files, (\d+) bytes total'
+                        r'(?:\. Already (?:sent|received) (\d+) files, '
+                        r'(\d+) bytes total)?')
+FILE_RE = re.compile(r'^\s+(\S+) (\d+)/(\d+) bytes\(\d+%\) '
+                     r'(sent to|received from) (?:idx:\d+)?/(\S+)')
+DIRECTIONS = {'Sending': 'sent', 'Receiving': 'received',
+              'sent to': 'sent', 'received from': 'received'}
+
+
+class StreamFile(object):
+    def __init__(self, path, peer, direction, done, total):
+        self.path = path
+        self.peer = peer
+        self.direction = direction
+        self.done = done
+        self.total = total
+
+
+class StreamSession(object):
+    """Files and bytes streamed in one direction with one peer."""
+
+    def __init__(self, peer, direction, files, total, files_done=None,
+                 done=None):
+        self.peer = peer
+        self.direction = direction
+        self.files = files
+        self.total = total
+        self.files_done = files_done
+        self.done = done
+        self.streaming = []
+
+    def bytes_done(self):
+        if self.done is not None:
+            return self.done
+        # cassandra 2.0 only gives the progress of the files in flight
+        return sum(f.done for f in self.streaming)
+
+
+class NetstatsSample(object):
+    def __init__(self, mode=None):
+        self.mode = mode
+        self.sessions = []
+
+    def files(self):
+        return [f for session in self.sessions for f in session.streaming]
+
+    def bytes_done(self):
+        return sum(session.bytes_done() for session in self.sessions)
+
+    def bytes_total(self):
+        return sum(session.total for session in self.sessions)
+
+    def peers(self):
+        """{peer: (bytes done, bytes total)} of the sessions."""
+        peers = {}
+        for session in self.sessions:
+            done, total = peers.get(session.peer, (0, 0))
+            peers[session.peer] = (done + session.bytes_done(),
+                                   total + session.total)
+        return peers
+
+
+def parse_netstats(output):
+    """Parses the output of nodetool netstats into a NetstatsSample."""
+    sample = NetstatsSample()
+    peer = None
+    sessions = {}
+    for line in output.splitlines():
+        match = MODE_RE.match(line)
+        if match:
+            sample.mode = match.group(1)
+            continue
+        match = PEER_RE.match(line)
+        if match:
+            peer = match.group(1)
+            continue
+        match = SESSION_RE.match(line)
+        if match and peer:
+            direction = DIRECTIONS[match.group(1)]
+            files_done, done = match.group(4), match.group(5)
+            session = StreamSession(peer, direction, int(match.group(2)),
+                                    int(match.group(3)),
+                                    files_done and int(files_done),
+                                    done and int(done))
+            sessions[(peer, direction)] = session
+            sample.sessions.append(session)
+            continue
+        match = FILE_RE.match(line)
+        if match:
+            direction = DIRECTIONS[match.group(4)]
+            stream_file = StreamFile(match.group(1), match.group(5),
+                                     direction, int(match.group(2)),
+                                     int(match.group(3)))
+            session = (sessions.get((stream_file.peer, direction)) or
+                       sessions.get((peer, direction)))
+            if session:
+                session.streaming.append(stream_file)
+            continue
+        if line.startswith('Read Repair Statistics'):
+            break
+    return sample
+
+
+def _format_bytes(value):
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if abs(value) < 1024:
+            return '%.1f%s' % (value, unit)
+        value /= 1024.0
+    return '%.1fTB' % value
+
+
+def _format_duration(seconds):
+    seconds = int(seconds)
+    return '%d:%02d:%02d' % (seconds / 3600, seconds / 60 % 60, seconds % 60)
+
+
+class StreamingProgress(object):
+    def __init__(self, stall_timeout=STALL_TIMEOUT, clock=time.time):
+        self.stall_timeout = stall_timeout
+        self.clock = clock
+        self.samples = []
+        self.last_progress = None
+
+    def add(self, sample):
+        now = self.clock()
+        if (self.last_progress is None or
+                sample.bytes_done() != self.samples[-1][1].bytes_done()):
+            self.last_progress = now
+        self.samples.append((now, sample))
+        del self.samples[:-THROUGHPUT_WINDOW]
+
+    def throughput(self):
+        """Bytes streamed per second over the last samples."""
+        if len(self.samples) < 2:
+            return None
+        (first, first_sample), (last, last_sample) = (self.samples[0],
+                                                      self.samples[-1])
+        if last <= first:
+            return None
+        return max(last_sample.bytes_done() - first_sample.bytes_done(),
+                   0) / float(last - first)
+
+    def eta(self):
+        """Seconds left at the current throughput, None if not known."""
+        rate = self.throughput()
+        if not rate:
+            return None
+        sample = self.samples[-1][1]
+        return max(sample.bytes_total() - sample.bytes_done(), 0) / rate
+
+    def stalled_for(self):
+        """Seconds without progress once past stall_timeout, else 0."""
+        if self.last_progress is None:
+            return 0
+        idle = self.clock() - self.last_progress
+        if idle < self.stall_timeout:
+            return 0
+        return idle
+
+    def report(self):
+        sample = self.samples[-1][1]
+        if not sample.sessions:
+            return 'Mode: %s, no streams' % sample.mode
+        lines = ['Mode: %s, streamed %s of %s' % (
+                     sample.mode, _format_bytes(sample.bytes_done()),
+                     _format_bytes(sample.bytes_total()))]
+        rate = self.throughput()
+        if rate is not None:
+            eta = self.eta()
+            lines[0] += ', %s/s, ETA %s' % (
+                _format_bytes(rate),
+                _format_duration(eta) if eta is not None else 'unknown')
+        for peer, (done, total) in sorted(sample.peers().items()):
+            lines.append('    %s: %s of %s' % (peer, _format_bytes(done),
+                                               _format_bytes(total)))
+        stalled = self.stalled_for()
+        if stalled:
+            lines.append('    WARNING: no progress for %s' %
+                         _format_duration(stalled))
+        return '\n'.join(lines)
+
+
+def sample_netstats():
+    """Runs nodetool netstats, returns a NetstatsSample or None."""
+    proc = subprocess.Popen('nodetool netstats', shell=True,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    (output, errout) = proc.communicate()
+    if proc.returncode != 0:
+        return None
+    return parse_netstats(output)
+
+
+def run_with_progress(cmd, interval=SAMPLE_INTERVAL,
+                      stall_timeout=STALL_TIMEOUT):
+    """Runs the nodetool cmd, reporting the streaming progress every
+    interval seconds until it exits. Returns the exit code of cmd.
+    """
+    print cmd
+    proc = subprocess.Popen(cmd, shell=True)
+    progress = StreamingProgress(stall_timeout)
+    while True:
+        for _ in range(interval):
+            if proc.poll() is not None:
+                return proc.returncode
+            time.sleep(1)
+        sample = sample_netstats()
+        if sample is None:
+            print 'Unable to get the streaming progress from nodetool netstats'
+            continue
+        progress.add(sample)
+        print progress.report()
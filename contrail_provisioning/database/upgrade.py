@@ -35,6 +35,8 @@ class DatabaseUpgrade(ContrailUpgrade, DatabaseSetup):
     # end _change_section
 
     def upgrade(self):
+        if self._dry_run():
+            return
         self._migrator = DatabaseMigrate()
         self._migrator.migrate(data_dir=self._args.data_dir,
                          analytics_data_dir=self._args.analytics_data_dir,
@@ -0,0 +1,162 @@
+#!/usr/bin/python
+#
+# Copyright (c) 2016 Juniper Networks, Inc. All rights reserved.
+#
+"""Zookeeper ensemble config.
+
+zoo.cfg and myid are rendered in one pass from the list of zookeeper
+nodes, server.N being the N-th node of the list, so every node of the
+ensemble must be given the same list. The settings and comments of the
+live zoo.cfg not managed here are kept. Each file is replaced atomically
+and only when its content differs.
+"""
+
+import os
+
+from contrail_provisioning.common.netstate import read_file, install_file
+
+ZOO_CFG = 'zoo.cfg'
+MYID = 'myid'
+PEER_PORT = 2888
+ELECTION_PORT = 3888
+# Managed settings, the live dataDir and clientPort are kept if set
+ZOO_SETTINGS = [
+    ('tickTime', '2000'),
+    ('initLimit', '10'),
+    ('syncLimit', '5'),
+    ('dataDir', '/var/lib/zookeeper'),
+    ('clientPort', '2181'),
+    # high session timeout to survive glance led disk activity
+    ('maxSessionTimeout', '120000'),
+    ('autopurge.purgeInterval', '3'),
+]
+KEPT_SETTINGS = ['dataDir', 'clientPort']
+
+
+def ensemble(zookeeper_ip_list, myid, self_ip=None):
+    """Validates the node list and myid, returns [(id, ip)]."""
+    if not zookeeper_ip_list:
+        raise RuntimeError('Zookeeper node list is empty')
+    duplicates = sorted(set(ip for ip in zookeeper_ip_list
+                            if zookeeper_ip_list.count(ip) > 1))
+    if duplicates:
+        raise RuntimeError('Zookeeper nodes listed more than once: %s'
+                           % ', '.join(duplicates))
+    servers = list(enumerate(zookeeper_ip_list, 1))
+    try:
+        myid = int(myid)
+    except (TypeError, ValueError):
+        raise RuntimeError('Invalid zookeeper id %r' % myid)
+    if not 1 <= myid <= len(servers):
+        raise RuntimeError('Zookeeper id %d is not in the ensemble of %d '
+                           'nodes' % (myid, len(servers)))
+    if self_ip in zookeeper_ip_list and servers[myid - 1][1] != self_ip:
+        raise RuntimeError('Zookeeper id %d is server %s in the node list, '
+                           'not %s' % (myid, servers[myid - 1][1], self_ip))
+    return servers
+
+
+class ZooCfg(object):
+    def __init__(self, content=''):
+        self.lines = content.splitlines()
+
+    def _setting(self, line):
+        line = line.strip()
+        if not line or line.startswith('#') or '=' not in line:
+            return None, None
+        key, value = line.split('=', 1)
+        return key.strip(), value.strip()
+
+    def get(self, key):
+        for line in self.lines:
+            line_key, value = self._setting(line)
+            if line_key == key:
+                return value
+        return None
+
+    def servers(self):
+        """{ip: id} of the server.N lines."""
+        servers = {}
+        for line in self.lines:
+            key, value = self._setting(line)
+            if key and key.startswith('server.'):
+                servers[value.split(':', 1)[0]] = key[len('server.'):]
+        return servers
+
+    def render(self, settings, servers):
+        """Returns the config with settings [(key, value)] and only the
+        servers [(id, ip)], each set once.
+        """
+        settings = list(settings) + [
+            ('server.%d' % server_id, '%s:%d:%d' % (ip, PEER_PORT,
+                                                     ELECTION_PORT))
+            for server_id, ip in servers]
+        values = dict(settings)
+        lines = []
+        done = set()
+        last_server = None
+        for line in self.lines:
+            key, value = self._setting(line)
+            if key is None:
+                lines.append(line)
+                continue
+            if key.startswith('server.') and key not in values:
+                continue
+            if key in values:
+                if key in done:
+                    continue
+                line = '%s=%s' % (key, values[key])
+                done.add(key)
+            lines.append(line)
+            if key.startswith('server.'):
+                last_server = len(lines)
+        # New servers go after the listed ones, the rest at the end
+        new_servers = ['%s=%s' % (name, val) for name, val in settings
+                       if name.startswith('server.') and name not in done]
+        if last_server is not None:
+            lines[last_server:last_server] = new_servers
+            done.update(name for name, val in settings
+                        if name.startswith('server.'))
+        while lines and not lines[-1].strip():
+            lines.pop()
+        lines += ['%s=%s' % (name, val) for name, val in settings
+                  if name not in done]
+        return '\n'.join(lines) + '\n'
+
+
+def _mode(path):
+    if os.path.isfile(path):
+        return os.stat(path).st_mode & 0777
+    return 0644
+
+
+def update_zookeeper_config(conf_dir, zookeeper_ip_list, myid, self_ip=None):
+    """Renders zoo.cfg and myid, returns the paths of the changed files."""
+    servers = ensemble(zookeeper_ip_list, myid, self_ip)
+    zoo_cfg = os.path.join(conf_dir, ZOO_CFG)
+    content = read_file(zoo_cfg) or ''
+    conf = ZooCfg(content)
+
+    live_servers = conf.servers()
+    renumbered = ['%s (server.%s -> server.%d)' % (ip, live_servers[ip],
+                                                   server_id)
+                  for server_id, ip in servers
+                  if live_servers.get(ip, str(server_id)) != str(server_id)]
+    if renumbered:
+        print ('WARNING: zookeeper servers renumbered, the node list must be '
+               'the same on every node: %s' % ', '.join(renumbered))
+
+    settings = [(key, conf.get(key) or value) if key in KEPT_SETTINGS
+                else (key, value) for key, value in ZOO_SETTINGS]
+    changed = []
+    new_content = conf.render(settings, servers)
+    if new_content != content:
+        install_file(zoo_cfg, new_content, _mode(zoo_cfg))
+        changed.append(zoo_cfg)
+
+    myid_file = os.path.join(dict(settings)['dataDir'], MYID)
+    new_myid = '%d\n' % servers[int(myid) - 1][0]
+    if read_file(myid_file) != new_myid:
+        install_file(myid_file, new_myid, _mode(myid_file))
+        changed.append(myid_file)
+    return changed
@@ -0,0 +1,246 @@
+#!/usr/bin/python
+#
+# Copyright (c) 2016 Juniper Networks, Inc. All rights reserved.
+#
+"""Resident galera health agent for haproxy mysql checks.
+
+Holds a single mysql client session to the local galera node, refreshes
+wsrep_local_state on a timer and answers the haproxy HTTP health probe
+from the cached state, so health checks never open new DB connections.
+"""
+
+import os
+import sys
+import time
+import errno
+import select
+import argparse
+import threading
+import subprocess
+import ConfigParser
+import SocketServer
+import BaseHTTPServer
+
+WSREP_SYNCED = '4'
+CHECK_QUERY = "show global status where variable_name='wsrep_local_state';\n"
+
+
+class MysqlSession(object):
+    """Long lived mysql client session, restarted only when it dies."""
+
+    def __init__(self, host, port, user, password, connect_timeout=2,
+                 mysql_bin='/usr/bin/mysql'):
+        self.cmd = [mysql_bin, '--batch', '--skip-column-names',
+                    '--unbuffered', '--connect_timeout', str(connect_timeout),
+                    '-h', host, '--port', str(port), '-u', user]
+        self.password = password
+        self.proc = None
+
+    def _start(self):
+        env = dict(os.environ)
+        # Keep the password off the process command line
+        env['MYSQL_PWD'] = self.password
+        # The client keeps its own descriptor of devnull
+        with open(os.devnull, 'w') as devnull:
+            self.proc = subprocess.Popen(self.cmd, stdin=subprocess.PIPE,
+                                         stdout=subprocess.PIPE,
+                                         stderr=devnull, bufsize=0,
+                                         close_fds=True, env=env)
+
+    def close(self):
+        if self.proc is None:
+            return
+        try:
+            self.proc.kill()
+            self.proc.wait()
+        except OSError:
+            pass
+        self.proc = None
+
+    def query(self, query, timeout):
+        """Runs a single row query, returns the row or None on failure."""
+        try:
+            if self.proc is None or self.proc.poll() is not None:
+                self.close()
+                self._start()
+            self.proc.stdin.write(query)
+            ready, _, _ = select.select([self.proc.stdout], [], [], timeout)
+            row = self.proc.stdout.readline() if ready else ''
+        except (IOError, OSError, select.error):
+            row = ''
+        if not row:
+            # Timed out or the client exited on a server error, the
+            # session is re-established on the next refresh.
+            self.close()
+            return None
+        return row.rstrip('\n')
+
+
+class WsrepState(object):
+    """Cached wsrep state shared by the refresher and the HTTP handlers."""
+
+    def __init__(self, max_age):
+        self.max_age = max_age
+        self.state = None
+        self.updated = 0
+        self.lock = threading.Lock()
+
+    def update(self, state):
+        with self.lock:
+            self.state = state
+            self.updated = time.time()
+
+    def is_synced(self):
+        with self.lock:
+            state, updated = self.state, self.updated
+        if time.time() - updated > self.max_age:
+            return False
+        return state == WSREP_SYNCED
+
+
+class WsrepRefresher(threading.Thread):
+    def __init__(self, session, cache, interval, timeout):
+        super(WsrepRefresher, self).__init__()
+        self.daemon = True
+        self.session = session
+        self.cache = cache
+        self.interval = interval
+        self.timeout = timeout
+
+    def refresh(self):
+        row = self.session.query(CHECK_QUERY, self.timeout)
+        state = None
+        if row:
+            fields = row.split('\t')
+            if len(fields) == 2:
+                state = fields[1].strip()
+        self.cache.update(state)
+
+    def run(self):
+        while True:
+            started = time.time()
+            self.refresh()
+            time.sleep(max(0, self.interval - (time.time() - started)))
+
+
+class GaleraHealthHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    ok_body = '<html><body>MySQL is running.</body></html>\r\n'
+    fail_body = '<html><body>MySQL is *down*.</body></html>\r\n'
+
+    def _respond(self, send_body=True):
+        if self.server.cache.is_synced():
+            code, body = 200, self.ok_body
+        else:
+            code, body = 503, self.fail_body
+        self.send_response(code)
+        self.send_header('Content-Type', 'text/html')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+
+    def do_GET(self):
+        self._respond()
+
+    def do_OPTIONS(self):
+        # haproxy "option httpchk" defaults to OPTIONS
+        self._respond()
+
+    def do_HEAD(self):
+        self._respond(send_body=False)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class GaleraHealthServer(SocketServer.ThreadingMixIn,
+                         BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, cache):
+        BaseHTTPServer.HTTPServer.__init__(self, address,
+                                           GaleraHealthHandler)
+        self.cache = cache
+
+
+class GaleraHealthAgent(object):
+    def __init__(self, args_str=None):
+        self.global_defaults = {
+            'listen_ip': '127.0.0.1',
+            'listen_port': '9201',
+            'mysql_host': 'localhost',
+            'mysql_port': '3306',
+            'mysql_user': 'cmon',
+            'mysql_password': 'cmon',
+            'interval': '1',
+            'connect_timeout': '2',
+            'max_age': '5',
+        }
+        self._args = None
+        if not args_str:
+            args_str = ' '.join(sys.argv[1:])
+        self.parse_args(args_str)
+
+    def parse_args(self, args_str):
+        '''
+        Eg. contrail-galera-health --listen_port 9201 --mysql_user cmon
+                --mysql_password cmon --interval 1 --max_age 5
+        '''
+        conf_parser = argparse.ArgumentParser(add_help=False)
+        conf_parser.add_argument("-c", "--conf_file",
+                                 help="Specify config file", metavar="FILE")
+        args, remaining_argv = conf_parser.parse_known_args(args_str.split())
+        if args.conf_file:
+            config = ConfigParser.SafeConfigParser()
+            config.read([args.conf_file])
+            self.global_defaults.update(dict(config.items("GLOBAL")))
+
+        parser = argparse.ArgumentParser(
+            parents=[conf_parser],
+            description=__doc__,
+            formatter_class=argparse.RawDescriptionHelpFormatter,
+            )
+        parser.set_defaults(**self.global_defaults)
+        parser.add_argument("--listen_ip", help="IP Address to serve health checks on")
+        parser.add_argument("--listen_port", help="Port to serve health checks on", type=int)
+        parser.add_argument("--mysql_host", help="MySQL server to monitor")
+        parser.add_argument("--mysql_port", help="MySQL server port", type=int)
+        parser.add_argument("--mysql_user", help="MySQL user used for the check")
+        parser.add_argument("--mysql_password", help="MySQL password used for the check")
+        parser.add_argument("--interval", help="Seconds between wsrep state refreshes", type=float)
+        parser.add_argument("--connect_timeout", help="Seconds to wait for MySQL to answer", type=int)
+        parser.add_argument("--max_age", help="Seconds after which a cached state is treated as down", type=float)
+        self._args = parser.parse_args(remaining_argv)
+
+    def run(self):
+        cache = WsrepState(self._args.max_age)
+        session = MysqlSession(self._args.mysql_host, self._args.mysql_port,
+                               self._args.mysql_user,
+                               self._args.mysql_password,
+                               self._args.connect_timeout)
+        refresher = WsrepRefresher(session, cache, self._args.interval,
+                                   self._args.connect_timeout)
+        refresher.start()
+        server = GaleraHealthServer((self._args.listen_ip,
+                                     self._args.listen_port), cache)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        except select.error as e:
+            if e.args[0] != errno.EINTR:
+                raise
+        finally:
+            server.server_close()
+            session.close()
+
+
+def main(args_str=None):
+    agent = GaleraHealthAgent(args_str)
+    agent.run()
+
+if __name__ == "__main__":
+    main()
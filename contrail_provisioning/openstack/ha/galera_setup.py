@@ -8,20 +8,21 @@ import sys
 import argparse
 import ConfigParser
 import time
-import platform
 from distutils.version import LooseVersion
 
-from fabric.api import local,run
-from fabric.context_managers import lcd, hide, settings
-from fabric.operations import get, put
+from contrail_provisioning.common.lazy import local, run, settings, hide, get
 
 
+from contrail_provisioning.common import platform_info
 from contrail_provisioning.common.base import ContrailSetup
 from contrail_provisioning.openstack.ha.templates import galera_param_template
 from contrail_provisioning.openstack.ha.templates import cmon_param_template
 from contrail_provisioning.openstack.ha.templates import cmon_conf_template
+from contrail_provisioning.openstack.ha.templates import galera_health_conf_template
+from contrail_provisioning.openstack.ha.templates import galera_health_ini_template
+from contrail_provisioning.openstack.ha.templates import galera_health_service_template
 
-if LooseVersion("14.04") == LooseVersion(platform.dist()[1]):
+if LooseVersion("14.04") == LooseVersion(platform_info.dist()[1]):
     from contrail_provisioning.openstack.ha.templates\
                 import wsrep_conf_template_ubuntu_1404 as wsrep_conf_template
 else:
@@ -30,6 +31,11 @@ else:
 from contrail_provisioning.openstack.ha.templates import wsrep_conf_centos_template
 
 
+GALERA_HEALTH_CONF = '/etc/contrail/contrail-galera-health.conf'
+GALERA_HEALTH_PORT = '9201'
+SUPERVISOR_OPENSTACK_FILES = '/etc/contrail/supervisord_openstack_files'
+
+
 class GaleraSetup(ContrailSetup):
     def __init__(self, args_str = None):
         super(GaleraSetup, self).__init__()
@@ -166,6 +172,54 @@ class GaleraSetup(ContrailSetup):
                                         self._temp_dir_name + '/cmon.cnf')
         local("sudo mv %s/cmon.cnf /etc/cmon.cnf" % (self._temp_dir_name))
 
+    def use_systemd(self):
+        return not (self.pdist in ['Ubuntu'] and
+                    LooseVersion(self.pdistversion) <= LooseVersion('14.04'))
+
+    def fix_galera_health_config(self):
+        # contrail-galera-check.sh answers the haproxy mysql checks from
+        # the wsrep state cached by the contrail-galera-health agent
+        template_vals = {'__listen_port__': GALERA_HEALTH_PORT,
+                         '__cmonuser__': self._args.cmon_user or 'cmon',
+                         '__cmonpass__': self._args.cmon_pass or 'cmon',
+                        }
+        self._template_substitute_write(galera_health_conf_template.template,
+                                        template_vals,
+                                        self._temp_dir_name + '/galera_health_conf')
+        local("sudo chmod 600 %s/galera_health_conf" % self._temp_dir_name)
+        local("sudo mv %s/galera_health_conf %s" % (self._temp_dir_name,
+                                                   GALERA_HEALTH_CONF))
+
+        template_vals = {'__conf_file__': GALERA_HEALTH_CONF}
+        if self.use_systemd():
+            self._template_substitute_write(galera_health_service_template.template,
+                                            template_vals,
+                                            self._temp_dir_name + '/galera_health_service')
+            local("sudo mv %s/galera_health_service /lib/systemd/system/contrail-galera-health.service" %
+                  self._temp_dir_name)
+        else:
+            self._template_substitute_write(galera_health_ini_template.template,
+                                            template_vals,
+                                            self._temp_dir_name + '/galera_health_ini')
+            local("sudo mkdir -p %s" % SUPERVISOR_OPENSTACK_FILES)
+            local("sudo mv %s/galera_health_ini %s/contrail-galera-health.ini" %
+                  (self._temp_dir_name, SUPERVISOR_OPENSTACK_FILES))
+
+    def start_galera_health(self):
+        if self.use_systemd():
+            local("sudo systemctl daemon-reload")
+            local("sudo systemctl enable contrail-galera-health")
+            local("sudo systemctl restart contrail-galera-health")
+            return
+        if os.path.exists('/tmp/supervisord_openstack.sock'):
+            sock = "unix:///tmp/supervisord_openstack.sock"
+        else:
+            sock = "unix:///var/run/supervisord_openstack.sock"
+        # Started with supervisor-openstack when it is not running yet
+        with settings(warn_only=True):
+            local("supervisorctl -s %s update" % sock)
+            local("supervisorctl -s %s restart contrail-galera-health" % sock)
+
     def fixup_config_files(self):
         with settings(warn_only=True):
             local("service contrail-hamon stop")
@@ -184,6 +238,7 @@ class GaleraSetup(ContrailSetup):
         #if self._args.openstack_index == 1:
         #    local('sed -ibak "s#wsrep_cluster_address=.*#wsrep_cluster_address=gcomm://#g" %s' % (self.wsrep_conf))
         self.fix_cmon_config()
+        self.fix_galera_health_config()
 
         local("echo %s > /etc/contrail/galeraid" % self._args.openstack_index)
         self.install_mysql_db()
@@ -344,6 +399,7 @@ class GaleraSetup(ContrailSetup):
 
         local("sudo update-rc.d -f mysql remove")
         local("sudo update-rc.d mysql defaults")
+        self.start_galera_health()
 
     # bootstrsp the donor node. Check if the first node can be
     # donor or joiner
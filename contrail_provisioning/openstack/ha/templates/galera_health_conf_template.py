@@ -0,0 +1,11 @@
+import string
+
+template = string.Template("""
+[GLOBAL]
+listen_ip = 127.0.0.1
+listen_port = $__listen_port__
+mysql_host = localhost
+mysql_port = 3306
+mysql_user = $__cmonuser__
+mysql_password = $__cmonpass__
+""")
@@ -0,0 +1,17 @@
+import string
+
+template = string.Template("""
+[program:contrail-galera-health]
+command=/usr/bin/contrail-galera-health --conf_file $__conf_file__
+priority=450
+autostart=true
+autorestart=true
+killasgroup=true
+stopsignal=TERM
+stdout_capture_maxbytes=1MB
+redirect_stderr=true
+stdout_logfile=/var/log/contrail/contrail-galera-health-stdout.log
+stderr_logfile=/dev/null
+startsecs=2
+exitcodes=0                   ; 'expected' exit codes for process (default 0,2)
+""")
@@ -0,0 +1,17 @@
+import string
+
+template = string.Template("""
+[Unit]
+Description=Contrail galera health agent
+After=network.target mysql.service mysqld.service
+
+[Service]
+Type=simple
+ExecStart=/usr/bin/contrail-galera-health --conf_file $__conf_file__
+Restart=always
+RestartSec=2
+ExecStop=/bin/kill -s TERM $MAINPID
+
+[Install]
+WantedBy=multi-user.target
+""")
@@ -22,6 +22,9 @@ RUN_STATE="isrunning"
 mysqlpid=$(pidof mysqld)
 CHECK_QUERY="show global status where variable_name='wsrep_local_state'"
 CONNECT_TIMEOUT=2
+# Port of the resident contrail-galera-health agent, when it is running the
+# cached wsrep state is used instead of opening a new mysql connection.
+HEALTH_AGENT_PORT="9201"
 return_ok()
 {
     echo -e "HTTP/1.1 200 OK\r\n"
@@ -42,6 +45,18 @@ return_fail()
     echo -e "\r\n"
     exit 1
 }
+check_health_agent()
+{
+    exec 3<>/dev/tcp/127.0.0.1/$HEALTH_AGENT_PORT || return
+    echo -e "GET / HTTP/1.0\r\n\r" >&3
+    read -t $CONNECT_TIMEOUT -r line <&3
+    exec 3<&-
+    case "$line" in
+        *" 200 "*) return_ok;;
+        *" 503 "*) return_fail;;
+    esac
+}
+check_health_agent 2>/dev/null
 if [ -z "$mysqlpid" ]; then
    return_fail;
 fi
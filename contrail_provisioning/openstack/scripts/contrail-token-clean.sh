@@ -12,10 +12,22 @@ mysql_password=$OS_KS_PASS
 mysql_host="localhost"
 mysql_port=3306
 mysql=$(which mysql)
+cmon_user=$CMON_USER
 cmon_user_pass=$CMON_PASS
 cmon_stats_purge="call sp_cmon_purge_history;"
-token_removed="/tmp/ks_token_remove"
-token_clean="keystone-manage -v -d token_flush"
+# cmon tables truncated on every run, in addition to all *_history tables.
+# Tables missing from the installed cmon schema are skipped.
+cmon_purge_tables="cmon_log mysql_statistics_tm mysql_performance_results
+                   cmon_job cmon_job_message cluster_log backup_log
+                   restore_log backup restore alarm_log
+                   mysql_query_histogram mysql_slow_queries"
+# Expired keystone tokens are deleted in batches of token_batch_size rows,
+# pausing token_batch_pause seconds between batches so that the token table
+# is never locked for long. At most token_row_budget rows are removed per run.
+token_batch_size=1000
+token_batch_pause=0.1
+token_row_budget=500000
+query_timeout=600
 MYIPS=$(ip a s|sed -ne '/127.0.0.1/!{s/^[ \t]*inet[ \t]*\([0-9.]\+\)\/.*$/\1/p}')
 
 timestamp() {
@@ -37,10 +49,6 @@ log_info_msg() {
     echo "$(timestamp): INFO: $msg" >> $LOGFILE
 }
 
-if [ ! -f "$token_removed" ] ; then
-         touch "$token_removed"
-fi
-
 get_my_ip() {
 flag=false
 for ip in $MYIPS
@@ -59,33 +67,63 @@ for ip in $MYIPS
 done
 }
 
+now_ms() {
+    echo $(($(date +%s%N)/1000000))
+}
+
+# Starts the single mysql session used by a maintenance job.
+open_session() {
+    user=$1
+    password=$2
+    coproc MYSQL_SESSION { MYSQL_PWD=$password $mysql -N -B -n -u${user} -h${mysql_host} -P${mysql_port} 2>>$LOGFILE; }
+}
+
+close_session() {
+    eval "exec ${MYSQL_SESSION[1]}>&-"
+    wait $MYSQL_SESSION_PID
+}
+
+# Runs statements on the open session and prints the result rows. A marker
+# row terminates the output, so no reconnect is needed between queries.
+session_query() {
+    echo "$1" >&${MYSQL_SESSION[1]}
+    echo "SELECT '__end_of_query__';" >&${MYSQL_SESSION[1]}
+    while read -t $query_timeout -r row <&${MYSQL_SESSION[0]}; do
+        if [ "$row" == "__end_of_query__" ]; then
+            return 0
+        fi
+        echo "$row"
+    done
+    return 1
+}
+
 cmon_data_purge() {
     log_info_msg "Starting to purged cmon stats history"
-    mysql -u${cmon_user_pass} -p${cmon_user_pass} -h${mysql_host} -P${mysql_port} -e "use cmon; truncate table cmon_log;"
-    mysql -u${cmon_user_pass} -p${cmon_user_pass} -h${mysql_host} -P${mysql_port} -e "use cmon; truncate table memory_usage_history;"
-    mysql -u${cmon_user_pass} -p${cmon_user_pass} -h${mysql_host} -P${mysql_port} -e "use cmon; truncate table cpu_stats_history;"
-    mysql -u${cmon_user_pass} -p${cmon_user_pass} -h${mysql_host} -P${mysql_port} -e "use cmon; truncate table ram_stats_history;"
-    mysql -u${cmon_user_pass} -p${cmon_user_pass} -h${mysql_host} -P${mysql_port} -e "use cmon; truncate table disk_stats_history;"
-    mysql -u${cmon_user_pass} -p${cmon_user_pass} -h${mysql_host} -P${mysql_port} -e "use cmon; truncate table diskdata_history;"
-    mysql -u${cmon_user_pass} -p${cmon_user_pass} -h${mysql_host} -P${mysql_port} -e "use cmon; truncate table mysql_global_statistics_history;"
-    mysql -u${cmon_user_pass} -p${cmon_user_pass} -h${mysql_host} -P${mysql_port} -e "use cmon; truncate table mysql_statistics_history;"
-    mysql -u${cmon_user_pass} -p${cmon_user_pass} -h${mysql_host} -P${mysql_port} -e "use cmon; truncate table mysql_statistics_tm;"
-    mysql -u${cmon_user_pass} -p${cmon_user_pass} -h${mysql_host} -P${mysql_port} -e "use cmon; truncate table mysql_advisor_history;"
-    mysql -u${cmon_user_pass} -p${cmon_user_pass} -h${mysql_host} -P${mysql_port} -e "use cmon; truncate table expression_result_history;"
-    mysql -u${cmon_user_pass} -p${cmon_user_pass} -h${mysql_host} -P${mysql_port} -e "use cmon; truncate table mysql_performance_results;"
-    mysql -u${cmon_user_pass} -p${cmon_user_pass} -h${mysql_host} -P${mysql_port} -e "use cmon; truncate table net_stats_history;"
-    mysql -u${cmon_user_pass} -p${cmon_user_pass} -h${mysql_host} -P${mysql_port} -e "use cmon; truncate table cmon_job;"
-    mysql -u${cmon_user_pass} -p${cmon_user_pass} -h${mysql_host} -P${mysql_port} -e "use cmon; truncate table cmon_job_message;"
-    mysql -u${cmon_user_pass} -p${cmon_user_pass} -h${mysql_host} -P${mysql_port} -e "use cmon; truncate table cluster_log;"
-    mysql -u${cmon_user_pass} -p${cmon_user_pass} -h${mysql_host} -P${mysql_port} -e "use cmon; truncate table backup_log;"
-    mysql -u${cmon_user_pass} -p${cmon_user_pass} -h${mysql_host} -P${mysql_port} -e "use cmon; truncate table restore_log;"
-    mysql -u${cmon_user_pass} -p${cmon_user_pass} -h${mysql_host} -P${mysql_port} -e "use cmon; truncate table backup;"
-    mysql -u${cmon_user_pass} -p${cmon_user_pass} -h${mysql_host} -P${mysql_port} -e "use cmon; truncate table restore;"
-    mysql -u${cmon_user_pass} -p${cmon_user_pass} -h${mysql_host} -P${mysql_port} -e "use cmon; truncate table alarm_log;"
-    mysql -u${cmon_user_pass} -p${cmon_user_pass} -h${mysql_host} -P${mysql_port} -e "use cmon; truncate table mysql_query_histogram;"
-    mysql -u${cmon_user_pass} -p${cmon_user_pass} -h${mysql_host} -P${mysql_port} -e "use cmon; truncate table mysql_slow_queries;"
-    mysql -u${cmon_user_pass} -p${cmon_user_pass} -h${mysql_host} -P${mysql_port} -e "use cmon; ${cmon_stats_purge}"
-    log_info_msg "Purged cmon stats history"
+    start=$(now_ms)
+    open_session $cmon_user $cmon_user_pass
+    in_list="'$(echo $cmon_purge_tables | sed "s/ /','/g")'"
+    tables=$(session_query "SELECT table_name, IFNULL(table_rows, 0) FROM information_schema.tables
+                            WHERE table_schema = 'cmon' AND
+                            (table_name LIKE '%\_history' OR table_name IN (${in_list}));")
+    if [ $? -ne 0 ]; then
+        log_error_msg "Unable to list cmon tables, skipping cmon stats purge"
+        close_session
+        return
+    fi
+    truncates=""
+    num_tables=0
+    rows_purged=0
+    while read table rows; do
+        [ -z "$table" ] && continue
+        truncates="${truncates}TRUNCATE TABLE cmon.${table}; "
+        num_tables=$((num_tables+1))
+        rows_purged=$((rows_purged+rows))
+    done <<< "$tables"
+    if ! session_query "${truncates}USE cmon; ${cmon_stats_purge}" > /dev/null; then
+        log_error_msg "cmon stats purge failed"
+    fi
+    close_session
+    log_info_msg "Purged cmon stats history: $num_tables tables, ~$rows_purged rows in $(($(now_ms)-start)) ms"
 }
 
 keystone_token_cleanup() {
@@ -94,13 +132,36 @@ keystone_token_cleanup() {
     sleep $delay
 
     log_info_msg "keystone-cleaner::Starting token cleanup"
-
-    `$token_clean 2> >( cat <() > $token_removed)`
-    tokens_purged=$(cat $token_removed | grep "Total expired tokens" | awk '{print $11}')
-    log_info_msg "Number of expired tokens purged in this job: $tokens_purged"
-
-    valid_token=$($mysql -u${mysql_user} -p${mysql_password} -h${mysql_host} -P${mysql_port} -e "USE keystone ; SELECT count(*) FROM token;")
-    valid_token=$(echo $valid_token | awk '{print $2}')
+    start=$(now_ms)
+    open_session $mysql_user $mysql_password
+    has_token_table=$(session_query "SELECT count(*) FROM information_schema.tables
+                                     WHERE table_schema = 'keystone' AND table_name = 'token';")
+    if [ "$has_token_table" != "1" ]; then
+        log_info_msg "keystone-cleaner::No keystone token table, nothing to clean"
+        close_session
+        return
+    fi
+
+    tokens_purged=0
+    batches=0
+    while [ $tokens_purged -lt $token_row_budget ]; do
+        deleted=$(session_query "DELETE FROM keystone.token WHERE expires < UTC_TIMESTAMP() LIMIT $token_batch_size;
+                                 SELECT ROW_COUNT();")
+        if [ $? -ne 0 ]; then
+            log_error_msg "keystone-cleaner::Expired token delete failed"
+            break
+        fi
+        batches=$((batches+1))
+        tokens_purged=$((tokens_purged+deleted))
+        if [ $deleted -lt $token_batch_size ]; then
+            break
+        fi
+        sleep $token_batch_pause
+    done
+    log_info_msg "Number of expired tokens purged in this job: $tokens_purged in $batches batches, $(($(now_ms)-start)) ms"
+
+    valid_token=$(session_query "SELECT count(*) FROM keystone.token;")
+    close_session
 
     log_info_msg "keystone-cleaner::Finishing token cleanup, there are $valid_token valid tokens..."
 }
@@ -9,8 +9,7 @@ import argparse
 import ConfigParser
 from distutils.version import LooseVersion
 
-from fabric.api import local
-from fabric.context_managers import settings
+from contrail_provisioning.common.lazy import local, settings
 
 from contrail_provisioning.common.base import ContrailSetup
 
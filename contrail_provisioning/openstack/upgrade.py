@@ -8,9 +8,7 @@ from distutils.version import LooseVersion
 
 from setup import OpenstackSetup
 from contrail_provisioning.common.upgrade import ContrailUpgrade
-from fabric.context_managers import settings
-
-from fabric.api import local
+from contrail_provisioning.common.lazy import local, settings
 
 
 class OpenstackUpgrade(ContrailUpgrade, OpenstackSetup):
@@ -108,6 +106,8 @@ class OpenstackUpgrade(ContrailUpgrade, OpenstackSetup):
         local("openstack-config --set /etc/nova/nova.conf neutron user_domain_name Default")
 
     def upgrade(self):
+        if self._dry_run():
+            return
         self.stop()
         self._upgrade()
         # In Rel 2.0 and 2.1, the cmon was started as part of CMON monitor
@@ -6,12 +6,118 @@ import os
 import sys
 import subprocess
 from pprint import pformat
+from StringIO import StringIO
 
-from fabric.api import local, env, run
-from fabric.operations import get, put
-from fabric.context_managers import lcd, settings
+from contrail_provisioning.common.lazy import run, settings, get, put
 sys.path.insert(0, os.getcwd())
 
+from contrail_provisioning.common.libvirt_conf import LIBVIRTD_CONF, \
+    LibvirtConf
+from contrail_provisioning.common.parallel import run_on_hosts
+
+NOVA_CONF='/etc/nova/nova.conf'
+LIBVIRTD_CENTOS_BIN_CONF='/etc/sysconfig/libvirtd'
+LIBVIRTD_UBUNTU_BIN_CONF='/etc/default/libvirt-bin'
+LIBVIRTD_UBUNTU_INIT_CONF='/etc/init/libvirt-bin.conf'
+# libvirtd listens on tcp, without authentication, for the migrations
+LIBVIRTD_LISTEN_SETTINGS=[('listen_tls', 0), ('listen_tcp', 1),
+                          ('auth_tcp', 'none')]
+LIVE_MIGRATION_FLAG='VIR_MIGRATE_UNDEFINE_SOURCE,VIR_MIGRATE_PEER2PEER,VIR_MIGRATE_LIVE'
+
+LIBVIRTD_CONF_MARKER='--- libvirtd.conf ---'
+
+# Collects everything the live migration plan of a host depends on in a
+# single remote call, one "key=value" per line, followed by libvirtd.conf.
+FACTS_SCRIPT = r"""
+echo "live_migration_flag=$(openstack-config --get %(nova_conf)s DEFAULT live_migration_flag 2>/dev/null)"
+echo "vncserver_listen=$(openstack-config --get %(nova_conf)s DEFAULT vncserver_listen 2>/dev/null)"
+echo "centos_bin_conf=$(ls %(centos_bin_conf)s 2>/dev/null | wc -l)"
+echo "centos_bin_pending=$(grep -c '#LIBVIRTD_ARGS="--listen"' %(centos_bin_conf)s 2>/dev/null)"
+echo "ubuntu_bin_conf=$(ls %(ubuntu_bin_conf)s 2>/dev/null | wc -l)"
+echo "ubuntu_bin_listen=$(grep -c -e '-d -l' %(ubuntu_bin_conf)s 2>/dev/null)"
+echo "ubuntu_bin_opts=$(grep -c '^libvirtd_opts' %(ubuntu_bin_conf)s 2>/dev/null)"
+echo "ubuntu_init_conf=$(ls %(ubuntu_init_conf)s 2>/dev/null | wc -l)"
+echo "ubuntu_init_listen=$(grep -c -e '-d -l' %(ubuntu_init_conf)s 2>/dev/null)"
+echo "nova_uid=$(id -u nova 2>/dev/null)"
+echo "nova_gid=$(id -g nova 2>/dev/null)"
+echo "qemu_uid=$(id -u libvirt-qemu 2>/dev/null)"
+echo "qemu_gid=$(id -g libvirt-qemu 2>/dev/null)"
+echo "uids=$(cut -d ':' -f 3 /etc/passwd | tr '\n' ' ')"
+echo "gids=$(cut -d ':' -f 3 /etc/group | tr '\n' ' ')"
+echo "nova_services=$(ps -Af | grep nova | grep -v grep | awk '{print $9}' | cut -d '/' -f 4 | grep nova | sort -u | tr '\n' ' ')"
+if [ -f %(libvirtd_conf)s ]; then echo "%(conf_marker)s"; cat %(libvirtd_conf)s; fi
+""" % {'nova_conf': NOVA_CONF, 'libvirtd_conf': LIBVIRTD_CONF,
+       'centos_bin_conf': LIBVIRTD_CENTOS_BIN_CONF,
+       'ubuntu_bin_conf': LIBVIRTD_UBUNTU_BIN_CONF,
+       'ubuntu_init_conf': LIBVIRTD_UBUNTU_INIT_CONF,
+       'conf_marker': LIBVIRTD_CONF_MARKER}
+
+
+def parse_facts(output):
+    facts = {}
+    lines = output.splitlines()
+    libvirtd_conf = None
+    if LIBVIRTD_CONF_MARKER in lines:
+        index = lines.index(LIBVIRTD_CONF_MARKER)
+        lines, libvirtd_conf = lines[:index], lines[index + 1:]
+    facts['libvirtd_conf'] = libvirtd_conf
+    for line in lines:
+        if '=' in line:
+            key, value = line.strip().split('=', 1)
+            facts[key] = value.strip()
+    for key in ['uids', 'gids']:
+        facts[key] = set(int(i) for i in facts.get(key, '').split())
+    facts['nova_services'] = facts.get('nova_services', '').split()
+    return facts
+
+
+def gather_host_facts(host_entry):
+    """Runs in a pool worker, returns (host, facts or None on failure)."""
+    host, token = host_entry
+    with settings(host_string='root@%s' % host, password=token,
+                  warn_only=True):
+        output = run(FACTS_SCRIPT, shell='/bin/bash')
+    if output.failed:
+        return host, None
+    return host, parse_facts(output)
+
+
+def host_script(commands, final_commands=()):
+    """Shell script running commands, stopping at the first failure.
+
+    final_commands are run when the script exits, whether the commands
+    succeeded or not, so the services stopped by a plan are always
+    started back. The exit status is the one of the commands.
+    """
+    lines = []
+    if final_commands:
+        lines += ['finish() {', '    rc=$?', '    set +e']
+        lines += ['    %s' % command for command in final_commands]
+        lines += ['    exit $rc', '}', 'trap finish EXIT']
+    return '\n'.join(lines + ['set -e'] + list(commands))
+
+
+def apply_host_plan(plan_entry):
+    """Runs in a pool worker, returns (host, succeeded).
+
+    files {path: content} are uploaded next to path and moved in place
+    before the commands are run, final_commands are run in any case.
+    """
+    host, token, commands, files, final_commands = plan_entry
+    moves = []
+    with settings(host_string='root@%s' % host, password=token,
+                  warn_only=True):
+        for path, content in sorted(files.items()):
+            staged = os.path.join(os.path.dirname(path),
+                                  '.%s.new' % os.path.basename(path))
+            if put(StringIO(content), staged, mode=0644).failed:
+                return host, False
+            moves.append('mv -f %s %s' % (staged, path))
+        script = host_script(moves + commands, final_commands)
+        result = run(script, shell='/bin/bash')
+    return host, result.succeeded
+
+
 # set livemigration configurations in nova and libvirtd
 class SetupLivem(object):
 
@@ -25,185 +131,153 @@ class SetupLivem(object):
         if self._args.storage_setup_mode == 'unconfigure':
             return
 
-        NOVA_CONF='/etc/nova/nova.conf'
-        LIBVIRTD_CONF='/etc/libvirt/libvirtd.conf'
-        LIBVIRTD_TMP_CONF='/tmp/libvirtd.conf'
-        LIBVIRTD_CENTOS_BIN_CONF='/etc/sysconfig/libvirtd'
-        LIBVIRTD_UBUNTU_BIN_CONF='/etc/default/libvirt-bin'
-        LIBVIRTD_UBUNTU_INIT_CONF='/etc/init/libvirt-bin.conf'
-        LIBVIRTD_TMP_BIN_CONF='/tmp/libvirtd.tmp'
-        LIBVIRTD_TMP_INIT_CONF='/tmp/libvirt-bin.conf'
-
-        for hostname, entry, entry_token in zip(self._args.storage_hostnames, self._args.storage_hosts, self._args.storage_host_tokens):
-           with settings(host_string = 'root@%s' %(entry), password = entry_token):
-               run('openstack-config --set %s DEFAULT live_migration_flag VIR_MIGRATE_UNDEFINE_SOURCE,VIR_MIGRATE_PEER2PEER,VIR_MIGRATE_LIVE' %(NOVA_CONF))
-               run('openstack-config --set %s DEFAULT vncserver_listen 0.0.0.0' %(NOVA_CONF))
-               run('cat %s | sed s/"#listen_tls = 0"/"listen_tls = 0"/ | sed s/"#listen_tcp = 1"/"listen_tcp = 1"/ | sed s/\'#auth_tcp = "sasl"\'/\'auth_tcp = "none"\'/ > %s' %(LIBVIRTD_CONF, LIBVIRTD_TMP_CONF), shell='/bin/bash')
-               run('cp -f %s %s' %(LIBVIRTD_TMP_CONF, LIBVIRTD_CONF))
-               libvirtd = run('ls %s 2>/dev/null |wc -l' %(LIBVIRTD_CENTOS_BIN_CONF))
-               if libvirtd != '0':
-                   run('cat %s | sed s/"#LIBVIRTD_ARGS=\"--listen\""/"LIBVIRTD_ARGS=\"--listen\""/ > %s' %(LIBVIRTD_CENTOS_BIN_CONF, LIBVIRTD_TMP_BIN_CONF), shell='/bin/bash')
-                   run('cp -f %s %s' %(LIBVIRTD_TMP_BIN_CONF, LIBVIRTD_CENTOS_BIN_CONF))
-                   run('service openstack-nova-compute restart')
-                   run('service libvirtd restart')
-
-               libvirtd = run('ls %s 2>/dev/null |wc -l' %(LIBVIRTD_UBUNTU_BIN_CONF))
-               if libvirtd != '0':
-                   libvirt_configured = run('cat %s |grep "\-d \-l"| wc -l' %(LIBVIRTD_UBUNTU_BIN_CONF))
-                   if libvirt_configured == '0':
-                       run('cat %s | sed s/"-d"/"-d -l"/ > %s' %(LIBVIRTD_UBUNTU_BIN_CONF, LIBVIRTD_TMP_BIN_CONF), shell='/bin/bash')
-                       libvirt_enabled = run('cat %s |grep "^libvirtd_opts"| wc -l' %(LIBVIRTD_UBUNTU_BIN_CONF))
-                       if libvirt_enabled == '0':
-                           run('echo \'libvirtd_opts="-l"\' >> %s' %(LIBVIRTD_TMP_BIN_CONF))
-                       #else:
-                       #Handle other cases
-                       run('cp -f %s %s' %(LIBVIRTD_TMP_BIN_CONF, LIBVIRTD_UBUNTU_BIN_CONF))
-                       run('service nova-compute restart')
-                       run('service libvirt-bin restart')
-
-               libvirtd = run('ls %s 2>/dev/null |wc -l' %(LIBVIRTD_UBUNTU_INIT_CONF))
-               if libvirtd != '0':
-                   libvirt_configured = run('cat %s |grep "\-d \-l"| wc -l' %(LIBVIRTD_UBUNTU_INIT_CONF))
-                   if libvirt_configured == '0':
-                       run('cat %s | sed s/"-d"/"-d -l"/ > %s' %(LIBVIRTD_UBUNTU_INIT_CONF, LIBVIRTD_TMP_INIT_CONF), shell='/bin/bash')
-                       run('cp -f %s %s' %(LIBVIRTD_TMP_INIT_CONF, LIBVIRTD_UBUNTU_INIT_CONF))
-                       run('service nova-compute restart')
-                       run('service libvirt-bin restart')
-
-        # Fix nova uid
+        storage_hosts = zip(self._args.storage_hosts,
+                            self._args.storage_host_tokens)
+        # Nova/libvirt ids have to match on the openstack nodes as well
+        uid_fix_hosts = []
         if self._args.fix_nova_uid == 'enabled':
-            uid_fix_nodes = []
-            uid_fix_node_tokens = []
-
-            #Form a list of all hosts and host_tokens
-            for entry, entry_token in zip(self._args.storage_hosts, self._args.storage_host_tokens):
-                uid_fix_nodes.append(entry)
-                uid_fix_node_tokens.append(entry_token)
-            #uid_fix_nodes.append(self._args.storage_master)
-            #uid_fix_node_tokens.append(self._args.storage_master_token)
+            uid_fix_hosts = list(storage_hosts)
             if self._args.storage_os_hosts[0] != 'none':
-                for entry, entry_token in zip(self._args.storage_os_hosts,
-                                                self._args.storage_os_host_tokens):
-                    uid_fix_nodes.append(entry)
-                    uid_fix_node_tokens.append(entry_token)
-
-            with settings(host_string = 'root@%s' %(uid_fix_nodes[0]),
-                            password = uid_fix_node_tokens[0]):
-                nova_id = run('sudo id -u nova')
-                qemu_id = run('sudo id -u libvirt-qemu')
-            uid_fix_required = 0
-
-            #Check if nova/libvirt uid is different in each node
-            for entry, entry_token in zip(uid_fix_nodes,
-                                                uid_fix_node_tokens):
-                with settings(host_string = 'root@%s' %(entry), password = entry_token):
-                    nova_id_check = run('sudo id -u nova')
-                    qemu_id_check = run('sudo id -u libvirt-qemu')
-                    if nova_id != nova_id_check or \
-                        qemu_id != qemu_id_check:
-                        uid_fix_required = 1
-                        break
-            if uid_fix_required == 0:
-                return
-
-            new_nova_uid = 500
-            new_nova_gid = 500
-
-            new_qemu_uid = 501
-            new_qemu_gid = 501
-
-            # Start from 500 and find the id that is not used in the system
-            while True:
-                recheck = 0
-                for entry, entry_token in zip(uid_fix_nodes,
-                                                uid_fix_node_tokens):
-                    with settings(host_string = 'root@%s' %(entry),
-                                    password = entry_token):
-                        id_check = run('sudo cat /etc/passwd | \
-                                                cut -d \':\' -f 3 | \
-                                                grep -w %d | wc -l'
-                                                %(new_nova_uid))
-                        if id_check != '0':
-                            new_nova_uid += 1
-                            new_qemu_uid += 1
-                            recheck = 1
-                        id_check = run('sudo cat /etc/passwd | \
-                                                cut -d \':\' -f 3 | \
-                                                grep -w %d | wc -l'
-                                                %(new_qemu_uid))
-                        if id_check != '0':
-                            new_nova_uid += 1
-                            new_qemu_uid += 1
-                            recheck = 1
-                        id_check = run('sudo cat /etc/group | \
-                                                cut -d \':\' -f 3 | \
-                                                grep -w %d | wc -l'
-                                                %(new_nova_gid))
-                        if id_check != '0':
-                            new_nova_gid += 1
-                            new_qemu_gid += 1
-                            recheck = 1
-                        id_check = run('sudo cat /etc/group | \
-                                                cut -d \':\' -f 3 | \
-                                                grep -w %d | wc -l'
-                                                %(new_qemu_gid))
-                        if id_check != '0':
-                            new_nova_gid += 1
-                            new_qemu_gid += 1
-                            recheck = 1
-                        if recheck == 1:
-                            break
-                if recheck == 0:
-                    break
-
-            # Stop nova services
-            # Change nova/libvirt uid and gid.
-            # Chown/chgrp on all the files from old uid/gid to new uid/gid
-            # Start nova services back
-            for entry, entry_token in zip(uid_fix_nodes,
-                                                uid_fix_node_tokens):
-                with settings(host_string = 'root@%s' %(entry), password = entry_token):
-                    nova_services = []
-                    services = run('ps -Af | grep nova | grep -v grep | \
-                                    awk \'{print $9}\' | cut -d \'/\' -f 4 | \
-                                    grep nova | uniq -d')
-                    for service in services.split('\r\n'):
-                        if service != '':
-                            nova_services.append(service)
-                    services = run('ps -Af | grep nova | grep -v grep | \
-                                    awk \'{print $9}\' | cut -d \'/\' -f 4 | \
-                                    grep nova | uniq -u')
-                    for service in services.split('\r\n'):
-                        if service != '':
-                            nova_services.append(service)
-
-                    print nova_services
-
-                    for service in nova_services:
-                        if service[0] != '':
-                            run('service %s stop' %(service))
-                    cur_nova_uid = run('sudo id -u nova')
-                    cur_qemu_uid = run('sudo id -u libvirt-qemu')
-                    cur_nova_gid = run('sudo id -g nova')
-                    cur_qemu_gid = run('sudo id -g libvirt-qemu')
-                    run('sudo usermod -u %d nova' %(new_nova_uid))
-                    run('sudo groupmod -g %d nova' %(new_nova_gid))
-                    run('sudo usermod -u %d libvirt-qemu' %(new_qemu_uid))
-                    run('sudo groupmod -g %d kvm' %(new_qemu_gid))
-                    run('sudo find / -uid %s -exec chown nova {} \; 2> /dev/null; echo done'
-                                                        %(cur_nova_uid))
-                    run('sudo find / -gid %s -exec chgrp nova {} \; 2> /dev/null; echo done'
-                                                        %(cur_nova_gid))
-                    run('sudo find / -uid %s -exec chown libvirt-qemu {} \; 2> /dev/null; echo done'
-                                                        %(cur_qemu_uid))
-                    run('sudo find / -gid %s -exec chgrp kvm {} \; 2> /dev/null; echo done'
-                                                        %(cur_qemu_gid))
-                    for service in nova_services:
-                        if service[0] != '':
-                            run('service %s start' %(service))
-                    run('service libvirt-bin restart')
-
-            return
+                uid_fix_hosts += zip(self._args.storage_os_hosts,
+                                     self._args.storage_os_host_tokens)
+
+        tokens = dict(storage_hosts + uid_fix_hosts)
+        hosts = []
+        for host, token in storage_hosts + uid_fix_hosts:
+            if host not in hosts:
+                hosts.append(host)
+
+        facts = dict(run_on_hosts(gather_host_facts,
+                                  [(host, tokens[host]) for host in hosts],
+                                  self._args.max_parallel_hosts))
+        failed = [host for host in hosts if facts[host] is None]
+        if failed:
+            raise RuntimeError('Unable to collect live migration facts from %s'
+                               % ', '.join(failed))
+
+        plans = {}
+        for host, token in storage_hosts:
+            commands, restarts, files = self.livem_config_plan(facts[host])
+            plans[host] = (commands, restarts, files, [])
+        uid_fix = self.uid_fix_plan([host for host, token in uid_fix_hosts],
+                                    facts)
+        for host, (commands, restarts, starts) in uid_fix.items():
+            plans.setdefault(host, ([], set(), {}, []))
+            plans[host][0].extend(commands)
+            plans[host][1].update(restarts)
+            plans[host][3].extend(starts)
+
+        plan_entries = []
+        for host in hosts:
+            if host not in plans:
+                continue
+            commands, restarts, files, starts = plans[host]
+            # Restarts and starts run even if a command fails, so nova
+            # and libvirt are never left stopped
+            final_commands = starts + ['service %s restart' % service
+                                       for service in sorted(restarts)]
+            if commands or files or final_commands:
+                plan_entries.append((host, tokens[host], commands, files,
+                                     final_commands))
+        results = run_on_hosts(apply_host_plan, plan_entries,
+                               self._args.max_parallel_hosts)
+        failed = [host for host, succeeded in results if not succeeded]
+        if failed:
+            raise RuntimeError('Live migration setup failed on %s'
+                               % ', '.join(failed))
+
+    def libvirt_services(self, facts):
+        if facts['centos_bin_conf'] != '0':
+            return 'openstack-nova-compute', 'libvirtd'
+        return 'nova-compute', 'libvirt-bin'
+
+    def livem_config_plan(self, facts):
+        """Returns the (commands, services to restart, files to write) of a
+        storage host.
+        """
+        commands = []
+        files = {}
+        if facts['live_migration_flag'] != LIVE_MIGRATION_FLAG:
+            commands.append('openstack-config --set %s DEFAULT live_migration_flag %s'
+                            %(NOVA_CONF, LIVE_MIGRATION_FLAG))
+        if facts['vncserver_listen'] != '0.0.0.0':
+            commands.append('openstack-config --set %s DEFAULT vncserver_listen 0.0.0.0'
+                            %(NOVA_CONF))
+        if facts['libvirtd_conf'] is not None:
+            libvirtd_conf = LibvirtConf('\n'.join(facts['libvirtd_conf']))
+            if libvirtd_conf.update(LIBVIRTD_LISTEN_SETTINGS):
+                files[LIBVIRTD_CONF] = libvirtd_conf.render()
+        if facts['centos_bin_conf'] != '0' and \
+           facts['centos_bin_pending'] not in ('', '0'):
+            commands.append('sed -i \'s/#LIBVIRTD_ARGS="--listen"/LIBVIRTD_ARGS="--listen"/\' %s'
+                            %(LIBVIRTD_CENTOS_BIN_CONF))
+        if facts['ubuntu_bin_conf'] != '0' and facts['ubuntu_bin_listen'] == '0':
+            commands.append('sed -i \'s/-d/-d -l/\' %s' %(LIBVIRTD_UBUNTU_BIN_CONF))
+            if facts['ubuntu_bin_opts'] == '0':
+                commands.append('echo \'libvirtd_opts="-l"\' >> %s'
+                                %(LIBVIRTD_UBUNTU_BIN_CONF))
+        if facts['ubuntu_init_conf'] != '0' and facts['ubuntu_init_listen'] == '0':
+            commands.append('sed -i \'s/-d/-d -l/\' %s' %(LIBVIRTD_UBUNTU_INIT_CONF))
+
+        restarts = set()
+        if commands or files:
+            restarts.update(self.libvirt_services(facts))
+        return commands, restarts, files
+
+    def uid_fix_plan(self, hosts, facts):
+        """Returns {host: (commands, services to restart, commands starting
+        the stopped services)} aligning the nova and libvirt-qemu uid/gid
+        across hosts, {} if they already match.
+        """
+        if not hosts:
+            return {}
+        first = facts[hosts[0]]
+        if all(facts[host]['nova_uid'] == first['nova_uid'] and
+               facts[host]['qemu_uid'] == first['qemu_uid']
+               for host in hosts):
+            return {}
+
+        # Start from 500 and find the ids that are not used on any node
+        used_uids = set()
+        used_gids = set()
+        for host in hosts:
+            used_uids |= facts[host]['uids']
+            used_gids |= facts[host]['gids']
+        new_nova_uid, new_qemu_uid = 500, 501
+        while new_nova_uid in used_uids or new_qemu_uid in used_uids:
+            new_nova_uid += 1
+            new_qemu_uid += 1
+        new_nova_gid, new_qemu_gid = 500, 501
+        while new_nova_gid in used_gids or new_qemu_gid in used_gids:
+            new_nova_gid += 1
+            new_qemu_gid += 1
+
+        # Stop nova services
+        # Change nova/libvirt uid and gid.
+        # Chown/chgrp on all the files from old uid/gid to new uid/gid,
+        # in a single walk of the filesystem. find fails on files removed
+        # during the walk or stale mounts, which must not stop the plan.
+        # Start nova services back, even if a command failed
+        plans = {}
+        for host in hosts:
+            host_facts = facts[host]
+            nova_services = host_facts['nova_services']
+            commands = ['service %s stop' %(service) for service in nova_services]
+            commands += ['usermod -u %d nova' %(new_nova_uid),
+                         'groupmod -g %d nova' %(new_nova_gid),
+                         'usermod -u %d libvirt-qemu' %(new_qemu_uid),
+                         'groupmod -g %d kvm' %(new_qemu_gid),
+                         'find / -path /proc -prune -o '
+                         '\\( -uid %s -exec chown nova {} + \\) , '
+                         '\\( -gid %s -exec chgrp nova {} + \\) , '
+                         '\\( -uid %s -exec chown libvirt-qemu {} + \\) , '
+                         '\\( -gid %s -exec chgrp kvm {} + \\) 2> /dev/null || true'
+                         %(host_facts['nova_uid'], host_facts['nova_gid'],
+                           host_facts['qemu_uid'], host_facts['qemu_gid'])]
+            starts = ['service %s start' %(service) for service in nova_services]
+            plans[host] = (commands, set([self.libvirt_services(host_facts)[1]]),
+                           starts)
+        return plans
 
     def _parse_args(self, args_str):
         '''
@@ -250,6 +324,7 @@ class SetupLivem(object):
         parser.add_argument("--storage-os-hosts", help = "Host names of openstack nodes other than master", nargs='+', type=str)
         parser.add_argument("--storage-os-host-tokens", help = "passwords of openstack nodes other than master", nargs='+', type=str)
         parser.add_argument("--fix-nova-uid", help = "Enable/disable uid fix")
+        parser.add_argument("--max-parallel-hosts", help = "Number of hosts configured concurrently", type=int, default=16)
 
         self._args = parser.parse_args(remaining_argv)
 
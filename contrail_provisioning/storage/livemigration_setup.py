@@ -8,8 +8,7 @@ import sys
 import argparse
 import ConfigParser
 
-from fabric.api import run
-from fabric.context_managers import settings
+from contrail_provisioning.common.lazy import run, settings
 
 from contrail_provisioning.common.base import ContrailSetup
 
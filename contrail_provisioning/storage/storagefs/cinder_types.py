@@ -0,0 +1,208 @@
+#!/usr/bin/python
+#
+# Copyright (c) 2016 Juniper Networks, Inc. All rights reserved.
+#
+"""Cinder volume type reconciliation over a single authenticated session.
+
+The credentials of /etc/contrail/openstackrc are used to get one keystone
+token, the keystone and cinder certificates being checked against its
+OS_CACERT bundle and the cinder endpoint being the one of its
+OS_REGION_NAME region, when set. All the volume types and their extra
+specs are listed with one request, and only the types or
+volume_backend_name specs which differ from the desired mapping are
+created or updated.
+
+urllib2 only checks certificates against a given bundle from python
+2.7.9 on; with older interpreters (Ubuntu 14.04) the requests made with
+an OS_CACERT bundle are run with curl instead.
+"""
+
+import re
+import ssl
+import json
+import urllib2
+import platform
+import mimetools
+import subprocess
+from StringIO import StringIO
+
+BACKEND_KEY = 'volume_backend_name'
+# ssl.create_default_context and urlopen(context=) are python >= 2.7.9
+HAS_SSL_CONTEXT = hasattr(ssl, 'create_default_context')
+
+
+def read_openstackrc(path):
+    """Returns the variables exported by an openstackrc file."""
+    env = {}
+    with open(path, 'r') as fd:
+        for line in fd:
+            match = re.match(r'\s*(?:export\s+)?(OS_\w+)=(.*)$', line)
+            if match:
+                env[match.group(1)] = match.group(2).strip().strip('"\'')
+    return env
+
+
+def _ssl_context(cafile):
+    """SSL context checking the certificates against the cafile bundle,
+    None for the default checks.
+    """
+    if not cafile:
+        return None
+    return ssl.create_default_context(cafile=cafile)
+
+
+def _curl_request(url, data, headers, method, cafile):
+    """Runs the request with curl, returns (response headers, body)."""
+    cmd = ['curl', '--silent', '--show-error', '--fail', '--dump-header',
+           '-', '--cacert', cafile, '--request', method]
+    for key, value in headers:
+        cmd += ['--header', '%s: %s' % (key, value)]
+    if data is not None:
+        cmd += ['--data-binary', '@-']
+    cmd.append(url)
+    try:
+        proc = subprocess.Popen(cmd, stdin=subprocess.PIPE,
+                                stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE)
+    except OSError as e:
+        raise urllib2.URLError('curl is needed to check the certificates '
+                               'against %s with python %s: %s' %
+                               (cafile, platform.python_version(), e))
+    output, error = proc.communicate(data)
+    if proc.returncode != 0:
+        raise urllib2.URLError('%s %s: %s' % (method, url, error.strip()))
+    head, _, body = output.partition('\r\n\r\n')
+    # Interim "100 Continue" responses come before the final one
+    while head.split(' ', 2)[1:2] == ['100']:
+        head, _, body = body.partition('\r\n\r\n')
+    return mimetools.Message(StringIO(head.partition('\r\n')[2])), body
+
+
+def _request(url, body=None, headers=None, method=None, cafile=None):
+    data = json.dumps(body) if body is not None else None
+    all_headers = [('Accept', 'application/json')]
+    if body is not None:
+        all_headers.append(('Content-Type', 'application/json'))
+    all_headers += (headers or {}).items()
+    if cafile and not HAS_SSL_CONTEXT:
+        info, content = _curl_request(url, data, all_headers,
+                                      method or ('POST' if data is not None
+                                                 else 'GET'), cafile)
+        return info, json.loads(content) if content else {}
+    request = urllib2.Request(url, data)
+    for key, value in all_headers:
+        request.add_header(key, value)
+    if method:
+        request.get_method = lambda: method
+    context = _ssl_context(cafile)
+    if context is not None:
+        response = urllib2.urlopen(request, context=context)
+    else:
+        response = urllib2.urlopen(request)
+    data = response.read()
+    return response.info(), json.loads(data) if data else {}
+
+
+def _public_url(endpoints, region):
+    """URL of the first public endpoint of region, of any region if None."""
+    for endpoint in endpoints:
+        if region and region not in (endpoint.get('region'),
+                                     endpoint.get('region_id')):
+            continue
+        # v2 catalog endpoints have a publicURL, v3 ones an interface
+        if 'publicURL' in endpoint:
+            return endpoint['publicURL']
+        if endpoint.get('interface') == 'public':
+            return endpoint['url']
+    return None
+
+
+def keystone_authenticate(env, service_type):
+    """Returns (token, public endpoint of service_type) from keystone."""
+    auth_url = env['OS_AUTH_URL'].rstrip('/')
+    cafile = env.get('OS_CACERT')
+    region = env.get('OS_REGION_NAME')
+    if auth_url.endswith('v3'):
+        project = env.get('OS_PROJECT_NAME', env.get('OS_TENANT_NAME'))
+        body = {'auth': {
+            'identity': {'methods': ['password'], 'password': {'user': {
+                'name': env['OS_USERNAME'], 'password': env['OS_PASSWORD'],
+                'domain': {'name': env.get('OS_USER_DOMAIN_NAME',
+                                           'Default')}}}},
+            'scope': {'project': {
+                'name': project,
+                'domain': {'name': env.get('OS_PROJECT_DOMAIN_NAME',
+                                           'Default')}}}}}
+        headers, data = _request(auth_url + '/auth/tokens', body,
+                                 cafile=cafile)
+        token = headers['X-Subject-Token']
+        catalog = data['token'].get('catalog', [])
+    else:
+        body = {'auth': {'tenantName': env['OS_TENANT_NAME'],
+                         'passwordCredentials': {
+                             'username': env['OS_USERNAME'],
+                             'password': env['OS_PASSWORD']}}}
+        headers, data = _request(auth_url + '/tokens', body, cafile=cafile)
+        token = data['access']['token']['id']
+        catalog = data['access'].get('serviceCatalog', [])
+    for service in catalog:
+        if service['type'] == service_type:
+            url = _public_url(service['endpoints'], region)
+            if url:
+                return token, url
+    raise RuntimeError('No %s endpoint%s in the keystone catalog'
+                       % (service_type,
+                          ' in region %s' % region if region else ''))
+
+
+class VolumeTypeApi(object):
+    """The volume type calls of the Cinder API, on one token."""
+
+    def __init__(self, endpoint, token, cafile=None):
+        self.endpoint = endpoint.rstrip('/')
+        self.headers = {'X-Auth-Token': token}
+        self.cafile = cafile
+
+    @classmethod
+    def from_openstackrc(cls, path, api_version=1):
+        env = read_openstackrc(path)
+        service_type = 'volumev2' if int(api_version) >= 2 else 'volume'
+        token, endpoint = keystone_authenticate(env, service_type)
+        return cls(endpoint, token, env.get('OS_CACERT'))
+
+    def list_types(self):
+        """Returns {name: (id, extra_specs)} of all the volume types."""
+        _, data = _request(self.endpoint + '/types', headers=self.headers,
+                           cafile=self.cafile)
+        return dict((vtype['name'], (vtype['id'],
+                                     vtype.get('extra_specs') or {}))
+                    for vtype in data.get('volume_types', []))
+
+    def create_type(self, name):
+        _, data = _request(self.endpoint + '/types',
+                           {'volume_type': {'name': name}}, self.headers,
+                           cafile=self.cafile)
+        return data['volume_type']['id']
+
+    def set_extra_specs(self, type_id, specs):
+        _request(self.endpoint + '/types/%s/extra_specs' % type_id,
+                 {'extra_specs': specs}, self.headers, cafile=self.cafile)
+
+
+def reconcile_volume_types(api, desired):
+    """Makes the volume types match desired, [(type name, backend name)].
+
+    Returns the list of changes made.
+    """
+    existing = api.list_types()
+    changes = []
+    for name, backend in desired:
+        if name in existing:
+            type_id, specs = existing[name]
+        else:
+            type_id, specs = api.create_type(name), {}
+            changes.append('created type %s' % name)
+        if specs.get(BACKEND_KEY) != backend:
+            api.set_extra_specs(type_id, {BACKEND_KEY: backend})
+            changes.append('set %s %s=%s' % (name, BACKEND_KEY, backend))
+    return changes
@@ -0,0 +1,113 @@
+#!/usr/bin/python
+#
+# Copyright (c) 2016 Juniper Networks, Inc. All rights reserved.
+#
+"""Per host storage inventory for the Ceph OSD and journal checks.
+
+Mounts, partitions, OSD journal links and running ceph-osd daemons are
+collected with a single remote call and the OSD/journal decisions are
+answered from the resulting snapshot.
+"""
+
+import re
+
+from contrail_provisioning.common.lazy import run, settings
+
+INVENTORY_SCRIPT = r"""
+echo '@mounts'
+cat /proc/mounts
+echo '@partitions'
+cat /proc/partitions
+echo '@journals'
+for osd_dir in $(grep osd /proc/mounts | awk '{print $2}'); do
+    echo "$osd_dir $(readlink -f $osd_dir/journal 2>/dev/null)"
+done
+echo '@osds'
+ps -eo args | grep ceph-osd | grep -v grep
+true
+"""
+
+OSD_ID_RE = re.compile(r'(?:--id|-i)[ =](\d+)')
+
+
+class StorageInventory(object):
+    """Snapshot of the storage state of one host."""
+
+    def __init__(self, output=''):
+        # (device, mount point, fs type) in /proc/mounts order
+        self.mounts = []
+        self.partitions = set()
+        # OSD mount point -> resolved journal device
+        self.journals = {}
+        self.running_osds = set()
+        self.parse(output)
+
+    def parse(self, output):
+        section = None
+        for line in output.splitlines():
+            line = line.strip()
+            if line.startswith('@'):
+                section = line[1:]
+                continue
+            fields = line.split()
+            if not fields:
+                continue
+            if section == 'mounts' and len(fields) >= 3:
+                self.mounts.append((fields[0], fields[1], fields[2]))
+            elif section == 'partitions' and len(fields) == 4 and \
+                    fields[0].isdigit():
+                self.partitions.add(fields[3])
+            elif section == 'journals' and len(fields) == 2:
+                self.journals[fields[0]] = fields[1]
+            elif section == 'osds':
+                match = OSD_ID_RE.search(line)
+                if match:
+                    self.running_osds.add(match.group(1))
+
+    def disk_mounts(self, disk):
+        """Mounts of any partition of disk, eg. /dev/sdb."""
+        return [mount for mount in self.mounts if disk in mount[0]]
+
+    def is_mounted(self, disk):
+        return len(self.disk_mounts(disk)) != 0
+
+    def osd_mount(self, disk):
+        """OSD mount point on disk, None if the disk has no OSD mounted."""
+        for device, mount_point, fs_type in self.disk_mounts(disk):
+            if 'osd' in mount_point and 'tmp' not in mount_point:
+                return mount_point
+        return None
+
+    def osd_id(self, disk):
+        mount_point = self.osd_mount(disk)
+        if mount_point is None:
+            return None
+        return mount_point.split('-')[1]
+
+    def is_osd_running(self, osd_id):
+        return osd_id in self.running_osds
+
+    def osd_devices(self):
+        """(osd id, device) of the running OSDs which are mounted."""
+        devices = []
+        for osd_id in sorted(self.running_osds, key=int):
+            for device, mount_point, fs_type in self.mounts:
+                if mount_point.endswith('/ceph-%s' % osd_id):
+                    devices.append((osd_id, device))
+                    break
+        return devices
+
+    def is_journal_used(self, journal_disk):
+        """True if any mounted OSD has its journal on journal_disk."""
+        journal_name = journal_disk.split('/')[-1]
+        for journal in self.journals.values():
+            if journal_name in journal:
+                return True
+        return False
+
+
+def collect_inventory(host, token):
+    """Collects the StorageInventory of host with a single remote call."""
+    with settings(host_string='root@%s' % host, password=token):
+        output = run(INVENTORY_SCRIPT, shell='/bin/bash')
+    return StorageInventory(output)
@@ -3,19 +3,17 @@
 import argparse
 import ConfigParser
 
-import platform
 import os
 import sys
 import time
-import netaddr
 import subprocess
 from pprint import pformat
 
 import tempfile
-from fabric.api import local, env, run
-from fabric.operations import get, put
-from fabric.context_managers import lcd, settings
 from distutils.version import LooseVersion
+from contrail_provisioning.common import platform_info
+from contrail_provisioning.common.lazy import local, run, settings, get, \
+    netaddr
 
 sys.path.insert(0, os.getcwd())
 
@@ -40,7 +38,7 @@ class SetupNFSLivem(object):
     LIBERTY_VERSION = 2016
     # Denotes the OS type whether Ubuntu or Centos.
     global pdist
-    pdist = platform.dist()[0]
+    pdist = platform_info.dist()[0]
     global nova_mount
     nova_mount='/var/lib/nova/instances/global'
     global contrail_nova
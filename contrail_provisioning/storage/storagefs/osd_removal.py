@@ -0,0 +1,135 @@
+#!/usr/bin/python
+#
+# Copyright (c) 2016 Juniper Networks, Inc. All rights reserved.
+#
+"""Removal of a set of Ceph OSDs with a single data movement.
+
+All the OSDs to remove, from any number of disks or hosts, get their
+crush weight set to 0 together while rebalancing is held off, so data
+moves off them once. When their placement groups are clean again the
+OSDs are stopped and removed with batched ceph calls, the hosts being
+cleaned up in parallel. If the data did not move off in time the OSDs
+are left in with a crush weight of 0, unless the removal is forced.
+"""
+
+import time
+
+from contrail_provisioning.common.lazy import local
+
+from contrail_provisioning.common.parallel import run_on_hosts, \
+        run_host_script
+from contrail_provisioning.storage.storagefs.rolling_restart import \
+        ceph_json, pgs_of_osds, unclean_pgs
+
+POLL_INTERVAL = 5
+DRAIN_TIMEOUT = 3600
+
+
+def ceph_batch(commands):
+    """Runs the ceph commands in one privileged shell, stopping at the
+    first failure.
+
+    The ceph CLI has no multi-OSD form of crush reweight, crush remove or
+    auth del, each of them is still one monitor command, but they are
+    issued together instead of one sudo and shell per OSD.
+    """
+    if commands:
+        local('sudo sh -c "%s"' % ' && '.join('ceph %s' % command
+                                              for command in commands))
+
+
+class OsdRemoval(object):
+    """Drains and removes OSDs.
+
+    host_osds maps (host, token) to the [(osd id, disk)] to remove there,
+    stop_cmd is formatted with an osd id. With force the OSDs are removed
+    even if they still serve PGs once drain_timeout is over, which loses
+    the data of which they hold the last copy.
+    """
+
+    def __init__(self, host_osds, stop_cmd, drain_timeout=DRAIN_TIMEOUT,
+                 force=False):
+        self.host_osds = dict((host, osds) for host, osds in
+                              host_osds.items() if osds)
+        self.stop_cmd = stop_cmd
+        self.drain_timeout = drain_timeout
+        self.force = force
+        self.osd_ids = sorted(set(osd_id for osds in self.host_osds.values()
+                                  for osd_id, _ in osds), key=int)
+
+    def drain(self):
+        """Moves the data off all the OSDs with one rebalance."""
+        local('sudo ceph osd set norebalance')
+        try:
+            ceph_batch(['osd crush reweight osd.%s 0' % osd_id
+                        for osd_id in self.osd_ids])
+        finally:
+            local('sudo ceph osd unset norebalance')
+
+    def wait_for_drain(self):
+        """Waits for the OSDs to serve no PG and the PGs to be clean.
+
+        Returns the (PGs still mapped to the OSDs, unclean PGs) left when
+        drain_timeout is over, both empty once drained.
+        """
+        deadline = time.time() + self.drain_timeout
+        waiting = None
+        while True:
+            pg_dump = ceph_json('pg dump pgs_brief')
+            mapped = pgs_of_osds(pg_dump, self.osd_ids)
+            unclean = unclean_pgs(pg_dump)
+            if (not mapped and not unclean) or time.time() > deadline:
+                return mapped, unclean
+            status = (len(mapped), len(unclean))
+            if status != waiting:
+                print 'waiting for %s pgs to move off the osds and %s pgs ' \
+                      'to be active+clean' %(status)
+                waiting = status
+            time.sleep(POLL_INTERVAL)
+
+    def run_on_all_hosts(self, host_commands):
+        entries = [(host, token, host_commands(osds))
+                   for (host, token), osds in self.host_osds.items()]
+        failed = [host for host, succeeded in
+                  run_on_hosts(run_host_script, entries, len(entries))
+                  if not succeeded]
+        if failed:
+            raise RuntimeError('OSD removal failed on %s' % ', '.join(failed))
+
+    def remove(self):
+        ids = ' '.join(self.osd_ids)
+        local('sudo ceph osd out %s' % ids)
+        # The stop command fails for daemons which are not running
+        self.run_on_all_hosts(lambda osds: ['%s || true' %
+                                            (self.stop_cmd % osd_id)
+                                            for osd_id, _ in osds])
+        local('sudo ceph osd down %s' % ids)
+        ceph_batch(sum([['osd crush remove osd.%s' % osd_id,
+                         'auth del osd.%s' % osd_id]
+                        for osd_id in self.osd_ids], []) +
+                   ['osd rm %s' % ids])
+        self.run_on_all_hosts(lambda osds: sum(
+            [['umount /var/lib/ceph/osd/ceph-%s || true' % osd_id,
+              'parted -s %s mklabel gpt > /dev/null 2>&1' % disk]
+             for osd_id, disk in osds], []))
+
+    def run(self):
+        if not self.osd_ids:
+            return
+        print 'removing osds %s' %(' '.join(self.osd_ids))
+        self.drain()
+        mapped, unclean = self.wait_for_drain()
+        if mapped or unclean:
+            error = 'osds %s not drained after %s seconds' %(
+                        ' '.join(self.osd_ids), self.drain_timeout)
+            if mapped:
+                error += ', pgs still mapped to them: %s' %(
+                             ' '.join(sorted(mapped)))
+            if unclean:
+                error += ', pgs not active+clean: %s' %(
+                             ' '.join(sorted(unclean)))
+            if not self.force:
+                raise RuntimeError('%s. The osds are left in with a crush '
+                                   'weight of 0' % error)
+            print '%s, removing them anyway (forced)' % error
+        self.remove()
@@ -0,0 +1,201 @@
+#!/usr/bin/python
+#
+# Copyright (c) 2016 Juniper Networks, Inc. All rights reserved.
+#
+"""Rolling restarts of Ceph monitors and OSDs.
+
+OSDs are grouped by crush failure domain (host or chassis). With noout
+set, every OSD of a failure domain is restarted at once, hosts in
+parallel. Then only the placement groups those OSDs served are waited
+on to get back to active+clean, instead of the whole cluster health.
+"""
+
+import re
+import json
+import time
+
+from contrail_provisioning.common.lazy import local, run, settings
+
+from contrail_provisioning.common.parallel import run_on_hosts, \
+        run_host_script
+
+POLL_INTERVAL = 2
+# Seconds for restarted OSDs to be up with their PGs clean again, and for
+# a restarted monitor to rejoin the quorum
+CLEAN_TIMEOUT = 3600
+QUORUM_TIMEOUT = 600
+
+DAEMON_ID_RE = re.compile(r'(?:--id|-i)[ =](\S+)')
+
+
+def ceph_json(command):
+    """Runs a ceph command on the storage master, returns its JSON output."""
+    output = local('sudo ceph %s -f json 2>/dev/null' % command, capture=True)
+    return json.loads(output)
+
+
+def osd_failure_domains(osd_tree, domain_type):
+    """Maps osd id -> failure domain name from "ceph osd tree" output.
+
+    OSDs which are not under a bucket of domain_type make a failure domain
+    of their own.
+    """
+    nodes = dict((node['id'], node) for node in osd_tree.get('nodes', []))
+    parents = {}
+    for node in nodes.values():
+        for child in node.get('children', []):
+            parents[child] = node['id']
+    domains = {}
+    for node in nodes.values():
+        if node.get('type') != 'osd':
+            continue
+        domain = node['name']
+        current = node['id']
+        while current in parents:
+            current = parents[current]
+            if nodes[current].get('type') == domain_type:
+                domain = nodes[current]['name']
+                break
+        domains[str(node['id'])] = domain
+    return domains
+
+
+def _pg_stats(pg_dump):
+    # Older releases return the list directly, newer ones wrap it
+    if isinstance(pg_dump, dict):
+        return pg_dump.get('pg_stats', [])
+    return pg_dump
+
+
+def pgs_of_osds(pg_dump, osd_ids):
+    """Ids of the PGs with any of osd_ids in their up or acting set."""
+    osd_ids = set(int(osd_id) for osd_id in osd_ids)
+    return set(pg['pgid'] for pg in _pg_stats(pg_dump)
+               if osd_ids & set(pg.get('up', []) + pg.get('acting', [])))
+
+
+def unclean_pgs(pg_dump, pgids=None):
+    """Ids of the PGs, of pgids or all, which are not active+clean."""
+    unclean = set()
+    for pg in _pg_stats(pg_dump):
+        if pgids is not None and pg['pgid'] not in pgids:
+            continue
+        states = pg['state'].split('+')
+        if 'active' not in states or 'clean' not in states:
+            unclean.add(pg['pgid'])
+    return unclean
+
+
+def down_osds(osd_dump, osd_ids):
+    up = set(str(osd['osd']) for osd in osd_dump.get('osds', [])
+             if osd.get('up'))
+    return set(osd_ids) - up
+
+
+class OsdRollingRestart(object):
+    """Restarts OSDs failure domain by failure domain.
+
+    host_osds maps (host, token) to the ids of the OSDs running there,
+    restart_cmd is formatted with an osd id.
+    """
+
+    def __init__(self, host_osds, restart_cmd, domain_type='host',
+                 max_domains=1, clean_timeout=CLEAN_TIMEOUT):
+        self.host_osds = host_osds
+        self.restart_cmd = restart_cmd
+        self.domain_type = domain_type
+        self.max_domains = max(1, max_domains)
+        self.clean_timeout = clean_timeout
+
+    def plan(self):
+        """Returns the failure domains as [(domain, set of osd ids)]."""
+        domain_of = osd_failure_domains(ceph_json('osd tree'),
+                                        self.domain_type)
+        domains = {}
+        for osd_ids in self.host_osds.values():
+            for osd_id in osd_ids:
+                domain = domain_of.get(osd_id, 'osd.%s' % osd_id)
+                domains.setdefault(domain, set()).add(osd_id)
+        return sorted(domains.items())
+
+    def wait_for_clean(self, osd_ids, pgids):
+        """Raises if the OSDs are not up with their PGs clean within
+        clean_timeout, run() then unsets noout before failing.
+        """
+        deadline = time.time() + self.clean_timeout
+        waiting = None
+        while True:
+            down = down_osds(ceph_json('osd dump'), osd_ids)
+            unclean = set()
+            if not down:
+                unclean = unclean_pgs(ceph_json('pg dump pgs_brief'), pgids)
+                if not unclean:
+                    return
+            if time.time() > deadline:
+                raise RuntimeError('%s osds still down and %s pgs not '
+                                   'active+clean after %s seconds'
+                                   % (len(down), len(unclean),
+                                      self.clean_timeout))
+            status = (len(down), len(unclean))
+            if status != waiting:
+                print 'waiting for %s osds to come up and %s pgs to be ' \
+                      'active+clean' %(status)
+                waiting = status
+            time.sleep(POLL_INTERVAL)
+
+    def restart_domains(self, domains):
+        osd_ids = set()
+        for domain, domain_osds in domains:
+            osd_ids |= domain_osds
+        # PGs are looked up before the restart, the OSDs drop out of the
+        # up/acting sets while they are down.
+        pgids = pgs_of_osds(ceph_json('pg dump pgs_brief'), osd_ids)
+        entries = []
+        for (host, token), host_osds in self.host_osds.items():
+            commands = [self.restart_cmd % osd_id
+                        for osd_id in sorted(host_osds & osd_ids, key=int)]
+            if commands:
+                entries.append((host, token, commands))
+        print 'restarting failure domain(s) %s: osds %s' %(
+                ', '.join([domain for domain, _ in domains]),
+                ' '.join(sorted(osd_ids, key=int)))
+        failed = [host for host, succeeded in
+                  run_on_hosts(run_host_script, entries, len(entries))
+                  if not succeeded]
+        if failed:
+            raise RuntimeError('Failed to restart ceph-osd on %s'
+                               % ', '.join(failed))
+        self.wait_for_clean(osd_ids, pgids)
+
+    def run(self):
+        domains = self.plan()
+        if not domains:
+            return
+        local('sudo ceph osd set noout')
+        try:
+            for index in range(0, len(domains), self.max_domains):
+                self.restart_domains(domains[index:index + self.max_domains])
+        finally:
+            local('sudo ceph osd unset noout')
+
+
+def wait_for_mon_quorum(mon, timeout=QUORUM_TIMEOUT):
+    deadline = time.time() + timeout
+    while mon not in ceph_json('quorum_status').get('quorum_names', []):
+        if time.time() > deadline:
+            raise RuntimeError('ceph-mon %s did not rejoin quorum within %s '
+                               'seconds' % (mon, timeout))
+        time.sleep(POLL_INTERVAL)
+
+
+def restart_monitor(host, token, restart_cmd):
+    """Restarts the monitor of host and waits for it to rejoin quorum."""
+    with settings(host_string='root@%s' % host, password=token):
+        match = DAEMON_ID_RE.search(run('ps -eo args | grep ceph-mon | '
+                                        'grep -v grep | head -n 1'))
+        if not match:
+            return
+        mon = match.group(1)
+        run(restart_cmd % mon)
+    print 'waiting for ceph-mon %s to rejoin quorum' %(mon)
+    wait_for_mon_quorum(mon)
@@ -3,14 +3,12 @@
 import argparse
 import ConfigParser
 
-import platform
 import os
 import sys
 import time
 import re
 import string
 import socket
-import netifaces, netaddr
 import subprocess
 import fnmatch
 import struct
@@ -18,23 +16,30 @@ import shutil
 import json
 from pprint import pformat
 import xml.etree.ElementTree as ET
-import platform
 import commonport
 import StringIO
 
 import tempfile
-from fabric.api import local, env, sudo, run, settings
-from fabric.operations import get, put
-from fabric.context_managers import lcd, settings
-from fabric.api import local, env, run
-from fabric.operations import get, put
-from fabric.context_managers import lcd, settings
+from contrail_provisioning.common.lazy import local, run, sudo, settings, \
+    get, put
+from contrail_provisioning.common import platform_info
+from contrail_provisioning.common.hosts_file import converge_hosts
 from contrail_provisioning.storage.storagefs.ceph_utils import SetupCephUtils
+from contrail_provisioning.storage.storagefs.inventory import collect_inventory
+from contrail_provisioning.storage.storagefs.cinder_types import \
+        VolumeTypeApi, reconcile_volume_types
+from contrail_provisioning.storage.storagefs.rolling_restart import \
+        OsdRollingRestart, restart_monitor
+from contrail_provisioning.storage.storagefs.osd_removal import OsdRemoval
+from contrail_provisioning.storage.storagefs.syslog_forward import \
+        configure_forwarding, unconfigure_forwarding, set_collector_syslog_port
+from contrail_provisioning.storage.storagefs.virsh_secrets import \
+        read_ceph_key, reconcile_local_secrets, reconcile_host_secrets
 from distutils.version import LooseVersion
 
 sys.path.insert(0, os.getcwd())
 
-(PLATFORM, VERSION, EXTRA) = platform.linux_distribution()
+(PLATFORM, VERSION, EXTRA) = platform_info.linux_distribution()
 class SetupCeph(object):
 
     # Added global defines for the files.
@@ -142,7 +147,7 @@ class SetupCeph(object):
     LIBERTY_VERSION = 2016
     # Denotes the OS type whether Ubuntu or Centos.
     global pdist
-    pdist = platform.dist()[0]
+    pdist = platform_info.dist()[0]
     # Maximum monitors to be created
     global MAX_MONS
     MAX_MONS = 3
@@ -470,44 +475,16 @@ class SetupCeph(object):
                                             "mon cluster log to syslog" true'
                                             %(CEPH_CONFIG_FILE))
 
-        # enable server:port syslog remote logging
-        for entries in self._args.collector_hosts:
-            syslog_present = local('grep "*.* @%s:%s" %s | wc -l'
-                                    %(entries, commonport.SYSLOG_LOGPORT,
-                                    SYSLOGD_CONF), capture=True)
-            if syslog_present == '0':
-                local('echo "*.* @%s:%s" >> %s'
-                                    %(entries, commonport.SYSLOG_LOGPORT,
-                                    SYSLOGD_CONF))
-
-        # find and replace syslog port in collector
-        for entries, entry_token in zip(self._args.collector_hosts,
-                                            self._args.collector_host_tokens):
-            with settings(host_string = 'root@%s' %(entries),
-                                            password = entry_token):
-                syslog_port = run('grep "# syslog_port=-1" %s | wc -l'
-                                            %(COLLECTOR_CONF))
-                if syslog_port == '1':
-                    run('cat %s | sed "s/# syslog_port=-1/syslog_port=4514/" > \
-                                            %s; mv %s %s' %(COLLECTOR_CONF,
-                                            COLLECTOR_TMP_CONF,
-                                            COLLECTOR_TMP_CONF,
-                                            COLLECTOR_CONF))
-
-                syslog_port = run('grep "syslog_port=-1" %s | wc -l'
-                                            %(COLLECTOR_CONF))
-                if syslog_port == '1':
-                    run('cat %s | sed "s/syslog_port=-1/syslog_port=4514/" > \
-                                            %s; mv %s %s' %(COLLECTOR_CONF,
-                                            COLLECTOR_TMP_CONF,
-                                            COLLECTOR_TMP_CONF,
-                                            COLLECTOR_CONF))
-
-                # restart collector after syslog port change
-                run('service contrail-collector restart')
-
-        # restart rsyslog service after remote logging enabled
-        local('service rsyslog restart')
+        # enable server:port syslog remote logging with a drop-in
+        # holding all the collectors, replacing the rules older
+        # releases appended to the default config.
+        # rsyslog is only restarted if the forwarding changed.
+        configure_forwarding(self._args.collector_hosts,
+                                    commonport.SYSLOG_LOGPORT, SYSLOGD_CONF)
+
+        # set the syslog port in all the collectors
+        set_collector_syslog_port(zip(self._args.collector_hosts,
+                                    self._args.collector_host_tokens), True)
 
         return
     #end do_configure_syslog()
@@ -515,34 +492,12 @@ class SetupCeph(object):
     # Funtion to remove the syslog configuration
     def unconfigure_syslog(self):
             # disable server:port syslog remote logging
-            for entries in self._args.collector_hosts:
-                syslog_present = local('grep "*.* @%s:%s" %s | wc -l'
-                                                %(entries,
-                                                commonport.SYSLOG_LOGPORT,
-                                                SYSLOGD_CONF), capture=True)
-                if syslog_present == '1':
-                    local('sed -i "/*.* @%s:%s/d" %s'
-                                                %(entries,
-                                                commonport.SYSLOG_LOGPORT,
-                                                SYSLOGD_CONF))
-                    # restart rsyslog service after remote logging enabled
-                    local('service rsyslog restart')
-
-            # find and replace syslog port to default in collector
-            for entries, entry_token in zip(self._args.collector_hosts,
-                                            self._args.collector_host_tokens):
-                with settings(host_string = 'root@%s' %(entries),
-                                                password = entry_token):
-                    syslog_port = run('grep "syslog_port=4514" %s | wc -l'
-                                                %(COLLECTOR_CONF))
-                    if syslog_port == '1':
-                        run('cat %s | sed "s/syslog_port=4514/syslog_port=-1/" >\
-                                                %s; mv %s %s' %(COLLECTOR_CONF,
-                                                COLLECTOR_TMP_CONF,
-                                                COLLECTOR_TMP_CONF,
-                                                COLLECTOR_CONF))
-                        # restart collector after syslog default port change
-                        run('service contrail-collector restart')
+            unconfigure_forwarding(commonport.SYSLOG_LOGPORT, SYSLOGD_CONF,
+                                   self._args.collector_hosts)
+
+            # reset the syslog port to default in all the collectors
+            set_collector_syslog_port(zip(self._args.collector_hosts,
+                                    self._args.collector_host_tokens), False)
     #end unconfigure_syslog()
 
     def do_patch_cinder(self):
@@ -788,46 +743,22 @@ class SetupCeph(object):
     # the password during the ssh login.
     def do_ssh_config(self):
         storage_master_hostname = ''
-        # Add all the storage-compute hostnames/ip to the /etc/host of master
-        for entries, entry_token in zip(self._args.storage_hosts,
-                                            self._args.storage_host_tokens):
-            with settings(host_string = 'root@%s' %(entries),
-                                            password = entry_token):
-                if self._args.storage_hostnames[0] == \
-                                self._args.orig_hostnames[0]:
-                    for hostname, host_ip in zip(self._args.storage_hostnames,
-                                                self._args.storage_hosts):
-                        run('cat /etc/hosts | grep -v -w %s$ > /tmp/hosts; \
-                            a=`cat /tmp/hosts | grep -w "%s[ ]*%s" | wc -l`; \
-                            if [ "$a" == "0" ]; then echo %s %s >> /tmp/hosts; fi ; \
-                            cp -f /tmp/hosts /etc/hosts' \
-                            % (hostname, host_ip, hostname, host_ip, hostname))
-
-
-                for hostname, host_ip, orig_hostname in zip(
+        # The storage-compute hostnames/ip are converged into a managed
+        # block of /etc/hosts on every storage host, in parallel.
+        host_entries = []
+        for hostname, host_ip, orig_hostname in zip(
                                             self._args.storage_hostnames,
                                             self._args.storage_hosts,
                                             self._args.orig_hostnames):
-                    if host_ip == self._args.storage_master:
-                        storage_master_hostname = hostname
-                    run('cat /etc/hosts | grep -v -w %s > /tmp/hosts'
-                                %(host_ip))
-                    match = run('cat /etc/hosts | grep -w "%s"'
-                                %(host_ip), warn_only=True)
-                    if match == '':
-                        match = '%s %s'%(host_ip, hostname)
-                    if run('echo "%s" | grep -e %s[[:blank:]] -e %s$ | wc -l '
-                                %(match, hostname, hostname)) == '0':
-                        match = '%s %s' %(match, hostname)
-                    if run('echo "%s" | grep -e %s[[:blank:]] -e %s$ | wc -l '
-                                %(match, orig_hostname, orig_hostname)) == '0':
-                        match = '%s %s' %(match, orig_hostname)
-                    run('echo "%s" >> /tmp/hosts' %(match))
-                    run('cp -f /tmp/hosts /etc/hosts')
-                    # Check for chkconfig and add if not present
-                    chkconfig = run('ls /sbin/chkconfig 2>/dev/null | wc -l')
-                    if chkconfig == '0':
-                        run('ln -s /bin/true /sbin/chkconfig')
+            if host_ip == self._args.storage_master:
+                storage_master_hostname = hostname
+            host_entries.append((host_ip, [hostname, orig_hostname]))
+        # Check for chkconfig and add if not present
+        chkconfig_cmds = ['[ -e /sbin/chkconfig ] || '
+                          'ln -s /bin/true /sbin/chkconfig']
+        converge_hosts(zip(self._args.storage_hosts,
+                            self._args.storage_host_tokens),
+                        host_entries, 'storage', chkconfig_cmds)
 
         # Generate public id using ssh-keygen and first add the key to the
         # authorized keys file and the known_hosts file in the master itself.
@@ -1361,26 +1292,25 @@ class SetupCeph(object):
         return new_storage_disk_list
     #end get_storage_disk_list()
 
+    # Function to get the storage inventory (mounts, partitions, OSD
+    # journals and running OSDs) of a host. The inventory is collected
+    # with a single remote call and cached until refresh is requested.
+    def get_storage_inventory(self, entry, entry_token, refresh = False):
+        if refresh or entry not in self.storage_inventory:
+            self.storage_inventory[entry] = collect_inventory(entry,
+                                                              entry_token)
+        return self.storage_inventory[entry]
+    #end get_storage_inventory()
+
     # Function to check if journal disk is used already.
     # Returns TRUE if used
     # Returns FALSE if not used
     def do_journal_usage_check(self, entry, entry_token, journal_disk):
-        with settings(host_string = 'root@%s' %(entry), password = entry_token):
-            # Loop over the OSDs running and check the journal file
-            # in each OSD and check if the journal is same as the input
-            # 'journal_disk'
-            num_osds = int(run('cat /proc/mounts | grep osd | wc -l'))
-            journal_disk = journal_disk.split('/')[2]
-            while num_osds != 0:
-                osd_dir = run('cat /proc/mounts | grep osd | tail -n %s | \
-                                head -n 1 | awk \'{print $2 }\'' %(num_osds))
-                journal_uuid = run('ls -l %s/journal | awk \'{print $11 }\''
-                                    %(osd_dir))
-                journal_used = run('ls -l %s | grep %s | wc -l'
-                                    %(journal_uuid, journal_disk))
-                if journal_used != '0':
-                    return TRUE
-                num_osds -= 1
+        # Check the journal of each mounted OSD against the input
+        # 'journal_disk'
+        inventory = self.get_storage_inventory(entry, entry_token)
+        if inventory.is_journal_used(journal_disk):
+            return TRUE
         return FALSE
 
     #end do_journal_usage_check
@@ -1420,60 +1350,47 @@ class SetupCeph(object):
     # abort.
     # TODO: Try to recover OSD when drive is mounted for Ceph and ceph-osd
     #       is not running
-    def do_osd_check(self, ceph_disk_entry):
+    def do_osd_check(self, ceph_disk_entry, refresh = False):
         ohostname = ceph_disk_entry.split(':')[0]
         for hostname, entry, entry_token in \
                                         zip(self._args.storage_hostnames,
                                             self._args.storage_hosts,
                                             self._args.storage_host_tokens):
             if ohostname == hostname:
-                with settings(host_string = 'root@%s' %(entry),
-                                            password = entry_token):
+                inventory = self.get_storage_inventory(entry, entry_token,
+                                                       refresh)
+
+                # Wait for disk to be mounted during osd-start
+                osd_disk = ceph_disk_entry.split(':')[1]
+                retry = 0
+                while not inventory.is_mounted(osd_disk):
+                    retry += 1
+                    if retry > 2:
+                        break
+                    time.sleep(3)
+                    inventory = self.get_storage_inventory(entry,
+                                                    entry_token, True)
 
-                    # Wait for disk to be mounted during osd-start
-                    osd_disk = ceph_disk_entry.split(':')[1]
-                    retry = 0
-                    while True:
-                        osd_mounted = run('sudo cat /proc/mounts | grep %s | \
-                                            wc -l' %(osd_disk))
-                        if osd_mounted == '0':
-                            retry += 1
-                            if retry > 2:
-                                break
-                            time.sleep(3)
-                        else:
-                            break
+                osdnum = inventory.osd_id(osd_disk)
+                if osdnum is not None:
+                    if not inventory.is_osd_running(osdnum):
+                        print 'Ceph OSD process not running for disk %s in \
+                                        host %s' %(osd_disk, entry)
+                        sys.exit(-1)
 
-                    osd_running = run('sudo cat /proc/mounts | grep osd | \
-                                            grep %s | wc -l' %(osd_disk))
-                    if osd_running != '0':
-                        osddet = run('sudo mount | grep %s | grep -v grep | \
-                                            grep -v tmp | head -n 1 | \
-                                            awk \'{ print $3 }\''
-                                            %(osd_disk), shell='/bin/bash')
-                        osdnum = osddet.split('-')[1]
-                        pr_running = run('sudo ps -ef | grep ceph-osd | \
-                                            grep -w "%s %s" | grep -v grep | \
-                                            wc -l' %(CONTRAIL_STORAGE_CEPH_ID, osdnum))
-                        if pr_running == '0':
-                            print 'Ceph OSD process not running for disk %s in \
-                                            host %s' %(osd_disk, entry)
-                            sys.exit(-1)
-
-                        return TRUE
-                    else:
-                        osd_mounted = run('sudo cat /proc/mounts | grep %s | \
-                                            wc -l' %(osd_disk))
-                        if osd_mounted != '0':
-                            print 'Drive %s in host %s is in use, \
-                                            Cannot create OSD' %(osd_disk, entry)
-                            sys.exit(-1)
+                    return TRUE
+                else:
+                    if inventory.is_mounted(osd_disk):
+                        print 'Drive %s in host %s is in use, \
+                                        Cannot create OSD' %(osd_disk, entry)
+                        sys.exit(-1)
         return FALSE
     #end do_osd_check()
 
     # Function to create a OSD.
     # Checks if the OSD is already running, if not create ZAP/Create OSD
     def do_osd_create(self):
+        import netaddr
         global osd_count
 
         disk_list = self.get_storage_disk_list()
@@ -1510,7 +1427,7 @@ class SetupCeph(object):
                 local('cd /etc/ceph && sudo ceph-deploy --overwrite-conf osd create %s'
                         %(ceph_disk_entry))
                 time.sleep(10)
-                osd_running = self.do_osd_check(ceph_disk_entry)
+                osd_running = self.do_osd_check(ceph_disk_entry, True)
                 if osd_running == FALSE:
                     print 'OSD not running for %s' %(ceph_disk_entry)
                     sys.exit(-1)
@@ -1577,6 +1494,7 @@ class SetupCeph(object):
 
     # Function to create monitor if its not already running
     def do_monitor_create(self):
+        import netaddr
         # TODO: use mon list to create the mons
         global ceph_mon_hosts_list
         for hostname, entry, entry_token in \
@@ -2087,47 +2005,33 @@ class SetupCeph(object):
     # Function for Virsh/Cinder configurations for Ceph
     def do_configure_virsh_cinder_rbd(self):
 
-        # Check for secret keys if present for volumes pool.
-        # Virsh secret-list will list all the secrets.
-        # run dumpxml and check if has client.volumes
-        # If the client.volumes secret is already present,
-        # then reuse the same secret
-        secret_present = '0'
-        line_num = 1
-        while True:
-            virsh_secret = local('virsh secret-list  2>&1 | \
-                                        awk \'{print $1}\' | \
-                                        awk \'NR > 2 { print }\' | \
-                                        tail -n +%d | head -n 1'
-                                        %(line_num), capture=True)
-            if virsh_secret != "":
-                secret_present = local('virsh secret-dumpxml %s | \
-                                        grep -w "client.volumes" | \
-                                        wc -l' %(virsh_secret), capture=True)
-                if secret_present != '0':
-                    break
-            else:
-                break
-            line_num += 1
-
-        # If the key is not present, create it.
-        # Set the secret value for the key with the keyring vlaue
-        # Restart libvirt service
-        if secret_present == '0':
-            local('echo "<secret ephemeral=\'no\' private=\'no\'> \
-                            <usage type=\'ceph\'> \
-                                <name>client.volumes secret</name> \
-                            </usage> \
-                            </secret>" > secret.xml')
-            virsh_secret = local('virsh secret-define --file secret.xml 2>&1 | \
-                                                cut -d " " -f 2', capture=True)
-        volume_keyring_list = local('cat %s | grep key'
-                                            %(CEPH_VOLUME_KEYRING),
-                                            capture=True)
-        volume_keyring = volume_keyring_list.split(' ')[2]
-        local('virsh secret-set-value %s --base64 %s'
-                                                %(virsh_secret,volume_keyring))
-        local('sudo service libvirt-bin restart')
+        # Libvirt secrets are needed for client.volumes and, with
+        # hdd/ssd pools, for the client.<pool> of every pool.
+        # The secrets of each host are collected once and only the
+        # missing or mismatched ones are defined/updated.
+        # The storage master decides on the secret uuids (reusing the
+        # existing secrets) and the other storage hosts follow it.
+        multi_pool = self.is_multi_pool_disabled() == FALSE or \
+                        self.is_ssd_pool_disabled() == FALSE
+        secret_keys = {'volumes': read_ceph_key(CEPH_VOLUME_KEYRING)}
+        if multi_pool:
+            for pool_name in ceph_pool_list:
+                secret_keys[pool_name] = read_ceph_key(
+                                        '/etc/ceph/client.%s.keyring'
+                                        %(pool_name))
+        secret_uuids = {}
+        if reconcile_local_secrets(secret_keys, secret_uuids):
+            local('sudo service libvirt-bin restart')
+        for entries, entry_token in zip(self._args.storage_hosts,
+                                            self._args.storage_host_tokens):
+            if entries != self._args.storage_master:
+                reconcile_host_secrets(entries, entry_token, secret_keys,
+                                            secret_uuids)
+        print 'libvirt secrets: %s' %(', '.join(['client.%s=%s'
+                                            %(client, secret_uuids[client])
+                                            for client in
+                                            sorted(secret_uuids)]))
+        virsh_secret = secret_uuids['volumes']
 
         # Cinder configuration for rbd-disk for the volume pool
         local('sudo openstack-config --set %s rbd-disk volume_driver \
@@ -2167,50 +2071,6 @@ class SetupCeph(object):
                                         volume_backend_name RBD'
                                         %(CINDER_CONFIG_FILE))
 
-        # Check for the virsh secret in all the storage-compute nodes.
-        # If not present, add it.
-        for entries, entry_token in zip(self._args.storage_hosts,
-                                            self._args.storage_host_tokens):
-            if entries != self._args.storage_master:
-                with settings(host_string = 'root@%s' %(entries),
-                                            password = entry_token):
-                    # Virsh secret-list will list all the secrets.
-                    # run dumpxml and check if has client.volumes
-                    # If the client.volumes secret is already present,
-                    # then reuse the same secret
-                    same_secret = 0
-                    line_num = 1
-                    while True:
-                        virsh_unsecret = run('virsh secret-list  2>&1 | \
-                                                awk \'{print $1}\' | \
-                                                awk \'NR > 2 { print }\' | \
-                                                tail -n +%d | head -n 1'
-                                                %(line_num))
-                        if virsh_unsecret != "":
-                            if virsh_unsecret == virsh_secret:
-                                same_secret = 1
-                                break
-                            vol_present = run('virsh secret-dumpxml %s | \
-                                                    grep -w "client.volumes" | \
-                                                    wc -l' %(virsh_unsecret))
-                            if vol_present != '0':
-                                run('virsh secret-undefine %s' %(virsh_unsecret))
-                        else:
-                            break
-                        line_num += 1
-
-                    # If secret is not present, create new secret
-                    # Set the secret with the keyring
-                    if same_secret == 0:
-                        run('echo "<secret ephemeral=\'no\' private=\'no\'> \
-                                    <uuid>%s</uuid><usage type=\'ceph\'> \
-                                    <name>client.volumes secret</name> \
-                                    </usage> \
-                                    </secret>" > secret.xml' % (virsh_secret))
-                        run('virsh secret-define --file secret.xml')
-                    run('virsh secret-set-value %s --base64 %s'
-                                    %(virsh_secret,volume_keyring))
-
         # Cinder Backend Configuration
         # Based on the multipool configuration, configure the Backend.
         # add it in the storage-master and all other openstack nodes.
@@ -2243,53 +2103,10 @@ class SetupCeph(object):
                                             %(CINDER_CONFIG_FILE, back_end))
 
 
-        if self.is_multi_pool_disabled() == FALSE or \
-                        self.is_ssd_pool_disabled() == FALSE:
-            # Based on the hdd/ssd pools created,
-            # Check for secret keys if present for all the pools.
-            # Virsh secret-list will list all the secrets.
-            # run dumpxml and check if has client.pool
-            # If the client.pool secret is already present,
-            # then reuse the same secret
+        if multi_pool:
+            # Configure cinder backend for all the pools.
             for pool_name in ceph_pool_list:
-                secret_present = '0'
-                line_num = 1
-                while True:
-                    virsh_secret = local('virsh secret-list  2>&1 | \
-                                                awk \'{print $1}\' | \
-                                                awk \'NR > 2 { print }\' | \
-                                                tail -n +%d | head -n 1'
-                                                %(line_num), capture=True)
-                    if virsh_secret != "":
-                        secret_present = local('virsh secret-dumpxml %s | \
-                                                grep -w "client.%s" | wc -l'
-                                                %(virsh_secret, pool_name),
-                                                capture=True)
-                        if secret_present != '0':
-                            break
-                    else:
-                        break
-                    line_num += 1
-
-                # If secret is not present, create new secret
-                # Set the secret with the keyring
-                if secret_present == '0':
-                    local('echo "<secret ephemeral=\'no\' private=\'no\'> \
-                                <usage type=\'ceph\'> \
-                                <name>client.%s secret</name> \
-                                </usage> \
-                                </secret>" > secret_%s.xml'
-                                %(pool_name, pool_name))
-                    virsh_secret = local('virsh secret-define --file \
-                                    secret_%s.xml  2>&1 | \
-                                    cut -d " " -f 2' %(pool_name), capture=True)
-                volume_keyring_list = local('cat /etc/ceph/client.%s.keyring | \
-                                    grep key' %(pool_name), capture=True)
-                volume_keyring = volume_keyring_list.split(' ')[2]
-                local('virsh secret-set-value %s --base64 %s'
-                                    %(virsh_secret,volume_keyring))
-
-                # Configure cinder backend for all the pools.
+                virsh_secret = secret_uuids[pool_name]
                 # Configure the backends in the storage master
                 local('sudo openstack-config --set %s rbd-%s-disk \
                                     volume_driver \
@@ -2333,53 +2150,6 @@ class SetupCeph(object):
                                             rbd-%s-disk volume_backend_name %s'
                                             %(CINDER_CONFIG_FILE, pool_name,
                                             pool_name.upper()))
-                for entries, entry_token in zip(self._args.storage_hosts,
-                                            self._args.storage_host_tokens):
-                    if entries != self._args.storage_master:
-                        with settings(host_string = 'root@%s' %(entries),
-                                            password = entry_token):
-                            # Based on the hdd/ssd pools created,
-                            # Check for secret keys if present for all the pools.
-                            # Virsh secret-list will list all the secrets.
-                            # run dumpxml and check if has the client.pool
-                            # If the client.pool secret is already present,
-                            # then reuse the same secret
-                            same_secret = 0
-                            line_num = 1
-                            while True:
-                                virsh_unsecret = run('virsh secret-list  2>&1 | \
-                                                    awk \'{print $1}\' | \
-                                                    awk \'NR > 2 { print }\' | \
-                                                    tail -n +%d | head -n 1'
-                                                    %(line_num))
-                                if virsh_unsecret != "":
-                                    if virsh_unsecret == virsh_secret:
-                                        same_secret = 1
-                                        break
-                                    vol_present = run('virsh secret-dumpxml %s | \
-                                                        grep -w "client.%s" | \
-                                                        wc -l' %(virsh_unsecret,
-                                                        pool_name))
-                                    if vol_present != '0':
-                                        run('virsh secret-undefine %s'
-                                                        %(virsh_unsecret))
-                                else:
-                                    break
-                                line_num += 1
-
-                            # If secret is not present, create new secret
-                            # Set the secret with the keyring
-                            if same_secret == 0:
-                                run('echo "<secret ephemeral=\'no\' private=\'no\'> \
-                                        <uuid>%s</uuid><usage type=\'ceph\'> \
-                                        <name>client.%s secret</name> \
-                                        </usage> \
-                                        </secret>" > secret_%s.xml'
-                                        %(virsh_secret, pool_name, pool_name))
-                                run('virsh secret-define --file secret_%s.xml'
-                                                    %(pool_name))
-                            run('virsh secret-set-value %s --base64 %s'
-                                                %(virsh_secret,volume_keyring))
         return
     #end do_configure_virsh_cinder_rbd()
 
@@ -2857,56 +2627,37 @@ class SetupCeph(object):
         return
     #end do_configure_glance_rbd()
 
-    # Function to check cluster health
-    def do_cluster_health_check(self):
-        monstate = run('ceph health')
-        monslen = len(monstate)
-        while  monstate.find("HEALTH_OK", 0, monslen) == -1  and \
-               monstate.find("HEALTH_WARN", 0, monslen):
-            time.sleep(2)
-            monstate = run('ceph health')
-            monslen = len(monstate)
-
-
     # Function to restart monitors after package upgrade
+    # Monitors are restarted one at a time, each one has to rejoin the
+    # quorum before the next one is restarted.
     def do_monitor_restarts(self):
+        restart_cmd = 'sudo %s restart ceph-mon%s%%s' %(
+                        CONTRAIL_STORAGE_SYSTEMCTL, CONTRAIL_STORAG_OSD_MON_ID)
         for monhostname in ceph_mon_hosts_list:
             for entries, entry_token, hostname in zip(self._args.storage_hosts, \
                 self._args.storage_host_tokens, self._args.storage_hostnames):
                 if monhostname == hostname:
-                    with settings(host_string = 'root@%s' %(entries),
-                                  password = entry_token):
-                        mon = run('sudo ps -ef | grep ceph-mon | \
-                                  grep -v grep | tr -s \' \' | cut -d \" \" -f 11')
-                        if mon != '':
-                            run('sudo sudo %s restart ceph-mon%s%s' 
-                                    %(CONTRAIL_STORAGE_SYSTEMCTL, 
-                                        CONTRAIL_STORAG_OSD_MON_ID, mon))
-                            print ('checking health after restarting \
-                                    ceph-mon %s' %(mon))
-                            self.do_cluster_health_check()
+                    restart_monitor(entries, entry_token, restart_cmd)
     #end do_monitor_restarts
 
     # Function to restart osds after package upgrade
+    # The OSDs of a crush failure domain (chassis if configured, else
+    # host) are restarted together with noout set, up to
+    # --storage-restart-domains domains at a time.
     def do_osd_restarts(self):
+        host_osds = {}
         for entries, entry_token, hostname in zip(self._args.storage_hosts, \
             self._args.storage_host_tokens, self._args.storage_hostnames):
-                with settings(host_string = 'root@%s' %(entries),
-                              password = entry_token):
-                    osdlist = run('sudo ps -ef | grep ceph-osd | grep -v asok | \
-                                  grep -v grep | tr -s \' \' | cut -d \" \" -f 11')
-                    osdl = StringIO.StringIO(osdlist)
-                    osd = osdl.readline()
-                    while osd:
-                        osd = osd.strip('\n\r')
-                        if osd != '':
-                            run('sudo sudo %s restart ceph-osd%s%s' 
-                                    %(CONTRAIL_STORAGE_SYSTEMCTL, 
-                                        CONTRAIL_STORAG_OSD_MON_ID, osd))
-                            print ('checking health after restarting \
-                                ceph-osd %s' %(osd))
-                            self.do_cluster_health_check()
-                        osd = osdl.readline()
+            inventory = self.get_storage_inventory(entries, entry_token, True)
+            host_osds[(entries, entry_token)] = inventory.running_osds
+        if self.is_chassis_disabled() == TRUE:
+            domain_type = 'host'
+        else:
+            domain_type = 'chassis'
+        restart_cmd = 'sudo %s restart ceph-osd%s%%s' %(
+                        CONTRAIL_STORAGE_SYSTEMCTL, CONTRAIL_STORAG_OSD_MON_ID)
+        OsdRollingRestart(host_osds, restart_cmd, domain_type,
+                          int(self._args.storage_restart_domains)).run()
     #end do_osd_restarts
 
     # Function for first set of restarts.
@@ -3099,20 +2850,13 @@ class SetupCeph(object):
     def do_configure_cinder_types(self):
         global configure_with_ceph
 
+        # Desired cinder type -> volume_backend_name mapping
+        volume_types = []
+
         # Create Cinder type for all Ceph backend
         # Create the default type for volumes pool if not present
         if configure_with_ceph == 1:
-            type_configured = local('(. /etc/contrail/openstackrc ; \
-                                        %s type-list | \
-                                        grep -w ocs-block-disk | \
-                                        wc -l)' %(cinder_command), capture=True)
-            if type_configured == '0':
-                local('(. /etc/contrail/openstackrc ; \
-                                    %s type-create ocs-block-disk)'
-                                    %(cinder_command))
-            local('(. /etc/contrail/openstackrc ; \
-                    %s type-key ocs-block-disk set volume_backend_name=RBD)'
-                    %(cinder_command))
+            volume_types.append(('ocs-block-disk', 'RBD'))
 
         if self.is_multi_pool_disabled() == FALSE or \
                         self.is_ssd_pool_disabled() == FALSE:
@@ -3121,48 +2865,28 @@ class SetupCeph(object):
             for pool_name in ceph_pool_list:
                 # use the hdd-'pool name' (strip volumes_ from
                 # volumes_hdd/volumes_ssd/volumes_hdd_Pool_0/volumes_ssd_Pool_1)
-                type_configured = local('(. /etc/contrail/openstackrc ; \
-                                            %s type-list | \
-                                            grep -w ocs-block-%s-disk | \
-                                            wc -l)' %(cinder_command,
-                                            pool_name[8:]),
-                                            capture=True)
-                if type_configured == '0':
-                    local('(. /etc/contrail/openstackrc ; \
-                        %s type-create ocs-block-%s-disk)' %(cinder_command,
-                            pool_name[8:]))
-                local('(. /etc/contrail/openstackrc ; \
-                        %s type-key ocs-block-%s-disk set volume_backend_name=%s)'
-                        %(cinder_command, pool_name[8:], pool_name.upper()))
+                volume_types.append(('ocs-block-%s-disk' %(pool_name[8:]),
+                                     pool_name.upper()))
 
         # Create cinder type for NFS if not present already
         if create_nfs_disk_volume == 1:
-            type_configured = local('(. /etc/contrail/openstackrc ; \
-                                        %s type-list | \
-                                        grep -w ocs-block-nfs-disk | \
-                                        wc -l)' %(cinder_command), capture=True)
-            if type_configured == '0':
-                local('(. /etc/contrail/openstackrc ; \
-                        %s type-create ocs-block-nfs-disk)' %(cinder_command))
-            local('(. /etc/contrail/openstackrc ; \
-                %s type-key ocs-block-nfs-disk set volume_backend_name=NFS)'
-                %(cinder_command))
+            volume_types.append(('ocs-block-nfs-disk', 'NFS'))
 
         # Create Cinder type for all the LVM backends if not present already
         for lvm_types, lvm_names in zip(cinder_lvm_type_list,
                                         cinder_lvm_name_list):
-            type_configured = local('(. /etc/contrail/openstackrc ; \
-                                        %s type-list | \
-                                        grep -w %s | wc -l)'
-                                        %(cinder_command, lvm_types),
-                                        capture=True)
-            if type_configured == '0':
-                local('(. /etc/contrail/openstackrc ; \
-                                %s type-create %s)'
-                                %(cinder_command, lvm_types))
-            local('(. /etc/contrail/openstackrc ; \
-                                %s type-key %s set volume_backend_name=%s)'
-                                %(cinder_command, lvm_types, lvm_names))
+            volume_types.append((lvm_types, lvm_names))
+
+        # Authenticate once and only create/update what differs
+        if volume_types:
+            if cinder_version >= KILO_VERSION:
+                api_version = 2
+            else:
+                api_version = 1
+            volume_api = VolumeTypeApi.from_openstackrc(OPENSTACK_RC_FILE,
+                                                        api_version)
+            for change in reconcile_volume_types(volume_api, volume_types):
+                print 'cinder: %s' %(change)
         local('sudo service cinder-volume restart')
         return
 
@@ -3369,49 +3093,33 @@ class SetupCeph(object):
         return
     #end do_configure_stats_daemon()
 
-    # Function to remove each OSD in the self._args.disks_to_remove list.
+    # Function to remove the OSDs in the self._args.disks_to_remove list.
+    # All the OSDs are drained together and removed in one pass, see
+    # OsdRemoval.
     def do_remove_osd(self):
+        host_osds = {}
         for entries, entry_token, hostname in zip(self._args.storage_hosts,
                 self._args.storage_host_tokens, self._args.storage_hostnames):
             for disk_to_remove in self._args.disks_to_remove:
                 if hostname == disk_to_remove.split(':')[0]:
-                    with settings(host_string = 'root@%s' %(entries),
-                                                    password = entry_token):
-                        # Find the mounts and using the mount, find the OSD
-                        # number.
-                        # Remove osd using ceph commands.
-                        # Unmount the drive and destroy the partitions
-                        mounted = run('sudo cat /proc/mounts | grep %s | wc -l'
-                                            %(disk_to_remove.split(':')[1]))
-                        if mounted != '0':
-                            osd_det = run('sudo mount | grep %s | \
-                                                awk \'{ print $3 }\''
-                                                %(disk_to_remove.split(':')[1]),
-                                                shell='/bin/bash')
-                            if osd_det != '':
-                                osd_num = osd_det.split('-')[1]
-                                osd_running = run('ps -ef | grep ceph-osd | \
-                                                   grep -v grep | \
-                                                   grep -w "\\-%s %s" | wc -l'
-                                                   %(CONTRAIL_STORAGE_CEPH_ID, osd_num))
-                                if osd_running != '0':
-                                    run('sudo %s stop ceph-osd%s%s' 
-                                            %(CONTRAIL_STORAGE_SYSTEMCTL, 
-                                                CONTRAIL_STORAG_OSD_MON_ID, 
-                                                osd_num))
-                                run('sudo ceph -k %s osd out %s'
-                                            %(CEPH_ADMIN_KEYRING, osd_num))
-                                run('sudo ceph osd crush remove osd.%s'
-                                                                %(osd_num))
-                                run('sudo ceph -k %s auth del osd.%s'
-                                            %(CEPH_ADMIN_KEYRING, osd_num))
-                                run('sudo ceph -k %s osd rm %s'
-                                            %(CEPH_ADMIN_KEYRING, osd_num))
-                                run('sudo umount /var/lib/ceph/osd/ceph-%s'
-                                                                %(osd_num))
-                                run('sudo parted -s %s mklabel gpt 2>&1 > \
-                                                                /dev/null'
-                                            %(disk_to_remove.split(':')[1]))
+                    inventory = self.get_storage_inventory(entries,
+                                                           entry_token)
+                    # Find the mounts and using the mount, find the OSD
+                    # number.
+                    disk = disk_to_remove.split(':')[1]
+                    osd_num = inventory.osd_id(disk)
+                    if osd_num is not None:
+                        host_osds.setdefault((entries, entry_token),
+                                                []).append((osd_num, disk))
+        # Remove osds using ceph commands.
+        # Unmount the drives and destroy the partitions
+        OsdRemoval(host_osds, 'sudo %s stop ceph-osd%s%%s'
+                                %(CONTRAIL_STORAGE_SYSTEMCTL,
+                                    CONTRAIL_STORAG_OSD_MON_ID),
+                    force=self._args.force_osd_removal).run()
+        # The OSDs of the hosts are gone, drop their snapshots
+        for entries, entry_token in host_osds:
+            self.storage_inventory.pop(entries, None)
         return
     #end do_remove_osd()
 
@@ -3424,32 +3132,18 @@ class SetupCeph(object):
                 self._args.storage_host_tokens, self._args.storage_hostnames):
             for host_to_remove in self._args.hosts_to_remove:
                 if hostname == host_to_remove:
-                    with settings(host_string = 'root@%s' %(entries),
-                                        password = entry_token):
-                        # Check if ceph-osd process is running on the node which
-                        # has to be removed.
-                        # If ceph-osd is running, get the osd number and find
-                        # the corresponding mount name.
-                        # Create the list of hostname:mountname and save it to
-                        # self._args.disks_to_remove.
-                        # This will be removed using the do_remove_osd()
-                        line_num = 1
-                        while True:
-                            ceph_id = run('ps  -ef | grep ceph-osd | \
-                                                    grep -v grep | grep -v asok | \
-                                                    tail -n +%s | head -n 1 | \
-                                                    awk \'{print $11}\''
-                                                    %(line_num))
-                            if ceph_id != '':
-                                mount_name = run('sudo cat /proc/mounts | \
-                                                grep -w ceph-%s | \
-                                                awk \'{print $1}\'' %(ceph_id))
-                                disk_name = mount_name[:-1]
-                                disks_to_remove.append('%s:%s' %(hostname,
-                                                                    disk_name))
-                            else:
-                                break
-                            line_num += 1
+                    # Find the running ceph-osd processes on the node
+                    # which has to be removed and the device mounted for
+                    # each of them.
+                    # Create the list of hostname:diskname and save it to
+                    # self._args.disks_to_remove.
+                    # This will be removed using the do_remove_osd()
+                    inventory = self.get_storage_inventory(entries,
+                                                           entry_token)
+                    for ceph_id, mount_name in inventory.osd_devices():
+                        disk_name = mount_name[:-1]
+                        disks_to_remove.append('%s:%s' %(hostname,
+                                                            disk_name))
         self._args.disks_to_remove = disks_to_remove
         return
 
@@ -3891,6 +3585,8 @@ class SetupCeph(object):
     def __init__(self, args_str = None):
         #print sys.argv[1:]
         self._args = None
+        # Storage inventory snapshots, keyed by host
+        self.storage_inventory = {}
         if not args_str:
             args_str = ' '.join(sys.argv[1:])
 
@@ -4034,6 +3730,7 @@ class SetupCeph(object):
         parser.add_argument("--storage-setup-mode", help = "Storage configuration mode")
         parser.add_argument("--disks-to-remove", help = "Disks to remove", nargs="+", type=str)
         parser.add_argument("--hosts-to-remove", help = "Hosts to remove", nargs="+", type=str)
+        parser.add_argument("--force-osd-removal", help = "Remove the OSDs even if their data did not move off them", action="store_true")
         parser.add_argument("--storage-replica-size", help = "Replica size")
         parser.add_argument("--openstack-ip", help = "Openstack IP")
         parser.add_argument("--orig-hostnames", help = "Actual Host names of storage nodes", nargs='+', type=str)
@@ -4042,6 +3739,7 @@ class SetupCeph(object):
         parser.add_argument("--ssd-cache-tier", help = "Enable SSD cache tier")
         parser.add_argument("--object-storage", help = "Enable Ceph object storage")
         parser.add_argument("--object-storage-pool", help = "Ceph object storage pool")
+        parser.add_argument("--storage-restart-domains", help = "Maximum number of failure domains restarted in parallel", default = 1, type=int)
 
         self._args = parser.parse_args(remaining_argv)
 
@@ -0,0 +1,119 @@
+#!/usr/bin/python
+#
+# Copyright (c) 2016 Juniper Networks, Inc. All rights reserved.
+#
+"""Syslog forwarding to the analytics collectors.
+
+The forwarding rules are rendered as one rsyslog drop-in holding the
+complete collector set. The drop-in is only written when its content
+changes, so stale collectors go away and rsyslog is restarted once, and
+only when something changed. The collectors syslog_port is set on all
+the collectors in parallel.
+"""
+
+import re
+
+from contrail_provisioning.common.lazy import local
+
+from contrail_provisioning.common.netstate import read_file, install_file, \
+        remove_file
+from contrail_provisioning.common.parallel import run_on_hosts, \
+        run_host_script
+
+FORWARD_CONF = '/etc/rsyslog.d/49-contrail-storage-forward.conf'
+COLLECTOR_CONF = '/etc/contrail/contrail-collector.conf'
+COLLECTOR_SYSLOG_PORT = 4514
+
+
+def render_forwarding(collectors, port):
+    lines = ['# Generated by contrail-provisioning, do not edit.',
+             '# Forwards syslog to the analytics collectors.']
+    lines += ['*.* @%s:%s' % (collector, port) for collector in collectors]
+    return '\n'.join(lines) + '\n'
+
+
+def forwarded_collectors(port, path=FORWARD_CONF):
+    """Collectors the drop-in written by this module forwards to."""
+    content = read_file(path) or ''
+    rule = re.compile(r'^\*\.\* @(\S+):%s\s*$' % port)
+    return [match.group(1) for match in
+            (rule.match(line) for line in content.splitlines()) if match]
+
+
+def strip_legacy_rules(path, port, collectors):
+    """Drops the forwarding rules older releases appended to path for
+    collectors. Rules to other hosts, added by the admin, are kept.
+
+    Returns True if path was changed.
+    """
+    content = read_file(path)
+    if content is None or not collectors:
+        return False
+    rule = re.compile(r'^\*\.\* @(%s):%s\s*$' %
+                      ('|'.join(re.escape(collector)
+                                for collector in collectors), port))
+    lines = [line for line in content.splitlines(True)
+             if not rule.match(line)]
+    if ''.join(lines) == content:
+        return False
+    install_file(path, ''.join(lines), 0644)
+    return True
+
+
+def configure_forwarding(collectors, port, legacy_conf=None):
+    """Makes the drop-in forward to collectors, restarts rsyslog if needed.
+
+    Returns True if the configuration changed.
+    """
+    changed = False
+    if legacy_conf:
+        changed = strip_legacy_rules(legacy_conf, port,
+                                     set(collectors) |
+                                     set(forwarded_collectors(port)))
+    content = render_forwarding(collectors, port)
+    if read_file(FORWARD_CONF) != content:
+        install_file(FORWARD_CONF, content, 0644)
+        changed = True
+    if changed:
+        local('sudo service rsyslog restart')
+    return changed
+
+
+def unconfigure_forwarding(port, legacy_conf=None, collectors=()):
+    changed = False
+    if legacy_conf:
+        changed = strip_legacy_rules(legacy_conf, port,
+                                     set(collectors) |
+                                     set(forwarded_collectors(port)))
+    if read_file(FORWARD_CONF) is not None:
+        remove_file(FORWARD_CONF)
+        changed = True
+    if changed:
+        local('sudo service rsyslog restart')
+    return changed
+
+
+def set_collector_syslog_port(collectors, enable):
+    """Sets syslog_port on all the collectors, [(host, token)], in parallel.
+
+    contrail-collector is only restarted where the port changed.
+    """
+    if enable:
+        edit = 'sed -i -e "s/# syslog_port=-1/syslog_port=%s/" ' \
+               '-e "s/syslog_port=-1/syslog_port=%s/" %s' \
+               % (COLLECTOR_SYSLOG_PORT, COLLECTOR_SYSLOG_PORT, COLLECTOR_CONF)
+        match = 'syslog_port=-1'
+    else:
+        edit = 'sed -i "s/syslog_port=%s/syslog_port=-1/" %s' \
+               % (COLLECTOR_SYSLOG_PORT, COLLECTOR_CONF)
+        match = 'syslog_port=%s' % COLLECTOR_SYSLOG_PORT
+    commands = ['if grep -q "%s" %s; then %s && '
+                'service contrail-collector restart; fi'
+                % (match, COLLECTOR_CONF, edit)]
+    entries = [(host, token, commands) for host, token in collectors]
+    failed = [host for host, succeeded in
+              run_on_hosts(run_host_script, entries, len(entries))
+              if not succeeded]
+    if failed:
+        raise RuntimeError('Unable to set syslog_port on %s'
+                           % ', '.join(failed))
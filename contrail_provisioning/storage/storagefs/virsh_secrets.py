@@ -0,0 +1,102 @@
+#!/usr/bin/python
+#
+# Copyright (c) 2016 Juniper Networks, Inc. All rights reserved.
+#
+"""Libvirt secret reconciliation for the Ceph clients used by cinder/nova.
+
+The secrets of a host, with their usage names and values, are collected
+in one call. Only the missing or mismatched secrets are then defined or
+updated, in one batched call per host.
+"""
+
+import re
+import uuid
+
+from contrail_provisioning.common.lazy import local, run, settings
+
+# One "uuid|value|usage name" line per secret
+SECRETS_SCRIPT = r"""
+for secret in $(virsh secret-list 2>/dev/null | awk 'NR > 2 {print $1}'); do
+    value=$(virsh secret-get-value $secret 2>/dev/null)
+    name=$(virsh secret-dumpxml $secret 2>/dev/null | grep -o '<name>[^<]*</name>' | sed 's/<[^>]*>//g')
+    echo "$secret|$value|$name"
+done
+true
+"""
+
+SECRET_XML = "<secret ephemeral='no' private='no'><uuid>%s</uuid>" \
+             "<usage type='ceph'><name>client.%s secret</name></usage>" \
+             "</secret>"
+
+
+def read_ceph_key(keyring):
+    """Returns the base64 key of a ceph keyring file."""
+    with open(keyring, 'r') as fd:
+        match = re.search(r'^\s*key\s*=\s*(\S+)', fd.read(), re.M)
+    if not match:
+        raise RuntimeError('No key found in %s' % keyring)
+    return match.group(1)
+
+
+def parse_secrets(output):
+    """Returns {uuid: (ceph client or None, value)}."""
+    secrets = {}
+    for line in output.splitlines():
+        fields = line.strip().split('|', 2)
+        if len(fields) != 3 or not fields[0]:
+            continue
+        secret, value, name = fields
+        client = None
+        if name.startswith('client.'):
+            client = name.split()[0][len('client.'):]
+        secrets[secret] = (client, value)
+    return secrets
+
+
+def plan_secrets(secrets, keys, uuids):
+    """Commands making secrets match keys, {client: base64 key}.
+
+    uuids holds the secret uuid wanted for each client and is filled in
+    for clients without one, reusing the existing secret of the client
+    when there is one.
+    """
+    commands = []
+    for client in sorted(keys):
+        current = [secret for secret, (owner, _) in sorted(secrets.items())
+                   if owner == client]
+        if client not in uuids:
+            uuids[client] = current[0] if current else str(uuid.uuid4())
+        wanted = uuids[client]
+        # libvirt allows one secret per usage, drop the stale ones first
+        for secret in current:
+            if secret != wanted:
+                commands.append('virsh secret-undefine %s' % secret)
+        if wanted not in secrets or secrets[wanted][0] != client:
+            xml_file = '/tmp/secret_%s.xml' % client
+            commands.append('echo "%s" > %s' % (SECRET_XML % (wanted, client),
+                                                xml_file))
+            commands.append('virsh secret-define --file %s' % xml_file)
+            commands.append('rm -f %s' % xml_file)
+        if wanted not in secrets or secrets[wanted][1] != keys[client]:
+            commands.append('virsh secret-set-value %s --base64 %s'
+                            % (wanted, keys[client]))
+    return commands
+
+
+def reconcile_local_secrets(keys, uuids):
+    """Reconciles the secrets of the local host, True if any changed."""
+    secrets = parse_secrets(local(SECRETS_SCRIPT, capture=True))
+    commands = plan_secrets(secrets, keys, uuids)
+    if commands:
+        local(' && '.join(commands))
+    return bool(commands)
+
+
+def reconcile_host_secrets(host, token, keys, uuids):
+    """Reconciles the secrets of a remote host, True if any changed."""
+    with settings(host_string='root@%s' % host, password=token):
+        secrets = parse_secrets(run(SECRETS_SCRIPT, shell='/bin/bash'))
+        commands = plan_secrets(secrets, keys, uuids)
+        if commands:
+            run('\n'.join(['set -e'] + commands), shell='/bin/bash')
+    return bool(commands)
@@ -3,14 +3,12 @@
 import argparse
 import ConfigParser
 
-import platform
 import os
 import sys
 import time
 import re
 import string
 import socket
-import netifaces, netaddr
 import subprocess
 import fnmatch
 import struct
@@ -18,16 +16,10 @@ import shutil
 import json
 from pprint import pformat
 import xml.etree.ElementTree as ET
-import platform
-import pdb
 
 import tempfile
-from fabric.api import local, env, run, settings
-from fabric.operations import get, put
-from fabric.context_managers import lcd, settings
-from fabric.api import local, env, run
-from fabric.operations import get, put
-from fabric.context_managers import lcd, settings
+from contrail_provisioning.common.lazy import local, settings
+from contrail_provisioning.common import platform_info
 sys.path.insert(0, os.getcwd())
 
 class SetupStorageWebUI(object):
@@ -77,7 +69,7 @@ class SetupStorageWebUI(object):
             args_str = ' '.join(sys.argv[1:])
         self._parse_args(args_str)
 
-        pdist = platform.dist()[0]
+        pdist = platform_info.dist()[0]
 
         # Whenever Storage setup mode is reconfigure or unconfigure needs to remove below service and a feature
         # remove the Storage UI feature
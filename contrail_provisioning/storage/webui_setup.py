@@ -8,8 +8,7 @@ import sys
 import argparse
 import ConfigParser
 
-from fabric.api import run, local
-from fabric.context_managers import settings
+from contrail_provisioning.common.lazy import local, run, settings
 
 from contrail_provisioning.common.base import ContrailSetup
 
@@ -2,5 +2,9 @@
 
 #setup script for vcenter plugin package under supervisord
 chkconfig contrail-vcenter-plugin on
-service contrail-vcenter-plugin restart
+# With --skip-contrail-restart the caller restarts the plugin if its
+# config changed
+if [ "$1" != "--skip-contrail-restart" ]; then
+    service contrail-vcenter-plugin restart
+fi
 
@@ -3,13 +3,20 @@ import sys
 import argparse
 import ConfigParser
 
-from fabric.api import local
+from contrail_provisioning.common.lazy import local
 
 from contrail_provisioning.common.base import ContrailSetup
+from contrail_provisioning.common.service_restarts import ServiceGroup
 from contrail_provisioning.vcenter_plugin.templates import contrail_vcenter_plugin_conf
 
+VCENTER_PLUGIN_SERVICES = ServiceGroup(None, [
+    ('contrail-vcenter-plugin', ['/etc/contrail/contrail-vcenter-plugin.conf']),
+    ])
+
 
 class VcenterPluginSetup(ContrailSetup):
+    use_render_plan = True
+
     def __init__(self, args_str = None):
         super(VcenterPluginSetup, self).__init__()
         self._args = None
@@ -95,16 +102,20 @@ class VcenterPluginSetup(ContrailSetup):
                          '__contrail_admin_password__': ks_admin_passwd,
                          '__contrail_admin_tenant_name__': ks_admin_tenant_name,
         }
-        self._template_substitute_write(contrail_vcenter_plugin_conf.template,
-                                   template_vals, self._temp_dir_name + '/contrail-vcenter-plugin.conf')
-        local("sudo mv %s/contrail-vcenter-plugin.conf /etc/contrail/contrail-vcenter-plugin.conf" %(self._temp_dir_name))
+        self._install_template(contrail_vcenter_plugin_conf.template,
+                               template_vals,
+                               '/etc/contrail/contrail-vcenter-plugin.conf')
 
     def run_services(self):
-        local("sudo vcenter-plugin-setup.sh")
+        if self.changed_files is None:
+            local("sudo vcenter-plugin-setup.sh")
+        else:
+            local("sudo vcenter-plugin-setup.sh --skip-contrail-restart")
+            self.restart_changed_services(VCENTER_PLUGIN_SERVICES)
 
     def setup(self):
-        self.fixup_contrail_vcenter_plugin()        
-        self.run_services()        
+        self.render_config_files()
+        self.run_services()
 
 #end class VcenterPluginSetup
 def main(args_str = None):
@@ -8,7 +8,7 @@ import sys
 import argparse
 import ConfigParser
 
-from fabric.api import local, env, run, settings
+from contrail_provisioning.common.lazy import local, settings
 
 from contrail_provisioning.common.base import ContrailSetup
 
@@ -7,7 +7,7 @@
 from setup import WebuiSetup
 from contrail_provisioning.common.upgrade import ContrailUpgrade
 
-from fabric.api import local
+from contrail_provisioning.common.lazy import local
 
 
 class WebuiUpgrade(ContrailUpgrade, WebuiSetup):
@@ -33,6 +33,8 @@ class WebuiUpgrade(ContrailUpgrade, WebuiSetup):
         local('service supervisor-webui restart')
 
     def upgrade(self):
+        if self._dry_run():
+            return
         self._upgrade()
         self.restart()
 
@@ -11,7 +11,7 @@ def requirements(filename):
 setup(
     name='ContrailProvisioning',
     version='0.1dev',
-    packages=find_packages(),
+    packages=find_packages(exclude=['tests', 'tests.*']),
     include_package_data=True,
     long_description="Contrail VNC Provisioning API Implementation",
     install_requires=requirements('requirements.txt'),
@@ -43,6 +43,7 @@ setup(
             'update-collector-config = contrail_provisioning.collector.setup:fix_collector_config',
             'update-webui-config = contrail_provisioning.webui.setup:fix_webui_config',
             'remove-galera-node = contrail_provisioning.openstack.ha.galera_setup:remove_galera_node',
+            'contrail-galera-health = contrail_provisioning.openstack.ha.galera_health:main',
             'unregister-openstack-services = contrail_provisioning.openstack.setup:service_unregister',
             'readjust-cassandra-seed-list = contrail_provisioning.database.setup:readjust_seed_list',
             'decommission-cassandra-node = contrail_provisioning.database.setup:decommission_cassandra_node',
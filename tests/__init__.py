@@ -0,0 +1,3 @@
+#
+# Copyright (c) 2016 Juniper Networks, Inc. All rights reserved.
+#
@@ -0,0 +1,185 @@
+#
+# Copyright (c) 2016 Juniper Networks, Inc. All rights reserved.
+#
+"""XML to INI agent config conversion, checked against the golden files
+of fixtures/agent_xml2ini: <case>.ini is the expected output of
+<case>.xml.
+"""
+
+import os
+import shutil
+import ConfigParser
+import tempfile
+import unittest
+
+from contrail_provisioning.compute import agent_xml2ini
+from contrail_provisioning.compute.agent_xml2ini import convert_file, \
+    Xml2Ini
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        'fixtures', 'agent_xml2ini')
+GOLDEN_CASES = ['kvm', 'minimal', 'xen']
+
+
+def fixture(name):
+    return os.path.join(FIXTURES, name)
+
+
+def read(path):
+    with open(path, 'r') as fd:
+        return fd.read()
+
+
+class ConvertTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def target(self, name='contrail-vrouter-agent.conf'):
+        return os.path.join(self.tmp_dir, name)
+
+    def convert(self, case):
+        """Lines of the conversion of the fixture case.xml."""
+        target = self.target(case)
+        result = convert_file((fixture('%s.xml' % case), target, False))
+        self.assertEqual(result[2], 'converted', result[3])
+        return read(target).splitlines()
+
+    def parse(self, case):
+        """Converts the fixture case.xml, returns the parsed conf."""
+        self.convert(case)
+        conf = ConfigParser.RawConfigParser()
+        conf.read(self.target(case))
+        return conf
+
+    def test_golden(self):
+        for case in GOLDEN_CASES:
+            self.assertEqual(self.convert(case),
+                             read(fixture('%s.ini' % case)).splitlines())
+
+    def test_hypervisor(self):
+        self.assertIn('type=kvm', self.convert('kvm'))
+        lines = self.convert('xen')
+        self.assertIn('type=xen', lines)
+        self.assertIn('xen_ll_ip=169.254.0.1/16', lines)
+        self.assertIn('xen_ll_interface=xapi0', lines)
+        # No hypervisor element, the settings are left as examples
+        lines = self.convert('minimal')
+        self.assertIn('# type=kvm', lines)
+        self.assertIn('# xen_ll_ip=', lines)
+
+    def test_single_server(self):
+        # Written without a trailing space after the last server
+        lines = self.convert('xen')
+        self.assertEqual(lines[lines.index('[CONTROL-NODE]') + 4],
+                         'server=10.84.14.10')
+        for line in lines:
+            self.assertEqual(line, line.rstrip())
+
+    def test_comments(self):
+        for case in GOLDEN_CASES:
+            self.assertIn('# Maximum flows allowed per VM - given as % of '
+                          'maximum system flows', self.convert(case))
+
+    def test_gateway(self):
+        conf = self.parse('gateway')
+        self.assertEqual([section for section in conf.sections()
+                          if section.startswith('GATEWAY')], ['GATEWAY-0'])
+        self.assertEqual(dict(conf.items('GATEWAY-0')), {
+            'routing_instance': 'default-domain:demo:vn1:vn1',
+            'interface': 'vgw1',
+            'ip_blocks': '10.1.1.0/24',
+            'routes': '10.2.0.0/16 0.0.0.0/0'})
+
+    def test_gateway_bad_route(self):
+        target = self.target()
+        source, _, status, message = convert_file(
+            (fixture('bad_route.xml'), target, False))
+        self.assertEqual(status, 'failed')
+        self.assertIn("Invalid gateway route '10.3.0.0/33'", message)
+        self.assertFalse(os.path.exists(target))
+
+    def test_malformed(self):
+        target = self.target()
+        source, _, status, message = convert_file(
+            (fixture('malformed.xml'), target, False))
+        self.assertEqual(status, 'failed')
+        self.assertTrue(message.startswith('Unable to convert %s: ' %
+                                           source))
+        self.assertFalse(os.path.exists(target))
+
+    def test_missing_source(self):
+        status = convert_file((self.target('agent.conf'), self.target(),
+                               False))[2]
+        self.assertEqual(status, 'failed')
+
+    def test_existing_target(self):
+        target = self.target()
+        with open(target, 'w') as fd:
+            fd.write('[DEFAULT]\n')
+        job = (fixture('kvm.xml'), target, False)
+        self.assertEqual(convert_file(job)[2], 'skipped')
+        self.assertEqual(read(target), '[DEFAULT]\n')
+        self.assertEqual(convert_file(job[:2] + (True,))[2], 'converted')
+        self.assertEqual(read(target), read(fixture('kvm.ini')))
+
+
+class MainTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.fixups = []
+        self._convert_supervisor_ini = Xml2Ini.convert_supervisor_ini
+        Xml2Ini.convert_supervisor_ini = lambda obj: self.fixups.append(obj)
+
+    def tearDown(self):
+        Xml2Ini.convert_supervisor_ini = self._convert_supervisor_ini
+        shutil.rmtree(self.tmp_dir)
+
+    def main(self, source, *args):
+        target = os.path.join(self.tmp_dir, 'contrail-vrouter-agent.conf')
+        agent_xml2ini.main(' '.join(('--source_file', source,
+                                     '--target_file', target) + args))
+        return target
+
+    def test_converted(self):
+        target = self.main(fixture('minimal.xml'))
+        self.assertEqual(read(target), read(fixture('minimal.ini')))
+        self.assertEqual(len(self.fixups), 1)
+
+    def test_malformed_fails(self):
+        try:
+            self.main(fixture('malformed.xml'))
+        except SystemExit as e:
+            self.assertEqual(e.code, 1)
+        else:
+            self.fail('No failure on a malformed source')
+        self.assertEqual(self.fixups, [])
+
+    def test_missing_source_is_not_an_error(self):
+        self.main(os.path.join(self.tmp_dir, 'agent.conf'))
+        self.assertEqual(len(self.fixups), 1)
+
+    def test_bulk(self):
+        source_dir = os.path.join(self.tmp_dir, 'xml')
+        target_dir = os.path.join(self.tmp_dir, 'ini')
+        os.mkdir(source_dir)
+        os.mkdir(target_dir)
+        for name in ['kvm.xml', 'malformed.xml']:
+            shutil.copy(fixture(name), source_dir)
+        try:
+            agent_xml2ini.main('--source_dir %s --target_dir %s --workers 1'
+                               % (source_dir, target_dir))
+        except SystemExit as e:
+            self.assertEqual(e.code, 1)
+        else:
+            self.fail('No failure on a malformed source')
+        self.assertEqual(os.listdir(target_dir), ['kvm.xml'])
+        self.assertEqual(read(os.path.join(target_dir, 'kvm.xml')),
+                         read(fixture('kvm.ini')))
+        self.assertEqual(self.fixups, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,295 @@
+#
+# Copyright (c) 2016 Juniper Networks, Inc. All rights reserved.
+#
+"""Cinder volume type reconciliation against a fake keystone and cinder
+server.
+"""
+
+import os
+import re
+import ssl
+import json
+import shutil
+import urllib2
+import tempfile
+import threading
+import unittest
+import subprocess
+import BaseHTTPServer
+from distutils.spawn import find_executable
+
+from contrail_provisioning.storage.storagefs import cinder_types
+from contrail_provisioning.storage.storagefs.cinder_types import \
+    VolumeTypeApi, reconcile_volume_types
+
+TOKEN = 'f00dcafe'
+TYPES_RE = re.compile(r'^/(\w+)/v2/admin/types(?:/(\w+)/extra_specs)?$')
+
+
+class FakeOpenstackHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, data, code=200, headers=()):
+        body = json.dumps(data)
+        self.send_response(code)
+        for key, value in headers:
+            self.send_header(key, value)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _body(self):
+        length = int(self.headers.getheader('Content-Length') or 0)
+        return json.loads(self.rfile.read(length)) if length else None
+
+    def _endpoints(self, v3):
+        base = 'http%s://127.0.0.1:%d' % ('s' if self.server.tls else '',
+                                          self.server.server_address[1])
+        endpoints = []
+        for region in ['RegionOne', 'RegionTwo']:
+            url = '%s/%s/v2/admin' % (base, region.lower())
+            if v3:
+                endpoints += [{'interface': interface, 'region': region,
+                               'region_id': region,
+                               'url': url.replace('/v2/', '/%s/' % interface)
+                               if interface != 'public' else url}
+                              for interface in ['admin', 'internal',
+                                                'public']]
+            else:
+                endpoints.append({'region': region, 'publicURL': url,
+                                  'adminURL': url + '/admin'})
+        return [{'type': 'volume', 'endpoints': []},
+                {'type': 'volumev2', 'endpoints': endpoints}]
+
+    def do_POST(self):
+        body = self._body()
+        self.server.requests.append(('POST', self.path, body))
+        if self.path == '/v2.0/tokens':
+            return self._reply({'access': {
+                'token': {'id': TOKEN},
+                'serviceCatalog': self._endpoints(v3=False)}})
+        if self.path == '/v3/auth/tokens':
+            return self._reply({'token': {
+                'catalog': self._endpoints(v3=True)}},
+                code=201, headers=[('X-Subject-Token', TOKEN)])
+        self._types('POST', body)
+
+    def do_GET(self):
+        self.server.requests.append(('GET', self.path, None))
+        self._types('GET')
+
+    def _types(self, method, body=None):
+        match = TYPES_RE.match(self.path)
+        if not match:
+            return self._reply({}, 404)
+        if self.headers.getheader('X-Auth-Token') != TOKEN:
+            return self._reply({}, 401)
+        region, type_id = match.groups()
+        types = self.server.types.setdefault(region, {})
+        if method == 'GET':
+            return self._reply({'volume_types': [
+                {'id': tid, 'name': name, 'extra_specs': specs}
+                for tid, (name, specs) in sorted(types.items())]})
+        if type_id is None:
+            type_id = 'type%d' % len(types)
+            types[type_id] = (body['volume_type']['name'], {})
+            return self._reply({'volume_type': {
+                'id': type_id, 'name': body['volume_type']['name']}})
+        types[type_id][1].update(body['extra_specs'])
+        self._reply({'extra_specs': types[type_id][1]})
+
+
+class FakeOpenstack(BaseHTTPServer.HTTPServer):
+    def __init__(self, certfile=None):
+        BaseHTTPServer.HTTPServer.__init__(self, ('127.0.0.1', 0),
+                                           FakeOpenstackHandler)
+        self.tls = certfile is not None
+        if self.tls:
+            self.socket = ssl.wrap_socket(self.socket, certfile=certfile,
+                                          server_side=True)
+        self.requests = []
+        self.types = {}
+
+
+class FakeServerTest(unittest.TestCase):
+    certfile = None
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.server = FakeOpenstack(self.certfile)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+        shutil.rmtree(self.tmp_dir)
+
+    def openstackrc(self, version='v2.0', **env):
+        env.setdefault('OS_AUTH_URL', 'http%s://127.0.0.1:%d/%s/' % (
+            's' if self.certfile else '', self.server.server_address[1],
+            version))
+        path = os.path.join(self.tmp_dir, 'openstackrc')
+        with open(path, 'w') as f:
+            f.write('export OS_USERNAME=admin\n'
+                    'export OS_PASSWORD=secret123\n'
+                    'export OS_TENANT_NAME=admin\n'
+                    'export OS_NO_CACHE=1\n')
+            for key, value in sorted(env.items()):
+                f.write('export %s=%s\n' % (key, value))
+        return path
+
+
+class ReconcileVolumeTypesTest(FakeServerTest):
+    desired = [('ocs-block-disk', 'RBD'),
+               ('ocs-block-hdd-disk', 'VOLUMES_HDD'),
+               ('ocs-block-nfs-disk', 'NFS')]
+
+    def test_reconcile(self):
+        self.server.types['regiontwo'] = {
+            'type0': ('ocs-block-disk', {'volume_backend_name': 'RBD'}),
+            'type1': ('ocs-block-hdd-disk', {'volume_backend_name': 'HDD'}),
+        }
+        api = VolumeTypeApi.from_openstackrc(
+            self.openstackrc(OS_REGION_NAME='RegionTwo'), 2)
+        self.assertEqual(reconcile_volume_types(api, self.desired), [
+            'set ocs-block-hdd-disk volume_backend_name=VOLUMES_HDD',
+            'created type ocs-block-nfs-disk',
+            'set ocs-block-nfs-disk volume_backend_name=NFS'])
+        self.assertEqual(
+            [(method, path) for method, path, body in self.server.requests],
+            [('POST', '/v2.0/tokens'),
+             ('GET', '/regiontwo/v2/admin/types'),
+             ('POST', '/regiontwo/v2/admin/types/type1/extra_specs'),
+             ('POST', '/regiontwo/v2/admin/types'),
+             ('POST', '/regiontwo/v2/admin/types/type2/extra_specs')])
+        self.assertEqual(self.server.requests[0][2]['auth'], {
+            'tenantName': 'admin',
+            'passwordCredentials': {'username': 'admin',
+                                    'password': 'secret123'}})
+        self.assertEqual(sorted(self.server.types['regiontwo'].values()), [
+            ('ocs-block-disk', {'volume_backend_name': 'RBD'}),
+            ('ocs-block-hdd-disk', {'volume_backend_name': 'VOLUMES_HDD'}),
+            ('ocs-block-nfs-disk', {'volume_backend_name': 'NFS'})])
+
+        # Nothing left to change, a token and a listing only
+        del self.server.requests[:]
+        self.assertEqual(reconcile_volume_types(api, self.desired), [])
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_keystone_v3_region(self):
+        api = VolumeTypeApi.from_openstackrc(
+            self.openstackrc('v3', OS_REGION_NAME='RegionTwo'), 2)
+        self.assertEqual(api.endpoint, 'http://127.0.0.1:%d/regiontwo/v2/'
+                         'admin' % self.server.server_address[1])
+        reconcile_volume_types(api, self.desired[:1])
+        self.assertEqual(self.server.types.keys(), ['regiontwo'])
+
+    def test_no_region(self):
+        api = VolumeTypeApi.from_openstackrc(self.openstackrc(), 2)
+        self.assertTrue(api.endpoint.endswith('/regionone/v2/admin'))
+
+    def test_unknown_region(self):
+        path = self.openstackrc(OS_REGION_NAME='RegionThree')
+        self.assertRaises(RuntimeError, VolumeTypeApi.from_openstackrc,
+                          path, 2)
+
+    def test_empty_cacert(self):
+        # openstackrc exports an empty OS_CACERT without ssl
+        api = VolumeTypeApi.from_openstackrc(self.openstackrc(OS_CACERT=''),
+                                             2)
+        self.assertEqual(reconcile_volume_types(api, self.desired[:1]),
+                         ['created type ocs-block-disk',
+                          'set ocs-block-disk volume_backend_name=RBD'])
+
+
+def make_certificate(directory):
+    """Self signed certificate of 127.0.0.1, None if openssl fails."""
+    certfile = os.path.join(directory, 'keystone.pem')
+    keyfile = os.path.join(directory, 'keystone.key')
+    with open(os.devnull, 'w') as devnull:
+        try:
+            failed = subprocess.call(
+                ['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes',
+                 '-days', '1', '-subj', '/CN=127.0.0.1',
+                 '-addext', 'subjectAltName=IP:127.0.0.1',
+                 '-keyout', keyfile, '-out', certfile],
+                stdout=devnull, stderr=devnull)
+        except OSError:
+            return None
+    if failed:
+        return None
+    with open(certfile, 'a') as cert:
+        with open(keyfile, 'r') as key:
+            cert.write(key.read())
+    return certfile
+
+
+class CaBundleTest(FakeServerTest):
+    @classmethod
+    def setUpClass(cls):
+        cls.cert_dir = tempfile.mkdtemp()
+        cls.certfile = make_certificate(cls.cert_dir)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.cert_dir)
+
+    def setUp(self):
+        if self.certfile is None:
+            self.skipTest('openssl can not make a test certificate')
+        super(CaBundleTest, self).setUp()
+
+    def test_cacert(self):
+        api = VolumeTypeApi.from_openstackrc(
+            self.openstackrc(OS_CACERT=self.certfile), 2)
+        self.assertEqual(reconcile_volume_types(api, [('ocs-block-disk',
+                                                       'RBD')]),
+                         ['created type ocs-block-disk',
+                          'set ocs-block-disk volume_backend_name=RBD'])
+
+    def test_unknown_ca(self):
+        self.assertRaises(urllib2.URLError, VolumeTypeApi.from_openstackrc,
+                          self.openstackrc(), 2)
+
+
+class CurlCaBundleTest(CaBundleTest):
+    """The requests with a CA bundle of python < 2.7.9, run with curl."""
+
+    def setUp(self):
+        if find_executable('curl') is None:
+            self.skipTest('curl is not installed')
+        super(CurlCaBundleTest, self).setUp()
+        self.has_ssl_context = cinder_types.HAS_SSL_CONTEXT
+        cinder_types.HAS_SSL_CONTEXT = False
+
+    def tearDown(self):
+        cinder_types.HAS_SSL_CONTEXT = self.has_ssl_context
+        super(CurlCaBundleTest, self).tearDown()
+
+    def test_keystone_v3(self):
+        api = VolumeTypeApi.from_openstackrc(
+            self.openstackrc('v3', OS_CACERT=self.certfile), 2)
+        self.assertEqual(api.headers, {'X-Auth-Token': TOKEN})
+        self.assertEqual(reconcile_volume_types(api, [('ocs-block-disk',
+                                                       'RBD')]),
+                         ['created type ocs-block-disk',
+                          'set ocs-block-disk volume_backend_name=RBD'])
+
+    def test_wrong_ca(self):
+        other_dir = tempfile.mkdtemp()
+        try:
+            certfile = make_certificate(other_dir)
+            self.assertRaises(urllib2.URLError,
+                              VolumeTypeApi.from_openstackrc,
+                              self.openstackrc(OS_CACERT=certfile), 2)
+        finally:
+            shutil.rmtree(other_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
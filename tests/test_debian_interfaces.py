@@ -0,0 +1,144 @@
+#
+# Copyright (c) 2016 Juniper Networks, Inc. All rights reserved.
+#
+"""Debian interfaces parser, checked against the files of
+fixtures/interfaces: <case>/input is edited the way the vhost0 setup
+does and compared with <case>/expected.
+"""
+
+import os
+import unittest
+
+from contrail_provisioning.common import debian_interfaces
+from contrail_provisioning.common.debian_interfaces import \
+    InterfacesConfig, InterfacesFile, Stanza
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        'fixtures', 'interfaces')
+VHOST0_OPTIONS = [('pre-up', '/usr/bin/if-vhost0'),
+                  ('netmask', '255.255.255.0'),
+                  ('network_name', 'application')]
+
+
+def read_fixture(*path):
+    with open(os.path.join(FIXTURES, *path), 'r') as fd:
+        return fd.read()
+
+
+class InterfacesFixtureTest(unittest.TestCase):
+    def setUp(self):
+        self.installed = {}
+        self._install_file = debian_interfaces.netstate.install_file
+        debian_interfaces.netstate.install_file = self.install_file
+
+    def tearDown(self):
+        debian_interfaces.netstate.install_file = self._install_file
+
+    def install_file(self, path, content, mode=None):
+        self.installed[path] = content
+
+    def load(self, case):
+        return InterfacesConfig(os.path.join(FIXTURES, case, 'input',
+                                             'interfaces'))
+
+    def relpath(self, case, cfg):
+        return os.path.relpath(cfg.path, os.path.join(FIXTURES, case,
+                                                      'input'))
+
+    def assertExpected(self, case, config):
+        """Every file of config matches the expected one, and only the
+        changed files are written.
+        """
+        changed = [cfg.path for cfg in config.files if cfg.changed]
+        for cfg in config.files:
+            self.assertEqual(cfg.serialize(), read_fixture(
+                case, 'expected', self.relpath(case, cfg)))
+        self.assertEqual(config.save(), changed)
+        self.assertEqual(sorted(self.installed), sorted(changed))
+        self.assertFalse([cfg for cfg in config.files if cfg.changed])
+
+    def test_round_trip(self):
+        for case in ['bond', 'vlan', 'sourced']:
+            config = self.load(case)
+            for cfg in config.files:
+                self.assertFalse(cfg.changed)
+                self.assertEqual(cfg.serialize(), read_fixture(
+                    case, 'input', self.relpath(case, cfg)))
+            self.assertEqual(config.save(), [])
+
+    def test_bond(self):
+        config = self.load('bond')
+        cfg = config.file_for_iface('bond0')
+        self.assertTrue(cfg is config.main)
+        bond_options = [(key, value) for key, value
+                        in config.find_iface('bond0').options()
+                        if key.startswith('bond-')]
+        self.assertEqual(bond_options, [('bond-mode', '802.3ad'),
+                                        ('bond-miimon', '100'),
+                                        ('bond-slaves', 'eth1 eth2')])
+        config.remove_iface('bond0')
+        cfg.add_iface('bond0', 'manual',
+                      [('pre-up', 'ifconfig bond0 up'),
+                       ('post-down', 'ifconfig bond0 down')] + bond_options)
+        cfg.add_iface('vhost0', 'static', VHOST0_OPTIONS +
+                      [('address', '10.1.1.5')])
+        self.assertExpected('bond', config)
+
+    def test_vlan(self):
+        config = self.load('vlan')
+        cfg = config.main
+        self.assertEqual(config.find_iface('eth1.100').get_options(
+                         'vlan-raw-device'), ['eth1'])
+        config.remove_iface('eth1.100')
+        cfg.add_iface('eth1.100', 'manual',
+                      [('post-up', 'ifconfig eth1.100 up'),
+                       ('pre-down', 'ifconfig eth1.100 down'),
+                       ('vlan-raw-device', 'eth1')])
+        cfg.add_iface('vhost0', 'static', VHOST0_OPTIONS +
+                      [('address', '10.2.0.5')])
+        self.assertExpected('vlan', config)
+
+    def test_sourced(self):
+        config = self.load('sourced')
+        self.assertEqual([self.relpath('sourced', cfg)
+                          for cfg in config.files],
+                         ['interfaces', 'interfaces.d/eth0.cfg',
+                          'fragments/eth1'])
+        # non_mgmt_ip: the stanza of the device is kept without its address
+        cfg = config.file_for_iface('eth1')
+        self.assertEqual(self.relpath('sourced', cfg), 'fragments/eth1')
+        stanza = cfg.find_iface('eth1')
+        stanza.set_method('manual')
+        stanza.remove_options(['address', 'netmask', 'gateway',
+                               'broadcast', 'network'])
+        stanza.add_option('pre-up', 'ifconfig eth1 up')
+        stanza.add_option('post-down', 'ifconfig eth1 down')
+        cfg.add_iface('vhost0', 'static', VHOST0_OPTIONS +
+                      [('address', '10.3.0.5')])
+        self.assertTrue(config.file_for_iface('vhost0') is cfg)
+        self.assertExpected('sourced', config)
+
+
+class InterfacesFileTest(unittest.TestCase):
+    def test_continuation_lines(self):
+        cfg = InterfacesFile('interfaces', 'iface eth0 inet static\n'
+                             '    up echo \\\n'
+                             'iface is not a stanza here\n')
+        self.assertEqual(len(cfg.stanzas), 1)
+        self.assertFalse(cfg.changed)
+
+    def test_remove_last_auto_entry(self):
+        cfg = InterfacesFile('interfaces', 'auto eth0\n'
+                             'iface eth0 inet dhcp\n')
+        cfg.remove_iface('eth0')
+        self.assertEqual(cfg.serialize(), '')
+
+    def test_new_iface(self):
+        cfg = InterfacesFile('interfaces')
+        cfg.append(Stanza.iface('eth0', 'manual', [('mtu', '9000')]))
+        self.assertEqual(cfg.serialize(),
+                         'iface eth0 inet manual\n    mtu 9000\n\n')
+
+
+if __name__ == '__main__':
+    unittest.main()
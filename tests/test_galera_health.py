@@ -0,0 +1,268 @@
+#
+# Copyright (c) 2016 Juniper Networks, Inc. All rights reserved.
+#
+"""Galera health agent, run against a fake galera node: a TCP server
+answering the mysql client stand-in of fixtures/galera.
+"""
+
+import os
+import time
+import socket
+import httplib
+import threading
+import unittest
+import SocketServer
+
+from contrail_provisioning.openstack.ha.galera_health import MysqlSession, \
+    WsrepState, WsrepRefresher, GaleraHealthServer, CHECK_QUERY
+
+FAKE_MYSQL = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          'fixtures', 'galera', 'fake_mysql')
+PROBES = 200
+NOT_READY = ('ERROR 1047 (08S01): WSREP has not yet prepared node for '
+             'application use')
+
+
+class FakeGaleraHandler(SocketServer.StreamRequestHandler):
+    """One client connection, answered from the node state at each query:
+    a wsrep_local_state value, "error" for a failed statement, "hang" to
+    never answer, "drop" to close the connection, "stall" to never send
+    the greeting.
+    """
+
+    def handle(self):
+        node = self.server
+        with node.lock:
+            node.connections += 1
+        if node.state == 'stall':
+            self.rfile.readline()
+            return
+        self.wfile.write('fake galera\n')
+        login = self.rfile.readline().split()
+        if login[1:] != ['cmon', node.password]:
+            self.wfile.write("ERROR 1045 (28000): Access denied for user "
+                             "'%s'\n" % ' '.join(login[1:2]))
+            return
+        self.wfile.write('ok\n')
+        for query in iter(self.rfile.readline, ''):
+            node.queries.append(query)
+            state = node.state
+            if state == 'drop':
+                return
+            elif state == 'hang':
+                continue
+            elif state == 'error':
+                self.wfile.write(NOT_READY + '\n')
+            else:
+                self.wfile.write('wsrep_local_state\t%s\n' % state)
+
+
+class FakeGaleraNode(SocketServer.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, password='secret'):
+        SocketServer.ThreadingTCPServer.__init__(self, ('127.0.0.1', 0),
+                                                 FakeGaleraHandler)
+        self.password = password
+        self.state = '4'
+        self.connections = 0
+        self.queries = []
+        self.lock = threading.Lock()
+
+
+def unused_port():
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+class FakeMysqlTest(unittest.TestCase):
+    def setUp(self):
+        self.node = FakeGaleraNode()
+        self.node_thread = threading.Thread(target=self.node.serve_forever)
+        self.node_thread.daemon = True
+        self.node_thread.start()
+        self.session = self.mysql_session()
+
+    def tearDown(self):
+        self.session.close()
+        self.node.shutdown()
+        self.node.server_close()
+        self.node_thread.join()
+
+    def mysql_session(self, port=None, password='secret', connect_timeout=2):
+        host, node_port = self.node.server_address
+        return MysqlSession(host, port or node_port, 'cmon', password,
+                            connect_timeout, mysql_bin=FAKE_MYSQL)
+
+    def set_state(self, state):
+        self.node.state = state
+
+    def connections(self):
+        return self.node.connections
+
+
+class MysqlSessionTest(FakeMysqlTest):
+    def test_single_session(self):
+        for _ in range(20):
+            self.assertEqual(self.session.query(CHECK_QUERY, 5),
+                             'wsrep_local_state\t4')
+        self.assertEqual(self.connections(), 1)
+        self.assertEqual(self.node.queries, [CHECK_QUERY] * 20)
+
+    def test_password_off_the_command_line(self):
+        self.assertNotIn('secret', self.session.cmd)
+        session = self.mysql_session(password='wrong')
+        try:
+            self.assertEqual(session.query(CHECK_QUERY, 5), None)
+        finally:
+            session.close()
+        self.assertEqual(self.node.queries, [])
+
+    def test_restarted_when_the_connection_drops(self):
+        self.assertTrue(self.session.query(CHECK_QUERY, 5))
+        self.set_state('drop')
+        self.assertEqual(self.session.query(CHECK_QUERY, 5), None)
+        self.assertEqual(self.session.proc, None)
+        self.set_state('2')
+        self.assertEqual(self.session.query(CHECK_QUERY, 5),
+                         'wsrep_local_state\t2')
+        self.assertEqual(self.connections(), 2)
+
+    def test_restarted_on_server_error(self):
+        self.set_state('error')
+        self.assertEqual(self.session.query(CHECK_QUERY, 5), None)
+        self.assertEqual(self.session.proc, None)
+        self.set_state('4')
+        self.assertEqual(self.session.query(CHECK_QUERY, 5),
+                         'wsrep_local_state\t4')
+        self.assertEqual(self.connections(), 2)
+
+    def test_connection_refused(self):
+        session = self.mysql_session(port=unused_port())
+        try:
+            started = time.time()
+            self.assertEqual(session.query(CHECK_QUERY, 5), None)
+            self.assertTrue(time.time() - started < 5)
+            self.assertEqual(session.proc, None)
+        finally:
+            session.close()
+
+    def test_connect_timeout(self):
+        # The node accepts the connection but never greets, the client
+        # gives up after --connect_timeout, before the query timeout
+        self.set_state('stall')
+        session = self.mysql_session(connect_timeout=1)
+        try:
+            started = time.time()
+            self.assertEqual(session.query(CHECK_QUERY, 10), None)
+            self.assertTrue(time.time() - started < 5)
+            self.assertEqual(session.proc, None)
+        finally:
+            session.close()
+
+    def test_timeout(self):
+        self.set_state('hang')
+        started = time.time()
+        self.assertEqual(self.session.query(CHECK_QUERY, 0.5), None)
+        self.assertTrue(time.time() - started < 5)
+        self.assertEqual(self.session.proc, None)
+        self.assertEqual(self.node.queries, [CHECK_QUERY])
+
+
+class WsrepRefresherTest(FakeMysqlTest):
+    def setUp(self):
+        super(WsrepRefresherTest, self).setUp()
+        self.cache = WsrepState(max_age=5)
+        self.refresher = WsrepRefresher(self.session, self.cache, 1, 5)
+
+    def test_states(self):
+        self.assertFalse(self.cache.is_synced())
+        self.refresher.refresh()
+        self.assertTrue(self.cache.is_synced())
+        # Donor/desynced
+        self.set_state('2')
+        self.refresher.refresh()
+        self.assertFalse(self.cache.is_synced())
+        self.set_state('error')
+        self.refresher.refresh()
+        self.assertEqual(self.cache.state, None)
+        self.assertFalse(self.cache.is_synced())
+        self.set_state('4')
+        self.refresher.refresh()
+        self.assertTrue(self.cache.is_synced())
+        self.set_state('drop')
+        self.refresher.refresh()
+        self.assertEqual(self.cache.state, None)
+
+    def test_unexpected_row(self):
+        self.set_state('4\textra')
+        self.refresher.refresh()
+        self.assertEqual(self.cache.state, None)
+        self.set_state(' 4 ')
+        self.refresher.refresh()
+        self.assertTrue(self.cache.is_synced())
+
+    def test_stale_state(self):
+        self.refresher.refresh()
+        self.cache.updated -= 6
+        self.assertFalse(self.cache.is_synced())
+
+
+class GaleraHealthServerTest(FakeMysqlTest):
+    def setUp(self):
+        super(GaleraHealthServerTest, self).setUp()
+        self.cache = WsrepState(max_age=5)
+        self.refresher = WsrepRefresher(self.session, self.cache, 1, 5)
+        self.server = GaleraHealthServer(('127.0.0.1', 0), self.cache)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+        super(GaleraHealthServerTest, self).tearDown()
+
+    def probe(self, method='GET'):
+        conn = httplib.HTTPConnection(*self.server.server_address)
+        try:
+            conn.request(method, '/')
+            response = conn.getresponse()
+            return response.status, response.read()
+        finally:
+            conn.close()
+
+    def test_probes(self):
+        self.refresher.refresh()
+        self.assertEqual(self.probe(),
+                         (200, '<html><body>MySQL is running.</body>'
+                               '</html>\r\n'))
+        # haproxy httpchk defaults to OPTIONS
+        self.assertEqual(self.probe('OPTIONS')[0], 200)
+        self.assertEqual(self.probe('HEAD'), (200, ''))
+        self.set_state('2')
+        self.refresher.refresh()
+        self.assertEqual(self.probe()[0], 503)
+
+    def test_probes_reuse_the_session(self):
+        # The probes are answered from the cached state, without opening
+        # a mysql connection each
+        started = time.time()
+        for index in range(PROBES):
+            if index % 20 == 0:
+                self.refresher.refresh()
+            self.assertEqual(self.probe()[0], 200)
+        elapsed = time.time() - started
+        self.assertEqual(self.connections(), 1)
+        # Forking a mysql client per probe takes tens of ms
+        self.assertTrue(elapsed / PROBES < 0.05,
+                        '%.1fms per probe' % (elapsed * 1000 / PROBES))
+
+
+if __name__ == '__main__':
+    unittest.main()
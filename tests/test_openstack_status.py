@@ -0,0 +1,116 @@
+#
+# Copyright (c) 2016 Juniper Networks, Inc. All rights reserved.
+#
+"""Parsing helpers of tools/openstack-status."""
+
+import os
+import imp
+import sys
+import unittest
+
+TOOL = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))), 'tools', 'openstack-status')
+
+
+def load_tool():
+    # The tool has no .py suffix, don't leave a compiled file next to it
+    dont_write_bytecode = sys.dont_write_bytecode
+    sys.dont_write_bytecode = True
+    try:
+        return imp.load_source('openstack_status', TOOL)
+    finally:
+        sys.dont_write_bytecode = dont_write_bytecode
+
+status = load_tool()
+
+UNIT_FILES = """\
+dbus.service                                static
+openstack-nova-api.service                  enabled
+openstack-nova-compute.service              disabled
+rabbitmq-server.service                     enabled
+sshd.socket                                 enabled
+
+"""
+CHKCONFIG = """\
+memcached      \t0:off\t1:off\t2:on\t3:on\t4:on\t5:on\t6:off
+openstack-nova-api\t0:off\t1:off\t2:off\t3:on\t4:on\t5:on\t6:off
+mysqld         \t0:off\t1:off\t2:off\t3:off\t4:off\t5:off\t6:off
+
+xinetd based services:
+\tchargen-dgram:\toff
+"""
+
+
+def report(**states):
+    return [{'group': 'services',
+             'services': [{'name': name.replace('_', '-'), 'status': value,
+                           'enabled': True}
+                          for name, value in sorted(states.items())]}]
+
+
+class ParseTest(unittest.TestCase):
+    def test_runlevel(self):
+        self.assertEqual(status.parse_runlevel(
+            '         run-level 3  2016-05-02 10:12\n'), '3')
+        self.assertEqual(status.parse_runlevel(''), None)
+
+    def test_rpm_names(self):
+        output = ('openstack-nova-common\n'
+                  'package openstack-swift is not installed\n'
+                  'libvirt\n')
+        self.assertEqual(status.parse_rpm_names(
+            output, ['openstack-nova-common', 'openstack-swift', 'libvirt',
+                     'memcached']),
+            set(['openstack-nova-common', 'libvirt']))
+
+    def test_unit_files(self):
+        self.assertEqual(status.parse_unit_files(UNIT_FILES), {
+            'dbus': True,
+            'openstack-nova-api': True,
+            'openstack-nova-compute': False,
+            'rabbitmq-server': True})
+
+    def test_chkconfig(self):
+        states = status.parse_chkconfig(CHKCONFIG, '2')
+        self.assertEqual((states['memcached'], states['openstack-nova-api'],
+                          states['mysqld']), (True, False, False))
+        self.assertTrue(status.parse_chkconfig(CHKCONFIG,
+                                               '3')['openstack-nova-api'])
+        self.assertFalse(status.parse_chkconfig(CHKCONFIG,
+                                                None)['memcached'])
+
+
+class ApiBlockersTest(unittest.TestCase):
+    packages = set(['openstack-keystone', 'openstack-glance',
+                    'openstack-nova-common'])
+
+    def test_all_active(self):
+        states = status.service_states(report(
+            openstack_keystone='active', openstack_nova_api='active',
+            openstack_glance_api='active',
+            openstack_glance_registry='active'))
+        for package in self.packages:
+            self.assertEqual(status.api_blockers(package, self.packages,
+                                                 states), [])
+
+    def test_keystone_down(self):
+        states = status.service_states(report(
+            openstack_keystone='inactive', openstack_nova_api='active'))
+        self.assertEqual(status.api_blockers('openstack-nova-common',
+                                             self.packages, states),
+                         [('openstack-keystone', 'inactive')])
+        self.assertEqual(status.api_blockers('openstack-glance',
+                                             self.packages, states),
+                         [('openstack-keystone', 'inactive'),
+                          ('openstack-glance-api', 'not reported'),
+                          ('openstack-glance-registry', 'not reported')])
+
+    def test_without_keystone(self):
+        states = status.service_states(report(openstack_nova_api='timeout'))
+        self.assertEqual(status.api_blockers(
+            'openstack-nova-common', set(['openstack-nova-common']), states),
+            [('openstack-nova-api', 'timeout')])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+#
+# Copyright (c) 2016 Juniper Networks, Inc. All rights reserved.
+#
+
+import unittest
+
+from contrail_provisioning.storage.storagefs import osd_removal
+from contrail_provisioning.storage.storagefs.osd_removal import OsdRemoval
+
+HOST = ('10.1.1.1', 'secret')
+
+
+def pg(pgid, state, osds):
+    return {'pgid': pgid, 'state': state, 'up': osds, 'acting': osds}
+
+
+class TestOsdRemoval(unittest.TestCase):
+    def setUp(self):
+        self.commands = []
+        self.host_scripts = []
+        self.pg_dumps = []
+        self.saved = (osd_removal.local, osd_removal.ceph_json,
+                      osd_removal.run_on_hosts, osd_removal.POLL_INTERVAL)
+        osd_removal.local = self.commands.append
+        osd_removal.ceph_json = lambda command: self.pg_dumps.pop(0)
+        osd_removal.run_on_hosts = self.run_on_hosts
+        osd_removal.POLL_INTERVAL = 0
+
+    def tearDown(self):
+        (osd_removal.local, osd_removal.ceph_json,
+         osd_removal.run_on_hosts, osd_removal.POLL_INTERVAL) = self.saved
+
+    def run_on_hosts(self, func, entries, max_workers):
+        self.host_scripts += [commands for host, token, commands in entries]
+        return [(host, True) for host, token, commands in entries]
+
+    def removal(self, **kwargs):
+        return OsdRemoval({HOST: [('3', '/dev/sdb'), ('4', '/dev/sdc')]},
+                          'stop osd.%s', **kwargs)
+
+    def removed(self):
+        return [command for command in self.commands
+                if 'osd rm' in command or 'osd out' in command]
+
+    def test_drained(self):
+        self.pg_dumps = [[pg('1.0', 'active+remapped', [1, 3])],
+                         [pg('1.0', 'active+clean', [1, 2])]]
+        self.removal().run()
+        self.assertEqual(self.commands[:3],
+                         ['sudo ceph osd set norebalance',
+                          'sudo sh -c "ceph osd crush reweight osd.3 0 && '
+                          'ceph osd crush reweight osd.4 0"',
+                          'sudo ceph osd unset norebalance'])
+        self.assertIn('sudo ceph osd out 3 4', self.commands)
+        self.assertEqual(len(self.host_scripts), 2)
+        self.assertIn('parted -s /dev/sdb mklabel gpt > /dev/null 2>&1',
+                      self.host_scripts[1])
+
+    def test_timeout_leaves_osds_in(self):
+        self.pg_dumps = [[pg('1.0', 'active+clean', [1, 3]),
+                          pg('1.1', 'active+degraded', [4]),
+                          pg('1.2', 'active+clean', [1, 2])]]
+        with self.assertRaises(RuntimeError) as context:
+            self.removal(drain_timeout=-1).run()
+        message = str(context.exception)
+        self.assertIn('pgs still mapped to them: 1.0 1.1', message)
+        self.assertIn('pgs not active+clean: 1.1', message)
+        self.assertEqual(self.removed(), [])
+        self.assertEqual(self.host_scripts, [])
+
+    def test_timeout_forced(self):
+        self.pg_dumps = [[pg('1.0', 'active+clean', [1, 3])]]
+        self.removal(drain_timeout=-1, force=True).run()
+        self.assertEqual(self.removed(), [
+            'sudo ceph osd out 3 4',
+            'sudo sh -c "ceph osd crush remove osd.3 && ceph auth del osd.3'
+            ' && ceph osd crush remove osd.4 && ceph auth del osd.4'
+            ' && ceph osd rm 3 4"'])
+        self.assertEqual(len(self.host_scripts), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,186 @@
+#
+# Copyright (c) 2016 Juniper Networks, Inc. All rights reserved.
+#
+"""Package plan of the upgrade, run with fake package manager backends."""
+
+import unittest
+
+from contrail_provisioning.common.packages import PackagePlan, \
+    PackageBackend, AptBackend, YumBackend, apply_plan
+from contrail_provisioning.common.upgrade import ContrailUpgrade
+
+
+class FakeBackend(object):
+    """Records the commands instead of running them."""
+
+    def __init__(self, installed_packages):
+        self.installed_packages = set(installed_packages)
+        self.ran = []
+
+    def installed(self, names):
+        return self.installed_packages & set(names)
+
+    def run(self, cmd):
+        self.ran.append(cmd)
+
+
+class FakeAptBackend(FakeBackend, AptBackend):
+    def __init__(self, installed_packages, force_confmiss=False):
+        FakeBackend.__init__(self, installed_packages)
+        AptBackend.__init__(self, force_confmiss)
+
+
+class FakeYumBackend(FakeBackend, YumBackend):
+    pass
+
+
+def upgrade_plan():
+    return PackagePlan(remove=['contrail-old', 'not-installed'],
+                       downgrade=['python-kazoo=1.3'],
+                       upgrade=['contrail-lib', 'contrail-lib'],
+                       replace=[('contrail-fabric', 'contrail-fabric-utils')])
+
+
+class PackagePlanTest(unittest.TestCase):
+    def test_merged_sets(self):
+        plan = upgrade_plan()
+        self.assertEqual(plan.removals, ['contrail-old', 'not-installed',
+                                         'contrail-fabric'])
+        self.assertEqual(plan.installs, ['python-kazoo=1.3', 'contrail-lib',
+                                         'contrail-fabric-utils'])
+        self.assertTrue(plan.downgrade)
+        self.assertTrue(plan.reinstall)
+
+    def test_resolve_drops_missing_removals(self):
+        plan = upgrade_plan()
+        plan.resolve(set(['contrail-old', 'contrail-fabric']))
+        self.assertEqual(plan.removals, ['contrail-old', 'contrail-fabric'])
+
+    def test_split_plans(self):
+        plan = upgrade_plan()
+        removal, install = plan.removal_plan(), plan.install_plan()
+        self.assertEqual(removal.removals, plan.removals)
+        self.assertEqual(removal.installs, [])
+        self.assertEqual(install.removals, [])
+        self.assertEqual(install.installs, plan.installs)
+        self.assertTrue(install.downgrade and install.reinstall)
+
+    def test_empty(self):
+        plan = PackagePlan()
+        self.assertTrue(plan.is_empty())
+        self.assertTrue(plan.describe().endswith('nothing to do'))
+
+    def test_backend_is_abstract(self):
+        self.assertRaises(TypeError, PackageBackend)
+
+
+class ApplyPlanTest(unittest.TestCase):
+    installed = ['contrail-old', 'contrail-fabric', 'contrail-lib']
+
+    def test_apt_single_run(self):
+        backend = FakeAptBackend(self.installed)
+        apply_plan(backend, upgrade_plan())
+        self.assertEqual(backend.ran, [
+            'DEBIAN_FRONTEND=noninteractive apt-get -y --force-yes'
+            ' -o Dpkg::Options::="--force-overwrite"'
+            ' -o Dpkg::Options::="--force-confnew" --reinstall --purge'
+            ' install python-kazoo=1.3 contrail-lib contrail-fabric-utils'
+            ' contrail-old- contrail-fabric-'])
+
+    def test_apt_force_confmiss(self):
+        backend = FakeAptBackend([], force_confmiss=True)
+        apply_plan(backend, PackagePlan(upgrade=['contrail-lib']))
+        self.assertEqual(backend.ran, [
+            'DEBIAN_FRONTEND=noninteractive apt-get -y --force-yes'
+            ' -o Dpkg::Options::="--force-overwrite"'
+            ' -o Dpkg::Options::="--force-confmiss"'
+            ' -o Dpkg::Options::="--force-confnew" install contrail-lib'])
+
+    def test_apt_dry_run_simulates(self):
+        backend = FakeAptBackend(self.installed)
+        apply_plan(backend, upgrade_plan(), dry_run=True)
+        self.assertEqual(len(backend.ran), 1)
+        self.assertTrue(' --simulate ' in backend.ran[0])
+
+    def test_apt_nothing_to_do(self):
+        backend = FakeAptBackend([])
+        apply_plan(backend, PackagePlan(remove=['not-installed']))
+        self.assertEqual(backend.ran, [])
+
+    def test_yum_remove_then_install(self):
+        backend = FakeYumBackend(self.installed)
+        apply_plan(backend, upgrade_plan())
+        self.assertEqual(backend.ran, [
+            'rpm -e --nodeps contrail-old contrail-fabric',
+            'yum --disablerepo=* --enablerepo=contrail* clean expire-cache',
+            'yum -y --disablerepo=* --enablerepo=contrail* --nogpgcheck'
+            ' install python-kazoo=1.3 contrail-lib contrail-fabric-utils'])
+
+    def test_yum_split_plans(self):
+        # CentOS removes the packages before the ensured ones are installed
+        backend = FakeYumBackend(self.installed)
+        plan = upgrade_plan()
+        apply_plan(backend, plan.removal_plan())
+        self.assertEqual(backend.ran,
+                         ['rpm -e --nodeps contrail-old contrail-fabric'])
+        apply_plan(backend, plan.install_plan())
+        self.assertEqual(backend.ran[-1],
+            'yum -y --disablerepo=* --enablerepo=contrail* --nogpgcheck'
+            ' install python-kazoo=1.3 contrail-lib contrail-fabric-utils')
+
+    def test_yum_dry_run_simulates(self):
+        backend = FakeYumBackend(self.installed)
+        apply_plan(backend, upgrade_plan(), dry_run=True)
+        self.assertEqual(backend.ran, [
+            'rpm -e --nodeps --test contrail-old contrail-fabric',
+            'yum --assumeno --disablerepo=* --enablerepo=contrail*'
+            ' --nogpgcheck'
+            ' install python-kazoo=1.3 contrail-lib contrail-fabric-utils'])
+
+
+class FakeUpgrade(ContrailUpgrade):
+    def __init__(self, pdist, backend):
+        ContrailUpgrade.__init__(self)
+        self.pdist = pdist
+        self.backend = backend
+        self.upgrade_data.update(remove=['contrail-old'],
+                                 upgrade=['contrail-lib'])
+
+    def _package_backend(self):
+        return self.backend
+
+
+class UpgradeDryRunTest(unittest.TestCase):
+    def test_no_dry_run(self):
+        upgrade = FakeUpgrade('centos', FakeYumBackend(['contrail-old']))
+        self.assertFalse(upgrade._dry_run())
+        self.assertEqual(upgrade.backend.ran, [])
+
+    def test_dry_run_only_simulates(self):
+        upgrade = FakeUpgrade('centos', FakeYumBackend(['contrail-old']))
+        upgrade.dry_run = True
+        self.assertTrue(upgrade._dry_run())
+        self.assertEqual(upgrade.backend.ran, [
+            'rpm -e --nodeps --test contrail-old',
+            'yum --assumeno --disablerepo=* --enablerepo=contrail*'
+            ' install contrail-lib'])
+
+    def test_centos_removes_before_ensure(self):
+        calls = []
+        upgrade = FakeUpgrade('centos', FakeYumBackend(['contrail-old']))
+        upgrade.backend.run = calls.append
+        upgrade._ensure_package = lambda: calls.append('ensure')
+        upgrade._apply_packages()
+        self.assertEqual(calls[:2], ['rpm -e --nodeps contrail-old',
+                                     'ensure'])
+
+    def test_ubuntu_single_transaction(self):
+        upgrade = FakeUpgrade('Ubuntu', FakeAptBackend(['contrail-old']))
+        upgrade._apply_packages()
+        self.assertEqual(len(upgrade.backend.ran), 1)
+        self.assertTrue(upgrade.backend.ran[0].endswith(
+            ' --purge install contrail-lib contrail-old-'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+#
+# Copyright (c) 2016 Juniper Networks, Inc. All rights reserved.
+#
+
+import os
+import tempfile
+import unittest
+
+from contrail_provisioning.common import routes
+from contrail_provisioning.common import staticroute_setup
+from contrail_provisioning.common.routes import Route, RouteTable
+
+PROC_ROUTE = """\
+Iface\tDestination\tGateway \tFlags\tRefCnt\tUse\tMetric\tMask\t\tMTU\tWindow\tIRTT
+eth0\t00000000\t0101010A\t0003\t0\t0\t0\t00000000\t0\t0\t0
+eth0\t0001010A\t00000000\t0001\t0\t0\t0\t00FFFFFF\t0\t0\t0
+eth1\t0000020A\t0102020A\t0003\t0\t0\t0\t0000FFFF\t0\t0\t0
+eth1\t0000030A\t0102020A\t0003\t0\t0\t100\t0000FFFF\t0\t0\t0
+"""
+DEFAULT = Route('0.0.0.0', 0, '10.1.1.1', 'eth0')
+NET2 = Route('10.2.0.0', 16, '10.2.2.1', 'eth1')
+NET3 = Route('10.3.0.0', 16, '10.2.2.1', 'eth1')
+
+
+class RouteTableTest(unittest.TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp()
+        with os.fdopen(fd, 'w') as f:
+            f.write(PROC_ROUTE)
+        self.table = RouteTable.read(self.path)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_read(self):
+        self.assertEqual(self.table.routes, set([DEFAULT, NET2, NET3]))
+        self.assertEqual(self.table.device_routes('eth1'), set([NET2, NET3]))
+        self.assertEqual(self.table.metrics[NET3], 100)
+
+    def test_missing(self):
+        desired = [NET2, NET2.on_device('eth2')]
+        self.assertEqual(self.table.missing(desired),
+                         set([NET2.on_device('eth2')]))
+
+    def test_replaced_by(self):
+        added = [NET2.on_device('eth2'), DEFAULT._replace(gateway='10.1.1.2'),
+                 Route('10.4.0.0', 16, '10.2.2.1', 'eth1')]
+        self.assertEqual(self.table.replaced_by(added), set([NET2, DEFAULT]))
+        # routes with a metric are not overwritten by "ip route replace"
+        self.assertEqual(self.table.replaced_by([NET3.on_device('eth2')]),
+                         set())
+        self.assertEqual(self.table.replaced_by([NET2]), set())
+
+
+class RollbackTest(unittest.TestCase):
+    def setUp(self):
+        self.applied = []
+        self.saved = (routes.apply_routes, RouteTable.__dict__['read'])
+        routes.apply_routes = lambda add=(), delete=(): self.applied.append(
+            (set(add), set(delete)))
+        RouteTable.read = classmethod(lambda cls: cls([DEFAULT, NET2]))
+
+    def tearDown(self):
+        routes.apply_routes, RouteTable.read = self.saved
+
+    def test_rollback_restores_replaced(self):
+        route = staticroute_setup.StaticRoute(device='eth2')
+        route.desired = [NET2.on_device('eth2'), NET3.on_device('eth2')]
+        route.restart_service()
+        route.rollback()
+        self.assertEqual(self.applied, [
+            (set(route.desired), set()),
+            (set([NET2]), set(route.desired))])
+
+
+if __name__ == '__main__':
+    unittest.main()
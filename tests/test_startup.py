@@ -0,0 +1,105 @@
+#
+# Copyright (c) 2016 Juniper Networks, Inc. All rights reserved.
+#
+"""Start-up benchmark of the console scripts.
+
+The module of every console script of setup.py is imported in a fresh
+interpreter, which must not load the heavy dependencies and must be done
+within IMPORT_TIME_LIMIT.
+"""
+
+import os
+import ast
+import sys
+import json
+import unittest
+import subprocess
+
+TOP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ['fabric', 'paramiko', 'netaddr', 'netifaces',
+                 'keystoneclient']
+# Best of RUNS, in seconds
+IMPORT_TIME_LIMIT = 1.0
+RUNS = 3
+# database/reset.py is empty, reset-vnc-database has no implementation yet
+UNIMPLEMENTED_SCRIPTS = ['reset-vnc-database']
+
+BENCHMARK = '''
+import sys, time, json
+start = time.time()
+__import__(sys.argv[1])
+elapsed = time.time() - start
+print json.dumps([elapsed, sorted(set(name.split('.')[0] for name in sys.modules
+                                      if sys.modules[name] is not None))])
+'''
+
+
+def console_scripts():
+    """[(name, module, function)] of the console scripts of setup.py."""
+    with open(os.path.join(TOP_DIR, 'setup.py')) as f:
+        tree = ast.parse(f.read())
+    scripts = []
+    for node in ast.walk(tree):
+        if (isinstance(node, ast.Dict) and
+                'console_scripts' in [key.s for key in node.keys
+                                      if isinstance(key, ast.Str)]):
+            for key, value in zip(node.keys, node.values):
+                if key.s != 'console_scripts':
+                    continue
+                for entry in value.elts:
+                    name, target = [part.strip()
+                                    for part in entry.s.split('=')]
+                    module, function = target.split(':')
+                    scripts.append((name, module, function))
+    return scripts
+
+
+def import_module(module):
+    """(seconds, top level modules loaded) of importing module."""
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        [TOP_DIR] + [path for path in [env.get('PYTHONPATH')] if path])
+    output = subprocess.check_output([sys.executable, '-c', BENCHMARK, module],
+                                     env=env)
+    elapsed, modules = json.loads(output)
+    return elapsed, modules
+
+
+class TestStartup(unittest.TestCase):
+    def setUp(self):
+        self.modules = sorted(set(module for name, module, function in
+                                  console_scripts()
+                                  if name not in UNIMPLEMENTED_SCRIPTS))
+
+    def test_heavy_modules_not_imported(self):
+        self.assertTrue(self.modules)
+        for module in self.modules:
+            elapsed, modules = import_module(module)
+            self.assertEqual([name for name in HEAVY_MODULES
+                              if name in modules], [], module)
+
+    def test_import_time(self):
+        for module in self.modules:
+            best = min(import_module(module)[0] for _ in range(RUNS))
+            self.assertLess(best, IMPORT_TIME_LIMIT,
+                            '%s imported in %.3fs' % (module, best))
+
+
+class TestConsoleScripts(unittest.TestCase):
+    def test_targets_defined(self):
+        scripts = console_scripts()
+        self.assertEqual(len(scripts), len(set(name for name, module,
+                                               function in scripts)))
+        for name, module, function in scripts:
+            if name in UNIMPLEMENTED_SCRIPTS:
+                continue
+            path = os.path.join(TOP_DIR, *module.split('.')) + '.py'
+            with open(path) as f:
+                tree = ast.parse(f.read(), path)
+            functions = [node.name for node in tree.body
+                         if isinstance(node, ast.FunctionDef)]
+            self.assertIn(function, functions, name)
+
+
+if __name__ == '__main__':
+    unittest.main()
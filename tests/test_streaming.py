@@ -0,0 +1,139 @@
+#
+# Copyright (c) 2016 Juniper Networks, Inc. All rights reserved.
+#
+"""Streaming progress, checked against captured nodetool netstats output
+in fixtures/netstats.
+"""
+
+import os
+import unittest
+
+from contrail_provisioning.database.streaming import parse_netstats, \
+    StreamingProgress
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        'fixtures', 'netstats')
+GB = 1024 ** 3
+MB = 1024 ** 2
+
+
+def netstats(name):
+    with open(os.path.join(FIXTURES, name), 'r') as fd:
+        return parse_netstats(fd.read())
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class ParseNetstatsTest(unittest.TestCase):
+    def test_cassandra_21(self):
+        sample = netstats('cassandra-2.1-decommission-1.txt')
+        self.assertEqual(sample.mode, 'LEAVING')
+        self.assertEqual([(session.peer, session.direction, session.files,
+                           session.files_done)
+                          for session in sample.sessions],
+                         [('10.84.13.24', 'sent', 12, 4),
+                          ('10.84.13.25', 'sent', 6, 2)])
+        self.assertEqual(sample.bytes_done(), GB + 512 * MB)
+        self.assertEqual(sample.bytes_total(), 7 * GB)
+        self.assertEqual(sample.peers(), {'10.84.13.24': (GB, 5 * GB),
+                                          '10.84.13.25': (512 * MB, 2 * GB)})
+        files = sample.files()
+        self.assertEqual([(f.peer, f.done, f.total) for f in files],
+                         [('10.84.13.24', 512 * MB, GB),
+                          ('10.84.13.25', 128 * MB, 256 * MB)])
+        self.assertTrue(files[0].path.endswith('-ka-112-Data.db'))
+
+    def test_cassandra_20(self):
+        # No "Already sent", the files in flight give the progress
+        sample = netstats('cassandra-2.0-decommission.txt')
+        self.assertEqual(sample.mode, 'LEAVING')
+        session, = sample.sessions
+        self.assertEqual((session.peer, session.files, session.total),
+                         ('10.84.13.24', 3, 3 * GB))
+        self.assertEqual(session.files_done, None)
+        self.assertEqual(len(session.streaming), 2)
+        self.assertEqual(sample.bytes_done(), GB + 256 * MB)
+
+    def test_receiving(self):
+        sample = netstats('cassandra-2.2-removenode-receiving.txt')
+        self.assertEqual(sample.mode, 'NORMAL')
+        session, = sample.sessions
+        self.assertEqual((session.peer, session.direction, session.done),
+                         ('10.84.13.26', 'received', 512 * MB))
+        self.assertEqual(session.streaming[0].direction, 'received')
+        self.assertEqual(sample.bytes_total(), 1536 * MB)
+
+    def test_idle(self):
+        sample = netstats('idle.txt')
+        self.assertEqual(sample.mode, 'NORMAL')
+        self.assertEqual(sample.sessions, [])
+        self.assertEqual(sample.bytes_done(), 0)
+
+
+class StreamingProgressTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.progress = StreamingProgress(stall_timeout=600,
+                                          clock=self.clock)
+
+    def add(self, name, elapsed=0):
+        self.clock.now += elapsed
+        self.progress.add(netstats(name))
+
+    def test_eta(self):
+        self.add('cassandra-2.1-decommission-1.txt')
+        self.assertEqual(self.progress.throughput(), None)
+        self.assertEqual(self.progress.eta(), None)
+        # 1.5GB more streamed in 60s, 4GB left
+        self.add('cassandra-2.1-decommission-2.txt', 60)
+        self.assertEqual(self.progress.throughput(), 1.5 * GB / 60)
+        self.assertEqual(self.progress.eta(), 160)
+        report = self.progress.report()
+        self.assertEqual(report.splitlines(), [
+            'Mode: LEAVING, streamed 3.0GB of 7.0GB, 25.6MB/s, ETA 0:02:40',
+            '    10.84.13.24: 2.0GB of 5.0GB',
+            '    10.84.13.25: 1.0GB of 2.0GB'])
+
+    def test_no_throughput_eta_unknown(self):
+        self.add('cassandra-2.1-decommission-1.txt')
+        self.add('cassandra-2.1-decommission-1.txt', 30)
+        self.assertEqual(self.progress.throughput(), 0)
+        self.assertEqual(self.progress.eta(), None)
+        self.assertTrue('ETA unknown' in self.progress.report())
+
+    def test_stall(self):
+        self.add('cassandra-2.1-decommission-1.txt')
+        self.add('cassandra-2.1-decommission-1.txt', 300)
+        self.assertEqual(self.progress.stalled_for(), 0)
+        self.assertFalse('WARNING' in self.progress.report())
+        self.add('cassandra-2.1-decommission-1.txt', 330)
+        self.assertEqual(self.progress.stalled_for(), 630)
+        self.assertEqual(self.progress.report().splitlines()[-1],
+                         '    WARNING: no progress for 0:10:30')
+        # Any progress clears the stall
+        self.add('cassandra-2.1-decommission-2.txt', 30)
+        self.assertEqual(self.progress.stalled_for(), 0)
+        self.assertFalse('WARNING' in self.progress.report())
+
+    def test_throughput_window(self):
+        self.add('cassandra-2.1-decommission-1.txt')
+        self.add('cassandra-2.1-decommission-2.txt', 60)
+        for _ in range(10):
+            self.add('cassandra-2.1-decommission-2.txt', 60)
+        # The first samples are out of the window, nothing streamed since
+        self.assertEqual(self.progress.throughput(), 0)
+        self.assertEqual(len(self.progress.samples), 10)
+
+    def test_idle_report(self):
+        self.add('idle.txt')
+        self.assertEqual(self.progress.report(), 'Mode: NORMAL, no streams')
+
+
+if __name__ == '__main__':
+    unittest.main()
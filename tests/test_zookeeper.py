@@ -0,0 +1,143 @@
+#
+# Copyright (c) 2016 Juniper Networks, Inc. All rights reserved.
+#
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from contrail_provisioning.database import zookeeper
+from contrail_provisioning.database.zookeeper import ZooCfg, ensemble, \
+    update_zookeeper_config, ZOO_SETTINGS
+
+NODES = ['10.1.1.1', '10.1.1.2', '10.1.1.3']
+LIVE_CFG = """# zookeeper config
+tickTime=2000
+dataDir=%s
+clientPort=2181
+# custom setting
+snapCount=50000
+server.1=10.1.1.1:2888:3888
+server.2=10.1.1.9:2888:3888
+"""
+
+
+class EnsembleTest(unittest.TestCase):
+    def test_servers(self):
+        self.assertEqual(ensemble(NODES, '2', '10.1.1.2'),
+                         [(1, '10.1.1.1'), (2, '10.1.1.2'), (3, '10.1.1.3')])
+
+    def test_empty(self):
+        self.assertRaises(RuntimeError, ensemble, [], 1)
+
+    def test_duplicates(self):
+        with self.assertRaises(RuntimeError) as context:
+            ensemble(NODES + ['10.1.1.2'], 1)
+        self.assertIn('10.1.1.2', str(context.exception))
+
+    def test_myid_out_of_range(self):
+        for myid in [0, 4, -1]:
+            self.assertRaises(RuntimeError, ensemble, NODES, myid)
+
+    def test_invalid_myid(self):
+        for myid in [None, 'one']:
+            self.assertRaises(RuntimeError, ensemble, NODES, myid)
+
+    def test_myid_not_self_ip(self):
+        with self.assertRaises(RuntimeError) as context:
+            ensemble(NODES, 1, '10.1.1.2')
+        self.assertIn('server 10.1.1.1', str(context.exception))
+        # A node outside of the list is not checked
+        self.assertEqual(len(ensemble(NODES, 1, '10.1.1.7')), 3)
+
+
+class RenderTest(unittest.TestCase):
+    def render(self, content, nodes=NODES):
+        return ZooCfg(content).render(ZOO_SETTINGS,
+                                      list(enumerate(nodes, 1)))
+
+    def test_new(self):
+        lines = self.render('').splitlines()
+        self.assertEqual(lines[:len(ZOO_SETTINGS)],
+                         ['%s=%s' % setting for setting in ZOO_SETTINGS])
+        self.assertEqual(lines[len(ZOO_SETTINGS):],
+                         ['server.1=10.1.1.1:2888:3888',
+                          'server.2=10.1.1.2:2888:3888',
+                          'server.3=10.1.1.3:2888:3888'])
+
+    def test_live(self):
+        rendered = self.render(LIVE_CFG % '/var/lib/zookeeper')
+        lines = rendered.splitlines()
+        # Comments and unmanaged settings are kept, servers in place
+        self.assertEqual(lines[:8], [
+            '# zookeeper config',
+            'tickTime=2000',
+            'dataDir=/var/lib/zookeeper',
+            'clientPort=2181',
+            '# custom setting',
+            'snapCount=50000',
+            'server.1=10.1.1.1:2888:3888',
+            'server.2=10.1.1.2:2888:3888'])
+        self.assertEqual(lines[8], 'server.3=10.1.1.3:2888:3888')
+        self.assertNotIn('10.1.1.9', rendered)
+        self.assertEqual(len([line for line in lines
+                              if line.startswith('dataDir=')]), 1)
+
+    def test_idempotent(self):
+        for content in ['', LIVE_CFG % '/var/lib/zookeeper']:
+            rendered = self.render(content)
+            self.assertEqual(self.render(rendered), rendered)
+
+    def test_removed_servers(self):
+        rendered = self.render(self.render(''), NODES[:2])
+        self.assertNotIn('server.3', rendered)
+        self.assertEqual(self.render(rendered, NODES[:2]), rendered)
+
+    def test_duplicate_settings(self):
+        rendered = self.render('tickTime=3000\ntickTime=4000\n')
+        self.assertEqual(rendered.count('tickTime='), 1)
+        self.assertIn('tickTime=2000\n', rendered)
+
+
+class UpdateConfigTest(unittest.TestCase):
+    def setUp(self):
+        self.conf_dir = tempfile.mkdtemp()
+        self.data_dir = os.path.join(self.conf_dir, 'data')
+        os.mkdir(self.data_dir)
+        self.zoo_cfg = os.path.join(self.conf_dir, 'zoo.cfg')
+        with open(self.zoo_cfg, 'w') as f:
+            f.write(LIVE_CFG % self.data_dir)
+        self.install_file = zookeeper.install_file
+        zookeeper.install_file = self.install
+
+    def tearDown(self):
+        zookeeper.install_file = self.install_file
+        shutil.rmtree(self.conf_dir)
+
+    def install(self, path, content, mode=None):
+        with open(path, 'w') as f:
+            f.write(content)
+
+    def test_update(self):
+        myid = os.path.join(self.data_dir, 'myid')
+        self.assertEqual(update_zookeeper_config(self.conf_dir, NODES, 2,
+                                                 '10.1.1.2'),
+                         [self.zoo_cfg, myid])
+        with open(myid) as f:
+            self.assertEqual(f.read(), '2\n')
+        with open(self.zoo_cfg) as f:
+            self.assertIn('dataDir=%s\n' % self.data_dir, f.read())
+        # Nothing to write the second time
+        self.assertEqual(update_zookeeper_config(self.conf_dir, NODES, 2,
+                                                 '10.1.1.2'), [])
+
+    def test_invalid_ensemble(self):
+        self.assertRaises(RuntimeError, update_zookeeper_config,
+                          self.conf_dir, NODES, 3, '10.1.1.2')
+        with open(self.zoo_cfg) as f:
+            self.assertEqual(f.read(), LIVE_CFG % self.data_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()